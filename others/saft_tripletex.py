@@ -1,6 +1,15 @@
 # -*- coding: utf-8 -*-
 """
-saft_tripletex.py  v1.2  –  rask full-dekning SAF-T -> CSV (+XLSX).
+saft_tripletex.py  v1.3  –  rask full-dekning SAF-T -> CSV (+XLSX).
+
+Ny i 1.3
+---------
+• Parsingen gjøres av felles SAF-T-motor (src/app/parsers/saft_engine, med
+  cache); her gjenstår zip-sjekk, XSD-validering, kontroller og utskrift.
+• Kolonnene er de samme som i 1.2: opening/closing_balance er debetsaldoen,
+  eller kreditsaldoen når debet er 0 (uten fortegn); debit_amt/credit_amt i
+  analysis_lines.csv følger siden (debet/kredit) til linjen analysen hører til.
+• Linjer med Amount + DebitCreditIndicator føres som debet/kredit av motoren.
 
 Ny i 1.2
 ---------
@@ -11,67 +20,23 @@ Ny i 1.2
 from __future__ import annotations
 from pathlib import Path
 import argparse, csv, decimal, io, logging, sys, zipfile
-from typing import Dict, List, Tuple, BinaryIO
+from typing import Tuple, BinaryIO
 import pandas as pd
 from lxml import etree
-try:
-    from tqdm import tqdm
-except ModuleNotFoundError:  # pragma: no cover
-    def tqdm(x, **k): return x                           # type: ignore
+
+_PARSERS_DIR = Path(__file__).resolve().parents[1] / "src" / "app" / "parsers"
+if str(_PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(_PARSERS_DIR))
+from saft_engine import load_saft  # noqa: E402
 
 # ── konstanter ────────────────────────────────────────────────────────────
 DEC = decimal.Decimal
-NS: Dict[str, str] = {"s": "urn:StandardAuditFile-Tax"}   # settes dynamisk
-LINE_TAGS = {"Line", "TransactionLine", "JournalLine", "Transaction"}
 MAX_ZIP_RATIO_DEFAULT = 200.0
 WRITE_XLSX = True
 
 logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
 
-ALIAS: Dict[str, Tuple[str, ...]] = {
-    "description": ("Name", "Description", "AccountDescription", "Text"),
-    "vat_code":    ("VatCode", "VATCode", "TaxCode", "StandardVatCode"),
-    "vat_rate":    ("TaxPercentageDecimal", "TaxPercentage"),
-    "opening_bal": ("OpeningBalance", "OpeningDebitBalance", "OpeningCreditBalance"),
-    "closing_bal": ("ClosingBalance", "ClosingDebitBalance", "ClosingCreditBalance"),
-}
-
 # ── hjelpere ──────────────────────────────────────────────────────────────
-def _ns(local: str) -> str: return f"{{{NS['s']}}}{local}"
-
-def _txt(el: etree._Element, tag: str) -> str | None:
-    tag_lc = tag.lower()
-    # direkte barn
-    for child in el:
-        if etree.QName(child).localname.lower() == tag_lc and child.text:
-            return child.text.strip()
-    # attributter
-    for attr, val in el.attrib.items():
-        if etree.QName(attr).localname.lower() == tag_lc and val.strip():
-            return val.strip()
-    # ett nivå dypere (Amount-noder)
-    for child in el:
-        if etree.QName(child).localname.lower() == tag_lc:
-            if child.text and child.text.strip():
-                return child.text.strip()
-            if "Amount" in child.attrib and child.attrib["Amount"].strip():
-                return child.attrib["Amount"].strip()
-    return None
-
-def _first(el: etree._Element, *tags: str) -> str | None:
-    for t in tags:
-        if (v := _txt(el, t)):
-            return v
-    return None
-
-def pick(el: etree._Element, key: str) -> str | None:
-    return _first(el, *ALIAS.get(key, (key,)))
-
-def _dec(s: str | None) -> DEC | None:
-    if not s: return None
-    try: return DEC(s.replace("\u00A0", "").replace(" ", "").replace(",", "."))
-    except decimal.InvalidOperation: return None
-
 def _dec_str(n: DEC | None) -> str | None:
     return str(n).replace(".", ",") if n is not None else None
 
@@ -80,7 +45,7 @@ def _to_dec(x) -> DEC:
     if isinstance(x, DEC): return x
     return DEC(str(x))
 
-# ── zip / namespace ───────────────────────────────────────────────────────
+# ── zip ───────────────────────────────────────────────────────────────────
 def _stream_xml(path: Path, limit: float) -> BinaryIO:
     if not zipfile.is_zipfile(path):
         return open(path, "rb")
@@ -91,128 +56,67 @@ def _stream_xml(path: Path, limit: float) -> BinaryIO:
     xml = next(n for n in z.namelist() if n.lower().endswith(".xml"))
     return z.open(xml)
 
-def _set_ns(stream: BinaryIO) -> None:
-    stream.seek(0)
-    _ev, root = next(etree.iterparse(stream, events=("start",)))
-    NS["s"] = etree.QName(root).namespace
-    stream.seek(0)
-
-# ── parser ────────────────────────────────────────────────────────────────
-def _parse(stream: BinaryIO):
-    hdr, bank, acc, cust, supp, jour, lines, analy = \
-        [], [], [], [], [], [], [], []
-
-    _set_ns(stream)
-    TAGS = tuple(_ns(t) for t in (
-        "Header","BankAccount","Account","Journal","Transaction",
-        *LINE_TAGS,"Customer","Supplier","Analysis"))
-
-    # kontekst-variabler
-    cur_journal_id: str | None = None
-    cur_voucher_no: str | None = None
-
-    ctx = etree.iterparse(stream, events=("start","end"), tag=TAGS,
-                          resolve_entities=False,no_network=True,
-                          load_dtd=False,huge_tree=False,recover=True)
-
-    for ev, el in tqdm(ctx, desc="Parsing", unit="elem", disable=not sys.stderr.isatty()):
-        ltag = etree.QName(el).localname
-
-        # -- START-events for kontekst -----------------------------------
-        if ev == "start":
-            if ltag == "Journal":
-                cur_journal_id = _txt(el, "JournalID")
-                cur_voucher_no = None              # reset
-            elif ltag == "Transaction":
-                cur_voucher_no = _first(el, "VoucherNo", "VoucherID") or cur_journal_id
-            continue  # prosesser resten på 'end'
-
-        # -- END-events: bygg rader --------------------------------------
-        if ltag == "Header":
-            hdr.append({
-                "file_version": _txt(el,"AuditFileVersion"),
-                "software":     _txt(el,"SoftwareCompanyName"),
-                "software_ver": _txt(el,"SoftwareVersion"),
-                "created":      _txt(el,"AuditFileDateCreated"),
-                "start":        _txt(el,"SelectionStartDate"),
-                "end":          _txt(el,"SelectionEndDate"),
-            })
-
-        elif ltag == "BankAccount":
-            bank.append({
-                "number": _txt(el,"BankAccountNumber"),
-                "name":   _txt(el,"BankAccountName"),
-                "currency": _txt(el,"CurrencyCode"),
-            })
-
-        elif ltag in {"Customer","Supplier"}:
-            dest = cust if ltag=="Customer" else supp
-            addr = el.find(f".//{_ns('Address')}")
-            dest.append({
-                "id":   _txt(el,f"{ltag}ID"),
-                "name": _txt(el,"Name"),
-                "vat":  _txt(el,"TaxRegistrationNumber"),
-                "country": _txt(addr,"Country") if addr is not None else None,
-                "city":    _txt(addr,"City")    if addr is not None else None,
-                "postal":  _txt(addr,"PostalCode") if addr is not None else None,
-            })
-
-        elif ltag == "Account":
-            acc.append({
-                "account_id":  _txt(el,"AccountID"),
-                "description": pick(el,"description"),
-                "type":        _txt(el,"AccountType"),
-                "opening_balance": _dec(pick(el,"opening_bal")),
-                "closing_balance": _dec(pick(el,"closing_bal")),
-                "vat_code":    pick(el,"vat_code"),
-            })
-
-        elif ltag == "Journal":
-            jour.append({
-                "journal_id": cur_journal_id,
-                "description": pick(el,"description"),
-                "posting_date": _txt(el,"PostingDate") or _txt(el,"VoucherDate"),
-                "batch_id": _txt(el,"BatchID"),
-                "system_id": _txt(el,"SystemID"),
-            })
-
-        elif ltag in LINE_TAGS:
-            dc = (_txt(el,"DebitCredit") or "").lower()
-            amt = _dec(pick(el,"amount"))
-            debit  = _dec(_txt(el,"DebitAmount"))  or (amt if dc.startswith("d") else None)
-            credit = _dec(_txt(el,"CreditAmount")) or (amt if dc.startswith("c") else None)
-            lines.append({
-                "journal_id":  cur_journal_id,
-                "record_id":   _txt(el,"RecordID"),
-                "voucher_no":  cur_voucher_no,
-                "account_id":  _txt(el,"AccountID"),
-                "description": pick(el,"description"),
-                "supplier_id": _txt(el,"SupplierID"),
-                "customer_id": _txt(el,"CustomerID"),
-                "currency":    _txt(el,"CurrencyCode"),
-                "amount_currency": _dec(_txt(el,"CurrencyAmount")),
-                "exchange_rate":   _txt(el,"ExchangeRate"),
-                "document_no": _txt(el,"DocumentNo"),
-                "debit":  debit,
-                "credit": credit,
-                "vat_code":  pick(el,"vat_code"),
-                "vat_rate":  pick(el,"vat_rate"),
-                "vat_base":  _dec(_txt(el,"TaxBase")),
-                "vat_debit": _dec(_txt(el,"DebitTaxAmount")),
-                "vat_credit":_dec(_txt(el,"CreditTaxAmount")),
-            })
-
-        elif ltag == "Analysis":
-            analy.append({
-                "journal_id":  cur_journal_id,
-                "record_id":   _txt(el.getparent(), "RecordID"),
-                "type":        _txt(el,"AnalysisType"),
-                "analysis_id": _txt(el,"AnalysisID"),
-                "debit_amt":   _dec(_txt(el,"DebitAnalysisAmount")),
-                "credit_amt":  _dec(_txt(el,"CreditAnalysisAmount")),
-            })
-
-        el.clear()
+# ── tabeller fra felles SAF-T-motor ───────────────────────────────────────
+def _side_balance(debit: pd.Series, credit: pd.Series) -> pd.Series:
+    """Saldo slik 1.2 leste den: debetsaldoen, ellers kreditsaldoen (uten fortegn)."""
+    d, c = debit.map(_to_dec), credit.map(_to_dec)
+    return d.where(d != 0, c)
+
+def _from_engine(res) -> Tuple[pd.DataFrame, ...]:
+    """Tabellene fra saft_engine i konverterens gamle kolonneformat (beløp som Decimal)."""
+    h = res.table("header", exact=True)
+    hdr = pd.DataFrame({
+        "file_version": h["AuditFileVersion"], "software": h["SoftwareCompanyName"],
+        "software_ver": h["SoftwareVersion"], "created": h["FileCreationDate"],
+        "start": h["SelectionStartDate"], "end": h["SelectionEndDate"],
+    })
+    b = res.table("bank_accounts", exact=True)
+    bank = pd.DataFrame({"number": b["BankAccountNumber"], "name": b["BankAccountName"],
+                         "currency": b["CurrencyCode"]})
+    a = res.table("accounts", exact=True)
+    acc = pd.DataFrame({
+        "account_id": a["AccountID"], "description": a["AccountDescription"], "type": a["AccountType"],
+        "opening_balance": _side_balance(a["OpeningDebit"], a["OpeningCredit"]),
+        "closing_balance": _side_balance(a["ClosingDebit"], a["ClosingCredit"]),
+        "vat_code": a["TaxCode"],
+    })
+
+    def _party(df: pd.DataFrame, id_col: str) -> pd.DataFrame:
+        return pd.DataFrame({"id": df[id_col], "name": df["Name"], "vat": df["VATNumber"],
+                             "country": df["Country"], "city": df["City"], "postal": df["PostalCode"]})
+    cust = _party(res.table("customers", exact=True), "CustomerID")
+    supp = _party(res.table("suppliers", exact=True), "SupplierID")
+
+    j = res.table("journals", exact=True)
+    jour = pd.DataFrame({
+        "journal_id": j["JournalID"], "description": j["Description"],
+        "posting_date": j["PostingDate"].fillna(j["VoucherDate"]),
+        "batch_id": j["BatchID"], "system_id": j["SystemID"],
+    })
+
+    tx = res.table("transactions", exact=True)
+    voucher_no = tx["VoucherNo"].replace("", None).fillna(tx["VoucherID"].replace("", None))
+    lines = pd.DataFrame({
+        "journal_id": tx["JournalID"], "record_id": tx["RecordID"],
+        "voucher_no": voucher_no.fillna(tx["JournalID"]),
+        "account_id": tx["AccountID"], "description": tx["Description"],
+        "supplier_id": tx["SupplierID"], "customer_id": tx["CustomerID"],
+        "currency": tx["CurrencyCode"], "amount_currency": tx["AmountCurrency"],
+        "exchange_rate": tx["ExchangeRate"], "document_no": tx["DocumentNumber"],
+        "debit": tx["Debit"], "credit": tx["Credit"],
+        "vat_code": tx["TaxCode"], "vat_rate": tx["TaxPercentage"], "vat_base": tx["TaxBase"],
+        "vat_debit": tx["DebitTaxAmount"], "vat_credit": tx["CreditTaxAmount"],
+    })
+
+    an = res.table("analysis_lines", exact=True)
+    line = tx.drop_duplicates("RecordID").set_index("RecordID")
+    parent = an["RecordID"].map(line["JournalID"])
+    credit_side = an["RecordID"].map(line["Credit"].map(_to_dec) > line["Debit"].map(_to_dec)).fillna(False).astype(bool)
+    amount = an["Amount"].map(_to_dec)
+    analy = pd.DataFrame({
+        "journal_id": parent, "record_id": an["RecordID"], "type": an["Type"], "analysis_id": an["ID"],
+        "debit_amt": amount.where(~credit_side, None), "credit_amt": amount.where(credit_side, None),
+    })
     return hdr, bank, acc, cust, supp, jour, lines, analy
 
 # ── kontroller ────────────────────────────────────────────────────────────
@@ -242,18 +146,20 @@ def convert(src: Path, dst: Path, *, max_ratio: float,
         xml = etree.parse(stream); etree.XMLSchema(etree.parse(xsd)).assertValid(xml)
         stream = io.BytesIO(etree.tostring(xml))
 
-    hdr, bank, acc, cust, supp, jour, lines, analy = _parse(stream); stream.close()
+    stream.close()
+    hdr, bank, acc, cust, supp, jour, lines, analy = _from_engine(load_saft(src))
 
-    if not (_check_balance(pd.DataFrame(lines)) and _check_vat(pd.DataFrame(lines))):
+    if not (_check_balance(lines) and _check_vat(lines)):
         sys.exit(3)
     if validate_only:
         logging.info("Validering OK – ingen CSV skrevet."); return
 
-    def _save(rows: List[Dict], name: str, money: Tuple[str, ...]):
-        df = pd.DataFrame(rows).replace({None:""}).fillna("")
+    def _save(df: pd.DataFrame, name: str, money: Tuple[str, ...]):
+        df = df.astype(object).where(df.notna(), None)
         for c in money:
             if c in df.columns:
                 df[c] = df[c].map(_dec_str)
+        df = df.fillna("")
         df.to_csv(dst / name, sep=";", index=False, encoding="utf-8",
                   quoting=csv.QUOTE_MINIMAL)
 
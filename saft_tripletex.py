@@ -4,6 +4,7 @@ from __future__ import annotations
 
 from pathlib import Path
 import argparse
+import sys
 import zipfile
 from tkinter import Tk, filedialog
 
@@ -16,12 +17,11 @@ except ModuleNotFoundError as exc:  # pragma: no cover - helpful message
         "lxml is required to parse SAF-T files. Install it with 'pip install lxml'."
     ) from exc
 
-try:  # pragma: no cover - optional dependency
-    from tqdm import tqdm
-except ModuleNotFoundError:  # pragma: no cover - fallback
-    def tqdm(iterable, **kwargs):
-        for item in iterable:
-            yield item
+_PARSERS_DIR = Path(__file__).resolve().parent / "src" / "app" / "parsers"
+if str(_PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(_PARSERS_DIR))
+
+from saft_engine import load_saft  # noqa: E402
 
 
 NS = {"s": "urn:StandardAuditFile-Tax"}
@@ -38,93 +38,42 @@ VAT_CODE_MAP: dict[int, str] = {
 }
 
 
-def _strip_ns(tag: str) -> str:
-    if "}" in tag:
-        return tag.split("}", 1)[1]
-    return tag
-
-
-def _normalize_date(value: str | None) -> str | None:
-    if not value:
-        return None
-    try:
-        return pd.to_datetime(value).strftime("%Y-%m-%d")
-    except Exception:
-        return value
-
-
-def _parse_accounts(elem: etree._Element) -> dict:
-    return {
-        "account_id": elem.findtext("s:AccountID", namespaces=NS),
-        "description": elem.findtext("s:AccountDescription", namespaces=NS),
-        "type": elem.findtext("s:AccountType", namespaces=NS),
-        "vat_code": elem.findtext("s:VatCode", namespaces=NS),
-    }
-
-
-def _parse_journal(elem: etree._Element) -> tuple[dict, list[dict]]:
-    j = {
-        "journal_id": elem.findtext("s:JournalID", namespaces=NS),
-        "description": elem.findtext("s:Description", namespaces=NS),
-        "voucher_date": _normalize_date(elem.findtext("s:VoucherDate", namespaces=NS)),
-        "voucher_type": elem.findtext("s:VoucherType", namespaces=NS),
-    }
-
-    transactions: list[dict] = []
-    for trans in elem.findall("s:Transaction", namespaces=NS):
-        t = {
-            "journal_id": j["journal_id"],
-            "voucher_no": trans.findtext("s:VoucherNo", namespaces=NS)
-            or trans.findtext("s:VoucherID", namespaces=NS)
-            or j["journal_id"],
-            "account_id": trans.findtext("s:AccountID", namespaces=NS),
-            "debit": trans.findtext("s:DebitAmount", namespaces=NS),
-            "credit": trans.findtext("s:CreditAmount", namespaces=NS),
-            "currency": trans.findtext("s:Currency/s:Code", namespaces=NS),
-            "document_no": trans.findtext("s:DocumentNumber", namespaces=NS),
-            "vat_code": trans.findtext("s:TaxInformation/s:VATCode", namespaces=NS),
-        }
-        transactions.append(t)
-    return j, transactions
-
-
-def _read_saft_xml(file_obj) -> tuple[list[dict], list[dict], list[dict]]:
-    accounts: list[dict] = []
-    journals: list[dict] = []
-    transactions: list[dict] = []
-
-    ns_uri = None
-    version = None
-
-    context = etree.iterparse(file_obj, events=("end",), recover=True)
-    for event, elem in tqdm(context, desc="Parsing", unit="elem"):
-        tag = _strip_ns(elem.tag)
-        if tag == "Account":
-            accounts.append(_parse_accounts(elem))
-        elif tag == "Journal":
-            journal, trans = _parse_journal(elem)
-            journals.append(journal)
-            transactions.extend(trans)
-        elif tag == "AuditFile":
-            if "}" in elem.tag:
-                ns_uri = elem.tag.split("}", 1)[0][1:]
-            version = elem.get("version")
-        elem.clear()
-        while elem.getprevious() is not None:
-            del elem.getparent()[0]
-    del context
+def _read_root(file_obj) -> tuple[str | None, str | None]:
+    """Namespace and version attribute of the root element (reads only the start of the file)."""
+    for _event, elem in etree.iterparse(file_obj, events=("start",), recover=True):
+        ns_uri = elem.tag.split("}", 1)[0][1:] if "}" in elem.tag else None
+        return ns_uri, elem.get("version")
+    return None, None
+
 
+def _check_version(in_path: Path) -> None:
+    if zipfile.is_zipfile(in_path):
+        with zipfile.ZipFile(in_path) as zf:
+            xml_names = [n for n in zf.namelist() if n.lower().endswith(".xml")]
+            if not xml_names:
+                raise ValueError("Zip file contains no XML file")
+            with zf.open(xml_names[0]) as f:
+                ns_uri, version = _read_root(f)
+    else:
+        with open(in_path, "rb") as f:
+            ns_uri, version = _read_root(f)
     if ns_uri != NS["s"] or version not in {"1.2", "1.3"}:
         raise ValueError(f"Unsupported SAF-T version: {version}")
 
-    return accounts, journals, transactions
+
+def _fmt_date(col: pd.Series) -> pd.Series:
+    return col.dt.strftime("%Y-%m-%d").astype(object).where(col.notna(), None)
 
 
 def konverter_saft_tripletex(
     input_path: str | Path,
     output_dir: str | Path,
 ) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    """Convert a Tripletex SAF-T file to three CSV files."""
+    """Convert a Tripletex SAF-T file to three CSV files.
+
+    Parsing is done by the shared SAF-T engine (src/app/parsers/saft_engine),
+    so a file that has been read before is served from its cache.
+    """
 
     in_path = Path(input_path)
     out_dir = Path(output_dir)
@@ -132,29 +81,43 @@ def konverter_saft_tripletex(
         raise FileNotFoundError(f"Input file not found: {in_path}")
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    if zipfile.is_zipfile(in_path):
-        with zipfile.ZipFile(in_path) as zf:
-            xml_names = [n for n in zf.namelist() if n.lower().endswith(".xml")]
-            if not xml_names:
-                raise ValueError("Zip file contains no XML file")
-            with zf.open(xml_names[0]) as f:
-                accounts, journals, transactions = _read_saft_xml(f)
-    else:
-        with open(in_path, "rb") as f:
-            accounts, journals, transactions = _read_saft_xml(f)
-
-    accounts_df = pd.DataFrame(accounts)
-    journals_df = pd.DataFrame(journals)
-    transactions_df = pd.DataFrame(transactions)
+    _check_version(in_path)
+    res = load_saft(in_path)
+
+    acc = res.accounts
+    accounts_df = pd.DataFrame({
+        "account_id": acc["AccountID"],
+        "description": acc["AccountDescription"],
+        "type": acc["AccountType"],
+        "vat_code": acc["TaxCode"],
+    })
+
+    jour = res.journals
+    journals_df = pd.DataFrame({
+        "journal_id": jour["JournalID"],
+        "description": jour["Description"],
+        "voucher_date": _fmt_date(jour["VoucherDate"]),
+        "voucher_type": jour["VoucherType"],
+    })
+
+    tx = res.lines
+    voucher_no = tx["VoucherNo"].replace("", None).fillna(tx["VoucherID"].replace("", None))
+    transactions_df = pd.DataFrame({
+        "journal_id": tx["JournalID"],
+        "voucher_no": voucher_no.fillna(tx["JournalID"]),
+        "account_id": tx["AccountID"],
+        "debit": tx["Debit"],
+        "credit": tx["Credit"],
+        "currency": tx["CurrencyCode"],
+        "document_no": tx["DocumentNumber"],
+        "vat_code": tx["TaxCode"],
+    })
 
     for df in [accounts_df, journals_df, transactions_df]:
         if "vat_code" in df.columns:
             df["vat_code"] = pd.to_numeric(df["vat_code"], errors="coerce").astype("Int64")
             df["vat_description"] = df["vat_code"].map(VAT_CODE_MAP)
 
-    if "voucher_date" in journals_df.columns:
-        journals_df["voucher_date"] = journals_df["voucher_date"].apply(_normalize_date)
-
     accounts_df.to_csv(out_dir / "accounts.csv", sep=";", index=False, encoding="utf-8")
     journals_df.to_csv(out_dir / "journal.csv", sep=";", index=False, encoding="utf-8")
     transactions_df.to_csv(out_dir / "transactions.csv", sep=";", index=False, encoding="utf-8")
@@ -227,6 +227,24 @@ def _bilag_key(val) -> str | None:
         return None
     return re.sub(r"[^0-9a-z]+", "", str(val).lower()) or None
 
+def _normalize_synonyms(df: pd.DataFrame) -> pd.DataFrame:
+    """Normaliser IB/UB/Endring o.l. til standardnavn (COLUMN_SYNONYMS)."""
+    rename_map: dict[str, str] = {}
+    for col in df.columns:
+        col_lower = str(col).strip().lower()
+        for std_name, syns in COLUMN_SYNONYMS.items():
+            if std_name in df.columns:
+                continue
+            if any(col_lower == s.lower() for s in syns):
+                rename_map[col] = std_name
+                break
+    if rename_map:
+        try:
+            df = df.rename(columns=rename_map)
+        except Exception:
+            pass
+    return df
+
 def _konto_key_series(s: pd.Series) -> pd.Series:
     if pd.api.types.is_numeric_dtype(s):
         return pd.to_numeric(s, errors="coerce").round(0).astype("Int64").astype(str)
@@ -333,22 +351,19 @@ class App(tk.Tk):
         # 1) Sørg for kanonisk datasett (Parquet/pickle) og last det
         try:
             dataset_path, manifest = ensure_parquet_fresh(self, self.root_dir, self.client, self.year, self.source, self.vtype)
-            df = load_canonical_dataset(dataset_path)
-            # normaliser IB/UB/Endring med synonymer
-            rename_map: dict[str, str] = {}
-            for col in df.columns:
-                col_lower = str(col).strip().lower()
-                for std_name, syns in COLUMN_SYNONYMS.items():
-                    if std_name in df.columns:
-                        continue
-                    if any(col_lower == s.lower() for s in syns):
-                        rename_map[col] = std_name
-                        break
-            if rename_map:
-                try:
-                    df = df.rename(columns=rename_map)
-                except Exception:
-                    pass
+            df = None
+            self._scoped = False
+            if self.source == "hovedbok" and (self.prefilter_konto or self.prefilter_bkey):
+                # Drilldown: les bare konto/bilag (pushdown); tomt utsnitt -> hele HB som før
+                df = load_canonical_dataset(
+                    dataset_path,
+                    accounts=[self.prefilter_konto] if self.prefilter_konto else None,
+                    vouchers=[self.prefilter_bkey] if self.prefilter_bkey else None,
+                )
+                self._scoped = len(df) > 0
+            if not self._scoped:
+                df = load_canonical_dataset(dataset_path)
+            df = _normalize_synonyms(df)
             self.src_path = str(dataset_path)
             self._manifest = manifest
         except Exception as exc:
@@ -356,8 +371,9 @@ class App(tk.Tk):
             self.destroy()
             return
 
-        # 2) Prefilter for drilldown (konto + bilag)
-        self.df_full = df.copy()
+        # 2) Prefilter for drilldown (konto + bilag). I et drilldown-vindu er df bare
+        #    utsnittet; hele datasettet (df_full) lastes først når det trengs.
+        self._df_full = None if self._scoped else df.copy()
         df_initial = df.copy()
         self.prefilter_info = ""
         if self.source == "hovedbok":
@@ -385,11 +401,14 @@ class App(tk.Tk):
 
         # 3) Diagnostikk: én konto → typisk feil kilde
         self._dataset_note = ""
-        if "konto" in df.columns:
+        if "konto" in df.columns and not self._scoped:
             uniq = _konto_key_series(df["konto"]).dropna().unique()
             if len(uniq) <= 1:
                 u = uniq[0] if len(uniq) == 1 else ""
                 self._dataset_note = f" • Advarsel: datasettet har {len(uniq)} unik konto ({u}). Sjekk at aktiv HB‑fil er hele hovedboken."
+        elif self._scoped and (manifest.get("unique_accounts") or 0) <= 1:
+            self._dataset_note = (f" • Advarsel: datasettet har {manifest.get('unique_accounts') or 0} unik konto."
+                                  " Sjekk at aktiv HB‑fil er hele hovedboken.")
 
         # 4) Last ev. tidligere regnr‑mapping
         self._regnr_map_path = year_paths(self.root_dir, self.client, self.year).mapping / "sb_regnr.json"
@@ -398,12 +417,25 @@ class App(tk.Tk):
         self._all_regnr_choices: list[tuple[str, str]] = []
 
         # sørg for at df‑ene har regnr/linje‑kolonner
-        self.df_full = self._with_regnskapslinjer_cols(self.df_full)
+        if self._df_full is not None:
+            self.df_full = self._with_regnskapslinjer_cols(self._df_full)
         df_initial = self._with_regnskapslinjer_cols(df_initial)
 
         # 5) Bygg UI
         self._build_ui(df_initial)
 
+    @property
+    def df_full(self) -> pd.DataFrame:
+        """Hele datasettet; i drilldown-vinduer lastes det ved første bruk (Tøm, søk, regnr, regnskap)."""
+        if self._df_full is None:
+            df = _normalize_synonyms(load_canonical_dataset(self.src_path))
+            self._df_full = self._with_regnskapslinjer_cols(df)
+        return self._df_full
+
+    @df_full.setter
+    def df_full(self, df: pd.DataFrame) -> None:
+        self._df_full = df
+
     # --------------------------- UI ---------------------------
     def _build_ui(self, df_initial: pd.DataFrame):
         top = ttk.Frame(self)
@@ -412,9 +444,9 @@ class App(tk.Tk):
 
         choices = ["Alle kolonner"]
         for c in ["konto", "kontonavn", "dato", "bilagsnr", "tekst", "regnr", "regnskapslinje"]:
-            if c in self.df_full.columns:
+            if c in df_initial.columns:
                 choices.append(c)
-        for c in self.df_full.columns:
+        for c in df_initial.columns:
             if not c.startswith("__") and c not in choices:
                 choices.append(c)
 
@@ -2,7 +2,7 @@
 """
 MVA-termin-dashboard fra SAF-T (NO)
 -----------------------------------
-- Leser SAF-T Regnskap (XML)
+- Leser SAF-T Regnskap (XML/ZIP/GZ) via felles SAF-T-motor (parsers/saft_engine, med cache)
 - Aggregerer grunnlag og mva per SAF-T mva-kode og per termin (bimånedlig som Skatteetaten)
 - Viser GUI (Streamlit) med:
   * filtrering per år
@@ -11,21 +11,24 @@ MVA-termin-dashboard fra SAF-T (NO)
   * frivillig sammenligning mot "faktisk innrapportert" (opplasting av egen CSV)
 - Støtter opplasting av egen mapping (CSV) for å klassifisere mva-koder som Utgående/Inngående/Annet.
 
-Avhengigheter: streamlit, pandas, lxml, python-dateutil
+Avhengigheter: streamlit, pandas, lxml (via saft_parser_pro), pyarrow
 """
 
 from __future__ import annotations
 
 import io
-import math
-from dataclasses import dataclass
-from datetime import datetime
-from dateutil import parser as dtparser
-from typing import Dict, Iterable, List, Optional, Tuple
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
 
 import pandas as pd
 import streamlit as st
-from lxml import etree
+
+_PARSERS_DIR = Path(__file__).resolve().parents[1] / "parsers"
+if str(_PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(_PARSERS_DIR))
+
+from saft_engine import load_saft  # noqa: E402
 
 # ----- Konstanter og standardinnstillinger ---------------------------------
 
@@ -79,61 +82,8 @@ DEFAULT_TAXCODE_MAP = pd.DataFrame(
     ]
 )
 
-# Felt som appen ser etter under <TaxInformation> i SAF-T:
-TAX_BASE_CANDIDATES = ("TaxBase", "TaxBaseAmount", "TaxableAmount", "TaxBasisAmount", "BaseAmount")
-TAX_AMOUNT_CANDIDATES = ("TaxAmount", "Amount")
-
 # ------------------------- Hjelpefunksjoner ---------------------------------
 
-def localname(tag: str) -> str:
-    """Fjerner XML-namespace fra et tag-navn."""
-    if tag is None:
-        return ""
-    return tag.split("}", 1)[-1] if "}" in tag else tag
-
-def try_parse_date(text: Optional[str]) -> Optional[datetime]:
-    if not text:
-        return None
-    try:
-        return dtparser.parse(text).date()
-    except Exception:
-        return None
-
-def to_float(x: Optional[str]) -> Optional[float]:
-    if x is None:
-        return None
-    try:
-        # erstatt ev. tusenskilletegn
-        s = str(x).strip().replace(" ", "").replace("\u00A0", "").replace(",", ".")
-        return float(s)
-    except Exception:
-        return None
-
-def first_child_text(elem: etree._Element, names: Iterable[str]) -> Optional[str]:
-    """Returner første eksisterende barneelementtekst blant gitt navneliste (uten namespace)."""
-    for ch in elem:
-        if localname(ch.tag) in names:
-            return (ch.text or "").strip()
-    return None
-
-def extract_taxinfo(line_elem: etree._Element) -> Optional[Dict[str, Optional[str]]]:
-    """Hent TaxInformation fra en Line."""
-    for ch in line_elem:
-        if localname(ch.tag) == "TaxInformation":
-            # Sjekk at det faktisk er VAT
-            tax_type = first_child_text(ch, ("TaxType",))
-            if tax_type and tax_type.strip().upper() != "VAT":
-                return None
-            tax_code = first_child_text(ch, ("TaxCode",))
-            tax_base = first_child_text(ch, TAX_BASE_CANDIDATES)
-            tax_amount = first_child_text(ch, TAX_AMOUNT_CANDIDATES)
-            return {
-                "TaxCode": (tax_code or "").strip(),
-                "TaxBase": tax_base,
-                "TaxAmount": tax_amount,
-            }
-    return None
-
 def month_to_termin(month: int, periodicity: str = "6-terminer") -> Tuple[int, str]:
     """Map måned til termin-nummer og en pen etikett."""
     m = int(month)
@@ -150,86 +100,34 @@ def month_to_termin(month: int, periodicity: str = "6-terminer") -> Tuple[int, s
               4: "T4 (Jul–Aug)", 5: "T5 (Sep–Okt)", 6: "T6 (Nov–Des)"}
     return termin, labels.get(termin, f"T{termin}")
 
-# -------------------- SAF-T parser (streaming, minnevennlig) ----------------
+# -------------------- SAF-T via felles motor (cache) -------------------------
 
 def parse_saft_xml(file_like) -> pd.DataFrame:
     """
     Returnerer DataFrame med kolonnene:
     ['Date', 'Year', 'Month', 'Termin', 'TerminLabel', 'TaxCode', 'TaxBase', 'TaxAmount']
-    Kun linjer med TaxInformation (VAT) tas med.
+    Kun linjer med TaxInformation (TaxType MVA/VAT) tas med.
+
+    Parsingen gjøres av saft_engine (samme parser og cache som resten av appen),
+    så xml/zip/gz støttes og en fil som er lest før hentes fra cachen.
     """
-    rows: List[Dict] = []
-    context = etree.iterparse(file_like, events=("start", "end"))
-    current_date: Optional[datetime] = None
-    current_month: Optional[int] = None
-
-    for event, elem in context:
-        tag = localname(elem.tag)
-
-        if event == "start":
-            if tag == "JournalEntry":
-                current_date = None
-                current_month = None
-
-        elif event == "end":
-            # Finn transaksjonsdato på nivå JournalEntry -> TransactionDate
-            if tag == "TransactionDate":
-                current_date = try_parse_date(elem.text)
-                if current_date:
-                    current_month = current_date.month
-
-            elif tag == "Line":
-                tx = extract_taxinfo(elem)
-                if tx and tx["TaxCode"]:
-                    tc = tx["TaxCode"]
-                    if tc not in NON_REPORTABLE_SAFT_CODES:
-                        # fall-back: om TransactionDate mangler, prøv å finne dato på linjen
-                        date_for_line = current_date
-                        if date_for_line is None:
-                            # noen systemer legger 'PostingDate' eller lignende på linje/dokument
-                            maybe_dates = []
-                            for ch in elem:
-                                nm = localname(ch.tag)
-                                if nm in {"PostingDate", "PostingDateTime", "Date"}:
-                                    maybe_dates.append(ch.text)
-                            for text in maybe_dates:
-                                date_for_line = try_parse_date(text)
-                                if date_for_line:
-                                    break
-
-                        if date_for_line is None:
-                            # Uten dato får vi ikke termin – hopp over
-                            elem.clear()
-                            continue
-
-                        year = date_for_line.year
-                        month = date_for_line.month
-                        termin, label = month_to_termin(month, periodicity="6-terminer")
-
-                        tax_base_f = to_float(tx["TaxBase"])
-                        tax_amount_f = to_float(tx["TaxAmount"])
-
-                        rows.append(
-                            {
-                                "Date": date_for_line,
-                                "Year": year,
-                                "Month": month,
-                                "Termin": termin,
-                                "TerminLabel": label,
-                                "TaxCode": tc,
-                                "TaxBase": tax_base_f if tax_base_f is not None else 0.0,
-                                "TaxAmount": tax_amount_f if tax_amount_f is not None else 0.0,
-                            }
-                        )
-                # Rydd element fra minne
-                elem.clear()
-
-            elif tag == "JournalEntry":
-                elem.clear()
-
-    df = pd.DataFrame(rows)
-    if df.empty:
-        return df
+    vat = load_saft(file_like).vat_lines
+    vat = vat[vat["Date"].notna() & ~vat["TaxCode"].isin(NON_REPORTABLE_SAFT_CODES)]
+    if vat.empty:
+        return pd.DataFrame()
+
+    month = vat["Date"].dt.month.astype(int)
+    termin = (month + 1) // 2
+    df = pd.DataFrame({
+        "Date": vat["Date"].dt.date,
+        "Year": vat["Date"].dt.year.astype(int),
+        "Month": month,
+        "Termin": termin,
+        "TerminLabel": [month_to_termin(m)[1] for m in month],
+        "TaxCode": vat["TaxCode"],
+        "TaxBase": vat["TaxBase"].fillna(0.0),
+        "TaxAmount": vat["TaxAmount"].fillna(0.0),
+    }).reset_index(drop=True)
 
     # Normaliser kode som streng uten ledende nuller
     df["TaxCode"] = df["TaxCode"].astype(str).str.strip().str.lstrip("0")
@@ -351,7 +249,7 @@ st.title("MVA per termin (fra SAF‑T) – sammenligning og analyse")
 
 with st.sidebar:
     st.header("1) Last opp SAF‑T")
-    saft_file = st.file_uploader("SAF‑T Regnskap (XML)", type=["xml"])
+    saft_file = st.file_uploader("SAF‑T Regnskap (XML/ZIP/GZ)", type=["xml", "zip", "gz"])
 
     st.header("2) Mapping (valgfritt)")
     st.markdown(
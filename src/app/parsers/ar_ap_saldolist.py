@@ -1,11 +1,13 @@
 """
 ar_ap_saldolist.py – lag en samlet saldobalanse for kunder (AR) og leverandører (AP).
 
-Dette skriptet bygger på run_saft_pro_gui.make_subledger for å generere
+Dette skriptet bygger på run_saft_pro_gui.compute_subledger for å beregne
 reskontro for både kunder og leverandører i én operasjon, og i tillegg lage
 et sammendrag og en avstemmingsrapport som viser om reskontrobeløpene
 stemmer med kontoplanens utgående saldo. Hvis accounts.csv mangler, hentes
-closing‑netto fra trial_balance.xlsx.
+closing‑netto fra trial_balance.xlsx. Arkene Customers_OpenItems og
+Suppliers_OpenItems viser de åpne postene bak saldoene (saft_openitems).
+Alt beregnes i minnet; Excel/CSV skrives bare til slutt.
 
 Kjør som modul:
     from ar_ap_saldolist import generate_saldolist
@@ -14,31 +16,39 @@ Kjør som modul:
 Eller fra kommandolinje:
     python ar_ap_saldolist.py [outdir] [--date_from YYYY-MM-DD] [--date_to YYYY-MM-DD]
 
+Batch (flere klienter og/eller datoer i én kjøring):
+    python ar_ap_saldolist.py klient1 klient2 --date_to 2024-06-30 2024-12-31 [--subledgers]
+
+Enkeltkjøring skriver også ar_subledger.xlsx / ap_subledger.xlsx (slå av med
+--no-subledgers); batch skriver dem bare med --subledgers.
+
 Hvis outdir ikke angis, brukes nåværende arbeidskatalog.
 """
 
 from __future__ import annotations
 
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Set, List
+from typing import Iterable, Optional, Sequence, Set, List, Tuple
 import pandas as pd
 
 from run_saft_pro_gui import (
-    make_subledger,
-    _read_csv_safe,
-    _to_num,
-    _parse_dates,
-    _norm_acc,
+    Subledger,
+    compute_subledger,
+    write_subledger,
     _has_value,
     AR_CONTROL_ACCOUNTS,
     AP_CONTROL_ACCOUNTS,
     _compute_target_closing,
+    _load_tx,
     _find_csv_file,
+    _read_csv_safe,
 )
+from saft_openitems import open_items
 
 
 def _sum_tx_by_account(
-    outdir: Path,
+    tx: pd.DataFrame,
     which: str,
     dto: pd.Timestamp,
     ctrl_accounts: Set[str],
@@ -47,42 +57,23 @@ def _sum_tx_by_account(
     """Summerer Debit - Credit per kontrollkonto til og med dto.
 
     Parametre:
-        outdir: mappe med SAF‑T‑CSV‑filer
+        tx: transaksjoner fra det felles transaksjonslageret (_load_tx), med
+            parsede datoer og normaliserte konti
         which: "AR" for kunder eller "AP" for leverandører
         dto: dato for siste transaksjon som skal tas med
         ctrl_accounts: sett med reskontrokonti
         with_party: True for å summere kun linjer med part-ID, False for
             å summere kun linjer uten part-ID (partyless)
 
-    Returnerer en DataFrame med kolonnene AccountID og Amount.
-
-    Filen transactions.csv lokaliseres via _find_csv_file for å støtte
-    ulike plasseringer av datafilene. Hvis filen ikke finnes eller
-    kontrollkontoene er tomme, returneres en tom DataFrame.
+    Returnerer en DataFrame med kolonnene AccountID og Amount (tom hvis det
+    ikke er transaksjoner eller kontrollkontoene er tomme).
     """
-    # Lokaliser transactions.csv med utvidet søk
-    tx_path = _find_csv_file(outdir, "transactions.csv")
-    tx = _read_csv_safe(tx_path, dtype=str) if tx_path else None
     if tx is None or tx.empty or not ctrl_accounts:
         return pd.DataFrame(columns=["AccountID", "Amount"])
-    # Parse datoer og normaliser konti
-    tx = _parse_dates(tx, ["TransactionDate", "PostingDate"])
-    tx["Date"] = tx["PostingDate"].fillna(tx["TransactionDate"])
-    for col in ["AccountID", "CustomerID", "SupplierID"]:
-        if col in tx.columns:
-            tx[col] = tx[col].astype(str)
-    tx["AccountID"] = tx["AccountID"].map(_norm_acc)
-    tx = _to_num(tx, ["Debit", "Credit"])
-    # Filtrer på dato
-    tx = tx.loc[~tx["Date"].isna() & (tx["Date"] <= dto)].copy()
-    # Filtrer på kontrollkontoer
-    tx = tx.loc[tx["AccountID"].isin(ctrl_accounts)].copy()
-    # Filtrer på part-ID
-    if which.upper() == "AR":
-        mask = _has_value(tx.get("CustomerID", pd.Series([], dtype=str)))
-    else:
-        mask = _has_value(tx.get("SupplierID", pd.Series([], dtype=str)))
-    tx = tx.loc[mask if with_party else ~mask].copy()
+    id_col = "CustomerID" if which.upper() == "AR" else "SupplierID"
+    mask = _has_value(tx.get(id_col, pd.Series("", index=tx.index, dtype=str)))
+    keep = tx["Date"].notna() & (tx["Date"] <= dto) & tx["AccountID"].isin(ctrl_accounts)
+    tx = tx.loc[keep & (mask if with_party else ~mask)]
     if tx.empty:
         return pd.DataFrame(columns=["AccountID", "Amount"])
     grp = tx.groupby("AccountID")[["Debit", "Credit"]].sum().reset_index()
@@ -90,65 +81,74 @@ def _sum_tx_by_account(
     return grp[["AccountID", "Amount"]]
 
 
-def generate_saldolist(
-    outdir: Path, date_from: Optional[str] = None, date_to: Optional[str] = None
-) -> Path:
-    """Lag samlet AR/AP saldoliste og avstemming i angitt mappe.
+def _open_items_for(outdir: Path, sub: Subledger) -> pd.DataFrame:
+    """Åpne poster pr part på kontrollkontoene til og med periodens slutt.
 
-    Skriptet genererer først subledger for både AR og AP ved hjelp av
-    run_saft_pro_gui.make_subledger. Deretter leses balansearkene og et
-    sammendrag samt en avstemmingsrapport lages. Rapporten skrives til
-    ar_ap_saldolist.xlsx og en CSV-fil med samme innhold.
+    Bruker de samme linjene som reskontroen, så summen av Open pr part er lik
+    UB_Amount (før eventuell skalering). Forfallsdato hentes fra
+    sales_invoices.csv / purchase_invoices.csv når filen finnes.
+    """
+    inv_path = _find_csv_file(outdir, "sales_invoices.csv" if sub.which == "AR" else "purchase_invoices.csv")
+    invoices = _read_csv_safe(inv_path, dtype=str) if inv_path else None
+    return open_items(sub.transactions, sub.which, asof=sub.period[1], invoices=invoices)
 
-    outdir må inneholde SAF‑T‑CSV‑filer (transactions.csv, accounts.csv osv.).
+
+@dataclass
+class Saldolist:
+    """Saldoliste for én mappe og periode, ferdig beregnet i minnet."""
+    customers: pd.DataFrame
+    suppliers: pd.DataFrame
+    summary: pd.DataFrame
+    reconciliation: pd.DataFrame
+    customers_open: pd.DataFrame
+    suppliers_open: pd.DataFrame
+    subledgers: Tuple[Subledger, Subledger]
+
+
+def build_saldolist(
+    outdir: Path, date_from: Optional[str] = None, date_to: Optional[str] = None
+) -> Saldolist:
+    """Beregn AR/AP saldoliste, sammendrag og avstemming uten å skrive filer.
+
+    Reskontroene beregnes med run_saft_pro_gui.compute_subledger og brukes
+    direkte; transaksjonene kommer fra det felles lageret (_load_tx).
     """
-    # Generer subledger for AR og AP
-    ar_path = make_subledger(outdir, "AR", date_from, date_to)
-    ap_path = make_subledger(outdir, "AP", date_from, date_to)
-    # Les balansearkene
-    ar_df = pd.read_excel(ar_path, sheet_name="AR_Balances")
-    ap_df = pd.read_excel(ap_path, sheet_name="AP_Balances")
+    ar = compute_subledger(outdir, "AR", date_from, date_to)
+    ap = compute_subledger(outdir, "AP", date_from, date_to)
+    ar_df = ar.balances.reset_index(drop=True)
+    ap_df = ap.balances.reset_index(drop=True)
     # Sammendrag: summer UB, IB og PR
     summary = pd.DataFrame(
         [
             {
-                "Type": "AR",
-                "Sum_UB": ar_df["UB_Amount"].sum(),
-                "Sum_IB": ar_df["IB_Amount"].sum(),
-                "Sum_PR": ar_df["PR_Amount"].sum(),
-            },
-            {
-                "Type": "AP",
-                "Sum_UB": ap_df["UB_Amount"].sum(),
-                "Sum_IB": ap_df["IB_Amount"].sum(),
-                "Sum_PR": ap_df["PR_Amount"].sum(),
-            },
+                "Type": typ,
+                "Sum_UB": df["UB_Amount"].sum(),
+                "Sum_IB": df["IB_Amount"].sum(),
+                "Sum_PR": df["PR_Amount"].sum(),
+            }
+            for typ, df in (("AR", ar_df), ("AP", ap_df))
         ]
     )
     # Bestem dato for avstemming
-    # Finn transactions.csv
-    tx_path = _find_csv_file(outdir, "transactions.csv")
-    tx = _read_csv_safe(tx_path, dtype=str) if tx_path else None
+    tx = _load_tx(outdir)
     if tx is None or tx.empty:
         raise FileNotFoundError("transactions.csv mangler")
-    tx = _parse_dates(tx, ["TransactionDate", "PostingDate"])
-    tx["Date"] = tx["PostingDate"].fillna(tx["TransactionDate"])
     dto = pd.to_datetime(date_to) if date_to else tx["Date"].dropna().max()
     # Avstemmingsrapport
     rec_rows: List[dict] = []
-    for typ, ctrl in [("AR", AR_CONTROL_ACCOUNTS), ("AP", AP_CONTROL_ACCOUNTS)]:
-        # Closing net fra kontoplanen eller trial balance
-        closing_net = _compute_target_closing(outdir, ctrl)
+    for sub, df, ctrl in [(ar, ar_df, AR_CONTROL_ACCOUNTS), (ap, ap_df, AP_CONTROL_ACCOUNTS)]:
+        # Closing net fra kontoplanen eller trial balance (allerede beregnet
+        # av reskontroen når den brukte de samme kontrollkontoene)
+        closing_net = (sub.target_closing if set(ctrl) == set(sub.ctrl_accounts)
+                       else _compute_target_closing(outdir, ctrl))
         closing = closing_net if closing_net is not None else 0.0
         # Sum UB fra reskontro
-        res = ar_df["UB_Amount"].sum() if typ == "AR" else ap_df["UB_Amount"].sum()
+        res = df["UB_Amount"].sum()
         # Sum av partyless transaksjoner
-        partless = _sum_tx_by_account(outdir, typ, dto, ctrl, with_party=False)[
-            "Amount"
-        ].sum()
+        partless = _sum_tx_by_account(tx, sub.which, dto, ctrl, with_party=False)["Amount"].sum()
         rec_rows.append(
             {
-                "Type": typ,
+                "Type": sub.which,
                 "ControlAccounts": ", ".join(sorted(ctrl)),
                 "ClosingNet": closing,
                 "Reskontro": res,
@@ -156,25 +156,84 @@ def generate_saldolist(
                 "Difference": closing - res - partless,
             }
         )
-    rec_df = pd.DataFrame(rec_rows)
+    return Saldolist(
+        customers=ar_df,
+        suppliers=ap_df,
+        summary=summary,
+        reconciliation=pd.DataFrame(rec_rows),
+        customers_open=_open_items_for(outdir, ar),
+        suppliers_open=_open_items_for(outdir, ap),
+        subledgers=(ar, ap),
+    )
+
+
+def write_saldolist(sl: Saldolist, outdir: Path, suffix: str = "", subledgers: bool = True) -> Path:
+    """Skriv ar_ap_saldolist{suffix}.xlsx og .csv (og reskontroene, med samme suffiks) for sl."""
+    if subledgers:
+        for sub in sl.subledgers:
+            write_subledger(sub, outdir, suffix)
     # Skriv Excel og CSV
-    out_path = outdir / "ar_ap_saldolist.xlsx"
+    out_path = outdir / f"ar_ap_saldolist{suffix}.xlsx"
     with pd.ExcelWriter(out_path, engine="xlsxwriter", datetime_format="yyyy-mm-dd") as writer:
-        ar_df.to_excel(writer, index=False, sheet_name="Customers_UB")
-        ap_df.to_excel(writer, index=False, sheet_name="Suppliers_UB")
-        summary.to_excel(writer, index=False, sheet_name="Summary")
-        rec_df.to_excel(writer, index=False, sheet_name="Reconciliation")
+        sl.customers.to_excel(writer, index=False, sheet_name="Customers_UB")
+        sl.suppliers.to_excel(writer, index=False, sheet_name="Suppliers_UB")
+        sl.summary.to_excel(writer, index=False, sheet_name="Summary")
+        sl.reconciliation.to_excel(writer, index=False, sheet_name="Reconciliation")
+        sl.customers_open.to_excel(writer, index=False, sheet_name="Customers_OpenItems")
+        sl.suppliers_open.to_excel(writer, index=False, sheet_name="Suppliers_OpenItems")
     # Lag også CSV for begge listene med en Type-kolonne
-    csv_path = outdir / "ar_ap_saldolist.csv"
-    ar_df2 = ar_df.copy()
+    ar_df2 = sl.customers.copy()
     ar_df2.insert(0, "Type", "AR")
-    ap_df2 = ap_df.copy()
+    ap_df2 = sl.suppliers.copy()
     ap_df2.insert(0, "Type", "AP")
     combined = pd.concat([ar_df2, ap_df2], ignore_index=True)
-    combined.to_csv(csv_path, index=False)
+    combined.to_csv(outdir / f"ar_ap_saldolist{suffix}.csv", index=False)
     return out_path
 
 
+def generate_saldolist(
+    outdir: Path,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    subledgers: bool = True,
+) -> Path:
+    """Lag samlet AR/AP saldoliste og avstemming i angitt mappe.
+
+    Reskontro for både AR og AP beregnes i minnet (build_saldolist), og
+    sammendrag og avstemmingsrapport lages fra de samme tabellene. Excel er
+    bare siste ledd: rapporten skrives til ar_ap_saldolist.xlsx og en CSV-fil
+    med samme innhold, og med subledgers=True også ar_subledger.xlsx og
+    ap_subledger.xlsx.
+
+    outdir må inneholde SAF‑T‑CSV‑filer (transactions.csv, accounts.csv osv.).
+    """
+    return write_saldolist(build_saldolist(outdir, date_from, date_to), outdir, subledgers=subledgers)
+
+
+def generate_saldolists(
+    outdirs: Iterable[Path],
+    dates_to: Sequence[Optional[str]] = (None,),
+    date_from: Optional[str] = None,
+    subledgers: bool = False,
+) -> List[Path]:
+    """Batch: saldoliste for hver mappe (klient) × hver sluttdato i én kjøring.
+
+    Transaksjonslageret lastes én gang pr mappe og gjenbrukes for alle
+    datoene. Med mer enn én dato får filene datoen som suffiks
+    (ar_ap_saldolist_2024-06-30.xlsx, og med subledgers=True
+    ar_subledger_2024-06-30.xlsx osv.). Returnerer stiene i samme rekkefølge.
+    """
+    dates_to = list(dates_to) or [None]
+    paths: List[Path] = []
+    for outdir in outdirs:
+        outdir = Path(outdir)
+        for dto in dates_to:
+            suffix = f"_{pd.Timestamp(dto):%Y-%m-%d}" if len(dates_to) > 1 and dto else ""
+            sl = build_saldolist(outdir, date_from, dto)
+            paths.append(write_saldolist(sl, outdir, suffix, subledgers=subledgers))
+    return paths
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -184,21 +243,42 @@ if __name__ == "__main__":
     parser.add_argument(
         "outdir",
         type=str,
-        nargs="?",
-        default=".",
+        nargs="*",
+        default=["."],
         help=(
-            "Directory containing SAF‑T CSV extracts. If omitted, the current working directory is used."
+            "Directory (or directories, one per client) containing SAF‑T CSV extracts. "
+            "If omitted, the current working directory is used."
         ),
     )
     parser.add_argument(
         "--date_from", type=str, default=None, help="Start date (YYYY-MM-DD)"
     )
     parser.add_argument(
-        "--date_to", type=str, default=None, help="End date (YYYY-MM-DD)"
+        "--date_to", type=str, nargs="+", default=None,
+        help="End date(s) (YYYY-MM-DD); several dates give one saldoliste per date",
+    )
+    parser.add_argument(
+        "--no-subledgers", action="store_true",
+        help="Do not write ar_subledger.xlsx / ap_subledger.xlsx",
+    )
+    parser.add_argument(
+        "--subledgers", action="store_true",
+        help="Batch mode: also write ar_subledger / ap_subledger workbooks (off by default)",
     )
     args = parser.parse_args()
     try:
-        path = generate_saldolist(Path(args.outdir), args.date_from, args.date_to)
-        print(f"Ferdig! Saldoliste generert i '{path}'.")
+        if len(args.outdir) == 1 and (args.date_to is None or len(args.date_to) == 1):
+            path = generate_saldolist(
+                Path(args.outdir[0]), args.date_from, args.date_to[0] if args.date_to else None,
+                subledgers=not args.no_subledgers,
+            )
+            print(f"Ferdig! Saldoliste generert i '{path}'.")
+        else:
+            paths = generate_saldolists(
+                [Path(d) for d in args.outdir], args.date_to or [None], args.date_from,
+                subledgers=args.subledgers and not args.no_subledgers,
+            )
+            for path in paths:
+                print(f"Ferdig! Saldoliste generert i '{path}'.")
     except FileNotFoundError as exc:
-        print(f"Feil: {exc}")
\ No newline at end of file
+        print(f"Feil: {exc}")
@@ -5,6 +5,7 @@ Bruk:
 
 Forventer:
     <outdir>/raw_elements.csv  (laget av parseren)
+    <outdir>/raw_path_stats.csv (valgfri; finnes når parseren kjøres med --raw sampled)
 
 Skriver:
     <outdir>/unknown_nodes.csv
@@ -13,16 +14,27 @@ Skriver:
 Endringer:
 - Normaliserer XPath bedre: fjerner namespace-prefiks og indeks-segmenter som [1], [2] osv.
 - Dette gjør matching mot kjente containere mer robust (lxml.getpath() bruker som regel [1]/[2]).
+- Støtter samplet rådump: når raw_path_stats.csv finnes, hentes antall pr sti derfra,
+  mens raw_elements.csv bare leverer eksempelrader. unknown_summary.csv viser da
+  reelle totaler selv om dumpen bare inneholder de første N forekomstene pr sti.
+- Kjente containere matches med ett kompilert mønster, og klassifiseringen huskes
+  pr normalisert sti; raw_elements.csv leses og unknown_nodes.csv skrives i samme
+  strømmende pass. Med --raw sampled kaller parseren write_unknown_reports selv
+  med stiindeksen den har bygget, så begge filene finnes rett etter parsingen.
 """
 import csv, re, sys
+from functools import lru_cache
 from pathlib import Path
 from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
 
-_NS_SEG = re.compile(r'(?<=/)[^/]*?:')   # fjern "ns:"-prefiks etter "/"
-_IDX_SEG = re.compile(r'\[\d+\]')        # fjern [1], [2], ...
+# ns-prefiks etter "/" og indeks-segmenter ([1], [2], ...) fjernes i samme regex-pass
+_STRIP = re.compile(r'(?<=/)[^/]*?:|\[\d+\]')
 
 def strip_ns_and_idx(xp: str) -> str:
-    return _IDX_SEG.sub('', _NS_SEG.sub('', xp or ''))
+    if not xp or ('[' not in xp and ':' not in xp):
+        return xp or ''   # allerede normalisert (f.eks. samplet dump)
+    return _STRIP.sub('', xp)
 
 KNOWN_CONTAINERS = [
     "/AuditFile/Header",
@@ -60,68 +72,86 @@ ROOT_GROUPERS = [
     "/AuditFile/FixedAssets/",
 ]
 
-def is_known(xp: str) -> bool:
-    xps = strip_ns_and_idx(xp)
-    for anchor in KNOWN_CONTAINERS:
-        if anchor in xps:
-            return True
-    if "/Analysis" in xps:
-        return True
-    return False
-
-def root_group(xp: str) -> str:
-    xps = strip_ns_and_idx(xp)
-    for base in ROOT_GROUPERS:
-        if base in xps:
-            tail = xps.split(base, 1)[1]
-            seg = tail.split("/", 1)[0]
-            return f"{base}{seg}"
-    return "/(annet)"
+# Alle ankrene (og "/Analysis") i én alternasjon: ett søk pr sti i stedet for en
+# løkke over listen. Rådumpen har mange rader, men få distinkte normaliserte
+# stier, så resultatet huskes pr sti.
+_KNOWN_RE = re.compile("|".join(re.escape(a) for a in [*KNOWN_CONTAINERS, "/Analysis"]))
+_ROOT_RE = re.compile("(" + "|".join(re.escape(b) for b in ROOT_GROUPERS) + ")([^/]*)")
 
-def main():
-    if len(sys.argv) != 2:
-        print("Bruk: python postprocess_unknown_nodes.py <outdir>")
-        sys.exit(2)
+@lru_cache(maxsize=1 << 16)
+def classify(xps: str) -> Optional[str]:
+    """None for kjente stier, ellers rotgruppen. xps er allerede normalisert."""
+    if _KNOWN_RE.search(xps):
+        return None
+    m = _ROOT_RE.search(xps)
+    return m.group(1) + m.group(2) if m else "/(annet)"
 
-    outdir = Path(sys.argv[1])
-    raw_path = outdir / "raw_elements.csv"
-    if not raw_path.exists():
-        print(f"Fant ikke {raw_path}. Sjekk at du bruker riktig <outdir>.")
-        sys.exit(1)
-
-    unk_path = outdir / "unknown_nodes.csv"
-    sum_path = outdir / "unknown_summary.csv"
-
-    unknown_rows = []
-    counts = defaultdict(int)
-    examples = {}
+def is_known(xp: str) -> bool:
+    return classify(strip_ns_and_idx(xp)) is None
 
-    with raw_path.open("r", encoding="utf-8", newline="") as f:
-        r = csv.DictReader(f)
+def root_group(xp: str) -> str:
+    return classify(strip_ns_and_idx(xp)) or "/(annet)"
+
+UNKNOWN_FIELDS = ["XPath","Tag","Text","Attributes"]
+SUMMARY_FIELDS = ["UnknownRoot","Count","ExampleXPath","ExampleTag","ExampleText"]
+
+def stream_unknown(raw_path: Path, unk_path: Path, count_rows: bool) -> Tuple[Dict[str, int], Dict[str, dict]]:
+    """Les raw_elements.csv én gang og skriv de ukjente radene fortløpende til unk_path.
+
+    Returnerer (antall pr rotgruppe, eksempelrad pr rotgruppe). Radene telles bare
+    med count_rows (full dump); ellers kommer antallene fra stistatistikken.
+    """
+    counts: Dict[str, int] = defaultdict(int)
+    examples: Dict[str, dict] = {}
+    with raw_path.open("r", encoding="utf-8", newline="") as f, \
+            unk_path.open("w", encoding="utf-8", newline="") as out:
+        r = csv.reader(f)
+        header = next(r, [])
+        pick = [header.index(c) if c in header else None for c in UNKNOWN_FIELDS]
+        w = csv.writer(out)
+        w.writerow(UNKNOWN_FIELDS)
+        i_xp = pick[0]
+        if i_xp is None:
+            return counts, examples
         for row in r:
-            xp = (row.get("XPath") or "").strip()
+            raw = row[i_xp] if i_xp < len(row) else ""
+            xp = raw.strip()
             if not xp:
                 continue
-            if is_known(xp):
+            xps = strip_ns_and_idx(xp)
+            grp = classify(xps)
+            if grp is None:
                 continue
-            unknown_rows.append({
-                "XPath": strip_ns_and_idx(row.get("XPath","")),
-                "Tag": row.get("Tag",""),
-                "Text": row.get("Text",""),
-                "Attributes": row.get("Attributes",""),
-            })
-            grp = root_group(xp)
-            counts[grp] += 1
+            vals = [row[i] if i is not None and i < len(row) else "" for i in pick]
+            vals[0] = xps if raw == xp else strip_ns_and_idx(raw)
+            w.writerow(vals)
+            if count_rows:
+                counts[grp] += 1
             if grp not in examples:
-                examples[grp] = row
-
-    with unk_path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=["XPath","Tag","Text","Attributes"])
-        w.writeheader()
-        w.writerows(unknown_rows)
-
+                examples[grp] = dict(zip(UNKNOWN_FIELDS, vals))
+    return counts, examples
+
+def count_paths(stats: Iterable[Tuple[str, str, int]], counts: Dict[str, int], examples: Dict[str, dict]) -> None:
+    """Legg stistatistikk (sti, tag, antall) for ukjente stier inn i counts/examples."""
+    for xp, tag, cnt in stats:
+        xp = (xp or "").strip()
+        if not xp:
+            continue
+        grp = classify(strip_ns_and_idx(xp))
+        if grp is None:
+            continue
+        counts[grp] += int(cnt or 0)
+        if grp not in examples:
+            examples[grp] = {"XPath": xp, "Tag": tag, "Text": ""}
+
+def _read_path_stats(stats_path: Path) -> Iterable[Tuple[str, str, int]]:
+    with stats_path.open("r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            yield row.get("XPath") or "", row.get("Tag",""), int(row.get("Count") or 0)
+
+def write_summary(sum_path: Path, counts: Dict[str, int], examples: Dict[str, dict]) -> None:
     with sum_path.open("w", encoding="utf-8", newline="") as f:
-        w = csv.DictWriter(f, fieldnames=["UnknownRoot","Count","ExampleXPath","ExampleTag","ExampleText"])
+        w = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
         w.writeheader()
         for grp, cnt in sorted(counts.items(), key=lambda x: (-x[1], x[0])):
             ex = examples.get(grp, {})
@@ -133,6 +163,42 @@ def main():
                 "ExampleText": ex.get("Text",""),
             })
 
+def write_unknown_reports(outdir: Path, path_stats: Optional[Dict[str, List]] = None) -> Tuple[Path, Path]:
+    """Skriv unknown_nodes.csv og unknown_summary.csv for outdir.
+
+    path_stats (sti -> [tag, antall, ...]) er stiindeksen parseren bygger med
+    raw_mode="sampled". Uten den brukes raw_path_stats.csv hvis filen finnes,
+    ellers telles radene i raw_elements.csv (full dump).
+    """
+    unk_path = outdir / "unknown_nodes.csv"
+    sum_path = outdir / "unknown_summary.csv"
+    stats_path = outdir / "raw_path_stats.csv"
+    if path_stats is not None:
+        stats = ((xp, st[0], st[1]) for xp, st in path_stats.items())
+    elif stats_path.exists():
+        stats = _read_path_stats(stats_path)
+    else:
+        stats = None
+
+    counts, examples = stream_unknown(outdir / "raw_elements.csv", unk_path, count_rows=stats is None)
+    # Samplet dump: tell opp fra stistatistikken (én rad pr distinkt sti)
+    if stats is not None:
+        count_paths(stats, counts, examples)
+    write_summary(sum_path, counts, examples)
+    return unk_path, sum_path
+
+def main():
+    if len(sys.argv) != 2:
+        print("Bruk: python postprocess_unknown_nodes.py <outdir>")
+        sys.exit(2)
+
+    outdir = Path(sys.argv[1])
+    raw_path = outdir / "raw_elements.csv"
+    if not raw_path.exists():
+        print(f"Fant ikke {raw_path}. Sjekk at du bruker riktig <outdir>.")
+        sys.exit(1)
+
+    unk_path, sum_path = write_unknown_reports(outdir)
     print(f"Skrev:\n - {unk_path}\n - {sum_path}")
 
 if __name__ == "__main__":
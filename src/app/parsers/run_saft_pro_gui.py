@@ -15,7 +15,7 @@ Bruk som modul:
     make_subledger(Path('output_dir'), which='AR')
 
 Kjør fra kommandolinje:
-    python run_saft_pro_gui.py [outdir] [--which AR|AP] [--date_from YYYY-MM-DD] [--date_to YYYY-MM-DD]
+    python run_saft_pro_gui.py [outdir] [--which AR|AP] [--date_from YYYY-MM-DD] [--date_to YYYY-MM-DD] [--monthly]
 
 Hvis outdir ikke angis, brukes nåværende arbeidskatalog. Dette gjør det
 enklere å kjøre skriptet direkte i f.eks. PyCharm.
@@ -23,17 +23,24 @@ enklere å kjøre skriptet direkte i f.eks. PyCharm.
 
 from __future__ import annotations
 
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Iterable, Set, Tuple
+from typing import Optional, Iterable, List, Set, Tuple
+import numpy as np
 import pandas as pd
 import datetime as _dt
 import os
 
-# Vi importerer parse_saft fra saft_parser_pro for å kunne kjøre full prosess
+# Full prosess parser via felles SAF-T-motor (cache), så andre verktøy
+# (f.eks. mva-dashbordet) gjenbruker samme parsing
 try:
-    from saft_parser_pro import parse_saft  # type: ignore
+    from saft_engine import load_saft  # type: ignore
 except Exception:
-    parse_saft = None  # type: ignore
+    load_saft = None  # type: ignore
+
+from saft_manifest import find_artifact
+from saft_store import load_transactions, norm_acc_series
+from saft_xlsx import XlsxStream
 
 # Optional GUI imports: Only loaded if tkinter is available.  If not, _tk is None.
 try:
@@ -74,21 +81,13 @@ def _complete_accounts_file(outdir: Path) -> None:
     definert av header.csv (SelectionStart/End). De nye kontoene legges
     til accounts.csv på disk. Hvis accounts.csv mangler, opprettes den.
     """
-    # Finn transaksjoner og header
-    tx_path = _find_csv_file(outdir, "transactions.csv")
-    if tx_path is None:
-        return
-    tx = _read_csv_safe(tx_path, dtype=str)
+    # Finn transaksjoner (typet og normalisert via lageret) og header
+    tx = _load_tx(outdir)
     if tx is None or tx.empty or "AccountID" not in tx.columns:
         return
     # Les header for datoperiode
     hdr_path = _find_csv_file(outdir, "header.csv")
     hdr = _read_csv_safe(hdr_path, dtype=str) if hdr_path else None
-    # Parse datoer og normaliser kontoer
-    tx = _parse_dates(tx, ["TransactionDate", "PostingDate"])
-    tx["Date"] = tx["PostingDate"].fillna(tx["TransactionDate"])
-    tx["AccountID"] = _norm_acc_series(tx["AccountID"].astype(str))
-    tx = _to_num(tx, ["Debit", "Credit"])
     # Unngå dobbeltsummering: bruk kun GL-linjer hvis kolonnen finnes
     if "IsGL" in tx.columns:
         tx = tx.loc[tx["IsGL"].astype(str).str.lower() == "true"].copy()
@@ -226,51 +225,15 @@ def _read_csv_safe(path: Path, dtype=str) -> Optional[pd.DataFrame]:
 def _find_csv_file(outdir: Path, filename: str) -> Optional[Path]:
     """Prøv å finne en fil med gitt navn i og rundt den angitte mappen.
 
-    Denne versjonen foretar et grundigere søk enn tidligere. Filen
-    lokaliseres gjennom følgende strategier (i rekkefølge):
+    Oppslaget går via saft_manifest.find_artifact:
 
-      1. Sjekk outdir og alle dets foreldre opp til roten.
-      2. Søk rekursivt i alle underkataloger av hver av disse mappene.
-      3. Sjekk arbeidskatalogen (cwd) og alle dets foreldre.
-      4. Søk rekursivt i alle underkataloger av hver av disse mappene.
+      1. saft_manifest.json fra parseren i outdir (eller nærmeste foreldre / csv-undermappe).
+      2. Direkte i outdir, arbeidskatalogen (cwd) og alle deres foreldre.
+      3. Begrenset søk nedover fra outdir og cwd (dybde og antall innslag er begrenset).
 
-    Hvis filen finnes flere steder, returneres den første som oppdages.
-    Returnerer None hvis filen ikke finnes.
+    Treff huskes for resten av prosessen. Returnerer None hvis filen ikke finnes.
     """
-    # Liste over mapper å sjekke eksplisitt (ikke rekursivt)
-    dirs_to_check = []
-    # outdir og alle foreldre
-    current = outdir
-    while True:
-        dirs_to_check.append(current)
-        if current.parent == current:
-            break
-        current = current.parent
-    # arbeidskatalogen (cwd) og alle foreldre
-    cwd = Path.cwd()
-    current = cwd
-    while True:
-        if current not in dirs_to_check:
-            dirs_to_check.append(current)
-        if current.parent == current:
-            break
-        current = current.parent
-    # 1. Sjekk direkte i mappene
-    for d in dirs_to_check:
-        candidate = d / filename
-        if candidate.is_file():
-            return candidate
-    # 2. Søk rekursivt i underkataloger til hver av mappene
-    #    Vi prøver i rekkefølgen gitt i dirs_to_check for determinisme
-    for base in dirs_to_check:
-        try:
-            for p in base.rglob(filename):
-                if p.is_file():
-                    return p
-        except Exception:
-            # rglob kan feile på visse systemer (f.eks. manglende tillatelser), ignorér
-            continue
-    return None
+    return find_artifact(outdir, filename)
 
 
 def _to_num(df: pd.DataFrame, cols: Iterable[str]) -> pd.DataFrame:
@@ -305,8 +268,20 @@ def _norm_acc(acc: str) -> str:
 
 
 def _norm_acc_series(s: pd.Series) -> pd.Series:
-    """Anvend _norm_acc på en hel Series."""
-    return s.apply(_norm_acc)
+    """Anvend _norm_acc på en hel Series (vektorisert)."""
+    return norm_acc_series(s)
+
+
+def _load_tx(outdir: Path) -> Optional[pd.DataFrame]:
+    """Hent transactions.csv for outdir fra det felles transaksjonslageret.
+
+    Datoene er parset (Date = PostingDate, ellers TransactionDate), AccountID er
+    normalisert og Debit/Credit/TaxAmount/Amount er numeriske. CSV-en leses bare
+    én gang så lenge den er uendret; kallet får en egen kopi den kan endre.
+    """
+    tx_path = _find_csv_file(outdir, "transactions.csv")
+    store = load_transactions(tx_path) if tx_path else None
+    return store.transactions() if store is not None else None
 
 
 def _range_dates(
@@ -363,6 +338,58 @@ def _range_dates(
     return dfrom.normalize(), dto.normalize()
 
 
+Window = Tuple[pd.Timestamp, pd.Timestamp]
+
+
+def _period_balances(df: pd.DataFrame, key: str, windows: Iterable[Window]) -> List[pd.DataFrame]:
+    """IB, PR og UB (Debit - Credit) pr key for en eller flere perioder i én gruppert reduksjon.
+
+    For hver periode (dfrom, dto) er IB = Date < dfrom, PR = dfrom <= Date <= dto
+    og UB = Date <= dto, som i de tidligere tre groupby-ene. Linjene plasseres én
+    gang i datointervaller mellom de sorterte periodegrensene (searchsorted),
+    summeres pr (key, intervall) med bincount og akkumuleres over intervallene;
+    hver periode er deretter bare et oppslag. Tolv måneder koster derfor omtrent
+    det samme som én periode. Linjer uten dato eller key telles ikke.
+
+    Returnerer én DataFrame pr periode med kolonnene key, UB, IB og PR, sortert
+    på key og bare med nøkler som har linjer i IB, PR eller UB.
+    """
+    windows = [(pd.Timestamp(a).as_unit("ns").value, pd.Timestamp(b).as_unit("ns").value + 1)
+               for a, b in windows]
+    codes, keys = pd.factorize(df[key], sort=True)
+    dates = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[ns]")
+    ok = (codes >= 0) & ~np.isnat(dates)
+    # Grenser på formen "Date < grense": dfrom for IB, dto + 1 ns for UB
+    cuts = np.unique([v for w in windows for v in w])
+    nb = len(cuts) + 1
+    bucket = np.searchsorted(cuts, dates[ok].view("int64"), side="right")
+    flat = codes[ok] * nb + bucket
+    net = df["Debit"].to_numpy(float)[ok] - df["Credit"].to_numpy(float)[ok]
+    size = len(keys) * nb
+    cum = np.bincount(flat, weights=net, minlength=size).reshape(len(keys), nb).cumsum(axis=1)
+    seen = np.bincount(flat, minlength=size).reshape(len(keys), nb).cumsum(axis=1)
+    out = []
+    for lo, hi in windows:
+        # cum[:, k] = sum av linjer med Date < cuts[k]
+        k_ib, k_ub = np.searchsorted(cuts, [lo, hi])
+        k_pr = max(k_ib, k_ub)  # dfrom > dto gir tom PR
+        ib, ub = cum[:, k_ib], cum[:, k_ub]
+        keep = seen[:, k_pr] > 0
+        out.append(pd.DataFrame({
+            key: keys[keep],
+            "UB": ub[keep],
+            "IB": ib[keep],
+            "PR": (cum[:, k_pr] - ib)[keep],
+        }))
+    return out
+
+
+def _month_windows(dfrom: pd.Timestamp, dto: pd.Timestamp) -> List[Window]:
+    """Månedsvise perioder fra dfrom til dto (første og siste måned avkortes til intervallet)."""
+    starts = pd.date_range(dfrom.to_period("M").start_time, dto, freq="MS")
+    return [(max(s, dfrom), min(s + pd.offsets.MonthEnd(0), dto)) for s in starts]
+
+
 def _pick_control_accounts(outdir: Path, which: str) -> Set[str]:
     """Hent kontrollkontoer for AR eller AP.
 
@@ -450,24 +477,16 @@ def _compute_target_closing(outdir: Path, control_accounts: Set[str]) -> Optiona
     return None
 
 
-def make_subledger(
+def _subledger_input(
     outdir: Path,
     which: str,
-    date_from: Optional[str] = None,
-    date_to: Optional[str] = None,
-) -> Path:
-    """Lag subledger Excel-rapport for AR eller AP i gitt katalog.
-
-    Parametre:
-        outdir: mappe som inneholder transactions.csv, accounts.csv, osv.
-        which: "AR" for kunder eller "AP" for leverandører.
-        date_from/date_to: valgfri overstyring av periode (ISO-datoer).
+    date_from: Optional[str],
+    date_to: Optional[str],
+) -> Tuple[pd.DataFrame, pd.DataFrame, Optional[pd.DataFrame], Set[str], Tuple[pd.Timestamp, pd.Timestamp]]:
+    """Felles forarbeid for reskontro: linjer med/uten part-ID på kontrollkontoene.
 
-    Returnerer stien til generert Excel-fil.
+    Returnerer (txp, partyless, party_df, ctrl_accounts, (dfrom, dto)).
     """
-    which = which.upper()
-    if which not in {"AR", "AP"}:
-        raise ValueError("which må være 'AR' eller 'AP'")
     # Før vi starter, prøv å komplettere kontoplanen slik at
     # kontrollkontoer har riktige UB-tall for skalering.
     try:
@@ -476,8 +495,7 @@ def make_subledger(
         pass
     # Les transaksjoner
     # Forsøk å finne transactions.csv i outdir, parent eller nåværende katalog
-    tx_path = _find_csv_file(outdir, "transactions.csv")
-    tx = _read_csv_safe(tx_path, dtype=str) if tx_path else None
+    tx = _load_tx(outdir)
     if tx is None or tx.empty:
         raise FileNotFoundError(
             "transactions.csv mangler eller er tom; sørg for at filen finnes i valgt mappe eller overordnet katalog"
@@ -486,54 +504,79 @@ def make_subledger(
     # Les header (bruk søk hvis filen ikke finnes direkte)
     hdr_path = _find_csv_file(outdir, "header.csv")
     hdr = _read_csv_safe(hdr_path, dtype=str) if hdr_path else None
-    # Normaliser konti og part-IDer
-    tx = _parse_dates(tx, ["TransactionDate", "PostingDate"])
-    tx["Date"] = tx["PostingDate"].fillna(tx["TransactionDate"])
-    for col in ["AccountID", "CustomerID", "SupplierID"]:
-        if col in tx.columns:
-            tx[col] = tx[col].astype(str)
-    if "AccountID" in tx.columns:
-        tx["AccountID"] = _norm_acc_series(tx["AccountID"])
-    tx = _to_num(tx, ["Debit", "Credit", "TaxAmount"])
-    tx["Amount"] = tx["Debit"] - tx["Credit"]
     # Bestem periode
     dfrom, dto = _range_dates(hdr, date_from, date_to, tx)
     # Velg kontrollkontoer
     ctrl_accounts = _pick_control_accounts(outdir, which)
     # Filtrer transaksjoner til kontrollkontoer
     tx_ctrl = tx[tx["AccountID"].isin(ctrl_accounts)].copy() if ctrl_accounts else tx.copy()
-    # Partinavn og ID-kolonner
-    if which == "AR":
-        id_col = "CustomerID"
-        name_col = "CustomerName"
-        cust_path = _find_csv_file(outdir, "customers.csv")
-        party_df = _read_csv_safe(cust_path, dtype=str) if cust_path else None
-    else:
-        id_col = "SupplierID"
-        name_col = "SupplierName"
-        supp_path = _find_csv_file(outdir, "suppliers.csv")
-        party_df = _read_csv_safe(supp_path, dtype=str) if supp_path else None
+    # Partregister
+    party_path = _find_csv_file(outdir, "customers.csv" if which == "AR" else "suppliers.csv")
+    party_df = _read_csv_safe(party_path, dtype=str) if party_path else None
     # Masker for transaksjoner med og uten part-ID
+    id_col = _PARTY_COLS[which][0]
     mask_has_party = _has_value(tx_ctrl.get(id_col, pd.Series([], dtype=str)))
     txp = tx_ctrl.loc[mask_has_party].copy()
     partyless = tx_ctrl.loc[~mask_has_party].copy()
-    # Summer per party i tre perioder: IB, PR og UB
-    def _sum_period(df: pd.DataFrame) -> pd.DataFrame:
-        if df.empty:
-            return pd.DataFrame({id_col: [], "Amount": []})
-        g = df.groupby(id_col)[["Debit", "Credit"]].sum().reset_index()
-        g["Amount"] = g["Debit"] - g["Credit"]
-        return g[[id_col, "Amount"]]
-    ib = _sum_period(txp.loc[txp["Date"] < dfrom])
-    pr = _sum_period(txp.loc[(txp["Date"] >= dfrom) & (txp["Date"] <= dto)])
-    ub = _sum_period(txp.loc[txp["Date"] <= dto])
-    # Kombiner til balanse
-    bal = (
-        ub.rename(columns={"Amount": "UB_Amount"})
-        .merge(ib.rename(columns={"Amount": "IB_Amount"}), on=id_col, how="outer")
-        .merge(pr.rename(columns={"Amount": "PR_Amount"}), on=id_col, how="outer")
-        .fillna(0.0)
-    )
+    return txp, partyless, party_df, ctrl_accounts, (dfrom, dto)
+
+
+# (ID-kolonne, navnekolonne) pr reskontrotype
+_PARTY_COLS = {"AR": ("CustomerID", "CustomerName"), "AP": ("SupplierID", "SupplierName")}
+
+
+def _party_balances(txp: pd.DataFrame, id_col: str, windows: List[Window]) -> List[pd.DataFrame]:
+    """IB/PR/UB pr part for hver periode, med rapportens kolonnenavn."""
+    return [
+        b.rename(columns={"UB": "UB_Amount", "IB": "IB_Amount", "PR": "PR_Amount"})
+        for b in _period_balances(txp, id_col, windows)
+    ]
+
+
+def _attach_party_names(bal: pd.DataFrame, party_df: Optional[pd.DataFrame], which: str) -> pd.DataFrame:
+    """Legg på partnavn fra customers.csv/suppliers.csv hvis tilgjengelig."""
+    id_col, name_col = _PARTY_COLS[which]
+    if party_df is not None and id_col in party_df.columns:
+        nm_src = None
+        if "Name" in party_df.columns:
+            nm_src = "Name"
+        elif name_col in party_df.columns:
+            nm_src = name_col
+        if nm_src:
+            bal = bal.merge(
+                party_df[[id_col, nm_src]].rename(columns={nm_src: name_col}),
+                on=id_col,
+                how="left",
+            )
+    return bal
+
+
+@dataclass
+class Subledger:
+    """Reskontro for AR eller AP i minnet (det make_subledger skriver til Excel)."""
+    which: str
+    balances: pd.DataFrame          # id, UB_Amount, IB_Amount, PR_Amount, [navn]
+    transactions: pd.DataFrame      # linjer med part-ID på kontrollkontoene
+    partyless: pd.DataFrame         # linjer uten part-ID på kontrollkontoene
+    ctrl_accounts: Set[str]
+    period: Tuple[pd.Timestamp, pd.Timestamp]
+    target_closing: Optional[float]  # kontoplanens UB for kontrollkontoene
+
+
+def compute_subledger(
+    outdir: Path,
+    which: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> Subledger:
+    """Beregn reskontro for AR eller AP uten å skrive filer (se make_subledger)."""
+    which = which.upper()
+    if which not in {"AR", "AP"}:
+        raise ValueError("which må være 'AR' eller 'AP'")
+    txp, partyless, party_df, ctrl_accounts, (dfrom, dto) = _subledger_input(outdir, which, date_from, date_to)
+    id_col = _PARTY_COLS[which][0]
+    # IB, PR og UB pr part i én gruppert reduksjon
+    bal = _party_balances(txp, id_col, [(dfrom, dto)])[0]
     # Skalering: finn mål for kontrollkontoene og juster UB/PR slik at summen stemmer
     target_ub = _compute_target_closing(outdir, ctrl_accounts)
     raw_sum = bal["UB_Amount"].sum() if not bal.empty else 0.0
@@ -548,32 +591,77 @@ def make_subledger(
         if "PR_Amount" in bal.columns:
             bal["PR_Amount"] = bal["UB_Amount"]
     # Legg på navn hvis tilgjengelig
-    if party_df is not None and id_col in party_df.columns:
-        nm_src = None
-        if "Name" in party_df.columns:
-            nm_src = "Name"
-        elif name_col in party_df.columns:
-            nm_src = name_col
-        if nm_src:
-            bal = bal.merge(
-                party_df[[id_col, nm_src]].rename(columns={nm_src: name_col}),
-                on=id_col,
-                how="left",
-            )
+    bal = _attach_party_names(bal, party_df, which)
     # Sorter etter ID
     bal = bal.sort_values(id_col)
-    # Skriv Excel med transaksjoner, balanser og partyless
-    out_name = "ar_subledger.xlsx" if which == "AR" else "ap_subledger.xlsx"
+    return Subledger(which, bal, txp, partyless, ctrl_accounts, (dfrom, dto), target_ub)
+
+
+def write_subledger(sub: Subledger, outdir: Path, suffix: str = "") -> Path:
+    """Skriv ar_subledger{suffix}.xlsx / ap_subledger{suffix}.xlsx for en beregnet reskontro."""
+    which = sub.which
+    out_name = f"ar_subledger{suffix}.xlsx" if which == "AR" else f"ap_subledger{suffix}.xlsx"
     out_path = outdir / out_name
-    with pd.ExcelWriter(out_path, engine="xlsxwriter", datetime_format="yyyy-mm-dd") as writer:
-        sheet_tx = "AR_Transactions" if which == "AR" else "AP_Transactions"
-        txp.to_excel(writer, index=False, sheet_name=sheet_tx)
-        sheet_bal = "AR_Balances" if which == "AR" else "AP_Balances"
-        bal.to_excel(writer, index=False, sheet_name=sheet_bal)
+    with XlsxStream(out_path) as xs:
+        # Skriv Excel med transaksjoner, balanser og partyless
+        xs.write_frame(sub.transactions, f"{which}_Transactions")
+        xs.write_frame(sub.balances, f"{which}_Balances")
         # Partyless ark hvis finnes
-        if not partyless.empty:
-            sheet_pl = "AR_Partyless" if which == "AR" else "AP_Partyless"
-            partyless.to_excel(writer, index=False, sheet_name=sheet_pl)
+        if not sub.partyless.empty:
+            xs.write_frame(sub.partyless, f"{which}_Partyless")
+    return out_path
+
+
+def make_subledger(
+    outdir: Path,
+    which: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> Path:
+    """Lag subledger Excel-rapport for AR eller AP i gitt katalog.
+
+    Parametre:
+        outdir: mappe som inneholder transactions.csv, accounts.csv, osv.
+        which: "AR" for kunder eller "AP" for leverandører.
+        date_from/date_to: valgfri overstyring av periode (ISO-datoer).
+
+    Returnerer stien til generert Excel-fil.
+    """
+    return write_subledger(compute_subledger(outdir, which, date_from, date_to), outdir)
+
+
+def make_monthly_subledger(
+    outdir: Path,
+    which: str,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+) -> Path:
+    """Lag månedsvis (rullerende) reskontro for AR eller AP.
+
+    Perioden fra _range_dates deles i kalendermåneder; for hver måned gis IB
+    (før månedens start), PR (i måneden) og UB (til og med månedens slutt) pr
+    part. Alle månedene beregnes i samme reduksjon som én enkelt periode.
+    Beløpene er rene hovedbokssummer (ingen skalering mot kontoplanen, som
+    bare har saldo for hele perioden).
+
+    Returnerer stien til ar_subledger_monthly.xlsx / ap_subledger_monthly.xlsx.
+    """
+    which = which.upper()
+    if which not in {"AR", "AP"}:
+        raise ValueError("which må være 'AR' eller 'AP'")
+    txp, _, party_df, _, (dfrom, dto) = _subledger_input(outdir, which, date_from, date_to)
+    id_col = _PARTY_COLS[which][0]
+    windows = _month_windows(dfrom, dto)
+    frames = []
+    for (start, _end), bal in zip(windows, _party_balances(txp, id_col, windows)):
+        bal.insert(0, "Period", start.strftime("%Y-%m"))
+        frames.append(bal)
+    monthly = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+        columns=["Period", id_col, "UB_Amount", "IB_Amount", "PR_Amount"])
+    monthly = _attach_party_names(monthly, party_df, which)
+    out_path = outdir / ("ar_subledger_monthly.xlsx" if which == "AR" else "ap_subledger_monthly.xlsx")
+    with XlsxStream(out_path) as xs:
+        xs.write_frame(monthly, f"{which}_Monthly")
     return out_path
 
 
@@ -581,25 +669,23 @@ def make_general_ledger(outdir: Path) -> Path:
     """Generer en enkel hovedbok (General Ledger) i Excel fra transactions.csv."""
     # Finne transactions.csv
     tx_path = _find_csv_file(outdir, "transactions.csv")
-    tx = _read_csv_safe(tx_path, dtype=str) if tx_path else None
-    if tx is None or tx.empty:
+    store = load_transactions(tx_path) if tx_path else None
+    if store is None or store.frame.empty:
         raise FileNotFoundError("transactions.csv mangler")
-    tx = _parse_dates(tx, ["TransactionDate", "PostingDate"])
-    tx["Date"] = tx["PostingDate"].fillna(tx["TransactionDate"])
-    tx["AccountID"] = _norm_acc_series(tx["AccountID"] if "AccountID" in tx.columns else pd.Series([], dtype=str))
-    tx = _to_num(tx, ["Debit", "Credit", "TaxAmount"])
-    tx["Amount"] = tx["Debit"] - tx["Credit"]
+    tx = store.transactions()
+    # Lageret har allerede den stabile (AccountID, Date)-rekkefølgen; arkene
+    # strømmes i den rekkefølgen uten sorterte kopier og deles ved Excels radgrense
+    order = store.order_account_date
     path = outdir / "general_ledger.xlsx"
-    with pd.ExcelWriter(path, engine="xlsxwriter", datetime_format="yyyy-mm-dd") as writer:
+    with XlsxStream(path) as xs:
         # GL-only visning hvis IsGL finnes
         if "IsGL" in tx.columns:
-            mask_gl = tx["IsGL"].astype(str).str.lower() == "true"
-            tx_gl = tx.loc[mask_gl].sort_values(["AccountID", "Date"])
-            tx_gl.to_excel(writer, index=False, sheet_name="GeneralLedger")
+            mask_gl = (tx["IsGL"].astype(str).str.lower() == "true").to_numpy()
+            xs.write_frame(tx, "GeneralLedger", order=order[mask_gl[order]])
             # Full transaksjonslogg for sporbarhet
-            tx.sort_values(["AccountID", "Date"]).to_excel(writer, index=False, sheet_name="AllTransactions")
+            xs.write_frame(tx, "AllTransactions", order=order)
         else:
-            tx.sort_values(["AccountID", "Date"]).to_excel(writer, index=False, sheet_name="GeneralLedger")
+            xs.write_frame(tx, "GeneralLedger", order=order)
     return path
 
 
@@ -617,16 +703,11 @@ def make_trial_balance(
         # Hvis noe går galt under komplettering, ignorer og fortsett med eksisterende data
         pass
 
-    tx_path = _find_csv_file(outdir, "transactions.csv")
     hdr_path = _find_csv_file(outdir, "header.csv")
-    tx = _read_csv_safe(tx_path, dtype=str) if tx_path else None
+    tx = _load_tx(outdir)
     hdr = _read_csv_safe(hdr_path, dtype=str) if hdr_path else None
     if tx is None or tx.empty:
         raise FileNotFoundError("transactions.csv mangler")
-    tx = _parse_dates(tx, ["TransactionDate", "PostingDate"])
-    tx["Date"] = tx["PostingDate"].fillna(tx["TransactionDate"])
-    tx["AccountID"] = _norm_acc_series(tx["AccountID"] if "AccountID" in tx.columns else pd.Series([], dtype=str))
-    tx = _to_num(tx, ["Debit", "Credit"])
     # Unngå dobbeltsummering: bruk kun GL-linjer hvis kolonnen finnes
     if "IsGL" in tx.columns:
         tx = tx.loc[tx["IsGL"].astype(str).str.lower() == "true"].copy()
@@ -758,13 +839,13 @@ def make_trial_balance(
         # Hvis noe går galt, hopp over justering
         pass
     path = outdir / "trial_balance.xlsx"
-    with pd.ExcelWriter(path, engine="xlsxwriter", datetime_format="yyyy-mm-dd") as writer:
+    with XlsxStream(path) as xs:
         # Lag full TrialBalance-fane
         # Rund av alle numeriske verdier til 2 desimaler for å unngå mikroskopiske differanser
         out_sorted = out.sort_values("AccountID").copy()
         for col in out_sorted.select_dtypes(include=["float", "float64"]).columns:
             out_sorted[col] = out_sorted[col].round(2)
-        out_sorted.to_excel(writer, index=False, sheet_name="TrialBalance")
+        xs.write_frame(out_sorted, "TrialBalance")
         # Lag en enkel fane med kun konto, navn, IB, bevegelse og UB.  Når kontoplanen
         # (accounts.csv) inneholder OpeningDebit/OpeningCredit og ClosingDebit/ClosingCredit,
         # benytter vi disse til å beregne IB, Movement og UB slik at saldobalansen stemmer med
@@ -797,29 +878,30 @@ def make_trial_balance(
         # Sorter etter AccountID hvis tilgjengelig og skriv til fane
         if "AccountID" in simple_df.columns:
             simple_df = simple_df.sort_values("AccountID")
-        simple_df.to_excel(writer, index=False, sheet_name="SimpleTrialBalance")
+        xs.write_frame(simple_df, "SimpleTrialBalance")
     return path
 
 
 # ---------------- GUI wrapper for subledger generation ----------------
-def _run_full_process(input_path: Path, outdir: Path) -> None:
+def _run_full_process(input_path: Path, outdir: Path, raw_mode: str = "full") -> None:
     """Kjør full prosess: parse SAF‑T, lag grunnlags-CSV og generer rapporter.
 
-    Denne funksjonen bruker parse_saft fra saft_parser_pro til å lese en
-    SAF‑T‑fil (XML eller ZIP) og skriver alle CSV‑filer til outdir/csv.
+    Denne funksjonen leser SAF‑T‑filen (XML, ZIP eller GZ) via saft_engine.load_saft
+    og skriver tabellene som CSV til outdir/csv (med rådump etter raw_mode, som
+    parse_saft). Er filen ikke i cachen, fylles cachen i samme gjennomløp.
     Deretter genereres både AR- og AP‑subledger, samt general ledger og
     trial balance, basert på data i csv-mappen. Rapportene lagres i
     outdir/excel. Etter fullføring skrives det en melding på standardutgang.
     """
-    if parse_saft is None:
-        raise RuntimeError("parse_saft er ikke tilgjengelig; saft_parser_pro mangler eller er korrupt")
+    if load_saft is None:
+        raise RuntimeError("saft_engine er ikke tilgjengelig; saft_parser_pro mangler eller er korrupt")
     # Sørg for underkataloger
     csv_dir = outdir / "csv"
     excel_dir = outdir / "excel"
     csv_dir.mkdir(parents=True, exist_ok=True)
     excel_dir.mkdir(parents=True, exist_ok=True)
-    # Kjør parsing
-    parse_saft(input_path, csv_dir)
+    # Parse via cachen og skriv CSV-grunnlaget for rapportene
+    load_saft(input_path, csv_dir=csv_dir, raw_mode=raw_mode)
     # Generer subledger for AR og AP
     ar_path = make_subledger(csv_dir, "AR")
     ap_path = make_subledger(csv_dir, "AP")
@@ -871,7 +953,7 @@ def launch_subledger_gui() -> None:
     # Full prosess: parse SAF‑T og generer rapporter
     def _run_full() -> None:
         file_path = _filedialog.askopenfilename(
-            title="Velg SAF‑T fil (.xml eller .zip)", filetypes=[("SAF‑T/XML/ZIP", "*.xml *.zip")]
+            title="Velg SAF‑T fil (.xml, .zip eller .gz)", filetypes=[("SAF‑T/XML/ZIP/GZ", "*.xml *.zip *.gz")]
         )
         if not file_path:
             return
@@ -937,6 +1019,11 @@ if __name__ == "__main__":
     parser.add_argument(
         "--date_to", type=str, default=None, help="End date (YYYY-MM-DD)"
     )
+    parser.add_argument(
+        "--monthly",
+        action="store_true",
+        help="Generate a monthly (rolling IB/PR/UB) subledger for the period instead of a single balance.",
+    )
     parser.add_argument(
         "--full",
         action="store_true",
@@ -968,7 +1055,8 @@ if __name__ == "__main__":
         else:
             # Kun subledger-generering
             try:
-                out_path = make_subledger(outdir, args.which, args.date_from, args.date_to)
+                make = make_monthly_subledger if args.monthly else make_subledger
+                out_path = make(outdir, args.which, args.date_from, args.date_to)
                 print(f"Ferdig! Genererte {args.which.upper()} subledger i '{out_path}'.")
             except FileNotFoundError as exc:
                 print(f"Feil: {exc}")
\ No newline at end of file
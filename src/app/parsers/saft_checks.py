@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+"""
+Kontrollmotor for en SAF-T-mappe: registrerte, vektoriserte kontroller over
+felles typede data, med strukturert resultat.
+
+load_control_data(mappe) leser alt kontrollene trenger én gang: transaksjonene
+fra saft_store (typede beløp/datoer, normalisert AccountID, delt med
+rapportene) og de små tabellene (accounts, customers, suppliers, gl_totals,
+analysis_lines, unknown_nodes) som tekst. Hver kontroll er en funksjon
+registrert med @control og returnerer et Check; run_controls kjører alle (eller
+et utvalg) og gir én rad pr kontroll:
+
+    control_id | control | status | delta | n_offending | offending_keys | result | seconds
+
+status er OK, AVVIK, INFO (bare tellinger) eller SKIPPET (data mangler);
+offending_keys er de første MAX_KEYS nøklene (bilag, journal, konto, part, ...)
+skilt med "|". result er den menneskelesbare teksten fra controls_summary.csv.
+
+run_batch([mappe, ...]) kjører hele settet for mange klienter og stabler
+resultatene med en client-kolonne; fra kommandolinjen:
+    python saft_checks.py <mappe> [<mappe> ...] [--out kontroller.csv]
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from saft_store import load_transactions, norm_acc_series
+
+TOL = 0.01          # kr 0,01 toleranse for bilag og total
+TOL_TOTALS = 1.0    # journal- og kontosummer mot oppgitte totaler
+MAX_KEYS = 50
+RESULT_COLUMNS = ["control_id", "control", "status", "delta", "n_offending",
+                  "offending_keys", "result", "seconds"]
+_SIDE_TABLES = ("accounts", "vouchers", "customers", "suppliers", "gl_totals",
+                "analysis_lines", "unknown_nodes")
+
+
+@dataclass
+class Check:
+    """Resultatet av én kontroll."""
+    status: str
+    result: object
+    delta: float = 0.0
+    keys: Sequence[str] = ()
+
+
+@dataclass
+class ControlData:
+    """Alt kontrollene leser, lastet én gang pr mappe."""
+    outdir: Path
+    tx: pd.DataFrame
+    tables: Dict[str, pd.DataFrame]
+    account_missing: Optional[np.ndarray] = None   # fra saft_store, på rå AccountID
+    _tb: Optional[pd.DataFrame] = field(default=None, repr=False)
+
+    def table(self, name: str) -> Optional[pd.DataFrame]:
+        return self.tables.get(name)
+
+    @property
+    def trial_balance(self) -> pd.DataFrame:
+        """Debet/kredit/netto pr konto, flettet med kontoplanens closing (hvis den finnes)."""
+        if self._tb is None:
+            self._tb = _trial_balance(self.tx, self.table("accounts"))
+        return self._tb
+
+
+@dataclass
+class Control:
+    control_id: str
+    title: str
+    fn: Callable[[ControlData], Check]
+
+
+CONTROLS: Dict[str, Control] = {}
+
+
+def control(control_id: str, title: str):
+    """Registrer en kontroll (kjøres i registreringsrekkefølge)."""
+    def deco(fn: Callable[[ControlData], Check]) -> Callable[[ControlData], Check]:
+        CONTROLS[control_id] = Control(control_id, title, fn)
+        return fn
+    return deco
+
+
+def _read_table(path: Path) -> Optional[pd.DataFrame]:
+    if not path.exists():
+        return None
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def _amount(s: pd.Series) -> pd.Series:
+    s = s.astype(str).str.replace("\u00A0", "", regex=False).str.replace(" ", "", regex=False)
+    return pd.to_numeric(s.str.replace(",", ".", regex=False), errors="coerce").fillna(0.0)
+
+
+def _present(s: pd.Series) -> pd.Series:
+    return s.fillna("").astype(str).str.strip() != ""
+
+
+def _keys(values: Iterable) -> List[str]:
+    return [str(v) for v in values]
+
+
+def load_control_data(outdir: Path) -> Optional[ControlData]:
+    """Transaksjoner og sidetabeller for outdir, eller None uten transactions.csv."""
+    outdir = Path(outdir)
+    store = load_transactions(outdir / "transactions.csv")
+    if store is None:
+        return None
+    tx = store.transactions()
+    for c in ("VoucherID", "AccountID"):
+        if c not in tx.columns:
+            tx[c] = ""
+    for c in ("Debit", "Credit"):
+        if c not in tx.columns:
+            tx[c] = 0.0
+    tables = {}
+    for name in _SIDE_TABLES:
+        df = _read_table(outdir / f"{name}.csv")
+        if df is not None:
+            tables[name] = df
+    return ControlData(outdir, tx, tables, store.account_missing)
+
+
+def _trial_balance(tx: pd.DataFrame, acc: Optional[pd.DataFrame]) -> pd.DataFrame:
+    tb = tx.groupby("AccountID", sort=True)[["Debit", "Credit"]].sum().reset_index()
+    tb["Net"] = tb["Debit"] - tb["Credit"]
+    if acc is None or "AccountID" not in acc.columns:
+        return tb
+    cols = [c for c in ("AccountID", "AccountDescription", "ClosingDebit", "ClosingCredit") if c in acc.columns]
+    acc = acc[cols].assign(AccountID=norm_acc_series(acc["AccountID"])).drop_duplicates("AccountID")
+    tb = tb.merge(acc, on="AccountID", how="left")
+    if {"ClosingDebit", "ClosingCredit"}.issubset(tb.columns):
+        tb["ClosingDebit"] = _amount(tb["ClosingDebit"])
+        tb["ClosingCredit"] = _amount(tb["ClosingCredit"])
+        tb["ClosingNet"] = tb["ClosingDebit"] - tb["ClosingCredit"]
+        tb["MatchClosing?"] = (tb["Net"] - tb["ClosingNet"]).abs() <= TOL_TOTALS
+    return tb
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Kontrollene
+# ────────────────────────────────────────────────────────────────────────────
+@control("line_count", "Linjetelling (transactions)")
+def _line_count(d: ControlData) -> Check:
+    return Check("INFO", len(d.tx))
+
+
+@control("global_balance", "Global debet= kredit")
+def _global_balance(d: ControlData) -> Check:
+    diff = float(d.tx["Debit"].sum() - d.tx["Credit"].sum())
+    if abs(diff) <= TOL:
+        return Check("OK", "OK", diff)
+    return Check("AVVIK", f"AVVIK {diff:.2f}", diff)
+
+
+@control("voucher_balance", "Bilag balansert")
+def _voucher_balance(d: ControlData) -> Check:
+    codes, vouchers = pd.factorize(d.tx["VoucherID"], sort=True)
+    net = np.bincount(codes[codes >= 0], weights=(d.tx["Debit"] - d.tx["Credit"]).to_numpy(float)[codes >= 0],
+                      minlength=len(vouchers))
+    bad = np.abs(net) > TOL
+    if not bad.any():
+        return Check("OK", "OK")
+    return Check("AVVIK", f"Ubalanserte bilag: {int(bad.sum())}", float(np.abs(net[bad]).sum()),
+                 _keys(vouchers[bad]))
+
+
+@control("journal_totals", "Journal totals = gl_totals.csv")
+def _journal_totals(d: ControlData) -> Check:
+    gtot = d.table("gl_totals")
+    if gtot is None:
+        return Check("SKIPPET", "SKIPPET (fil finnes ikke)")
+    if "JournalID" not in d.tx.columns:
+        return Check("SKIPPET", "SKIPPET (mangler JournalID)")
+    calc = d.tx.groupby("JournalID")[["Debit", "Credit"]].sum()
+    given = pd.DataFrame({c: _amount(gtot[c]) if c in gtot.columns else 0.0
+                          for c in ("TotalDebit", "TotalCredit")}, index=gtot.index)
+    if "JournalID" in gtot.columns:
+        given = given.groupby(gtot["JournalID"]).sum()
+    given = given.reindex(calc.index)
+    dd = (calc["Debit"] - given["TotalDebit"]).abs()
+    dc = (calc["Credit"] - given["TotalCredit"]).abs()
+    bad = ~((dd <= TOL_TOTALS) & (dc <= TOL_TOTALS))   # manglende totalrad = avvik
+    if not bad.any():
+        return Check("OK", "OK")
+    delta = float((dd[bad].fillna(calc["Debit"][bad]) + dc[bad].fillna(calc["Credit"][bad])).sum())
+    return Check("AVVIK", f"Avvik i {int(bad.sum())} journal(er)", delta, _keys(calc.index[bad]))
+
+
+@control("tb_vs_closing", "Saldobalanse vs accounts closing")
+def _tb_vs_closing(d: ControlData) -> Check:
+    acc = d.table("accounts")
+    if acc is None or "AccountID" not in acc.columns:
+        return Check("SKIPPET", "SKIPPET (accounts.csv mangler eller mangler AccountID)")
+    tb = d.trial_balance
+    if "MatchClosing?" not in tb.columns:
+        return Check("SKIPPET", "SKIPPET (Closing-felter mangler i accounts.csv)")
+    bad = ~tb["MatchClosing?"].to_numpy()
+    if not bad.any():
+        return Check("OK", "OK")
+    delta = float((tb["Net"] - tb["ClosingNet"]).abs()[bad].sum())
+    return Check("AVVIK", f"Avvik på {int(bad.sum())} konto(er)", delta, _keys(tb["AccountID"][bad]))
+
+
+def _record_keys(tx: pd.DataFrame, mask: np.ndarray) -> List[str]:
+    if "RecordID" in tx.columns:
+        return _keys(tx["RecordID"].to_numpy()[mask])
+    return _keys(np.flatnonzero(mask))
+
+
+@control("missing_account", "Transaksjoner uten AccountID")
+def _missing_account(d: ControlData) -> Check:
+    # normalisert AccountID gjør tom til "0" (som konto "0000"); bruk rå verdi fra lageret
+    if d.account_missing is not None:
+        mask = d.account_missing
+    else:
+        mask = (~_present(d.tx["AccountID"])).to_numpy()
+    n = int(mask.sum())
+    if n == 0:
+        return Check("OK", 0)
+    return Check("AVVIK", f"{n} linjer mangler AccountID", n, _record_keys(d.tx, mask))
+
+
+def _orphans(d: ControlData, table: str, col: str, label: str) -> Check:
+    master = d.table(table)
+    if master is None or col not in d.tx.columns or col not in master.columns:
+        return Check("SKIPPET", f"SKIPPET ({table}.csv mangler)")
+    ids = d.tx[col]
+    mask = (_present(ids) & ~ids.isin(master[col])).to_numpy()
+    n = int(mask.sum())
+    if n == 0:
+        return Check("OK", 0)
+    return Check("AVVIK", f"{n} linjer har ukjent {label}", n, _keys(pd.unique(ids.to_numpy()[mask])))
+
+
+@control("orphan_customer", "CustomerID uten master")
+def _orphan_customer(d: ControlData) -> Check:
+    return _orphans(d, "customers", "CustomerID", "CustomerID")
+
+
+@control("orphan_supplier", "SupplierID uten master")
+def _orphan_supplier(d: ControlData) -> Check:
+    return _orphans(d, "suppliers", "SupplierID", "SupplierID")
+
+
+@control("analysis_orphans", "Analysis uten record i transactions")
+def _analysis_orphans(d: ControlData) -> Check:
+    anl = d.table("analysis_lines")
+    if anl is None or "RecordID" not in anl.columns:
+        return Check("SKIPPET", "SKIPPET (analysis_lines.csv mangler)")
+    known = d.tx["RecordID"] if "RecordID" in d.tx.columns else pd.Series([], dtype=str)
+    mask = (~anl["RecordID"].isin(known)).to_numpy()
+    n = int(mask.sum())
+    if n == 0:
+        return Check("OK", 0)
+    return Check("AVVIK", f"{n} analysis-linjer mangler transaksjons-RecordID", n,
+                 _keys(pd.unique(anl["RecordID"].to_numpy()[mask])))
+
+
+@control("unknown_nodes", "Unknown nodes (rådump)")
+def _unknown_nodes(d: ControlData) -> Check:
+    unk = d.table("unknown_nodes")
+    if unk is None:
+        return Check("SKIPPET", "SKIPPET (unknown_nodes.csv mangler)")
+    return Check("INFO", len(unk))
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Kjøring
+# ────────────────────────────────────────────────────────────────────────────
+def run_controls(data: ControlData, ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Kjør kontrollene (alle, eller ids i gitt rekkefølge) og returner resultattabellen."""
+    rows = []
+    for cid in (list(ids) if ids is not None else list(CONTROLS)):
+        ctl = CONTROLS[cid]
+        t0 = time.perf_counter()
+        chk = ctl.fn(data)
+        keys = list(chk.keys)
+        rows.append({
+            "control_id": cid,
+            "control": ctl.title,
+            "status": chk.status,
+            "delta": round(float(chk.delta), 2),
+            "n_offending": len(keys),
+            "offending_keys": "|".join(keys[:MAX_KEYS]),
+            "result": chk.result,
+            "seconds": round(time.perf_counter() - t0, 6),
+        })
+    return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+def run_batch(outdirs: Iterable[Path], ids: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """Kontrollene for mange mapper i én tabell (client = mappenavnet).
+
+    Mapper uten transactions.csv gir én SKIPPET-rad (control_id "load").
+    """
+    ids = list(ids) if ids is not None else None
+    frames = []
+    for outdir in outdirs:
+        outdir = Path(outdir)
+        data = load_control_data(outdir)
+        if data is None:
+            res = pd.DataFrame([{"control_id": "load", "control": "Les transactions.csv",
+                                 "status": "SKIPPET", "delta": 0.0, "n_offending": 0,
+                                 "offending_keys": "", "result": "SKIPPET (transactions.csv mangler)",
+                                 "seconds": 0.0}], columns=RESULT_COLUMNS)
+        else:
+            res = run_controls(data, ids)
+        res.insert(0, "client", str(outdir))
+        frames.append(res)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["client", *RESULT_COLUMNS])
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Kjør SAF-T-kontrollene for én eller flere parser-mapper")
+    ap.add_argument("outdirs", nargs="+", help="Mapper med parser-CSV")
+    ap.add_argument("--out", default=None, help="Skriv samlet resultat til CSV")
+    ap.add_argument("--only", nargs="+", default=None, choices=list(CONTROLS), help="Bare disse kontrollene")
+    args = ap.parse_args()
+    res = run_batch([Path(p) for p in args.outdirs], args.only)
+    if args.out:
+        res.to_csv(args.out, index=False)
+        print("Kontroller skrevet til:", args.out)
+    else:
+        print(res[["client", "control_id", "status", "result", "seconds"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
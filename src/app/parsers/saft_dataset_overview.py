@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 # Bruk: python saft_dataset_overview.py "<sti til Saft output>"
-import sys, csv, os
+#
+# Oversikten hentes fra saft_stats.json (skrevet av parseren) når filen finnes og
+# tabellfilen er uendret (samme størrelse): da leses ingen tabeller. Ellers
+# telles CSV-radene som før, og for Parquet brukes fil-metadataene.
+import sys, csv
 from pathlib import Path
 
+from saft_stats import load_stats
+
+OVERVIEW_FILE = "dataset_overview.csv"
+
 def count_rows(p: Path):
     try:
         with p.open("r", encoding="utf-8", newline="") as f:
@@ -21,26 +29,59 @@ def first_cols(p: Path, n=8):
     except Exception:
         return ""
 
+def parquet_info(p: Path, n=8):
+    """(rader, første kolonner) fra Parquet-metadataene, uten å lese data."""
+    try:
+        import pyarrow.parquet as pq   # bare når saft_stats.json mangler/er utdatert
+        meta = pq.ParquetFile(str(p)).metadata
+        return meta.num_rows, ", ".join(meta.schema.to_arrow_schema().names[:n])
+    except Exception:
+        return None, ""
+
+def _fmt_stats(entry):
+    dates = "; ".join(f"{c} {r[0]}..{r[1]}" for c, r in entry.get("dates", {}).items() if r)
+    totals = "; ".join(f"{c}={v:.2f}" for c, v in entry.get("totals", {}).items() if v)
+    distinct = "; ".join(f"{c}={v}" for c, v in entry.get("distinct", {}).items() if v)
+    return dates, totals, distinct
+
+def overview(outdir: Path, n=8):
+    """Én rad pr tabellfil: (fil, rader, første kolonner, datoer, summer, distinkte)."""
+    stats = load_stats(outdir) or {}
+    by_file = {e["file"]: e for e in stats.get("tables", {}).values()}
+    rows = []
+    files = sorted([*outdir.glob("*.csv"), *outdir.glob("*.parquet")], key=lambda p: p.name)
+    for p in files:
+        if p.name == OVERVIEW_FILE:
+            continue
+        entry = by_file.get(p.name)
+        if entry is not None and entry.get("bytes") == p.stat().st_size:
+            rows.append((p.name, entry["rows"], ", ".join(entry["columns"][:n]), *_fmt_stats(entry)))
+        elif p.suffix == ".parquet":
+            rows.append((p.name, *parquet_info(p, n), "", "", ""))
+        else:
+            rows.append((p.name, count_rows(p), first_cols(p, n), "", "", ""))
+    return rows
+
 def main():
     if len(sys.argv)!=2:
         print("Bruk: python saft_dataset_overview.py <outdir>")
         sys.exit(2)
     outdir = Path(sys.argv[1])
-    rows = []
-    for p in sorted(outdir.glob("*.csv")):
-        rows.append((p.name, count_rows(p), first_cols(p)))
+    rows = overview(outdir)
     # skriv til skjerm
-    width = max(len(n) for n,_,_ in rows) if rows else 12
-    print(f"{'Filnavn'.ljust(width)} | Rader | Kolonner (første 8)")
+    width = max(len(r[0]) for r in rows) if rows else 12
+    print(f"{'Filnavn'.ljust(width)} | {'Rader':>9} | Kolonner (første 8)")
     print("-"*(width+40))
-    for name, cnt, cols in rows:
-        print(f"{name.ljust(width)} | {cnt if cnt is not None else '-':>5} | {cols}")
+    for name, cnt, cols, dates, _totals, _distinct in rows:
+        print(f"{name.ljust(width)} | {cnt if cnt is not None else '-':>9} | {cols}")
+        if dates:
+            print(f"{''.ljust(width)} | {'':>9} | {dates}")
     # lagre til overview.csv også
-    with (outdir/"dataset_overview.csv").open("w", encoding="utf-8", newline="") as f:
+    with (outdir/OVERVIEW_FILE).open("w", encoding="utf-8", newline="") as f:
         w = csv.writer(f)
-        w.writerow(["file","rows","first_columns"])
-        for name, cnt, cols in rows:
-            w.writerow([name, cnt, cols])
+        w.writerow(["file","rows","first_columns","date_ranges","totals","distinct"])
+        for row in rows:
+            w.writerow(row)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+Felles SAF-T-motor med cache – ett parse-steg bak alle SAF-T-konsumentene.
+
+load_saft(kilde) parser en SAF-T-fil (xml/zip/gz, sti eller fil-objekt) med
+saft_parser_pro til typede Parquet-tabeller og cacher resultatet på disk under
+innholdets SHA-256. Neste kall med samme fil (også under et annet navn, eller
+lastet opp på nytt i dashbordet) leser bare Parquet-filene.
+
+For filer gitt som sti slås innholdshashen opp i index.json i cache-mappen,
+nøklet på den oppløste stien og gyldig så lenge størrelse, mtime_ns, inode og
+SHA-256 av hode/hale er uendret; bare ved bom hashes hele filen.
+
+Cache-mappen er SAFT_CACHE_DIR (miljøvariabel) eller ~/.saft_cache, med én
+undermappe pr fil: <sha256>-v<ENGINE_VERSION>.<PARQUET_SCHEMA_VERSION>, så
+oppføringer fra en eldre motor eller et eldre tabellskjema ikke gjenbrukes. En oppføring er gyldig først når _COMPLETE er skrevet
+(parsing skjer i en midlertidig mappe som flyttes på plass til slutt).
+
+Konsumentene (mva-dashbordet, Tripletex-konverterne og rapport-GUIet) leser
+tabellene via SaftResult i stedet for å parse XML selv. Rapporter som leser
+CSV ber om csv_dir: ved cache-bom skrives CSV-tabellene i samme gjennomløp
+som Parquet-cachen (nøyaktig som parse_saft(fmt="csv"), med valgt raw_mode);
+ved treff parses filen rett til CSV, siden cachen verken har kildeskalaen på
+beløpene eller rådumpen.
+    res = load_saft("saft.zip")
+    res.lines       # transaksjonslinjer (float-beløp, datetime-datoer)
+    res.vat_lines   # mva-linjer med Date/TaxCode/TaxBase/TaxAmount
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+import pandas as pd
+
+import saft_parser_pro as spp
+
+ENGINE_VERSION = 1
+CACHE_ENV = "SAFT_CACHE_DIR"
+_COMPLETE = "_COMPLETE"
+_HASH_BLOCK = 1 << 20
+INDEX_FILE = "index.json"
+_INDEX_MAX = 500
+_SAMPLE_BYTES = 64 * 1024
+
+Source = Union[str, os.PathLike, BinaryIO]
+
+
+def cache_root(cache_dir: Optional[Path] = None) -> Path:
+    if cache_dir is not None:
+        return Path(cache_dir)
+    return Path(os.environ.get(CACHE_ENV) or Path.home() / ".saft_cache")
+
+
+def _hash_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(_HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _fingerprint(path: Path) -> Dict[str, object]:
+    """Størrelse, mtime_ns, inode og SHA-256 av de første og siste _SAMPLE_BYTES."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        st = os.fstat(fh.fileno())
+        h.update(fh.read(_SAMPLE_BYTES))
+        if st.st_size > _SAMPLE_BYTES:
+            fh.seek(max(_SAMPLE_BYTES, st.st_size - _SAMPLE_BYTES))
+            h.update(fh.read(_SAMPLE_BYTES))
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino,
+            "sample_sha256": h.hexdigest()}
+
+
+def _load_index(root: Path) -> Dict[str, Dict[str, object]]:
+    try:
+        doc = json.loads((root / INDEX_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return doc if isinstance(doc, dict) else {}
+
+
+def _path_digest(path: Path, root: Path, refresh: bool = False) -> str:
+    """SHA-256 av filen via indeksen; hele filen hashes bare når fingeravtrykket er ukjent."""
+    key = str(path.resolve())
+    fp = _fingerprint(path)
+    index = _load_index(root)
+    hit = index.get(key)
+    if not refresh and isinstance(hit, dict) and hit.get("sha256") \
+            and all(hit.get(k) == v for k, v in fp.items()):
+        return str(hit["sha256"])
+    digest = _hash_file(path)
+    index.pop(key, None)
+    index[key] = dict(fp, sha256=digest)
+    index = dict(list(index.items())[-_INDEX_MAX:])
+    tmp = root / f".{INDEX_FILE}.{os.getpid()}.tmp"
+    tmp.write_text(json.dumps(index, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, root / INDEX_FILE)
+    return digest
+
+
+def _spool(fileobj: BinaryIO, root: Path) -> tuple[Path, str]:
+    """Skriv et fil-objekt (f.eks. en Streamlit-opplasting) til en temp-fil og hash underveis."""
+    root.mkdir(parents=True, exist_ok=True)
+    if hasattr(fileobj, "seek"):
+        fileobj.seek(0)
+    h = hashlib.sha256()
+    fd, name = tempfile.mkstemp(prefix=".upload-", dir=root)
+    with os.fdopen(fd, "wb") as out:
+        for block in iter(lambda: fileobj.read(_HASH_BLOCK), b""):
+            h.update(block)
+            out.write(block)
+    return Path(name), h.hexdigest()
+
+
+class SaftResult:
+    """Tabellene fra én parset SAF-T-fil (leses lat fra cache-mappen)."""
+
+    def __init__(self, folder: Path, sha256: str):
+        self.folder = Path(folder)
+        self.sha256 = sha256
+        self._cache: Dict[Tuple[str, bool], pd.DataFrame] = {}
+
+    def table(self, name: str, exact: bool = False) -> pd.DataFrame:
+        """Tabell fra saft_parser_pro.TABLES: beløp som float64, datoer som datetime64.
+
+        exact=True gir Parquet-typene uendret (beløp som Decimal, datoer som date).
+        Typene konverteres kolonnevis i Arrow før to_pandas(). Tabellen leses én gang
+        pr (name, exact); hvert kall gir en grunn kopi av den, så nye/erstattede
+        kolonner ikke lekker inn i cachen (verdier skal ikke endres på stedet).
+        """
+        key = (name, exact)
+        if key not in self._cache:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            t = pq.read_table(str(self.folder / f"{name}.parquet"))
+            for col, kind in ({} if exact else spp.COLUMN_TYPES.get(name, {})).items():
+                i = t.schema.get_field_index(col)
+                if i < 0:
+                    continue
+                if kind == "amount":
+                    t = t.set_column(i, col, t.column(i).cast(pa.float64()))
+                elif kind == "date":
+                    t = t.set_column(i, col, t.column(i).cast(pa.timestamp("ns")))
+            self._cache[key] = t.to_pandas()
+        return self._cache[key].copy(deep=False)
+
+    @property
+    def header(self) -> pd.DataFrame: return self.table("header")
+    @property
+    def accounts(self) -> pd.DataFrame: return self.table("accounts")
+    @property
+    def customers(self) -> pd.DataFrame: return self.table("customers")
+    @property
+    def suppliers(self) -> pd.DataFrame: return self.table("suppliers")
+    @property
+    def tax_table(self) -> pd.DataFrame: return self.table("tax_table")
+    @property
+    def bank_accounts(self) -> pd.DataFrame: return self.table("bank_accounts")
+    @property
+    def journals(self) -> pd.DataFrame: return self.table("journals")
+    @property
+    def vouchers(self) -> pd.DataFrame: return self.table("vouchers")
+    @property
+    def lines(self) -> pd.DataFrame: return self.table("transactions")
+    @property
+    def analysis_lines(self) -> pd.DataFrame: return self.table("analysis_lines")
+
+    @property
+    def vat_lines(self) -> pd.DataFrame:
+        """Linjer med mva-kode (TaxType MVA/VAT eller tom) og Date = TransactionDate/PostingDate."""
+        tx = self.lines
+        code = tx["TaxCode"].fillna("").astype(str).str.strip()
+        ttype = tx["TaxType"].fillna("").astype(str).str.strip().str.upper()
+        out = tx[(code != "") & ttype.isin(["", "MVA", "VAT"])].copy()
+        out["TaxCode"] = code[out.index]
+        out["Date"] = out["TransactionDate"].fillna(out["PostingDate"])
+        return out.reset_index(drop=True)
+
+
+def load_saft(
+    source: Source,
+    cache_dir: Optional[Path] = None,
+    workers: int = 1,
+    refresh: bool = False,
+    csv_dir: Optional[Path] = None,
+    raw_mode: str = "off",
+) -> SaftResult:
+    """Parse source (sti eller fil-objekt; xml/zip/gz) via cachen og returner tabellene.
+
+    refresh=True hasher og parser på nytt selv om filen ligger i cachen.
+    csv_dir: skriv i tillegg tabellene som CSV (med raw_mode) dit, som
+    parse_saft(fmt="csv"). Ved cache-bom skjer det i samme gjennomløp (sekvensielt).
+    """
+    root = cache_root(cache_dir)
+    root.mkdir(parents=True, exist_ok=True)
+    spooled: Optional[Path] = None
+    if isinstance(source, (str, os.PathLike)):
+        path = Path(source)
+        digest = _path_digest(path, root, refresh)
+    else:
+        spooled, digest = _spool(source, root)
+        path = spooled
+    try:
+        folder = root / f"{digest}-v{ENGINE_VERSION}.{spp.PARQUET_SCHEMA_VERSION}"
+        if refresh and folder.exists():
+            shutil.rmtree(folder)
+        if not (folder / _COMPLETE).exists():
+            tmp = Path(tempfile.mkdtemp(prefix=f".{digest[:12]}-", dir=root))
+            try:
+                if csv_dir is None:
+                    spp.parse_saft(path, tmp, fmt="parquet", raw_mode="off", workers=workers)
+                else:
+                    spp.parse_saft(path, tmp, fmt="parquet", raw_mode=raw_mode, csv_dir=Path(csv_dir))
+                (tmp / _COMPLETE).write_text(digest, encoding="utf-8")
+                if folder.exists():  # halvferdig oppføring fra et avbrutt kall
+                    shutil.rmtree(folder)
+                os.replace(tmp, folder)
+            finally:
+                shutil.rmtree(tmp, ignore_errors=True)
+        elif csv_dir is not None:
+            spp.parse_saft(path, Path(csv_dir), fmt="csv", raw_mode=raw_mode)
+        return SaftResult(folder, digest)
+    finally:
+        if spooled is not None:
+            spooled.unlink(missing_ok=True)
+
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+Manifest over filene saft_parser_pro skriver, og oppslag av dem for rapportene.
+
+parse_saft skriver saft_manifest.json i output-mappen når alle tabellene er
+lukket (filen finnes altså bare etter en fullført kjøring):
+
+    {"manifest_version": 1, "format": "csv", "schema_version": 2, "raw_mode": "sampled",
+     "input": {"name": "saft.zip", "size": 123},
+     "artifacts": {"transactions": {"file": "transactions.csv", "rows": 4000,
+                                    "bytes": 812345}, ...}}
+
+Filene hashes ikke: det ville lest alle tabellene (GB-er) på nytt etter
+parsingen, og oppslagene trenger bare navn, rader og størrelse.
+
+find_artifact(mappe, "transactions.csv") finner filen via manifestet i mappen
+(eller i en av de nærmeste foreldrene / undermappene), ellers med direkte
+oppslag i mappen og dens foreldre og til slutt et begrenset søk nedover
+(maks SEARCH_DEPTH nivåer og SEARCH_LIMIT kataloginnslag). Treff huskes for
+prosessen, så gjentatte oppslag er gratis; bomtreff huskes ikke (filen kan bli
+opprettet senere, f.eks. accounts.csv).
+"""
+from __future__ import annotations
+
+import json
+import os
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+MANIFEST_FILE = "saft_manifest.json"
+MANIFEST_VERSION = 1
+MANIFEST_PARENTS = 2            # manifest søkes også så mange nivåer opp
+MANIFEST_SUBDIRS = ("csv",)     # og her (full prosess skriver CSV til <rot>/csv)
+SEARCH_DEPTH = 3
+SEARCH_LIMIT = 10_000
+
+_RESOLVED: Dict[Tuple[Path, str], Path] = {}
+_MANIFESTS: Dict[Path, Tuple[int, Dict[str, Any]]] = {}
+
+
+def write_manifest(
+    outdir: Path,
+    artifacts: Dict[str, Tuple[Path, int]],
+    input_path: Path,
+    fmt: str,
+    schema_version: int,
+    raw_mode: str,
+) -> Path:
+    """Skriv saft_manifest.json for artifacts (tabell -> (sti, rader)) i outdir."""
+    entries = {}
+    for name, (path, rows) in artifacts.items():
+        path = Path(path)
+        entries[name] = {
+            "file": os.path.relpath(path, outdir),
+            "rows": int(rows),
+            "bytes": path.stat().st_size,
+        }
+    doc = {
+        "manifest_version": MANIFEST_VERSION,
+        "format": fmt,
+        "schema_version": schema_version,
+        "raw_mode": raw_mode,
+        "input": {"name": Path(input_path).name, "size": Path(input_path).stat().st_size},
+        "artifacts": entries,
+    }
+    target = outdir / MANIFEST_FILE
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, target)
+    return target
+
+
+def load_manifest(folder: Path) -> Optional[Dict[str, Any]]:
+    """Manifestet i folder (None hvis det mangler eller er ugyldig); caches på mtime."""
+    path = Path(folder) / MANIFEST_FILE
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    hit = _MANIFESTS.get(path)
+    if hit is not None and hit[0] == mtime:
+        return hit[1]
+    try:
+        doc = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(doc, dict) or doc.get("manifest_version") != MANIFEST_VERSION:
+        return None
+    _MANIFESTS[path] = (mtime, doc)
+    return doc
+
+
+def _from_manifest(folder: Path, filename: str) -> Optional[Path]:
+    doc = load_manifest(folder)
+    if doc is None:
+        return None
+    for entry in doc.get("artifacts", {}).values():
+        if Path(entry.get("file", "")).name == filename:
+            candidate = folder / entry["file"]
+            if candidate.is_file():
+                return candidate
+    return None
+
+
+def _lineage(start: Path) -> Iterable[Path]:
+    current = start
+    while True:
+        yield current
+        if current.parent == current:
+            return
+        current = current.parent
+
+
+def _bounded_search(base: Path, filename: str, budget: list) -> Optional[Path]:
+    """Bredde-først-søk under base, maks SEARCH_DEPTH nivåer; budget[0] = gjenstående innslag."""
+    queue = deque([(base, 0)])
+    while queue and budget[0] > 0:
+        folder, depth = queue.popleft()
+        try:
+            with os.scandir(folder) as it:
+                subdirs = []
+                for entry in it:
+                    budget[0] -= 1
+                    if entry.name == filename and entry.is_file():
+                        return Path(entry.path)
+                    if depth < SEARCH_DEPTH and entry.is_dir(follow_symlinks=False) \
+                            and not entry.name.startswith("."):
+                        subdirs.append(entry.path)
+                    if budget[0] <= 0:
+                        break
+        except OSError:
+            continue
+        queue.extend((Path(p), depth + 1) for p in sorted(subdirs))
+    return None
+
+
+def find_artifact(outdir: Path, filename: str) -> Optional[Path]:
+    """Finn filename for outdir: cache, manifest, direkte oppslag, begrenset søk."""
+    outdir = Path(outdir)
+    key = (outdir.resolve(), filename)
+    hit = _RESOLVED.get(key)
+    if hit is not None and hit.is_file():
+        return hit
+
+    found = None
+    # 1. Manifest i outdir, de nærmeste foreldrene eller kjente undermapper
+    parents = list(_lineage(outdir))[: MANIFEST_PARENTS + 1]
+    for folder in [*parents, *(outdir / s for s in MANIFEST_SUBDIRS)]:
+        found = _from_manifest(folder, filename)
+        if found is not None:
+            break
+    # 2. Direkte i outdir, arbeidskatalogen og deres foreldre (bare stat-kall)
+    if found is None:
+        seen = []
+        for folder in [*_lineage(outdir), *_lineage(Path.cwd())]:
+            if folder in seen:
+                continue
+            seen.append(folder)
+            if (folder / filename).is_file():
+                found = folder / filename
+                break
+    # 3. Begrenset søk nedover fra outdir og arbeidskatalogen
+    if found is None:
+        budget = [SEARCH_LIMIT]
+        for base in (outdir, Path.cwd()):
+            found = _bounded_search(base, filename, budget)
+            if found is not None or budget[0] <= 0:
+                break
+    if found is not None:
+        _RESOLVED[key] = found
+    return found
+
+
+def clear_cache() -> None:
+    """Glem løste stier og leste manifester."""
+    _RESOLVED.clear()
+    _MANIFESTS.clear()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Åpne poster for kunde- og leverandørreskontro fra SAF-T-transaksjonene.
+
+match_open_items(linjer, "AR"|"AP") avstemmer fakturaer mot betalinger pr part
+og returnerer én rad pr post (faktura, betaling eller kreditnota) med gjenstående
+beløp. Avstemmingen skjer i tre vektoriserte trinn:
+
+1. Referanse: linjer med samme part og dokumentreferanse (DocumentNumber, ellers
+   LineSourceDocumentID) slås sammen til én post; har referansen både belastning
+   og innbetaling, er den avstemt (MatchedBy="ref") og resten står åpent.
+2. Beløp: poster uten motpost med nøyaktig motsatt beløp hos samme part pares
+   med en hash-join på (part, øre, datorang) – eldste faktura mot eldste betaling –
+   når datoene ligger innenfor max_days (MatchedBy="amount").
+3. FIFO: gjenværende innbetalinger fordeles på eldste åpne faktura pr part via
+   kumulative summer (MatchedBy="fifo"); overskudd blir stående som åpen
+   forskuddsbetaling.
+
+Summen av Open pr part er alltid lik saldoen (Debit - Credit) for linjene som
+var med. Beløpene har hovedbokens fortegn: AR-fakturaer positive, AP-fakturaer
+negative. Tabellen kan brukes direkte i aldersfordelingen
+(aging_cube(..., date_col="Date", amount_col="Open")) og i saldolisten.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+PARTY_COLS = {"AR": ("CustomerID", "CustomerName"), "AP": ("SupplierID", "SupplierName")}
+REF_COLUMNS = ("DocumentNumber", "LineSourceDocumentID")
+TOLERANCE = 0.005
+MAX_DAYS = 366
+_EMPTY = ("", "nan", "none", "nat")
+
+
+@dataclass
+class OpenItemResult:
+    """items: én rad pr post; line_item: post-ID (ItemID) pr inputlinje (samme indeks)."""
+    items: pd.DataFrame
+    line_item: pd.Series
+
+    def open_items(self) -> pd.DataFrame:
+        """Bare postene som fortsatt har åpent beløp."""
+        return self.items[self.items["Open"] != 0].reset_index(drop=True)
+
+
+def _text(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series("", index=df.index, dtype=str)
+    s = df[col].fillna("").astype(str).str.strip()
+    return s.mask(s.str.lower().isin(_EMPTY), "")
+
+
+def _date(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    return pd.to_datetime(df[col], errors="coerce")
+
+
+def _line_frame(lines: pd.DataFrame, which: str, asof) -> pd.DataFrame:
+    id_col = PARTY_COLS[which][0]
+    if "Date" in lines.columns:
+        date = _date(lines, "Date")
+    else:
+        date = _date(lines, "PostingDate").fillna(_date(lines, "TransactionDate"))
+    amount = (pd.to_numeric(lines["Debit"], errors="coerce").fillna(0.0)
+              - pd.to_numeric(lines["Credit"], errors="coerce").fillna(0.0))
+    ref = _text(lines, REF_COLUMNS[0])
+    for col in REF_COLUMNS[1:]:
+        ref = ref.mask(ref == "", _text(lines, col))
+    d = pd.DataFrame({
+        "Party": _text(lines, id_col),
+        "Ref": ref,
+        "Date": date,
+        # naturlig fortegn: > 0 belastning (faktura), < 0 innbetaling/kreditnota
+        "Natural": amount * (1.0 if which == "AR" else -1.0),
+    }, index=lines.index)
+    keep = d["Party"] != ""
+    if asof is not None:
+        keep &= d["Date"] <= pd.Timestamp(asof)
+    return d[keep]
+
+
+def _ref_items(d: pd.DataFrame) -> Tuple[pd.DataFrame, pd.Series]:
+    """Trinn 1: én post pr (part, referanse) og én pr linje uten referanse.
+
+    Returnerer (poster, post-ID pr linje).
+    """
+    with_ref = d["Ref"] != ""
+    r = d[with_ref]
+    pos = r["Natural"] > 0
+    keys = [r["Party"], r["Ref"]]
+    g = pd.DataFrame({
+        "Natural": r["Natural"],
+        "Charge": r["Natural"].where(pos, 0.0),
+        "HasPos": pos,
+        "HasNeg": r["Natural"] < 0,
+        "DocDate": r["Date"].where(pos),
+        "AnyDate": r["Date"],
+        "Lines": 1,
+    }).groupby(keys, sort=False).agg(
+        Natural=("Natural", "sum"), Charge=("Charge", "sum"), HasPos=("HasPos", "any"),
+        HasNeg=("HasNeg", "any"), DocDate=("DocDate", "min"), AnyDate=("AnyDate", "min"), Lines=("Lines", "sum"),
+    ).reset_index()
+    grouped = pd.DataFrame({
+        "Party": g["Party"],
+        "Ref": g["Ref"],
+        "Date": g["DocDate"].fillna(g["AnyDate"]),
+        "Original": g["Charge"].where(g["HasPos"], g["Natural"]),
+        "Natural": g["Natural"],
+        "Lines": g["Lines"],
+        "MatchedBy": np.where(g["HasPos"] & g["HasNeg"], "ref", ""),
+    })
+    n = d[~with_ref]
+    single = pd.DataFrame({
+        "Party": n["Party"].to_numpy(),
+        "Ref": "",
+        "Date": n["Date"].to_numpy(),
+        "Original": n["Natural"].to_numpy(),
+        "Natural": n["Natural"].to_numpy(),
+        "Lines": 1,
+        "MatchedBy": "",
+    })
+    items = pd.concat([grouped, single], ignore_index=True)
+
+    # post-ID pr linje: referansegruppens nummer, ellers egen post
+    item_of = pd.Series(-1, index=d.index, dtype=np.int64)
+    grp_no = pd.MultiIndex.from_frame(g[["Party", "Ref"]])
+    item_of[with_ref] = grp_no.get_indexer(pd.MultiIndex.from_arrays(keys))
+    item_of[~with_ref] = len(grouped) + np.arange(len(n))
+    return items, item_of
+
+
+def _amount_pairs(items: pd.DataFrame, tol: float, max_days: int) -> None:
+    """Trinn 2: par poster uten motpost med nøyaktig motsatt beløp (hash-join)."""
+    cand = items[(items["MatchedBy"] == "") & (items["Natural"].abs() > tol)]
+    cents = (cand["Natural"].abs() * 100).round().astype(np.int64)
+    c = pd.DataFrame({"Party": cand["Party"], "Cents": cents, "Date": cand["Date"],
+                      "Pos": cand["Natural"] > 0, "Item": cand.index})
+    c = c.sort_values(["Party", "Cents", "Date", "Item"], kind="stable")
+    c["Rank"] = c.groupby(["Party", "Cents", "Pos"], sort=False).cumcount()
+    on = ["Party", "Cents", "Rank"]
+    pairs = c[c["Pos"]].merge(c[~c["Pos"]], on=on, suffixes=("_inv", "_pay"))
+    days = (pairs["Date_pay"] - pairs["Date_inv"]).dt.days.abs()
+    pairs = pairs[days.le(max_days)]
+    hit = np.concatenate([pairs["Item_inv"].to_numpy(), pairs["Item_pay"].to_numpy()])
+    items.loc[hit, "MatchedBy"] = "amount"
+    items.loc[hit, "Natural"] = 0.0
+
+
+def _fifo(items: pd.DataFrame, tol: float) -> None:
+    """Trinn 3: fordel gjenværende innbetalinger på eldste åpne belastninger pr part."""
+    live = items[items["Natural"].abs() > tol].sort_values(["Party", "Date"], kind="stable")
+    pos = live["Natural"].clip(lower=0.0)
+    neg = (-live["Natural"]).clip(lower=0.0)
+    tot_pos = pos.groupby(live["Party"]).transform("sum")
+    tot_neg = neg.groupby(live["Party"]).transform("sum")
+    applied = np.minimum(tot_pos, tot_neg)
+    # eldste først: det som er brukt før denne posten, trekkes fra det som kan fordeles
+    used_pos = (applied - (pos.groupby(live["Party"]).cumsum() - pos)).clip(lower=0.0).clip(upper=pos)
+    used_neg = (applied - (neg.groupby(live["Party"]).cumsum() - neg)).clip(lower=0.0).clip(upper=neg)
+    used = used_pos + used_neg
+    touched = used.index[used > tol]
+    items.loc[touched, "MatchedBy"] = items.loc[touched, "MatchedBy"].mask(
+        items.loc[touched, "MatchedBy"] == "", "fifo")
+    items.loc[live.index, "Natural"] = live["Natural"] - used_pos + used_neg
+
+
+def match_open_items(
+    lines: pd.DataFrame,
+    which: str,
+    asof=None,
+    invoices: Optional[pd.DataFrame] = None,
+    tol: float = TOLERANCE,
+    max_days: int = MAX_DAYS,
+) -> OpenItemResult:
+    """Avstem reskontrolinjene for AR eller AP og returner postene med åpent beløp.
+
+    lines: transaksjonslinjer (transactions.csv / saft_store) med part-ID,
+    Debit/Credit og Date eller PostingDate/TransactionDate. Linjer uten part-ID
+    (og med asof: linjer etter asof) tas ikke med.
+    invoices: sales_invoices/purchase_invoices for forfallsdato (DueDate) pr
+    referanse (InvoiceNo, ellers DocumentNumber).
+    """
+    which = which.upper()
+    if which not in PARTY_COLS:
+        raise ValueError("which må være 'AR' eller 'AP'")
+    id_col, name_col = PARTY_COLS[which]
+    d = _line_frame(lines, which, asof)
+    items, line_item = _ref_items(d)
+    _amount_pairs(items, tol, max_days)
+    _fifo(items, tol)
+
+    sign = 1.0 if which == "AR" else -1.0
+    opened = items["Natural"].where(items["Natural"].abs() > tol, 0.0) * sign
+    out = pd.DataFrame({
+        "ItemID": np.arange(len(items)),
+        id_col: items["Party"],
+        "Ref": items["Ref"],
+        "Date": items["Date"],
+        "DueDate": pd.NaT,
+        "Original": items["Original"] * sign,
+        "Open": opened.round(2),
+        "Lines": items["Lines"],
+        "MatchedBy": items["MatchedBy"],
+    })
+    if name_col in lines.columns:
+        names = _text(lines, name_col).loc[d.index]
+        first = names[names != ""].groupby(d.loc[names.index, "Party"]).first()
+        out.insert(2, name_col, out[id_col].map(first).fillna(""))
+    if invoices is not None and not invoices.empty:
+        inv_ref = _text(invoices, "InvoiceNo")
+        inv_ref = inv_ref.mask(inv_ref == "", _text(invoices, "DocumentNumber"))
+        due = pd.to_datetime(invoices.get("DueDate"), errors="coerce")
+        due = pd.Series(due.to_numpy(), index=inv_ref.to_numpy())
+        due = due[~due.index.duplicated()]
+        out["DueDate"] = out["Ref"].map(due)
+    out = out.sort_values([id_col, "Date", "ItemID"], kind="stable").reset_index(drop=True)
+    return OpenItemResult(out, line_item)
+
+
+def open_items(lines: pd.DataFrame, which: str, asof=None, invoices: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Åpne poster pr part (se match_open_items)."""
+    return match_open_items(lines, which, asof, invoices).open_items()
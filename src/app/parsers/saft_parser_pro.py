@@ -11,35 +11,93 @@ Endringer i denne utgaven:
   DefaultCurrencyCode, SelectionStart, SelectionStartDate, SelectionEnd, SelectionEndDate.
 
 Skriver:
-- header.csv  (inkl. SelectionStart*/SelectionEnd* og DefaultCurrencyCode)
+- header.csv  (inkl. SelectionStart*/SelectionEnd*, DefaultCurrencyCode og Software*)
+- bank_accounts.csv (BankAccount under Header/Company)
 - accounts.csv  (inkl. GroupingCategory/GroupingCode, Opening*/Closing*)
 - tax_table.csv (inkl. StandardTaxCode)
 - customers.csv, suppliers.csv
 - arap_control_accounts.csv  (BalanceAccountStructure pr Customer/Supplier + konto)
-- vouchers.csv (inkl. VoucherType, VoucherDescription, ModificationDate)
-- transactions.csv (inkl. DebitTaxAmount, CreditTaxAmount, TaxAmount (fallback), Amount=Debit-Credit)
+- journals.csv (journalhodet: JournalID, Description, Type m.m.)
+- vouchers.csv (inkl. VoucherType, VoucherDescription, ModificationDate; JournalID arves fra <Journal>)
+- transactions.csv (inkl. DebitTaxAmount, CreditTaxAmount, TaxAmount (fallback), TaxBase, Amount=Debit-Credit;
+  flate Tripletex-transaksjoner uten <Line> blir én linje)
 - analysis_lines.csv
 - sales_invoices.csv (inkl. DueDate), purchase_invoices.csv (inkl. DueDate)
-- raw_elements.csv (full sporbarhet)
+- raw_elements.csv (full sporbarhet, se raw_mode under)
+- raw_path_stats.csv (kun raw_mode="sampled": antall pr distinkt sti)
+- unknown_nodes.csv, unknown_summary.csv (kun raw_mode="sampled" med fmt="csv":
+  ukjente noder klassifisert direkte fra stiindeksen, se postprocess_unknown_nodes)
+- saft_manifest.json (til slutt: fil, radantall og størrelse pr tabell;
+  rapportene finner filene via manifestet, se saft_manifest)
+- saft_stats.json (til slutt: kolonner, datoområde, summer og antall distinkte
+  nøkler pr tabell, for saft_dataset_overview; se saft_stats)
+
+raw_mode styrer rådumpen (CLI: --raw):
+- "full"    : én rad pr XML-element med indeksert XPath (som før; dyrt på store filer)
+- "sampled" : de første raw_sample forekomstene pr distinkte sti (uten indekser)
+              + aggregert stistatistikk i raw_path_stats.csv
+- "off"     : ingen rådump
+
+Med fmt="parquet" (CLI: --format parquet) skrives de samme tabellene som typede
+Parquet-filer (<tabell>.parquet) i row groups direkte fra strømparseren:
+beløp som decimal, datoer som date, periode/år som int. Skjemaversjonen og
+kolonnetypene registreres i saft_schema.json i output-mappen.
+
+Med workers > 1 (CLI: --workers N, 0 = alle kjerner) finner saft_scan først
+byte-grensene for <Journal>/<Transaction>, og hovedboken parses i biter av hele
+transaksjoner i egne prosesser. Stamdata parses én gang i hovedprosessen og deles
+med arbeiderne; delresultatene slås sammen i bitrekkefølge, så radene og
+bilagssummene blir identiske med sekvensiell parsing (krever --raw sampled/off).
+
+Med checkpoint_secs > 0 (CLI: --checkpoint [SEK]) skrives et sjekkpunkt
+(.saft_checkpoint.json i output-mappen) omtrent så ofte, alltid mellom to hele
+transaksjoner: antall ferdige transaksjoner, bytestørrelse og radantall pr
+CSV-fil, stamdata-oppslagene og stistatistikken. Kjøres samme fil (samme
+fingeravtrykk og innstillinger) på nytt mot samme mappe, kuttes CSV-filene
+tilbake til sjekkpunktet og parsingen fortsetter etter siste ferdige
+transaksjon. Krever fmt="csv", én prosess og raw_mode "sampled"/"off".
+Fingeravtrykket er størrelse, mtime_ns og SHA-256 av hode/hale; inputfilen
+hashes ikke i sin helhet før parsingen. Er bare mtime endret, avgjør SHA-256
+av den allerede leste starten av filen (hashet mens den ble lest).
 
 Bruk:
-    python saft_parser_pro_fixed.py <input .xml|.zip> <outdir>
+    python saft_parser_pro_fixed.py <input .xml|.zip|.gz> <outdir> [--format csv|parquet]
     python saft_parser_pro_fixed.py --gui
 """
 
 import argparse
 import csv
 import decimal
-import io
+import gzip
+import hashlib
 import json
 import logging
+import os
+import shutil
+import time
 import zipfile
-from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
 from pathlib import Path
-from typing import Iterable, Optional, Dict, Set, BinaryIO
+from datetime import date
+from typing import Any, Callable, Iterable, List, Optional, Dict, Set, BinaryIO, Tuple
 
 from lxml import etree
 
+from saft_scan import SaftLayout, SpliceReader, resume_pieces, scan_layout
+from saft_manifest import MANIFEST_FILE, write_manifest
+from postprocess_unknown_nodes import write_unknown_reports
+from saft_stats import STATS_FILE, TableStats, write_stats
+
+# valgfri avhengighet for Parquet-modus
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    _HAS_PYARROW = True
+except Exception:
+    _HAS_PYARROW = False
+
 # ---------------- Config / helpers ----------------
 DEC = decimal.Decimal
 decimal.getcontext().prec = 28
@@ -47,134 +105,340 @@ BAL_TOL = DEC("0.01")
 log = logging.getLogger("saft")
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 
-NS = {"s": "urn:StandardAuditFile-Taxation-Financial:NO"}  # fungerer også for 1.3
+NS = {"s": "urn:StandardAuditFile-Taxation-Financial:NO"}  # standard; faktisk namespace leses fra rotelementet
 
 def _lname(el): return etree.QName(el).localname
 def _text(el): return (el.text.strip() if (el is not None and el.text) else None)
+def _q(ns: str, name: str) -> str: return f"{{{ns}}}{name}" if ns else name
 
-def _first(el: etree._Element, names: Iterable[str]) -> Optional[str]:
-    """Finn første ikke-tomme forekomst av et navn (søker hvor som helst under el, m/ namespace)."""
+def _first(el: etree._Element, names: Iterable[str], ns: str = NS["s"]) -> Optional[str]:
+    """Finn første ikke-tomme forekomst av et navn (søker hvor som helst under el, m/ namespace).
+
+    Referansesemantikken for _Plan; selve parseløkken bruker de kompilerte planene.
+    """
     for nm in names:
-        n = el.find(f".//{{{NS['s']}}}{nm}")
+        n = el.find(f".//{_q(ns, nm)}")
         if n is not None:
             t = _text(n)
             if t not in (None, ""):
                 return t
     return None
 
-def _amount_of(el: etree._Element, primary: str) -> Optional[DEC]:
-    node = el.find(f".//{{{NS['s']}}}{primary}")
-    if node is None:
+def _dec(s: str) -> Optional[DEC]:
+    try:
+        return DEC(s.strip().replace(" ", "").replace("\u00A0", ""))
+    except Exception:
         return None
+
+def _amount_node(node: etree._Element, ns: str) -> Optional[DEC]:
     # direkte tekst
     if node.text and node.text.strip():
-        try:
-            return DEC(node.text.strip().replace(" ", "").replace("\u00A0", ""))
-        except Exception:
-            return None
+        return _dec(node.text)
     # nested <Amount>
-    amt = node.find(f".//{{{NS['s']}}}Amount")
+    amt = node.find(f".//{_q(ns, 'Amount')}")
     if amt is not None and amt.text and amt.text.strip():
-        try:
-            return DEC(amt.text.strip().replace(" ", "").replace("\u00A0", ""))
-        except Exception:
-            return None
+        return _dec(amt.text)
     # som attributt (noen leverandører)
     a = node.get("Amount")
     if a:
-        try:
-            return DEC(a.strip().replace(" ", "").replace("\u00A0", ""))
-        except Exception:
-            return None
+        return _dec(a)
     return None
 
-def _maybe_open_zip(path: Path) -> BinaryIO:
-    if path.suffix.lower() == ".zip":
-        z = zipfile.ZipFile(path, "r")
+def _amount_of(el: etree._Element, primary: str, ns: str = NS["s"]) -> Optional[DEC]:
+    node = el.find(f".//{_q(ns, primary)}")
+    if node is None:
+        return None
+    return _amount_node(node, ns)
+
+# ---------------- Kompilerte uttrekksplaner ----------------
+# Pr elementtype: tekstfelt -> kandidattagger i prioritert rekkefølge, og beløpsfelt.
+# Semantikken er den samme som _first/_amount_of (første forekomst i dokumentrekkefølge
+# pr kandidat), men hele elementet gås gjennom én gang i stedet for ett .find() pr kandidat.
+_TAX_BASE_TAGS = ("TaxBase", "TaxBaseAmount", "TaxableAmount", "TaxBasisAmount", "BaseAmount")
+_PLAN_SPECS: Dict[str, Tuple[Dict[str, Tuple[str, ...]], Tuple[str, ...]]] = {
+    "header": ({
+        "company": ("CompanyName",), "compid": ("CompanyID",),
+        "fcd": ("FileCreationDateTime", "AuditFileDateCreated", "FileCreationDate"),
+        "ver": ("AuditFileVersion",),
+        "sel_start": ("SelectionStart", "SelectionStartDate"), "sel_end": ("SelectionEnd", "SelectionEndDate"),
+        "sel_start_date": ("SelectionStartDate",), "sel_end_date": ("SelectionEndDate",),
+        "startd": ("StartDate",), "endd": ("EndDate",),
+        "prodver": ("ProductVersion",), "cert": ("SoftwareCertificateNumber",),
+        "func_cur": ("FunctionalCurrency",), "default_cur": ("DefaultCurrencyCode",),
+        "sw_company": ("SoftwareCompanyName",), "sw_id": ("SoftwareID",), "sw_ver": ("SoftwareVersion",),
+    }, ()),
+    "bank": ({
+        "number": ("BankAccountNumber",), "iban": ("IBANNumber",), "name": ("BankAccountName",),
+        "bic": ("BIC",), "currency": ("CurrencyCode",), "gl_account": ("GeneralLedgerAccountID",),
+    }, ()),
+    "account": ({
+        "acc_id": ("AccountID",), "acc_desc": ("AccountDescription",), "acc_type": ("AccountType",),
+        "parent": ("ParentAccountID",), "group_cat": ("GroupingCategory",),
+        "group_code": ("GroupingCode", "GroupingCategoryCode"),
+        "taxc": ("TaxCode", "VatCode", "VATCode", "StandardVatCode"), "taxt": ("TaxType",),
+    }, ("OpeningDebitBalance", "OpeningCreditBalance", "ClosingDebitBalance", "ClosingCreditBalance")),
+    "tax": ({
+        "std": ("StandardTaxCode", "StandardCode"), "code": ("TaxCode",), "type": ("TaxType",),
+        "perc": ("TaxPercentage",), "country": ("TaxCountryRegion",), "desc": ("Description",),
+    }, ()),
+    "customer": ({
+        "id": ("CustomerID",), "name": ("CompanyName", "CustomerName", "Name"),
+        "vat": ("VATNumber", "TaxRegistrationNumber"),
+        "country": ("Country",), "city": ("City",), "postal": ("PostalCode",),
+        "email": ("Email",), "phone": ("Telephone",),
+    }, ()),
+    "supplier": ({
+        "id": ("SupplierID",), "name": ("CompanyName", "SupplierName", "Name"),
+        "vat": ("VATNumber", "TaxRegistrationNumber"),
+        "country": ("Country",), "city": ("City",), "postal": ("PostalCode",),
+        "email": ("Email",), "phone": ("Telephone",),
+    }, ()),
+    "balance": ({"acct": ("AccountID",)},
+                ("OpeningDebitBalance", "OpeningCreditBalance", "ClosingDebitBalance", "ClosingCreditBalance")),
+    "voucher": ({
+        "voucher_id": ("TransactionID", "TransactionNo", "VoucherID"),
+        "voucher_no": ("VoucherNo", "TransactionNo", "TransactionID"),
+        "transaction_date": ("TransactionDate", "EntryDate"), "posting_date": ("PostingDate",),
+        "period": ("Period",), "year": ("FiscalYear", "Year"),
+        "source_doc": ("SourceDocumentID", "SourceID", "DocumentNumber"),
+        "journal_id": ("JournalID", "Journal"), "currency_code": ("CurrencyCode", "TransactionCurrency"),
+        # v1.3 optional fields
+        "voucher_type": ("VoucherType",), "voucher_desc": ("VoucherDescription",),
+        "mod_date": ("ModificationDate",),
+    }, ()),
+    "journal": ({
+        "id": ("JournalID",), "desc": ("Description",), "type": ("Type",),
+        "posting_date": ("PostingDate",), "voucher_date": ("VoucherDate",), "voucher_type": ("VoucherType",),
+        "batch_id": ("BatchID",), "system_id": ("SystemID",),
+    }, ()),
+    "line": ({
+        "record_id": ("RecordID", "LineID"), "system_id": ("SystemID",), "batch_id": ("BatchID",),
+        "doc_no": ("DocumentNumber", "DocumentNo"), "line_src": ("SourceDocumentID",), "acc_id": ("AccountID",),
+        "cust_id": ("CustomerID",), "sup_id": ("SupplierID",),
+        "desc": ("Description", "Narrative", "LineDescription"),
+        "amt_cur": ("AmountCurrency", "ForeignAmount", "CurrencyAmount"), "ex_rate": ("ExchangeRate",),
+        "tax_type": ("TaxType",), "tax_country": ("TaxCountryRegion",),
+        "tax_code": ("TaxCode", "VATCode", "VatCode"), "tax_perc": ("TaxPercentage",),
+        "dc": ("DebitCreditIndicator", "DebitCredit"),
+    }, ("DebitAmount", "CreditAmount", "DebitTaxAmount", "CreditTaxAmount", "TaxAmount", "Amount")
+       + _TAX_BASE_TAGS),
+    "line_ref": ({"record_id": ("RecordID", "LineID")}, ()),
+    "analysis": ({"type": ("AnalysisType",), "id": ("AnalysisID",)}, ("Amount",)),
+    "invoice": ({
+        "InvoiceNo": ("InvoiceNo", "InvoiceNumber"), "InvoiceDate": ("InvoiceDate",),
+        "TaxPointDate": ("TaxPointDate",), "GLPostingDate": ("GLPostingDate",),
+        "CurrencyCode": ("CurrencyCode", "TransactionCurrency"),
+        "NetTotal": ("NetTotal", "DocumentNetTotal"), "TaxPayable": ("TaxPayable", "DocumentTaxPayable"),
+        "GrossTotal": ("GrossTotal", "DocumentGrossTotal"), "SourceID": ("SourceID",),
+        "DocumentNumber": ("DocumentNumber",), "DueDate": ("DueDate",),
+        "CustomerID": ("CustomerID",), "CustomerName": ("CustomerName",),
+        "SupplierID": ("SupplierID",), "SupplierName": ("SupplierName",),
+    }, ()),
+}
+
+class _Plan:
+    """Kompilert uttrekksplan for én elementtype i ett namespace.
+
+    extract(el) gir {felt: tekst/None} for tekstfeltene og {beløpstagg: DEC/None}
+    for beløpsfeltene – samme verdier som _first/_amount_of, men i ett gjennomløp.
+    """
+    __slots__ = ("ns", "fields", "amounts", "tags", "tagset")
+
+    def __init__(self, ns: str, fields: Dict[str, Tuple[str, ...]], amounts: Tuple[str, ...] = ()):
+        self.ns = ns
+        self.fields = tuple((key, tuple(_q(ns, c) for c in cands)) for key, cands in fields.items())
+        self.amounts = tuple((a, _q(ns, a)) for a in amounts)
+        tags = {t for _, cands in self.fields for t in cands} | {t for _, t in self.amounts}
+        self.tags = tuple(sorted(tags))
+        self.tagset = frozenset(tags)
+
+    def _iter_upto(self, el: etree._Element, upto: etree._Element):
+        # barn (med etterkommere) til og med upto – resten av elementet kan være delvis parset
+        tags, tagset = self.tags, self.tagset
+        for child in el:
+            if child.tag in tagset:
+                yield child
+            yield from child.iterdescendants(*tags)
+            if child is upto:
+                break
+
+    def extract(self, el: etree._Element, upto: Optional[etree._Element] = None) -> Dict[str, Any]:
+        nodes = el.iterdescendants(*self.tags) if upto is None else self._iter_upto(el, upto)
+        first: Dict[str, etree._Element] = {}
+        for node in nodes:
+            if node.tag not in first:
+                first[node.tag] = node
+        out: Dict[str, Any] = {}
+        for key, cands in self.fields:
+            val = None
+            for c in cands:
+                n = first.get(c)
+                if n is not None and n.text:
+                    t = n.text.strip()
+                    if t:
+                        val = t
+                        break
+            out[key] = val
+        for key, qtag in self.amounts:
+            n = first.get(qtag)
+            out[key] = _amount_node(n, self.ns) if n is not None else None
+        return out
+
+@lru_cache(maxsize=None)
+def _plans_for(ns: str) -> Dict[str, _Plan]:
+    """Bygg (én gang pr namespace) uttrekksplanene for alle elementtyper."""
+    return {name: _Plan(ns, fields, amounts) for name, (fields, amounts) in _PLAN_SPECS.items()}
+
+# ---------------- Input (xml/zip/gzip) ----------------
+PROGRESS_STEP = 1 << 20   # framdrift rapporteres høyst én gang pr MiB lest fra disk
+
+_ZIP_MAGIC = b"PK\x03\x04"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+def _input_kind(path: Path) -> str:
+    """'zip', 'gzip' eller 'xml' ut fra magiske bytes (filendelsen kan ikke stoles på)."""
+    with open(path, "rb") as fh:
+        magic = fh.read(4)
+    if magic.startswith(_ZIP_MAGIC):
+        return "zip"
+    if magic.startswith(_GZIP_MAGIC):
+        return "gzip"
+    return "xml"
+
+
+class _CountingFile:
+    """Rå filhåndtak som teller bytes lest fra disk og rapporterer framdrift.
+
+    Ligger under zip/gzip-dekomprimeringen, så framdriften måles i komprimerte
+    bytes: progress(lest, total). hashed=True fører SHA-256 av den sammenhengende
+    starten av filen som er lest så langt (prefix(), for sjekkpunkter).
+    """
+    def __init__(self, path: Path, progress: Optional[Callable[[int, int], None]] = None,
+                 hashed: bool = False):
+        self._fh = open(path, "rb")
+        self.total = os.fstat(self._fh.fileno()).st_size
+        self.consumed = 0
+        self._progress = progress
+        self._next = 0
+        self._hash = hashlib.sha256() if hashed else None
+        self._hashed = 0
+
+    def read(self, n: int = -1) -> bytes:
+        pos = self._fh.tell() if self._hash is not None else 0
+        data = self._fh.read(n)
+        if self._hash is not None and pos <= self._hashed < pos + len(data):
+            # zip leser sentralkatalogen på slutten først – bare bytes som forlenger starten telles
+            self._hash.update(data[self._hashed - pos:])
+            self._hashed = pos + len(data)
+        self.consumed += len(data)
+        if self._progress is not None and self.consumed >= self._next:
+            self._next = self.consumed + PROGRESS_STEP
+            self._progress(min(self.consumed, self.total), self.total)
+        return data
+
+    def prefix(self) -> Optional[List[Any]]:
+        """[bytes, sha256] for starten av filen som er lest, eller None uten hashed."""
+        if self._hash is None:
+            return None
+        return [self._hashed, self._hash.copy().hexdigest()]
+
+    def finish(self) -> None:
+        """Rapporter 100 % (zip leser aldri sentralkatalogen på slutten på nytt)."""
+        if self._progress is not None and self._next != -1:
+            self._next = -1
+            self._progress(self.total, self.total)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self._fh.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self._fh.tell()
+
+    def seekable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class _InputStream:
+    """Dekomprimert strøm for iterparse; close() lukker hele kjeden."""
+    def __init__(self, stream: Any, raw: _CountingFile, *owned: Any):
+        self._stream = stream
+        self._raw = raw
+        self._owned = owned
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._stream.read(n)
+        if not data:
+            self._raw.finish()
+        return data
+
+    def close(self) -> None:
+        for f in (self._stream,) + self._owned:
+            f.close()
+
+
+def _maybe_open_zip(path: Path, progress: Optional[Callable[[int, int], None]] = None,
+                    hashed: bool = False) -> BinaryIO:
+    """Åpne SAF-T som strøm: .xml direkte, zip (første .xml-medlem) og gzip dekomprimeres
+    fortløpende, så minnebruken er uavhengig av filstørrelsen."""
+    kind = _input_kind(path)
+    raw = _CountingFile(path, progress, hashed)
+    if kind == "zip":
+        z = zipfile.ZipFile(raw, "r")
         xmls = [n for n in z.namelist() if n.lower().endswith(".xml")]
         if not xmls:
+            z.close(); raw.close()
             raise ValueError("ZIP inneholder ingen .xml")
-        return io.BytesIO(z.read(xmls[0]))
-    return open(path, "rb")
-
-# ---------------- Data classes ----------------
-@dataclass
-class VoucherAgg:
-    voucher_id: Optional[str] = None
-    voucher_no: Optional[str] = None
-    transaction_date: Optional[str] = None
-    posting_date: Optional[str] = None
-    period: Optional[str] = None
-    year: Optional[str] = None
-    source_doc: Optional[str] = None
-    journal_id: Optional[str] = None
-    currency_code: Optional[str] = None
-    voucher_type: Optional[str] = None
-    voucher_desc: Optional[str] = None
-    mod_date: Optional[str] = None
-    debit: DEC = field(default_factory=lambda: DEC(0))
-    credit: DEC = field(default_factory=lambda: DEC(0))
-
-# ---------------- Main parse ----------------
-def parse_saft(input_path: Path, outdir: Path) -> None:
-    outdir.mkdir(parents=True, exist_ok=True)
-    src = _maybe_open_zip(input_path)
-
-    # Writers
-    f_header   = open(outdir/"header.csv", "w", newline="", encoding="utf-8")
-    f_accounts = open(outdir/"accounts.csv", "w", newline="", encoding="utf-8")
-    f_tax      = open(outdir/"tax_table.csv", "w", newline="", encoding="utf-8")
-    f_cust     = open(outdir/"customers.csv", "w", newline="", encoding="utf-8")
-    f_supp     = open(outdir/"suppliers.csv", "w", newline="", encoding="utf-8")
-    f_arapca   = open(outdir/"arap_control_accounts.csv", "w", newline="", encoding="utf-8")
-    f_vouch    = open(outdir/"vouchers.csv", "w", newline="", encoding="utf-8")
-    f_lines    = open(outdir/"transactions.csv", "w", newline="", encoding="utf-8")
-    f_anl      = open(outdir/"analysis_lines.csv", "w", newline="", encoding="utf-8")
-    f_sinv     = open(outdir/"sales_invoices.csv", "w", newline="", encoding="utf-8")
-    f_pinv     = open(outdir/"purchase_invoices.csv", "w", newline="", encoding="utf-8")
-    f_raw      = open(outdir/"raw_elements.csv", "w", newline="", encoding="utf-8")
+        return _InputStream(z.open(xmls[0]), raw, z, raw)
+    if kind == "gzip":
+        return _InputStream(gzip.GzipFile(fileobj=raw, mode="rb"), raw, raw)
+    return _InputStream(raw, raw)
 
+# ---------------- Output-tabeller ----------------
+# Kolonnerekkefølgen er den samme for CSV og Parquet.
+TABLES: Dict[str, List[str]] = {
     # Header: behold gamle kolonner + nye (v1.3)
-    w_header = csv.DictWriter(f_header, fieldnames=[
+    "header": [
         "CompanyName","CompanyID",
         "FunctionalCurrency","DefaultCurrencyCode",
         "FileCreationDate","AuditFileVersion",
         "SelectionStart","SelectionStartDate","SelectionEnd","SelectionEndDate",
         "StartDate","EndDate",
-        "ProductVersion","SoftwareCertificateNumber"
-    ])
-    w_header.writeheader()
-
-    w_acc = csv.DictWriter(f_accounts, fieldnames=[
+        "ProductVersion","SoftwareCertificateNumber",
+        "SoftwareCompanyName","SoftwareID","SoftwareVersion"
+    ],
+    "bank_accounts": [
+        "BankAccountNumber","IBANNumber","BankAccountName","BIC","CurrencyCode","GeneralLedgerAccountID"
+    ],
+    "accounts": [
         "AccountID","AccountDescription","AccountType","ParentAccountID",
         "GroupingCategory","GroupingCode",
         "OpeningDebit","OpeningCredit","ClosingDebit","ClosingCredit","TaxCode","TaxType"
-    ]); w_acc.writeheader()
-
-    w_tax = csv.DictWriter(f_tax, fieldnames=[
+    ],
+    "tax_table": [
         "TaxCode","StandardTaxCode","TaxType","TaxPercentage","TaxCountryRegion","Description"
-    ]); w_tax.writeheader()
-
-    w_cust = csv.DictWriter(f_cust, fieldnames=[
+    ],
+    "customers": [
         "CustomerID","Name","VATNumber","Country","City","PostalCode","Email","Telephone"
-    ]); w_cust.writeheader()
-
-    w_supp = csv.DictWriter(f_supp, fieldnames=[
+    ],
+    "suppliers": [
         "SupplierID","Name","VATNumber","Country","City","PostalCode","Email","Telephone"
-    ]); w_supp.writeheader()
-
-    w_arap = csv.DictWriter(f_arapca, fieldnames=[
+    ],
+    "arap_control_accounts": [
         "PartyType","PartyID","AccountID","OpeningDebit","OpeningCredit","ClosingDebit","ClosingCredit"
-    ]); w_arap.writeheader()
-
-    w_vouch = csv.DictWriter(f_vouch, fieldnames=[
+    ],
+    "journals": [
+        "JournalID","Description","Type","PostingDate","VoucherDate","VoucherType","BatchID","SystemID"
+    ],
+    "vouchers": [
         "VoucherID","VoucherNo","TransactionDate","PostingDate","Period","Year",
         "SourceDocumentID","JournalID","CurrencyCode",
         "VoucherType","VoucherDescription","ModificationDate",
         "DebitTotal","CreditTotal","Balanced"
-    ]); w_vouch.writeheader()
-
-    w_lines = csv.DictWriter(f_lines, fieldnames=[
+    ],
+    "transactions": [
         "RecordID","VoucherID","VoucherNo","JournalID",
         "TransactionDate","PostingDate",
         "SystemID","BatchID","DocumentNumber","LineSourceDocumentID",
@@ -184,207 +448,673 @@ def parse_saft(input_path: Path, outdir: Path) -> None:
         "Description","Debit","Credit","Amount",
         "CurrencyCode","AmountCurrency","ExchangeRate",
         "TaxType","TaxCountryRegion","TaxCode","TaxPercentage",
-        "DebitTaxAmount","CreditTaxAmount","TaxAmount",
+        "DebitTaxAmount","CreditTaxAmount","TaxAmount","TaxBase",
         "IsGL","SourceType"
-    ]); w_lines.writeheader()
-
-    w_anl = csv.DictWriter(f_anl, fieldnames=["RecordID","Type","ID","Amount"]); w_anl.writeheader()
-
-    w_sinv = csv.DictWriter(f_sinv, fieldnames=[
+    ],
+    "analysis_lines": ["RecordID","Type","ID","Amount"],
+    "sales_invoices": [
         "InvoiceNo","InvoiceDate","TaxPointDate","GLPostingDate",
         "CustomerID","CustomerName","CustomerVATNumber",
         "CurrencyCode","NetTotal","TaxPayable","GrossTotal","SourceID","DocumentNumber","DueDate"
-    ]); w_sinv.writeheader()
-
-    w_pinv = csv.DictWriter(f_pinv, fieldnames=[
+    ],
+    "purchase_invoices": [
         "InvoiceNo","InvoiceDate","TaxPointDate","GLPostingDate",
         "SupplierID","SupplierName","SupplierVATNumber",
         "CurrencyCode","NetTotal","TaxPayable","GrossTotal","SourceID","DocumentNumber","DueDate"
-    ]); w_pinv.writeheader()
+    ],
+    "raw_elements": ["XPath","Tag","Text","Attributes"],
+    "raw_path_stats": ["XPath","Tag","Count","TextCount","AttributeCount","Sampled"],
+}
 
-    w_raw = csv.DictWriter(f_raw, fieldnames=["XPath","Tag","Text","Attributes"]); w_raw.writeheader()
+# Kolonnetyper i Parquet-modus. Kolonner som ikke er nevnt lagres som tekst.
+# "amount" = decimal(24,4), "rate" = decimal(20,8), "date" = date32, "int" = int64.
+_INVOICE_TYPES = {
+    "InvoiceDate": "date", "TaxPointDate": "date", "GLPostingDate": "date", "DueDate": "date",
+    "NetTotal": "amount", "TaxPayable": "amount", "GrossTotal": "amount",
+}
+COLUMN_TYPES: Dict[str, Dict[str, str]] = {
+    "accounts": {"OpeningDebit": "amount", "OpeningCredit": "amount",
+                 "ClosingDebit": "amount", "ClosingCredit": "amount"},
+    "tax_table": {"TaxPercentage": "rate"},
+    "arap_control_accounts": {"OpeningDebit": "amount", "OpeningCredit": "amount",
+                              "ClosingDebit": "amount", "ClosingCredit": "amount"},
+    "journals": {"PostingDate": "date", "VoucherDate": "date"},
+    "vouchers": {"TransactionDate": "date", "PostingDate": "date", "ModificationDate": "date",
+                 "Period": "int", "Year": "int", "DebitTotal": "amount", "CreditTotal": "amount"},
+    "transactions": {
+        "TransactionDate": "date", "PostingDate": "date",
+        "Debit": "amount", "Credit": "amount", "Amount": "amount",
+        "AmountCurrency": "amount", "ExchangeRate": "rate", "TaxPercentage": "rate",
+        "DebitTaxAmount": "amount", "CreditTaxAmount": "amount", "TaxAmount": "amount", "TaxBase": "amount",
+        "IsGL": "bool",
+    },
+    "analysis_lines": {"Amount": "amount"},
+    "raw_path_stats": {"Count": "int", "TextCount": "int", "AttributeCount": "int", "Sampled": "int"},
+    "sales_invoices": _INVOICE_TYPES,
+    "purchase_invoices": _INVOICE_TYPES,
+}
 
-    # buffers
-    accounts: Dict[str, Dict[str, str]] = {}
-    customers: Dict[str, Dict[str, str]] = {}
-    suppliers: Dict[str, Dict[str, str]] = {}
+PARQUET_SCHEMA_VERSION = 2
+PARQUET_ROW_GROUP_DEFAULT = 100_000
+SCHEMA_FILE = "saft_schema.json"
+OUTPUT_FORMATS = ("csv", "parquet")
+
+RAW_MODES = ("off", "sampled", "full")
+RAW_SAMPLE_DEFAULT = 5
+# Tabeller som bare skrives i gitte raw-moduser
+_RAW_TABLES = {"raw_elements": ("sampled", "full"), "raw_path_stats": ("sampled",)}
+
+
+# Konverterne for Parquet gir None for tomme verdier. Verdier som ikke kan tolkes
+# (f.eks. beløpet "1.234,50") blir også NULL, men meldes til reject(v), så
+# _ParquetSink kan telle dem pr kolonne (logg + saft_stats "rejected").
+def _pq_decimal(scale: int, reject: Callable[[Any], None]) -> Callable[[Any], Optional[DEC]]:
+    q = DEC(1).scaleb(-scale)
+    def conv(v):
+        if v is None or v == "":
+            return None
+        try:
+            return DEC(str(v).replace(" ", "").replace("\u00A0", "")).quantize(q)
+        except (ArithmeticError, ValueError):
+            reject(v)
+            return None
+    return conv
+
+def _pq_date(reject: Callable[[Any], None]) -> Callable[[Any], Optional[date]]:
+    def conv(v):
+        if not v:
+            return None
+        try:
+            return date.fromisoformat(str(v)[:10])
+        except ValueError:
+            reject(v)
+            return None
+    return conv
+
+def _pq_int(reject: Callable[[Any], None]) -> Callable[[Any], Optional[int]]:
+    def conv(v):
+        if v is None or v == "":
+            return None
+        try:
+            return int(str(v).strip())
+        except ValueError:
+            reject(v)
+            return None
+    return conv
+
+def _pq_bool(v) -> Optional[bool]:
+    if v is None or v == "":
+        return None
+    return str(v).strip().lower() in ("true", "1", "y", "yes")
+
+def _pq_str(v) -> Optional[str]:
+    return None if v is None else str(v)
+
+
+class _CsvSink:
+    """Radskriver for én CSV-tabell (samme API som csv.DictWriter).
+
+    resume=(byte, rader) fortsetter en eksisterende fil fra et sjekkpunkt: filen
+    kuttes til byte og radtelleren starter på rader. stats (saft_stats) føres
+    for hver rad; ved resume bygges den opp igjen fra radene som allerede står i filen.
+    """
+    def __init__(self, path: Path, fields: List[str], types: Dict[str, str],
+                 resume: Optional[Tuple[int, int]] = None):
+        self.path = path
+        self.stats = TableStats(fields, types)
+        if resume is None:
+            self._fh = open(path, "w", newline="", encoding="utf-8")
+            self.rows = 0
+        else:
+            self._fh = open(path, "r+", newline="", encoding="utf-8")
+            self._fh.truncate(resume[0])
+            self._fh.seek(resume[0])
+            self.rows = resume[1]
+            if self.stats.active:
+                with open(path, "r", newline="", encoding="utf-8") as fh:
+                    for row in csv.DictReader(fh):
+                        self.stats.add(row)
+        self._w = csv.DictWriter(self._fh, fieldnames=fields)
+        if resume is None:
+            self._w.writeheader()
+
+    def writerow(self, row: Dict[str, Any]) -> None:
+        self._w.writerow(row)
+        self.rows += 1
+        if self.stats.active:
+            self.stats.add(row)
+
+    def sync(self) -> int:
+        """Skriv bufferen helt ut til disk og returner filstørrelsen (for sjekkpunkt)."""
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+        return self._fh.tell()
+
+    def append_file(self, path: Path, rows: int, stats: TableStats) -> None:
+        """Legg til radene (rows stk., med statistikk) fra en annen CSV med samme kolonner."""
+        with open(path, "r", newline="", encoding="utf-8") as fh:
+            fh.readline()
+            shutil.copyfileobj(fh, self._fh, 1 << 20)
+        self.rows += rows
+        self.stats.merge(stats)
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class _ParquetSink:
+    """Radskriver for én typet Parquet-tabell.
+
+    Rader bufres og skrives som én row group pr ``row_group_size`` rader, slik at
+    minnebruken holder seg flat uansett filstørrelse. stats føres som i _CsvSink.
+    """
+    def __init__(self, path: Path, fields: List[str], types: Dict[str, str], row_group_size: int):
+        arrow_types = {
+            "amount": (pa.decimal128(24, 4), lambda rej: _pq_decimal(4, rej)),
+            "rate": (pa.decimal128(20, 8), lambda rej: _pq_decimal(8, rej)),
+            "date": (pa.date32(), _pq_date),
+            "int": (pa.int64(), _pq_int),
+            "bool": (pa.bool_(), lambda rej: _pq_bool),
+            "str": (pa.string(), lambda rej: _pq_str),
+        }
+        self.path = path
+        self._fields = fields
+        self.stats = TableStats(fields, types)
+        self._conv = [arrow_types[types.get(f, "str")][1](self._rejecter(f)) for f in fields]
+        self.schema = pa.schema([pa.field(f, arrow_types[types.get(f, "str")][0]) for f in fields])
+        self._rows: List[Dict[str, Any]] = []
+        self.rows = 0
+        self._group = max(1, int(row_group_size))
+        self._w = pq.ParquetWriter(str(path), self.schema, compression="zstd")
+
+    def _rejecter(self, col: str) -> Callable[[Any], None]:
+        rejected = self.stats.rejected
+        def reject(v: Any) -> None:
+            if col not in rejected:
+                log.warning("%s: %s=%r kan ikke lagres som %s i Parquet – skrives som NULL",
+                            self.path.name, col, v, self.schema.field(col).type)
+            rejected[col] = rejected.get(col, 0) + 1
+        return reject
+
+    def writerow(self, row: Dict[str, Any]) -> None:
+        self._rows.append(row)
+        self.rows += 1
+        if self.stats.active:
+            self.stats.add(row)
+        if len(self._rows) >= self._group:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        rows, self._rows = self._rows, []
+        arrays = [
+            pa.array([conv(r.get(f)) for r in rows], type=fld.type)
+            for f, conv, fld in zip(self._fields, self._conv, self.schema)
+        ]
+        self._w.write_table(pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def append_file(self, path: Path, rows: int, stats: TableStats) -> None:
+        """Legg til radene (rows stk., med statistikk) fra en annen Parquet-fil med samme skjema."""
+        self._flush()
+        table = pq.read_table(str(path), schema=self.schema)
+        if table.num_rows:
+            self._w.write_table(table, row_group_size=self._group)
+        self.rows += rows
+        self.stats.merge(stats)
+
+    def close(self) -> None:
+        self._flush()
+        self._w.close()
+        for col, n in self.stats.rejected.items():
+            log.warning("%s: %d verdi(er) i %s ble NULL i Parquet (ugyldig format)", self.path.name, n, col)
+
+
+class _TeeSink:
+    """Skriver hver rad både til Parquet-tabellen og til CSV-kopien (parse_saft(csv_dir=...))."""
+    def __init__(self, main: "_ParquetSink", copy: _CsvSink):
+        self.main = main
+        self.copy = copy
+        self.path = main.path
+
+    @property
+    def rows(self) -> int:
+        return self.main.rows
+
+    @property
+    def stats(self) -> TableStats:
+        return self.main.stats
+
+    def writerow(self, row: Dict[str, Any]) -> None:
+        self.main.writerow(row)
+        self.copy.writerow(row)
+
+    def close(self) -> None:
+        self.main.close()
+        self.copy.close()
+
+
+def _attrs_json(el: etree._Element) -> str:
+    """Attributter som JSON med lokale navn (for rådumpen)."""
+    attrs = {}
+    for k, v in el.attrib.items():
+        try:
+            key = etree.QName(k).localname
+        except Exception:
+            key = str(k)
+        attrs[key] = v
+    return json.dumps(attrs, ensure_ascii=False)
+
+
+def _open_sinks(
+    outdir: Path,
+    fmt: str,
+    row_group_size: int = PARQUET_ROW_GROUP_DEFAULT,
+    raw_mode: str = "full",
+    tables: Optional[Iterable[str]] = None,
+    resume: Optional[Dict[str, Tuple[int, int]]] = None,
+) -> Dict[str, Any]:
+    """Åpne én radskriver pr tabell i TABLES (eller bare tables) for valgt format og raw-modus.
+
+    Rådump-tabeller som ikke skrives i valgt modus slettes fra outdir, slik at
+    postprosessering ikke leser en gammel dump. resume: tabell -> (byte, rader)
+    fra et sjekkpunkt (bare CSV).
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Ukjent format: {fmt!r} (forventet {', '.join(OUTPUT_FORMATS)})")
+    if raw_mode not in RAW_MODES:
+        raise ValueError(f"Ukjent raw_mode: {raw_mode!r} (forventet {', '.join(RAW_MODES)})")
+    if fmt == "parquet" and not _HAS_PYARROW:
+        raise RuntimeError("pyarrow mangler – installer 'pyarrow' for Parquet.")
+
+    sinks: Dict[str, Any] = {}
+    for name, fields in TABLES.items():
+        if tables is not None and name not in tables:
+            continue
+        path = outdir / f"{name}.{fmt}"
+        if raw_mode not in _RAW_TABLES.get(name, RAW_MODES):
+            path.unlink(missing_ok=True)
+            continue
+        if fmt == "parquet":
+            sinks[name] = _ParquetSink(path, fields, COLUMN_TYPES.get(name, {}), row_group_size)
+        else:
+            sinks[name] = _CsvSink(path, fields, COLUMN_TYPES.get(name, {}),
+                                   resume.get(name) if resume else None)
+    return sinks
+
+
+def _write_schema_file(outdir: Path) -> None:
+    """Registrer skjemaversjon og kolonnetyper for Parquet-output."""
+    doc = {
+        "schema_version": PARQUET_SCHEMA_VERSION,
+        "format": "parquet",
+        "tables": {
+            name: {f: COLUMN_TYPES.get(name, {}).get(f, "str") for f in fields}
+            for name, fields in TABLES.items()
+        },
+    }
+    (outdir / SCHEMA_FILE).write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+
+# ---------------- Data classes ----------------
+@dataclass
+class VoucherAgg:
+    voucher_id: Optional[str] = None
+    voucher_no: Optional[str] = None
+    transaction_date: Optional[str] = None
+    posting_date: Optional[str] = None
+    period: Optional[str] = None
+    year: Optional[str] = None
+    source_doc: Optional[str] = None
+    journal_id: Optional[str] = None
+    currency_code: Optional[str] = None
+    voucher_type: Optional[str] = None
+    voucher_desc: Optional[str] = None
+    mod_date: Optional[str] = None
+    debit: DEC = field(default_factory=lambda: DEC(0))
+    credit: DEC = field(default_factory=lambda: DEC(0))
+
+def _fill_voucher(v: VoucherAgg, f: Dict[str, Any], journal_id: Optional[str] = None) -> None:
+    for k in ("voucher_id", "voucher_no", "transaction_date", "posting_date", "period", "year", "source_doc",
+              "journal_id", "currency_code", "voucher_type", "voucher_desc", "mod_date"):
+        setattr(v, k, f[k])
+    if v.journal_id is None:  # JournalID står normalt på <Journal>, ikke på <Transaction>
+        v.journal_id = journal_id
+
+# ---------------- Main parse ----------------
+@dataclass
+class _Masters:
+    """Stamdata som linjene slås opp mot (deles med arbeiderne i parallellmodus)."""
+    accounts: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    customers: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    suppliers: Dict[str, Dict[str, str]] = field(default_factory=dict)
     # control account mapping for customers and suppliers (BalanceAccountStructure).
     # For each party ID, we will store the associated control account to use when lines lack AccountID.
     # See handling in Customer/Supplier sections below.
-    customer_ctrl: Dict[str, str] = {}
-    supplier_ctrl: Dict[str, str] = {}
+    customer_ctrl: Dict[str, str] = field(default_factory=dict)
+    supplier_ctrl: Dict[str, str] = field(default_factory=dict)
+
+def _line_row(ln: Dict[str, Any], v: VoucherAgg, m: _Masters) -> Dict[str, Any]:
+    """Rad til transactions fra et linjeuttrekk (plans["line"]); oppdaterer bilagssummene i v."""
+    # context comes from current voucher
+    v_id = v.voucher_id
+    v_no = v.voucher_no
+    j_id = v.journal_id
+    currency = v.currency_code
+    tr_date = v.transaction_date
+    p_date = v.posting_date
+
+    acc_id = ln["acc_id"]
+    cust_id = ln["cust_id"]
+    sup_id = ln["sup_id"]
+
+    debit = ln["DebitAmount"] or DEC(0)
+    credit = ln["CreditAmount"] or DEC(0)
+    # Amount + DebitCreditIndicator (D/C, K = kredit) i stedet for Debit-/CreditAmount
+    if ln["DebitAmount"] is None and ln["CreditAmount"] is None and ln["Amount"] is not None and ln["dc"]:
+        if ln["dc"][:1].upper() == "D":
+            debit = abs(ln["Amount"])
+        elif ln["dc"][:1].upper() in ("C", "K"):
+            credit = abs(ln["Amount"])
+    amount = debit - credit
+
+    # Always update voucher totals, even for lines without AccountID, since these are part of the
+    # journal totals.
+    #
+    # Hvis AccountID mangler forsøker vi å tilordne en kontrollkonto basert på CustomerID
+    # eller SupplierID. SAF‑T v1.3 lar hver kunde/leverandør ha en BalanceAccountStructure
+    # som spesifiserer hvilken hovedbokskonto reskontrolinjer skal føres mot (f.eks. 1510,
+    # 1550, 2410 osv.). Dersom en linje mangler AccountID men har CustomerID eller SupplierID,
+    # henter vi kontoen fra de respektive mappingene. Dersom vi ikke finner en konto på
+    # denne måten, skriver vi ikke linjen til transactions.csv (for å unngå å inkludere
+    # rene analyselinjer eller fakturalinjer uten konto).
+
+    # Update voucher totals first
+    v.debit += debit
+    v.credit += credit
+
+    # Dersom konto mangler, forsøk å finne en kontrollkonto via kunde- eller leverandørmapping.
+    if not acc_id:
+        if cust_id and cust_id in m.customer_ctrl:
+            acc_id = m.customer_ctrl[cust_id]
+        elif sup_id and sup_id in m.supplier_ctrl:
+            acc_id = m.supplier_ctrl[sup_id]
+    # Hvis kontoen fremdeles er blank etter mapping, sett den til en
+    # placeholder "UNDEFINED" slik at linjen likevel kommer med i
+    # transaksjonsfilen. Dette sikrer at hovedboken blir komplett og
+    # at saldoen kan følges opp. Revisor kan filtrere på AccountID="UNDEFINED"
+    # for å identifisere linjer som manglet konto i SAF‑T.
+    if not acc_id:
+        acc_id = "UNDEFINED"
+
+    # v1.3 tax split
+    d_tax = ln["DebitTaxAmount"] or DEC(0)
+    c_tax = ln["CreditTaxAmount"] or DEC(0)
+    tax_amt = ln["TaxAmount"] or (d_tax - c_tax)
+    tax_base = next((ln[t] for t in _TAX_BASE_TAGS if ln[t] is not None), None)
+
+    acc_desc = m.accounts.get(acc_id, {}).get("AccountDescription", "") if acc_id else ""
+    cust_name = m.customers.get(cust_id, {}).get("Name", "") if cust_id else ""
+    cust_vat = m.customers.get(cust_id, {}).get("VATNumber", "") if cust_id else ""
+    sup_name = m.suppliers.get(sup_id, {}).get("Name", "") if sup_id else ""
+    sup_vat = m.suppliers.get(sup_id, {}).get("VATNumber", "") if sup_id else ""
+
+    return {
+        "RecordID": ln["record_id"] or "",
+        "VoucherID": v_id or "",
+        "VoucherNo": v_no or "",
+        "JournalID": j_id or "",
+        "TransactionDate": tr_date or "",
+        "PostingDate": p_date or "",
+        "SystemID": ln["system_id"] or "",
+        "BatchID": ln["batch_id"] or "",
+        "DocumentNumber": ln["doc_no"] or "",
+        "LineSourceDocumentID": ln["line_src"] or "",
+        "AccountID": acc_id or "",
+        "AccountDescription": acc_desc,
+        "CustomerID": cust_id or "",
+        "CustomerName": cust_name,
+        "CustomerVATNumber": cust_vat,
+        "SupplierID": sup_id or "",
+        "SupplierName": sup_name,
+        "SupplierVATNumber": sup_vat,
+        "Description": ln["desc"] or "",
+        "Debit": f"{debit}",
+        "Credit": f"{credit}",
+        "Amount": f"{amount}",
+        "CurrencyCode": currency or "",
+        "AmountCurrency": ln["amt_cur"] or "",
+        "ExchangeRate": ln["ex_rate"] or "",
+        "TaxType": ln["tax_type"] or "",
+        "TaxCountryRegion": ln["tax_country"] or "",
+        "TaxCode": ln["tax_code"] or "",
+        "TaxPercentage": ln["tax_perc"] or "",
+        "DebitTaxAmount": f"{d_tax}",
+        "CreditTaxAmount": f"{c_tax}",
+        "TaxAmount": f"{tax_amt}",
+        "TaxBase": "" if tax_base is None else f"{tax_base}",
+        "IsGL": "True",
+        "SourceType": "GL",
+    }
+
+_HOOK_TAGS = ("GeneralLedgerEntries", "Journal")
+
+def _parse_events(
+    src: BinaryIO,
+    sinks: Dict[str, Any],
+    masters: _Masters,
+    raw_mode: str,
+    raw_sample: int,
+    path_stats: Dict[str, List[Any]],
+    raw_sink: Any = None,
+    raw_skip_depth: int = 0,
+    on_event: Optional[Callable[[str, str, etree._Element], None]] = None,
+    raw_from: Optional[str] = None,
+    on_tx_end: Optional[Callable[[], None]] = None,
+) -> None:
+    """Kjør strømparseren over src og skriv radene til sinks.
+
+    raw_sink erstatter raw_elements-skriveren, raw_skip_depth utelater de ytterste
+    nivåene fra rådumpen (innpakningen rundt en transaksjonsbit) og raw_from alt
+    før første start av den taggen (journalhodet foran biten). on_event(evt, tag, el)
+    kalles for GeneralLedgerEntries/Journal, on_tx_end() etter hver ferdig skrevne
+    transaksjon (sjekkpunkter).
+    """
+    w_header = sinks.get("header")
+    w_bank   = sinks.get("bank_accounts")
+    w_acc    = sinks.get("accounts")
+    w_tax    = sinks.get("tax_table")
+    w_cust   = sinks.get("customers")
+    w_supp   = sinks.get("suppliers")
+    w_arap   = sinks.get("arap_control_accounts")
+    w_jour   = sinks.get("journals")
+    w_vouch  = sinks.get("vouchers")
+    w_lines  = sinks.get("transactions")
+    w_anl    = sinks.get("analysis_lines")
+    w_sinv   = sinks.get("sales_invoices")
+    w_pinv   = sinks.get("purchase_invoices")
+    w_raw    = raw_sink if raw_sink is not None else sinks.get("raw_elements")
+
+    # buffers
+    accounts = masters.accounts
+    customers = masters.customers
+    suppliers = masters.suppliers
+    customer_ctrl = masters.customer_ctrl
+    supplier_ctrl = masters.supplier_ctrl
     cur_voucher: Optional[VoucherAgg] = None
+    cur_tx_el: Optional[etree._Element] = None
+    voucher_pending = False
+    n_lines = 0
+    cur_journal_el: Optional[etree._Element] = None
+    cur_journal_id: Optional[str] = None
+    plans: Optional[Dict[str, _Plan]] = None   # settes fra rotelementets namespace
+    bal_tag = jid_tag = ""
+
+    # rådump: i "sampled" holdes en billig stistakk (lokale navn, uten indekser)
+    # i stedet for getpath() pr element. path_stats: sti -> [tag, antall, m/tekst, m/attributter]
+    sampled = raw_mode == "sampled"
+    raw_on = raw_from is None
+    path_stack: List[str] = []
 
     # streaming parse
     ctx = etree.iterparse(src, events=("start","end"))
     root = None
     for evt, el in ctx:
         tag = _lname(el)
+        if plans is None:
+            ns = etree.QName(el).namespace or ""
+            plans = _plans_for(ns)
+            bal_tag = _q(ns, "BalanceAccountStructure")
+            jid_tag = _q(ns, "JournalID")
+
+        if on_event is not None and tag in _HOOK_TAGS:
+            on_event(evt, tag, el)
+
+        if sampled:
+            if evt == "start":
+                path_stack.append((path_stack[-1] if path_stack else "") + "/" + tag)
+                raw_on = raw_on or tag == raw_from
+            else:
+                xp = path_stack.pop()
+                if raw_on and len(path_stack) >= raw_skip_depth:
+                    text = el.text.strip() if el.text else ""
+                    st = path_stats.get(xp)
+                    if st is None:
+                        st = path_stats[xp] = [tag, 0, 0, 0]
+                    st[1] += 1
+                    if text:
+                        st[2] += 1
+                    if el.attrib:
+                        st[3] += 1
+                    if st[1] <= raw_sample:
+                        w_raw.writerow({"XPath": xp, "Tag": tag, "Text": text, "Attributes": _attrs_json(el)})
 
         # rådump (konverter attributter til vanlig dict før json.dumps)
-        if evt == "end":
+        elif evt == "end" and w_raw is not None:
             try:
                 xp = el.getroottree().getpath(el)
             except Exception:
                 xp = f"/{tag}"
-            attrs = {}
-            for k, v in el.attrib.items():
-                try:
-                    key = etree.QName(k).localname
-                except Exception:
-                    key = str(k)
-                attrs[key] = v
             w_raw.writerow({
                 "XPath": xp,
                 "Tag": tag,
                 "Text": (el.text.strip() if el.text else ""),
-                "Attributes": json.dumps(attrs, ensure_ascii=False)
+                "Attributes": _attrs_json(el)
             })
 
         # Header
         if evt == "end" and tag == "Header":
-            company = _first(el, ["CompanyName"])
-            compid  = _first(el, ["CompanyID"])
-            # Fil-dato: flere varianter i omløp
-            fcd = _first(el, ["FileCreationDateTime","AuditFileDateCreated","FileCreationDate"])
-            ver = _first(el, ["AuditFileVersion"])
-
-            # Periode: støtt både v1.2 og v1.3
-            sel_start = _first(el, ["SelectionStart","SelectionStartDate"])
-            sel_end   = _first(el, ["SelectionEnd","SelectionEndDate"])
-            startd    = _first(el, ["StartDate"])
-            endd      = _first(el, ["EndDate"])
-
-            prodver = _first(el, ["ProductVersion"])
-            cert    = _first(el, ["SoftwareCertificateNumber"])
-            func_cur    = _first(el, ["FunctionalCurrency"])
-            default_cur = _first(el, ["DefaultCurrencyCode"])
-            currency_out = func_cur or default_cur or ""
+            h = plans["header"].extract(el)
+            # Fil-dato: flere varianter i omløp; periode: støtt både v1.2 og v1.3
+            currency_out = h["func_cur"] or h["default_cur"] or ""
 
             w_header.writerow({
-                "CompanyName": company or "",
-                "CompanyID": compid or "",
+                "CompanyName": h["company"] or "",
+                "CompanyID": h["compid"] or "",
                 "FunctionalCurrency": currency_out,
-                "DefaultCurrencyCode": default_cur or "",
-                "FileCreationDate": fcd or "",
-                "AuditFileVersion": ver or "",
-                "SelectionStart": sel_start or "",
-                "SelectionStartDate": _first(el, ["SelectionStartDate"]) or "",
-                "SelectionEnd": sel_end or "",
-                "SelectionEndDate": _first(el, ["SelectionEndDate"]) or "",
-                "StartDate": startd or "",
-                "EndDate": endd or "",
-                "ProductVersion": prodver or "",
-                "SoftwareCertificateNumber": cert or ""
+                "DefaultCurrencyCode": h["default_cur"] or "",
+                "FileCreationDate": h["fcd"] or "",
+                "AuditFileVersion": h["ver"] or "",
+                "SelectionStart": h["sel_start"] or "",
+                "SelectionStartDate": h["sel_start_date"] or "",
+                "SelectionEnd": h["sel_end"] or "",
+                "SelectionEndDate": h["sel_end_date"] or "",
+                "StartDate": h["startd"] or "",
+                "EndDate": h["endd"] or "",
+                "ProductVersion": h["prodver"] or "",
+                "SoftwareCertificateNumber": h["cert"] or "",
+                "SoftwareCompanyName": h["sw_company"] or "",
+                "SoftwareID": h["sw_id"] or "",
+                "SoftwareVersion": h["sw_ver"] or "",
+            })
+
+        # Bank accounts (Header/Company)
+        if evt == "end" and tag == "BankAccount" and w_bank is not None:
+            b = plans["bank"].extract(el)
+            w_bank.writerow({
+                "BankAccountNumber": b["number"] or "", "IBANNumber": b["iban"] or "",
+                "BankAccountName": b["name"] or "", "BIC": b["bic"] or "",
+                "CurrencyCode": b["currency"] or "", "GeneralLedgerAccountID": b["gl_account"] or "",
             })
 
         # Accounts
         if evt == "end" and tag in ("Account","GeneralLedgerAccount"):
-            acc_id  = _first(el, ["AccountID"])
+            a = plans["account"].extract(el)
+            acc_id = a["acc_id"]
             if acc_id:
-                acc_desc= _first(el, ["AccountDescription"])
-                acc_type= _first(el, ["AccountType"])
-                parent  = _first(el, ["ParentAccountID"])
-                group_cat = _first(el, ["GroupingCategory"])
-                group_code= _first(el, ["GroupingCode","GroupingCategoryCode"])
-                op_dr   = _amount_of(el, "OpeningDebitBalance") or DEC(0)
-                op_cr   = _amount_of(el, "OpeningCreditBalance") or DEC(0)
-                cl_dr   = _amount_of(el, "ClosingDebitBalance") or DEC(0)
-                cl_cr   = _amount_of(el, "ClosingCreditBalance") or DEC(0)
-                taxc    = _first(el, ["TaxCode"])
-                taxt    = _first(el, ["TaxType"])
-                accounts[acc_id] = {"AccountDescription": acc_desc or "", "TaxCode": taxc or ""}
+                acc_desc = a["acc_desc"]
+                op_dr   = a["OpeningDebitBalance"] or DEC(0)
+                op_cr   = a["OpeningCreditBalance"] or DEC(0)
+                cl_dr   = a["ClosingDebitBalance"] or DEC(0)
+                cl_cr   = a["ClosingCreditBalance"] or DEC(0)
+                accounts[acc_id] = {"AccountDescription": acc_desc or "", "TaxCode": a["taxc"] or ""}
                 w_acc.writerow({
-                    "AccountID": acc_id, "AccountDescription": acc_desc or "", "AccountType": acc_type or "",
-                    "ParentAccountID": parent or "",
-                    "GroupingCategory": group_cat or "", "GroupingCode": group_code or "",
+                    "AccountID": acc_id, "AccountDescription": acc_desc or "", "AccountType": a["acc_type"] or "",
+                    "ParentAccountID": a["parent"] or "",
+                    "GroupingCategory": a["group_cat"] or "", "GroupingCode": a["group_code"] or "",
                     "OpeningDebit": f"{op_dr}", "OpeningCredit": f"{op_cr}",
                     "ClosingDebit": f"{cl_dr}", "ClosingCredit": f"{cl_cr}",
-                    "TaxCode": taxc or "", "TaxType": taxt or ""
+                    "TaxCode": a["taxc"] or "", "TaxType": a["taxt"] or ""
                 })
 
         # TaxTable
         if evt == "end" and tag == "TaxTableEntry":
-            std = _first(el, ["StandardTaxCode","StandardCode"])
+            t = plans["tax"].extract(el)
             w_tax.writerow({
-                "TaxCode": _first(el, ["TaxCode"]) or "",
-                "StandardTaxCode": std or "",
-                "TaxType": _first(el, ["TaxType"]) or "",
-                "TaxPercentage": _first(el, ["TaxPercentage"]) or "",
-                "TaxCountryRegion": _first(el, ["TaxCountryRegion"]) or "",
-                "Description": _first(el, ["Description"]) or ""
+                "TaxCode": t["code"] or "",
+                "StandardTaxCode": t["std"] or "",
+                "TaxType": t["type"] or "",
+                "TaxPercentage": t["perc"] or "",
+                "TaxCountryRegion": t["country"] or "",
+                "Description": t["desc"] or ""
             })
 
-        # Customers
-        if evt == "end" and tag == "Customer":
-            cid = _first(el, ["CustomerID"])
-            if cid:
-                name = _first(el, ["CompanyName","CustomerName","Name"])
-                customers[cid] = {"Name": name or "", "VATNumber": _first(el, ["VATNumber"]) or ""}
-                w_cust.writerow({
-                    "CustomerID": cid, "Name": name or "", "VATNumber": customers[cid]["VATNumber"],
-                    "Country": _first(el, ["Country"]) or "", "City": _first(el, ["City"]) or "",
-                    "PostalCode": _first(el, ["PostalCode"]) or "",
-                    "Email": _first(el, ["Email"]) or "", "Telephone": _first(el, ["Telephone"]) or ""
+        # Customers / Suppliers
+        if evt == "end" and tag in ("Customer", "Supplier"):
+            is_cust = tag == "Customer"
+            p = plans["customer" if is_cust else "supplier"].extract(el)
+            pid = p["id"]
+            if pid:
+                party, ctrl = (customers, customer_ctrl) if is_cust else (suppliers, supplier_ctrl)
+                party[pid] = {"Name": p["name"] or "", "VATNumber": p["vat"] or ""}
+                (w_cust if is_cust else w_supp).writerow({
+                    ("CustomerID" if is_cust else "SupplierID"): pid,
+                    "Name": p["name"] or "", "VATNumber": p["vat"] or "",
+                    "Country": p["country"] or "", "City": p["city"] or "",
+                    "PostalCode": p["postal"] or "",
+                    "Email": p["email"] or "", "Telephone": p["phone"] or ""
                 })
                 # BalanceAccountStructure (1.3)
-                for b in el.findall(f".//{{{NS['s']}}}BalanceAccountStructure"):
-                    # Extract the control account for this customer. If multiple BalanceAccountStructure
+                for b in el.iterdescendants(bal_tag):
+                    # Extract the control account for this party. If multiple BalanceAccountStructure
                     # elements exist, the last one will overwrite earlier ones, which is acceptable
                     # because SAF‑T v1.3 typically defines one account per party.
-                    acct = _first(b, ["AccountID"])
+                    bal = plans["balance"].extract(b)
+                    acct = bal["acct"]
                     if acct:
-                        customer_ctrl[cid] = acct
+                        ctrl[pid] = acct
                     w_arap.writerow({
-                        "PartyType":"Customer","PartyID":cid,
+                        "PartyType": tag, "PartyID": pid,
                         "AccountID": acct or "",
-                        "OpeningDebit": f"{_amount_of(b,'OpeningDebitBalance') or DEC(0)}",
-                        "OpeningCredit": f"{_amount_of(b,'OpeningCreditBalance') or DEC(0)}",
-                        "ClosingDebit": f"{_amount_of(b,'ClosingDebitBalance') or DEC(0)}",
-                        "ClosingCredit": f"{_amount_of(b,'ClosingCreditBalance') or DEC(0)}",
-                    })
-
-        # Suppliers
-        if evt == "end" and tag == "Supplier":
-            sid = _first(el, ["SupplierID"])
-            if sid:
-                name = _first(el, ["CompanyName","SupplierName","Name"])
-                suppliers[sid] = {"Name": name or "", "VATNumber": _first(el, ["VATNumber"]) or ""}
-                w_supp.writerow({
-                    "SupplierID": sid, "Name": name or "", "VATNumber": suppliers[sid]["VATNumber"],
-                    "Country": _first(el, ["Country"]) or "", "City": _first(el, ["City"]) or "",
-                    "PostalCode": _first(el, ["PostalCode"]) or "",
-                    "Email": _first(el, ["Email"]) or "", "Telephone": _first(el, ["Telephone"]) or ""
-                })
-                for b in el.findall(f".//{{{NS['s']}}}BalanceAccountStructure"):
-                    acct = _first(b, ["AccountID"])
-                    if acct:
-                        supplier_ctrl[sid] = acct
-                    w_arap.writerow({
-                        "PartyType":"Supplier","PartyID":sid,
-                        "AccountID": acct or "",
-                        "OpeningDebit": f"{_amount_of(b,'OpeningDebitBalance') or DEC(0)}",
-                        "OpeningCredit": f"{_amount_of(b,'OpeningCreditBalance') or DEC(0)}",
-                        "ClosingDebit": f"{_amount_of(b,'ClosingDebitBalance') or DEC(0)}",
-                        "ClosingCredit": f"{_amount_of(b,'ClosingCreditBalance') or DEC(0)}",
+                        "OpeningDebit": f"{bal['OpeningDebitBalance'] or DEC(0)}",
+                        "OpeningCredit": f"{bal['OpeningCreditBalance'] or DEC(0)}",
+                        "ClosingDebit": f"{bal['ClosingDebitBalance'] or DEC(0)}",
+                        "ClosingCredit": f"{bal['ClosingCreditBalance'] or DEC(0)}",
                     })
 
         # Start Transaction (Voucher)
+        # Bilagsfeltene hentes ikke her: ved start-hendelsen avhenger det av lxml sin
+        # innlesningsbuffer hvor mye av <Transaction> som finnes. De hentes i stedet ved
+        # slutten av første linje (før søsknene slettes) eller ved </Transaction>.
         if evt == "start" and tag == "Transaction":
             cur_voucher = VoucherAgg()
-            cur_voucher.voucher_id = _first(el, ["TransactionID","TransactionNo","VoucherID"])
-            cur_voucher.voucher_no = _first(el, ["VoucherNo","TransactionNo","TransactionID"])
-            cur_voucher.transaction_date = _first(el, ["TransactionDate","EntryDate"])
-            cur_voucher.posting_date = _first(el, ["PostingDate"])
-            cur_voucher.period = _first(el, ["Period"])
-            cur_voucher.year = _first(el, ["FiscalYear","Year"])
-            cur_voucher.source_doc = _first(el, ["SourceDocumentID","SourceID","DocumentNumber"])
-            cur_voucher.journal_id = _first(el, ["JournalID","Journal"])
-            cur_voucher.currency_code = _first(el, ["CurrencyCode","TransactionCurrency"])
-            # v1.3 optional fields
-            cur_voucher.voucher_type = _first(el, ["VoucherType"])
-            cur_voucher.voucher_desc = _first(el, ["VoucherDescription"])
-            cur_voucher.mod_date     = _first(el, ["ModificationDate"])
+            cur_tx_el = el
+            voucher_pending = True
+            n_lines = 0
+            # journalhodet (JournalID m.m.) ligger foran første <Transaction> og er ferdig parset her
+            jel = el.getparent()
+            if jel is not cur_journal_el:
+                cur_journal_el = jel
+                cur_journal_id = _text(jel.find(jid_tag)) if jel is not None else None
 
         # Line variants
         if evt == "end" and tag in ("Line", "TransactionLine", "JournalLine"):
@@ -399,112 +1129,11 @@ def parse_saft(input_path: Path, outdir: Path) -> None:
                 while el.getprevious() is not None:
                     del el.getparent()[0]
                 continue
-            # context comes from current voucher
-            v_id = cur_voucher.voucher_id
-            v_no = cur_voucher.voucher_no
-            j_id = cur_voucher.journal_id
-            currency = cur_voucher.currency_code
-            tr_date = cur_voucher.transaction_date
-            p_date = cur_voucher.posting_date
-
-            record_id = _first(el, ["RecordID", "LineID"])
-            system_id = _first(el, ["SystemID"])
-            batch_id = _first(el, ["BatchID"])
-            doc_no = _first(el, ["DocumentNumber"])
-            line_src = _first(el, ["SourceDocumentID"])
-            acc_id = _first(el, ["AccountID"])
-            cust_id = _first(el, ["CustomerID"])
-            sup_id = _first(el, ["SupplierID"])
-            desc = _first(el, ["Description", "Narrative", "LineDescription"])
-
-            debit = _amount_of(el, "DebitAmount") or DEC(0)
-            credit = _amount_of(el, "CreditAmount") or DEC(0)
-            amount = debit - credit
-
-            # Always update voucher totals, even for lines without AccountID, since these are part of the
-            # journal totals.
-            #
-            # Hvis AccountID mangler forsøker vi å tilordne en kontrollkonto basert på CustomerID
-            # eller SupplierID. SAF‑T v1.3 lar hver kunde/leverandør ha en BalanceAccountStructure
-            # som spesifiserer hvilken hovedbokskonto reskontrolinjer skal føres mot (f.eks. 1510,
-            # 1550, 2410 osv.). Dersom en linje mangler AccountID men har CustomerID eller SupplierID,
-            # henter vi kontoen fra de respektive mappingene. Dersom vi ikke finner en konto på
-            # denne måten, skriver vi ikke linjen til transactions.csv (for å unngå å inkludere
-            # rene analyselinjer eller fakturalinjer uten konto).
-
-            # Update voucher totals first
-            cur_voucher.debit += debit
-            cur_voucher.credit += credit
-
-            # Dersom konto mangler, forsøk å finne en kontrollkonto via kunde- eller leverandørmapping.
-            if not acc_id:
-                if cust_id and cust_id in customer_ctrl:
-                    acc_id = customer_ctrl[cust_id]
-                elif sup_id and sup_id in supplier_ctrl:
-                    acc_id = supplier_ctrl[sup_id]
-            # Hvis kontoen fremdeles er blank etter mapping, sett den til en
-            # placeholder "UNDEFINED" slik at linjen likevel kommer med i
-            # transaksjonsfilen. Dette sikrer at hovedboken blir komplett og
-            # at saldoen kan følges opp. Revisor kan filtrere på AccountID="UNDEFINED"
-            # for å identifisere linjer som manglet konto i SAF‑T.
-            if not acc_id:
-                acc_id = "UNDEFINED"
-
-            amt_cur = _first(el, ["AmountCurrency", "ForeignAmount"])
-            ex_rate = _first(el, ["ExchangeRate"])
-            tax_type = _first(el, ["TaxType"])
-            tax_country = _first(el, ["TaxCountryRegion"])
-            tax_code = _first(el, ["TaxCode"])
-            tax_perc = _first(el, ["TaxPercentage"])
-            # v1.3 tax split
-            d_tax = _amount_of(el, "DebitTaxAmount") or DEC(0)
-            c_tax = _amount_of(el, "CreditTaxAmount") or DEC(0)
-            tax_amt = _amount_of(el, "TaxAmount") or (d_tax - c_tax)
-
-            acc_desc = accounts.get(acc_id, {}).get("AccountDescription", "") if acc_id else ""
-            cust_name = customers.get(cust_id, {}).get("Name", "") if cust_id else ""
-            cust_vat = customers.get(cust_id, {}).get("VATNumber", "") if cust_id else ""
-            sup_name = suppliers.get(sup_id, {}).get("Name", "") if sup_id else ""
-            sup_vat = suppliers.get(sup_id, {}).get("VATNumber", "") if sup_id else ""
-
-            w_lines.writerow(
-                {
-                    "RecordID": record_id or "",
-                    "VoucherID": v_id or "",
-                    "VoucherNo": v_no or "",
-                    "JournalID": j_id or "",
-                    "TransactionDate": tr_date or "",
-                    "PostingDate": p_date or "",
-                    "SystemID": system_id or "",
-                    "BatchID": batch_id or "",
-                    "DocumentNumber": doc_no or "",
-                    "LineSourceDocumentID": line_src or "",
-                    "AccountID": acc_id or "",
-                    "AccountDescription": acc_desc,
-                    "CustomerID": cust_id or "",
-                    "CustomerName": cust_name,
-                    "CustomerVATNumber": cust_vat,
-                    "SupplierID": sup_id or "",
-                    "SupplierName": sup_name,
-                    "SupplierVATNumber": sup_vat,
-                    "Description": desc or "",
-                    "Debit": f"{debit}",
-                    "Credit": f"{credit}",
-                    "Amount": f"{amount}",
-                    "CurrencyCode": currency or "",
-                    "AmountCurrency": amt_cur or "",
-                    "ExchangeRate": ex_rate or "",
-                    "TaxType": tax_type or "",
-                    "TaxCountryRegion": tax_country or "",
-                    "TaxCode": tax_code or "",
-                    "TaxPercentage": tax_perc or "",
-                    "DebitTaxAmount": f"{d_tax}",
-                    "CreditTaxAmount": f"{c_tax}",
-                    "TaxAmount": f"{tax_amt}",
-                    "IsGL": "True",
-                    "SourceType": "GL",
-                }
-            )
+            if voucher_pending:
+                _fill_voucher(cur_voucher, plans["voucher"].extract(cur_tx_el, upto=el), cur_journal_id)
+                voucher_pending = False
+            w_lines.writerow(_line_row(plans["line"].extract(el), cur_voucher, masters))
+            n_lines += 1
 
             # free memory
             el.clear()
@@ -516,10 +1145,11 @@ def parse_saft(input_path: Path, outdir: Path) -> None:
             parent = el.getparent()
             while parent is not None and _lname(parent) not in ("Line","TransactionLine","JournalLine"):
                 parent = parent.getparent()
-            rec_id = _first(parent, ["RecordID","LineID"]) if parent is not None else None
+            rec_id = plans["line_ref"].extract(parent)["record_id"] if parent is not None else None
+            an = plans["analysis"].extract(el)
             w_anl.writerow({
-                "RecordID": rec_id or "", "Type": _first(el, ["AnalysisType"]) or "",
-                "ID": _first(el, ["AnalysisID"]) or "", "Amount": f"{_amount_of(el,'Amount') or DEC(0)}"
+                "RecordID": rec_id or "", "Type": an["type"] or "",
+                "ID": an["id"] or "", "Amount": f"{an['Amount'] or DEC(0)}"
             })
             # Important: do NOT delete previous siblings here; we still need other children
             # (e.g., AccountID, DebitAmount) of the parent <Line> until the line end event.
@@ -528,33 +1158,42 @@ def parse_saft(input_path: Path, outdir: Path) -> None:
         # SourceDocuments – Sales & Purchase (for DueDate i aging)
         if evt == "end" and tag == "Invoice":
             parent = _lname(el.getparent()) if el.getparent() is not None else ""
-            inv = {
-                "InvoiceNo": _first(el, ["InvoiceNo","InvoiceNumber"]) or "",
-                "InvoiceDate": _first(el, ["InvoiceDate"]) or "",
-                "TaxPointDate": _first(el, ["TaxPointDate"]) or "",
-                "GLPostingDate": _first(el, ["GLPostingDate"]) or "",
-                "CurrencyCode": _first(el, ["CurrencyCode","TransactionCurrency"]) or "",
-                "NetTotal": _first(el, ["NetTotal","DocumentNetTotal"]) or "",
-                "TaxPayable": _first(el, ["TaxPayable","DocumentTaxPayable"]) or "",
-                "GrossTotal": _first(el, ["GrossTotal","DocumentGrossTotal"]) or "",
-                "SourceID": _first(el, ["SourceID"]) or "",
-                "DocumentNumber": _first(el, ["DocumentNumber"]) or "",
-                "DueDate": _first(el, ["DueDate"]) or "",
-            }
+            f = plans["invoice"].extract(el)
+            inv = {k: f[k] or "" for k in ("InvoiceNo", "InvoiceDate", "TaxPointDate", "GLPostingDate", "CurrencyCode",
+                                           "NetTotal", "TaxPayable", "GrossTotal", "SourceID", "DocumentNumber", "DueDate")}
             if parent == "SalesInvoices":
-                cid = _first(el, ["CustomerID"])
-                cname = customers.get(cid,{}).get("Name","") if cid else _first(el,["CustomerName"])
+                cid = f["CustomerID"]
+                cname = customers.get(cid,{}).get("Name","") if cid else f["CustomerName"]
                 inv.update({"CustomerID":cid or "","CustomerName":cname or "","CustomerVATNumber":customers.get(cid,{}).get("VATNumber","")})
                 w_sinv.writerow(inv)
             elif parent == "PurchaseInvoices":
-                sid = _first(el, ["SupplierID"])
-                sname = suppliers.get(sid,{}).get("Name","") if sid else _first(el,["SupplierName"])
+                sid = f["SupplierID"]
+                sname = suppliers.get(sid,{}).get("Name","") if sid else f["SupplierName"]
                 inv.update({"SupplierID":sid or "","SupplierName":sname or "","SupplierVATNumber":suppliers.get(sid,{}).get("VATNumber","")})
                 w_pinv.writerow(inv)
 
+        # Journals (hodet; transaksjonene er allerede tømt her)
+        if evt == "end" and tag == "Journal" and w_jour is not None:
+            jr = plans["journal"].extract(el)
+            w_jour.writerow({
+                "JournalID": jr["id"] or "", "Description": jr["desc"] or "", "Type": jr["type"] or "",
+                "PostingDate": jr["posting_date"] or "", "VoucherDate": jr["voucher_date"] or "",
+                "VoucherType": jr["voucher_type"] or "", "BatchID": jr["batch_id"] or "",
+                "SystemID": jr["system_id"] or "",
+            })
+
         # End Transaction
         if evt == "end" and tag == "Transaction":
             if cur_voucher is not None:
+                if voucher_pending:  # bilag uten linjer
+                    _fill_voucher(cur_voucher, plans["voucher"].extract(el), cur_journal_id)
+                    voucher_pending = False
+                if n_lines == 0:
+                    # flate transaksjoner (Tripletex): konteringen ligger direkte på <Transaction>
+                    ln = plans["line"].extract(el)
+                    if ln["acc_id"] or ln["DebitAmount"] is not None or ln["CreditAmount"] is not None \
+                            or ln["Amount"] is not None:
+                        w_lines.writerow(_line_row(ln, cur_voucher, masters))
                 balanced = abs(cur_voucher.debit - cur_voucher.credit) <= BAL_TOL
                 w_vouch.writerow({
                     "VoucherID": cur_voucher.voucher_id or "", "VoucherNo": cur_voucher.voucher_no or "",
@@ -566,7 +1205,10 @@ def parse_saft(input_path: Path, outdir: Path) -> None:
                     "ModificationDate": cur_voucher.mod_date or "",
                     "DebitTotal": f"{cur_voucher.debit}", "CreditTotal": f"{cur_voucher.credit}", "Balanced": "Y" if balanced else "N"
                 })
+                if on_tx_end is not None:
+                    on_tx_end()
             cur_voucher = None
+            cur_tx_el = None
             # Important: do NOT delete previous siblings here; we still need other children
             # (e.g., AccountID, DebitAmount) of the parent <Line> until the line end event.
             el.clear()
@@ -577,17 +1219,459 @@ def parse_saft(input_path: Path, outdir: Path) -> None:
         if evt == "end" and el == root:
             root.clear()
 
-    for fh in (f_header,f_accounts,f_tax,f_cust,f_supp,f_arapca,f_vouch,f_lines,f_anl,f_sinv,f_pinv,f_raw):
-        fh.close()
+# ---------------- Sjekkpunkter (gjenopptakbar parsing) ----------------
+CHECKPOINT_FILE = ".saft_checkpoint.json"
+CHECKPOINT_VERSION = 2
+CHECKPOINT_SECS_DEFAULT = 60.0
+_NO_RESUME_TABLES = ("raw_path_stats",)   # skrives først helt til slutt
+_HASH_BLOCK = 1 << 20
+_FINGERPRINT_SAMPLE = 64 * 1024
+
+
+def _input_fingerprint(path: Path) -> Dict[str, Any]:
+    """Størrelse, mtime_ns og SHA-256 av de første og siste _FINGERPRINT_SAMPLE bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        h.update(fh.read(_FINGERPRINT_SAMPLE))
+        if size > _FINGERPRINT_SAMPLE:
+            fh.seek(max(_FINGERPRINT_SAMPLE, size - _FINGERPRINT_SAMPLE))
+            h.update(fh.read(_FINGERPRINT_SAMPLE))
+        mtime_ns = os.fstat(fh.fileno()).st_mtime_ns
+    return {"size": size, "mtime_ns": mtime_ns, "sample_sha256": h.hexdigest()}
+
+
+def _hash_prefix(path: Path, n: int) -> str:
+    """SHA-256 av de første n bytes av path."""
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while n > 0:
+            block = fh.read(min(_HASH_BLOCK, n))
+            if not block:
+                break
+            h.update(block)
+            n -= len(block)
+    return h.hexdigest()
+
+
+def _same_input(state: Dict[str, Any], fp: Dict[str, Any], input_path: Path) -> bool:
+    """Er inputfilen den samme som da sjekkpunktet ble skrevet?
+
+    Likt fingeravtrykk holder. Er bare mtime endret (kopiert/rørt fil), hashes
+    starten av filen som allerede var lest og sammenlignes med input_prefix.
+    """
+    old = state.get("input")
+    if old == fp:
+        return True
+    prefix = state.get("input_prefix")
+    if not (isinstance(old, dict) and prefix
+            and all(old.get(k) == fp[k] for k in ("size", "sample_sha256"))):
+        return False
+    return _hash_prefix(input_path, int(prefix[0])) == prefix[1]
+
+
+class _Checkpointer:
+    """Skriver sjekkpunkt mellom to hele transaksjoner, høyst én gang pr every sekunder.
+
+    Sjekkpunktet skrives til en temp-fil og flyttes på plass, etter at CSV-filene er
+    synket til disk – filstørrelsene i sjekkpunktet er derfor alltid skrevet ferdig.
+    """
+    def __init__(self, path: Path, every: float, meta: Dict[str, Any], sinks: Dict[str, Any],
+                 masters: _Masters, path_stats: Dict[str, List[Any]], tx_done: int = 0,
+                 prefix: Optional[Callable[[], Optional[List[Any]]]] = None):
+        self.path = path
+        self.prefix = prefix
+        self.every = every
+        self.meta = meta
+        self.sinks = sinks
+        self.masters = masters
+        self.path_stats = path_stats
+        self.tx_done = tx_done
+        self._due = time.monotonic() + every
+
+    def tick(self) -> None:
+        self.tx_done += 1
+        if time.monotonic() >= self._due:
+            self.save()
+            self._due = time.monotonic() + self.every
+
+    def save(self) -> None:
+        state = dict(
+            self.meta, tx_done=self.tx_done,
+            sinks={name: [sink.sync(), sink.rows] for name, sink in self.sinks.items()
+                   if name not in _NO_RESUME_TABLES},
+            masters=asdict(self.masters), path_stats=self.path_stats,
+            input_prefix=self.prefix() if self.prefix is not None else None,
+        )
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        tmp.write_text(json.dumps(state, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+@dataclass
+class _Resume:
+    state: Dict[str, Any]
+    xml_path: Path
+    spooled: bool
+    pieces: list
+
+
+def _load_resume(input_path: Path, outdir: Path, meta: Dict[str, Any],
+                 progress: Optional[Callable[[int, int], None]] = None) -> Optional[_Resume]:
+    """Gyldig sjekkpunkt for input_path i outdir, med utsnittene som gjenstår – ellers None.
+
+    Et sjekkpunkt for en annen fil (se _same_input), andre innstillinger eller med
+    CSV-filer som er kortere enn registrert (ikke skrevet ferdig) slettes, og
+    parsingen starter på nytt.
+    """
+    path = outdir / CHECKPOINT_FILE
+    if not path.exists():
+        return None
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        state = None
+    ok = (
+        isinstance(state, dict)
+        and all(state.get(k) == v for k, v in meta.items() if k != "input")
+        and all((outdir / f"{name}.csv").exists() and (outdir / f"{name}.csv").stat().st_size >= size
+                for name, (size, _rows) in state.get("sinks", {}).items())
+        and _same_input(state, meta["input"], input_path)
+    )
+    if ok:
+        xml_path, spooled = _seekable_xml(input_path, outdir, progress)
+        pieces = resume_pieces(xml_path, state["tx_done"])
+        if pieces is not None:
+            return _Resume(state, xml_path, spooled, pieces)
+        if spooled:
+            xml_path.unlink(missing_ok=True)
+    log.info("Sjekkpunkt i %s kan ikke brukes for %s – starter på nytt", outdir, input_path.name)
+    path.unlink(missing_ok=True)
+    return None
+
+
+def _parse_checkpointed(input_path: Path, outdir: Path, sinks: Dict[str, Any], masters: _Masters,
+                        raw_mode: str, raw_sample: int, path_stats: Dict[str, List[Any]],
+                        every: float, meta: Dict[str, Any], resume: Optional[_Resume],
+                        progress: Optional[Callable[[int, int], None]] = None) -> None:
+    if resume is None:
+        # starten av inputfilen hashes mens den leses (reserve ved endret mtime, se _same_input)
+        src = _maybe_open_zip(input_path, progress, hashed=True)
+        ckpt = _Checkpointer(outdir / CHECKPOINT_FILE, every, meta, sinks, masters, path_stats,
+                             prefix=src._raw.prefix)
+        raw_from = None
+    else:
+        # den gjenopptatte lesingen er ikke sammenhengende: uten prefiks krever neste
+        # gjenopptak uendret fingeravtrykk
+        ckpt = _Checkpointer(outdir / CHECKPOINT_FILE, every, meta, sinks, masters, path_stats,
+                             resume.state["tx_done"])
+        log.info("Fortsetter fra sjekkpunkt etter %d transaksjoner (%d linjer)",
+                 ckpt.tx_done, resume.state["sinks"]["transactions"][1])
+        src = SpliceReader(resume.xml_path, resume.pieces,
+                           None if resume.spooled else progress, PROGRESS_STEP)
+        raw_from = "Transaction"   # alt foran er allerede talt med i stistatistikken
+    try:
+        _parse_events(src, sinks, masters, raw_mode, raw_sample, path_stats,
+                      raw_from=raw_from, on_tx_end=ckpt.tick)
+    finally:
+        src.close()
+        if resume is not None and resume.spooled:
+            resume.xml_path.unlink(missing_ok=True)
+
+
+def parse_saft(
+    input_path: Path,
+    outdir: Path,
+    fmt: str = "csv",
+    row_group_size: int = PARQUET_ROW_GROUP_DEFAULT,
+    raw_mode: str = "full",
+    raw_sample: int = RAW_SAMPLE_DEFAULT,
+    workers: int = 1,
+    progress: Optional[Callable[[int, int], None]] = None,
+    checkpoint_secs: float = 0.0,
+    csv_dir: Optional[Path] = None,
+) -> None:
+    """Parse SAF-T (xml/zip) og skriv tabellene i TABLES til outdir.
+
+    fmt: "csv" (standard) eller "parquet" (typede kolonner, row groups på
+    row_group_size rader, skjemaversjon i saft_schema.json).
+    raw_mode: "full" (standard), "sampled" (raw_sample forekomster pr sti +
+    raw_path_stats) eller "off".
+    workers: > 1 parser hovedboken i så mange prosesser (0 = alle kjerner).
+    Radrekkefølge og bilagssummer blir de samme som sekvensielt; krever
+    raw_mode "sampled" eller "off".
+    progress(lest, total): framdrift i byte av inputfilen slik den ligger på disk
+    (komprimerte bytes for zip/gzip).
+    checkpoint_secs: > 0 skriver sjekkpunkt omtrent så ofte og fortsetter fra et
+    gyldig sjekkpunkt i outdir (krever fmt "csv", workers 1 og raw_mode "sampled"/"off").
+    csv_dir: med fmt "parquet" skrives de samme radene i samme gjennomløp også som
+    CSV til csv_dir, nøyaktig som fmt "csv" (med manifest og statistikk der).
+    Rådumpen etter raw_mode havner da bare i csv_dir. Krever workers 1.
+    """
+    workers = workers or os.cpu_count() or 1
+    if csv_dir is not None and (fmt != "parquet" or workers > 1 or checkpoint_secs > 0):
+        raise ValueError("csv_dir krever fmt='parquet', workers=1 og ingen sjekkpunkter")
+    if workers > 1 and raw_mode == "full":
+        raise ValueError("raw_mode='full' støttes ikke med workers > 1 (bruk 'sampled' eller 'off')")
+    if checkpoint_secs > 0 and (fmt != "csv" or workers > 1 or raw_mode == "full"):
+        raise ValueError("Sjekkpunkter krever fmt='csv', workers=1 og raw_mode 'sampled' eller 'off'")
+    dirs = [outdir] if csv_dir is None else [outdir, Path(csv_dir)]
+    for d in dirs:
+        d.mkdir(parents=True, exist_ok=True)
+        for done_file in (MANIFEST_FILE, STATS_FILE):     # finnes bare etter fullført kjøring
+            (d / done_file).unlink(missing_ok=True)
+    meta: Dict[str, Any] = {}
+    resume: Optional[_Resume] = None
+    if checkpoint_secs > 0:
+        meta = {"version": CHECKPOINT_VERSION, "input": _input_fingerprint(input_path),
+                "options": {"raw_mode": raw_mode, "raw_sample": raw_sample,
+                            "schema_version": PARQUET_SCHEMA_VERSION}}
+        resume = _load_resume(input_path, outdir, meta, progress)
+    if csv_dir is None:
+        outputs = [(outdir, fmt, _open_sinks(outdir, fmt, row_group_size, raw_mode,
+                                             resume=resume.state["sinks"] if resume else None))]
+        sinks = outputs[0][2]
+    else:
+        outputs = [(outdir, fmt, _open_sinks(outdir, fmt, row_group_size, "off")),
+                   (Path(csv_dir), "csv", _open_sinks(Path(csv_dir), "csv", raw_mode=raw_mode))]
+        main, copies = outputs[0][2], outputs[1][2]
+        sinks = {name: _TeeSink(main[name], c) if name in main else c for name, c in copies.items()}
+    masters = _Masters(**resume.state["masters"]) if resume else _Masters()
+    path_stats: Dict[str, List[Any]] = resume.state["path_stats"] if resume else {}
+
+    if workers > 1:
+        _parse_parallel(input_path, outdir, sinks, masters, fmt, row_group_size, raw_mode, raw_sample,
+                        path_stats, workers, progress)
+    elif checkpoint_secs > 0:
+        _parse_checkpointed(input_path, outdir, sinks, masters, raw_mode, raw_sample, path_stats,
+                            checkpoint_secs, meta, resume, progress)
+    else:
+        src = _maybe_open_zip(input_path, progress)
+        _parse_events(src, sinks, masters, raw_mode, raw_sample, path_stats)
+        src.close()
+
+    if raw_mode == "sampled":
+        w_stats = sinks["raw_path_stats"]
+        for xp, (tg, cnt, n_text, n_attr) in path_stats.items():
+            w_stats.writerow({
+                "XPath": xp, "Tag": tg, "Count": cnt, "TextCount": n_text,
+                "AttributeCount": n_attr, "Sampled": min(cnt, raw_sample),
+            })
+
+    for sink in sinks.values():
+        sink.close()
+    for d, d_fmt, d_sinks in outputs:
+        d_raw = raw_mode if d_fmt == "csv" or csv_dir is None else "off"
+        if d_fmt == "parquet":
+            _write_schema_file(d)
+        elif d_raw == "sampled":
+            write_unknown_reports(d, path_stats)
+        write_manifest(d, {name: (sink.path, sink.rows) for name, sink in d_sinks.items()},
+                       input_path, d_fmt, PARQUET_SCHEMA_VERSION, d_raw)
+        write_stats(d, {name: (sink.path, sink.rows, sink.stats) for name, sink in d_sinks.items()}, d_fmt)
+    if checkpoint_secs > 0:
+        (outdir / CHECKPOINT_FILE).unlink(missing_ok=True)
     log.info("Ferdig: %s", outdir)
 
+# ---------------- Parallell parsing ----------------
+# Hovedprosessen parser alt utenom transaksjonsbitene (header, stamdata,
+# journalhoder, kildedokumenter). Når <GeneralLedgerEntries> starter er stamdataene
+# ferdige; da startes arbeiderne, som parser hver sin bit til en delmappe. Ved
+# </GeneralLedgerEntries> hentes delene i bitrekkefølge og legges til tabellene,
+# slik at radrekkefølgen blir den samme som ved sekvensiell parsing.
+_GLE_TABLES = ("vouchers", "transactions", "analysis_lines")
+_PARTS_DIR = ".saft_parts"
+_SPOOL_FILE = ".saft_input.xml"
+_CHUNK_MIN = 1 << 20
+_CHUNK_MAX = 64 << 20
+_WRAPPER_DEPTH = 3   # AuditFile/GeneralLedgerEntries/Journal rundt hver bit
+
+
+class _SampleCollector:
+    """Samler rådump-eksempler med sorteringsnøkkel (bit, kilde, løpenr).
+
+    Hovedstrømmen merker eksemplene med indeksen til biten de ligger foran,
+    arbeiderne med sin egen bit – sortert gir det dokumentrekkefølge.
+    """
+    def __init__(self, gap: int = 0, part: int = 0):
+        self.gap = gap
+        self.part = part
+        self.rows: List[Tuple[Tuple[int, int, int], Dict[str, Any]]] = []
+
+    def writerow(self, row: Dict[str, Any]) -> None:
+        self.rows.append(((self.gap, self.part, len(self.rows)), row))
+
+
+_W: Dict[str, Any] = {}   # arbeiderstate, satt av _worker_init
+
+def _worker_init(path: str, layout: SaftLayout, masters: _Masters, fmt: str, row_group_size: int,
+                 raw_mode: str, raw_sample: int, parts_dir: str) -> None:
+    _W.update(path=Path(path), layout=layout, masters=masters, fmt=fmt, row_group_size=row_group_size,
+              raw_mode=raw_mode, raw_sample=raw_sample, parts_dir=Path(parts_dir))
+
+def _parse_chunk(i: int) -> Tuple[str, Dict[str, Tuple[int, TableStats]], list, Dict[str, List[Any]]]:
+    """Parse transaksjonsbit i (i en arbeiderprosess) til delmappen <parts>/<i>."""
+    part = _W["parts_dir"] / f"{i:05d}"
+    part.mkdir(parents=True, exist_ok=True)
+    sinks = _open_sinks(part, _W["fmt"], _W["row_group_size"], "off", tables=_GLE_TABLES)
+    samples = _SampleCollector(gap=i, part=1) if _W["raw_mode"] == "sampled" else None
+    stats: Dict[str, List[Any]] = {}
+    src = SpliceReader(_W["path"], _W["layout"].worker_pieces(i))
+    try:
+        _parse_events(src, sinks, _W["masters"], _W["raw_mode"], _W["raw_sample"], stats,
+                      raw_sink=samples, raw_skip_depth=_WRAPPER_DEPTH, raw_from="Transaction")
+    finally:
+        src.close()
+        for sink in sinks.values():
+            sink.close()
+    rows = {name: (sink.rows, sink.stats) for name, sink in sinks.items()}
+    return str(part), rows, (samples.rows if samples is not None else []), stats
+
+
+class _ParallelRun:
+    """Styrer arbeiderne fra hovedstrømmen (via on_event) og slår sammen resultatene."""
+
+    def __init__(self, xml_path: Path, layout: SaftLayout, outdir: Path, sinks: Dict[str, Any],
+                 masters: _Masters, fmt: str, row_group_size: int, raw_mode: str, raw_sample: int,
+                 path_stats: Dict[str, List[Any]], workers: int,
+                 progress: Optional[Callable[[int, int], None]] = None):
+        self.xml_path = xml_path
+        self.layout = layout
+        self.parts_dir = outdir / _PARTS_DIR
+        self.sinks = sinks
+        self.masters = masters
+        self.fmt = fmt
+        self.row_group_size = row_group_size
+        self.raw_mode = raw_mode
+        self.raw_sample = raw_sample
+        self.path_stats = path_stats
+        self.workers = workers
+        self.progress = progress
+        self.samples = _SampleCollector() if raw_mode == "sampled" else None
+        self._worker_stats: List[Dict[str, List[Any]]] = []
+        self._journal = -1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._results = None
+
+    def on_event(self, evt: str, tag: str, el: etree._Element) -> None:
+        parent = el.getparent()
+        if tag == "Journal":
+            if parent is None or _lname(parent) != "GeneralLedgerEntries":
+                return
+            if evt == "start":
+                self._journal += 1
+            j = self.layout.journals[self._journal]
+            if self.samples is not None:
+                self.samples.gap = j.first_chunk if evt == "start" else j.first_chunk + j.n_chunks
+        elif evt == "start":
+            self._start()
+        else:
+            self._collect()
+
+    def _start(self) -> None:
+        # stamdataene er ferdige når hovedboken starter
+        self.parts_dir.mkdir(parents=True, exist_ok=True)
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_worker_init,
+            initargs=(str(self.xml_path), self.layout, self.masters, self.fmt, self.row_group_size,
+                      self.raw_mode, self.raw_sample, str(self.parts_dir)),
+        )
+        self._results = self._pool.map(_parse_chunk, range(len(self.layout.chunks)))
+
+    def _collect(self) -> None:
+        for i, (part, rows, samples, stats) in enumerate(self._results):
+            if self.progress is not None:
+                self.progress(self.layout.chunks[i].end, self.layout.size)
+            for name in _GLE_TABLES:
+                self.sinks[name].append_file(Path(part) / f"{name}.{self.fmt}", *rows[name])
+            shutil.rmtree(part, ignore_errors=True)
+            if self.samples is not None:
+                self.samples.rows.extend(samples)
+                self._worker_stats.append(stats)
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+        shutil.rmtree(self.parts_dir, ignore_errors=True)
+
+    def finish(self) -> None:
+        """Slå sammen rådump-eksempler og stistatistikk (sampled) i dokumentrekkefølge."""
+        if self.samples is None:
+            return
+        by_path: Dict[str, list] = {}
+        for key, row in sorted(self.samples.rows, key=lambda kr: kr[0]):
+            kept = by_path.setdefault(row["XPath"], [])
+            if len(kept) < self.raw_sample:
+                kept.append((key, row))
+        w_raw = self.sinks["raw_elements"]
+        for _, row in sorted((kr for kept in by_path.values() for kr in kept), key=lambda kr: kr[0]):
+            w_raw.writerow(row)
+
+        merged: Dict[str, Any] = dict.fromkeys(by_path)   # rekkefølge: første eksempel
+        for stats in [dict(self.path_stats)] + self._worker_stats:
+            for xp, (tg, cnt, n_text, n_attr) in stats.items():
+                st = merged.get(xp)
+                if st is None:
+                    merged[xp] = [tg, cnt, n_text, n_attr]
+                else:
+                    st[1] += cnt
+                    st[2] += n_text
+                    st[3] += n_attr
+        self.path_stats.clear()
+        self.path_stats.update(merged)
+
+
+def _seekable_xml(input_path: Path, outdir: Path,
+                  progress: Optional[Callable[[int, int], None]] = None) -> Tuple[Path, bool]:
+    """Arbeiderne trenger en vanlig XML-fil med tilfeldig tilgang – pakk ut zip/gzip ved behov."""
+    if _input_kind(input_path) == "xml":
+        return input_path, False
+    spool = outdir / _SPOOL_FILE
+    src = _maybe_open_zip(input_path, progress)
+    with open(spool, "wb") as fh:
+        shutil.copyfileobj(src, fh, 1 << 20)
+    src.close()
+    return spool, True
+
+def _parse_parallel(input_path: Path, outdir: Path, sinks: Dict[str, Any], masters: _Masters, fmt: str,
+                    row_group_size: int, raw_mode: str, raw_sample: int,
+                    path_stats: Dict[str, List[Any]], workers: int,
+                    progress: Optional[Callable[[int, int], None]] = None) -> None:
+    xml_path, spooled = _seekable_xml(input_path, outdir, progress)
+    try:
+        size = xml_path.stat().st_size
+        layout = scan_layout(xml_path, min(_CHUNK_MAX, max(_CHUNK_MIN, size // (workers * 4))))
+        if layout is None or len(layout.chunks) < 2:
+            log.info("Parallell parsing ikke aktuelt for %s – parser sekvensielt", input_path.name)
+            raw = _CountingFile(xml_path, None if spooled else progress)
+            src = _InputStream(raw, raw)
+            _parse_events(src, sinks, masters, raw_mode, raw_sample, path_stats)
+            src.close()
+            return
+        log.info("Parallell parsing: %d biter, %d prosesser", len(layout.chunks), workers)
+        run = _ParallelRun(xml_path, layout, outdir, sinks, masters, fmt, row_group_size, raw_mode,
+                           raw_sample, path_stats, workers, None if spooled else progress)
+        src = SpliceReader(xml_path, layout.main_pieces())
+        try:
+            _parse_events(src, sinks, masters, raw_mode, raw_sample, path_stats,
+                          raw_sink=run.samples, on_event=run.on_event)
+        finally:
+            src.close()
+            run.shutdown()
+        run.finish()
+    finally:
+        if spooled:
+            xml_path.unlink(missing_ok=True)
+
 # ---------------- GUI wrapper (enkel) ----------------
 def launch_gui():
     import tkinter as tk
     from tkinter import filedialog, messagebox
     root = tk.Tk(); root.title("SAF-T Pro Parser (v1.3 ready)")
     def run():
-        p = filedialog.askopenfilename(title="Velg SAF-T", filetypes=[("SAF-T/XML/ZIP","*.xml *.zip")])
+        p = filedialog.askopenfilename(title="Velg SAF-T", filetypes=[("SAF-T/XML/ZIP/GZ","*.xml *.zip *.gz")])
         if not p: return
         out = filedialog.askdirectory(title="Velg output-mappe")
         if not out: return
@@ -599,15 +1683,36 @@ def launch_gui():
     tk.Button(root, text="Kjør parsing…", command=run, width=32).pack(padx=20,pady=20)
     root.mainloop()
 
+def _log_progress(step: int = 5) -> Callable[[int, int], None]:
+    """Framdrift til loggen, én linje pr step prosent."""
+    last = [-step]
+    def report(done: int, total: int) -> None:
+        pct = int(done * 100 / total) if total else 100
+        if pct >= last[0] + step:
+            last[0] = pct - pct % step
+            log.info("Lest %.1f av %.1f MB (%d%%)", done / 1e6, total / 1e6, pct)
+    return report
+
 def main(argv=None) -> int:
     p = argparse.ArgumentParser()
-    p.add_argument("input", nargs="?", help="SAF-T .xml eller .zip")
+    p.add_argument("input", nargs="?", help="SAF-T .xml, .zip eller .xml.gz")
     p.add_argument("outdir", nargs="?", help="Output-mappe")
     p.add_argument("--gui", action="store_true", help="Start enkel GUI")
+    p.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="Output-format (csv eller typet parquet)")
+    p.add_argument("--row-group-size", type=int, default=PARQUET_ROW_GROUP_DEFAULT, help="Rader pr Parquet row group")
+    p.add_argument("--raw", choices=RAW_MODES, default="full", help="Rådump: off, sampled eller full")
+    p.add_argument("--raw-sample", type=int, default=RAW_SAMPLE_DEFAULT, help="Eksempler pr sti i --raw sampled")
+    p.add_argument("--workers", type=int, default=1, help="Prosesser for hovedboken (0 = alle kjerner)")
+    p.add_argument("--progress", action="store_true", help="Logg framdrift (lest av inputfilen)")
+    p.add_argument("--checkpoint", type=float, nargs="?", const=CHECKPOINT_SECS_DEFAULT, default=0.0,
+                   metavar="SEK", help="Skriv sjekkpunkt hvert SEK sekund og fortsett fra et tidligere "
+                                       f"(standard {CHECKPOINT_SECS_DEFAULT:.0f}; krever --raw sampled/off)")
     args = p.parse_args(argv)
     if args.gui: launch_gui(); return 0
     if not args.input or not args.outdir: p.print_help(); return 2
-    parse_saft(Path(args.input), Path(args.outdir)); return 0
+    parse_saft(Path(args.input), Path(args.outdir), fmt=args.format, row_group_size=args.row_group_size,
+               raw_mode=args.raw, raw_sample=args.raw_sample, workers=args.workers,
+               progress=_log_progress() if args.progress else None, checkpoint_secs=args.checkpoint); return 0
 
 if __name__ == "__main__":
     raise SystemExit(main())
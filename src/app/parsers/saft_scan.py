@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+Rask forhåndsskanning av SAF-T-filer (byte-offsets uten XML-parsing).
+
+Brukes av saft_parser_pro til parallell parsing: skanningen finner
+<GeneralLedgerEntries>, hver <Journal> og grensene mellom hele <Transaction>-
+elementer, og deler hver journal i biter (Chunk) av omtrent chunk_bytes byte.
+Hver bit kan parses for seg når den pakkes inn i rot-, GLE- og journal-taggene
+(se worker_pieces), mens resten av filen (main_pieces) parses i hovedprosessen.
+
+Skanningen bruker mmap.find på ferdigkvalifiserte taggnavn og er derfor
+I/O-bundet. Filer den ikke kan dele trygt (UTF-16, ingen hovedbok, MasterFiles
+etter hovedboken) gir None – da parses filen sekvensielt.
+
+resume_pieces finner på samme måte stedet rett etter en gitt transaksjon, slik at
+en avbrutt parsing kan fortsette fra et sjekkpunkt.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple, Union
+
+# Rotelementet: hopp over deklarasjon, kommentarer og DOCTYPE
+_ROOT_RE = re.compile(rb"<!--.*?-->|<\?.*?\?>|<![^>]*>|<([\w.:-]+)", re.S)
+_GLE_RE = re.compile(rb"<((?:[\w.-]+:)?)GeneralLedgerEntries[\s>]")
+_HEAD_LIMIT = 1 << 16
+
+Piece = Union[bytes, Tuple[int, int]]
+
+
+@dataclass
+class Chunk:
+    journal: int
+    start: int
+    end: int
+
+
+@dataclass
+class JournalSpan:
+    start: int
+    end: int
+    open_tag: bytes
+    header: bytes                # journalhodet (JournalID m.m.) foran første <Transaction>
+    first_chunk: int
+    n_chunks: int
+
+
+@dataclass
+class SaftLayout:
+    """Byte-layout for hovedboken i én SAF-T-fil."""
+    size: int
+    head: bytes                  # alt til og med rotens starttagg (deklarasjon + xmlns)
+    root_qname: bytes
+    prefix: bytes                # namespace-prefiks på hovedboktaggene (vanligvis b"")
+    gle_open: bytes
+    journals: List[JournalSpan] = field(default_factory=list)
+    chunks: List[Chunk] = field(default_factory=list)
+
+    def tail(self) -> bytes:
+        p = self.prefix
+        return b"</" + p + b"Journal></" + p + b"GeneralLedgerEntries></" + self.root_qname + b">"
+
+    def worker_pieces(self, i: int) -> List[Piece]:
+        """Selvstendig XML-dokument for bit i: rot + GLE + journal med hode + transaksjonene."""
+        c = self.chunks[i]
+        j = self.journals[c.journal]
+        return [self.head, self.gle_open, j.open_tag, j.header, (c.start, c.end), self.tail()]
+
+    def main_pieces(self) -> List[Piece]:
+        """Resten av filen (alt utenom bitene), i filrekkefølge."""
+        out: List[Piece] = []
+        prev = 0
+        for c in self.chunks:
+            if c.start > prev:
+                out.append((prev, c.start))
+            prev = c.end
+        if self.size > prev:
+            out.append((prev, self.size))
+        return out
+
+
+def _find_tag(mm, open_tag: bytes, start: int, end: int) -> int:
+    """Finn starttaggen open_tag (f.eks. b"<Transaction") – ikke <TransactionID o.l."""
+    n = len(open_tag)
+    while True:
+        pos = mm.find(open_tag, start, end)
+        if pos < 0 or mm[pos + n:pos + n + 1] in (b" ", b"\t", b"\r", b"\n", b">", b"/"):
+            return pos
+        start = pos + n
+
+
+def _find_gle(mm) -> Optional[Tuple[int, bytes]]:
+    pos = 0
+    while True:
+        pos = mm.find(b"GeneralLedgerEntries", pos)
+        if pos < 0:
+            return None
+        lt = mm.rfind(b"<", max(0, pos - 64), pos)
+        if lt >= 0:
+            m = _GLE_RE.match(mm[lt:pos + 21])
+            if m:
+                return lt, m.group(1)
+        pos += 20
+
+
+def scan_layout(path: Path, chunk_bytes: int) -> Optional[SaftLayout]:
+    """Skann path og del hver journal i biter på ca. chunk_bytes byte (hele transaksjoner)."""
+    chunk_bytes = max(1, int(chunk_bytes))
+    with open(path, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # tom fil
+            return None
+        try:
+            return _scan(mm, chunk_bytes)
+        finally:
+            mm.close()
+
+
+def _locate(mm) -> Optional[Tuple[bytes, bytes, bytes, bytes, int, int]]:
+    """(head, rotnavn, prefiks, GLE-starttagg, slutt på GLE-starttagg, start på </GLE>) eller None."""
+    first = mm[:_HEAD_LIMIT]
+    if first.startswith((b"\xff\xfe", b"\xfe\xff")) or b"\x00" in first[:512]:
+        return None  # UTF-16/32: byte-søk på ASCII-tagger virker ikke
+    root = None
+    for m in _ROOT_RE.finditer(first):
+        if m.group(1):
+            root = m
+            break
+    if root is None:
+        return None
+    root_end = first.find(b">", root.end())
+    if root_end < 0:
+        return None
+
+    gle = _find_gle(mm)
+    if gle is None:
+        return None
+    gle_start, prefix = gle
+    gle_open_end = mm.find(b">", gle_start) + 1
+    gle_end = mm.rfind(b"</" + prefix + b"GeneralLedgerEntries>")
+    if gle_open_end <= 0 or gle_end < gle_open_end:
+        return None
+    return first[:root_end + 1], root.group(1), prefix, mm[gle_start:gle_open_end], gle_open_end, gle_end
+
+
+def _journals(mm, prefix: bytes, start: int, gle_end: int) -> Iterator[Optional[Tuple[int, int, int, int]]]:
+    """(start, slutt på starttagg, start på </Journal>, første <Transaction> eller -1) pr journal.
+
+    Gir None (og stopper) for journaler som ikke kan avgrenses.
+    """
+    j_open, j_close = b"<" + prefix + b"Journal", b"</" + prefix + b"Journal>"
+    t_open = b"<" + prefix + b"Transaction"
+    pos = start
+    while True:
+        js = _find_tag(mm, j_open, pos, gle_end)
+        if js < 0:
+            return
+        jo_end = mm.find(b">", js) + 1
+        je = mm.find(j_close, jo_end, gle_end)
+        if jo_end <= 0 or je < 0 or mm[jo_end - 2:jo_end] == b"/>":
+            yield None
+            return
+        yield js, jo_end, je, _find_tag(mm, t_open, jo_end, je)
+        pos = je + len(j_close)
+
+
+def _scan(mm, chunk_bytes: int) -> Optional[SaftLayout]:
+    loc = _locate(mm)
+    if loc is None:
+        return None
+    head, root_qname, prefix, gle_open, gle_open_end, gle_end = loc
+    # arbeiderne trenger ferdige stamdata – de må ligge foran hovedboken
+    if _find_tag(mm, b"<" + prefix + b"MasterFiles", gle_end, len(mm)) >= 0:
+        return None
+
+    layout = SaftLayout(size=len(mm), head=head, root_qname=root_qname, prefix=prefix, gle_open=gle_open)
+    j_close_len = len(b"</" + prefix + b"Journal>")
+    t_close = b"</" + prefix + b"Transaction>"
+    for span in _journals(mm, prefix, gle_open_end, gle_end):
+        if span is None:
+            return None
+        js, jo_end, je, s = span
+        first_chunk = len(layout.chunks)
+        header = mm[jo_end:s] if s >= 0 else b""
+        if s >= 0:
+            last_end = mm.rfind(t_close, s, je) + len(t_close)
+            while s < last_end:
+                e = mm.find(t_close, s + chunk_bytes, last_end) if s + chunk_bytes < last_end else -1
+                e = last_end if e < 0 else e + len(t_close)
+                layout.chunks.append(Chunk(len(layout.journals), s, e))
+                s = e
+        layout.journals.append(JournalSpan(
+            start=js, end=je + j_close_len, open_tag=mm[js:jo_end], header=header,
+            first_chunk=first_chunk, n_chunks=len(layout.chunks) - first_chunk,
+        ))
+    return layout
+
+
+def resume_pieces(path: Path, tx_done: int) -> Optional[List[Piece]]:
+    """Dokument som fortsetter rett etter de tx_done første <Transaction> i hovedboken.
+
+    Resten av filen pakkes inn i rot-, GLE- og journal-taggene (med journalhodet),
+    slik at parseren kan fortsette fra et sjekkpunkt. None hvis filen ikke kan deles
+    eller har færre transaksjoner.
+    """
+    with open(path, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+        try:
+            loc = _locate(mm)
+            if loc is None or tx_done < 1:
+                return None
+            head, _root, prefix, gle_open, gle_open_end, gle_end = loc
+            t_close = b"</" + prefix + b"Transaction>"
+            left = tx_done
+            for span in _journals(mm, prefix, gle_open_end, gle_end):
+                if span is None:
+                    return None
+                js, jo_end, je, s = span
+                pos = s
+                while s >= 0 and left:
+                    e = mm.find(t_close, pos, je)
+                    if e < 0:
+                        break
+                    pos = e + len(t_close)
+                    left -= 1
+                if not left:
+                    return [head, gle_open, mm[js:jo_end], mm[jo_end:s], (pos, len(mm))]
+            return None
+        finally:
+            mm.close()
+
+
+class SpliceReader:
+    """Fil-lignende leser som setter sammen bytes og (start, slutt)-utsnitt av en fil.
+
+    Gis direkte til etree.iterparse (som bare trenger read(n)). progress(pos, size)
+    kalles med filposisjonen etter hvert utsnitt som leses (høyst én gang pr step byte).
+    """
+    def __init__(self, path: Path, pieces: List[Piece],
+                 progress: Optional[Callable[[int, int], None]] = None, step: int = 1 << 20):
+        self._fh = open(path, "rb")
+        self._pieces = list(pieces)
+        self._i = 0
+        self._pos = 0  # posisjon innen gjeldende bit
+        self._progress = progress
+        self._size = os.fstat(self._fh.fileno()).st_size
+        self._step = step
+        self._next = 0
+
+    def read(self, n: int = -1) -> bytes:
+        out: List[bytes] = []
+        want = n if n is not None and n >= 0 else None
+        while self._i < len(self._pieces) and (want is None or want > 0):
+            piece = self._pieces[self._i]
+            if isinstance(piece, bytes):
+                left = len(piece) - self._pos
+                take = left if want is None else min(left, want)
+                data = piece[self._pos:self._pos + take]
+            else:
+                start, end = piece
+                left = end - start - self._pos
+                take = left if want is None else min(left, want)
+                self._fh.seek(start + self._pos)
+                data = self._fh.read(take)
+                pos = start + self._pos + len(data)
+                if self._progress is not None and (pos >= self._next or pos == self._size):
+                    self._next = pos + self._step
+                    self._progress(pos, self._size)
+            out.append(data)
+            self._pos += len(data)
+            if want is not None:
+                want -= len(data)
+            if len(data) == left:
+                self._i += 1
+                self._pos = 0
+            elif not data:  # filen er kortere enn forventet
+                break
+        return b"".join(out)
+
+    def close(self) -> None:
+        self._fh.close()
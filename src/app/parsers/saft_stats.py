@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Statistikk pr tabell for en parser-kjøring (saft_stats.json), til oversikter
+som ikke skal lese tabellene på nytt.
+
+parse_saft skriver filen til slutt, ved siden av saft_manifest.json:
+
+    {"stats_version": 1, "format": "csv",
+     "tables": {"transactions": {"file": "transactions.csv", "bytes": 812345, "rows": 4000,
+                                 "columns": ["RecordID", ...],
+                                 "dates": {"TransactionDate": ["2025-01-02", "2025-12-30"]},
+                                 "totals": {"Debit": 1234.5, ...},
+                                 "distinct": {"AccountID": 42, ...}}, ...}}
+
+Parquet-tabeller får i tillegg "rejected": {"Debit": 3} når verdier ikke kunne
+lagres med kolonnetypen (de blir NULL; i CSV står teksten urørt).
+
+Radskriverne i saft_parser_pro fører en TableStats mens radene skrives:
+radantall, min/maks for kolonner av typen "date", summer ("amount") og
+mengden distinkte verdier (KEY_COLUMNS). Tabellene leses derfor ikke på nytt
+når de er lukket. Tabeller uten slike kolonner (f.eks. rådumpen) koster ingenting.
+
+Modulen bruker bare standardbiblioteket, så load_stats (og
+saft_dataset_overview) starter uten pandas/pyarrow.
+"""
+from __future__ import annotations
+
+import json
+import os
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+STATS_FILE = "saft_stats.json"
+STATS_VERSION = 1
+KEY_COLUMNS = ("AccountID", "CustomerID", "SupplierID", "VoucherID", "JournalID", "TaxCode", "InvoiceNo")
+
+
+def _tracked(columns: Iterable[str], types: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+    cols = list(columns)
+    return ([c for c in cols if types.get(c) == "date"],
+            [c for c in cols if types.get(c) == "amount"],
+            [c for c in cols if c in KEY_COLUMNS])
+
+
+def _iso_date(v: Any) -> Optional[str]:
+    """YYYY-MM-DD fra de første 10 tegnene, eller None hvis det ikke er en gyldig dato."""
+    d = str(v)[:10]
+    if len(d) != 10 or d[4] != "-" or d[7] != "-":
+        return None
+    try:
+        date.fromisoformat(d)
+    except ValueError:
+        return None
+    return d
+
+
+def _number(v: Any) -> Optional[float]:
+    """Beløp som float (mellomrom/NBSP som tusenskille tåles), ellers None."""
+    try:
+        x = float(v)
+    except (TypeError, ValueError):
+        try:
+            x = float(str(v).replace(" ", "").replace("\u00A0", ""))
+        except ValueError:
+            return None
+    return x if x == x else None   # NaN telles ikke
+
+
+class TableStats:
+    """Løpende statistikk for én tabell, oppdatert pr rad av radskriveren."""
+
+    def __init__(self, columns: Iterable[str], types: Dict[str, str]):
+        self.columns = list(columns)
+        self.dates, self.amounts, self.keys = _tracked(self.columns, types)
+        self.active = bool(self.dates or self.amounts or self.keys)
+        self.ranges: Dict[str, List[str]] = {}
+        self.totals: Dict[str, float] = dict.fromkeys(self.amounts, 0.0)
+        self.distinct: Dict[str, Set[str]] = {c: set() for c in self.keys}
+        self.rejected: Dict[str, int] = {}   # ført av _ParquetSink
+
+    def add(self, row: Dict[str, Any]) -> None:
+        for c in self.dates:
+            v = row.get(c)
+            if not v:
+                continue
+            r = self.ranges.get(c)
+            d = str(v)[:10]
+            if r is not None and r[0] <= d <= r[1]:
+                continue
+            d = _iso_date(d)   # valideres bare når min/maks ville endret seg
+            if d is None:
+                continue
+            if r is None:
+                self.ranges[c] = [d, d]
+            elif d < r[0]:
+                r[0] = d
+            else:
+                r[1] = d
+        for c in self.amounts:
+            v = row.get(c)
+            if v is not None and v != "":
+                x = _number(v)
+                if x is not None:
+                    self.totals[c] += x
+        for c in self.keys:
+            v = row.get(c)
+            if v is not None and v != "":
+                self.distinct[c].add(str(v))
+
+    def merge(self, other: "TableStats") -> None:
+        """Legg til statistikken fra en annen del av samme tabell (parallell parsing)."""
+        for c, (lo, hi) in other.ranges.items():
+            r = self.ranges.get(c)
+            self.ranges[c] = [lo, hi] if r is None else [min(r[0], lo), max(r[1], hi)]
+        for c, v in other.totals.items():
+            self.totals[c] = self.totals.get(c, 0.0) + v
+        for c, v in other.distinct.items():
+            self.distinct.setdefault(c, set()).update(v)
+        for c, n in other.rejected.items():
+            self.rejected[c] = self.rejected.get(c, 0) + n
+
+    def entry(self, path: Path, rows: int) -> Dict[str, Any]:
+        """Oppføringen i saft_stats.json for den lukkede tabellfilen path."""
+        path = Path(path)
+        entry = {"file": path.name, "bytes": path.stat().st_size,
+                 "rows": int(rows), "columns": list(self.columns),
+                 "dates": {c: list(self.ranges.get(c, [])) for c in self.dates},
+                 "totals": {c: round(self.totals[c], 4) for c in self.amounts},
+                 "distinct": {c: len(self.distinct[c]) for c in self.keys}}
+        if self.rejected:
+            entry["rejected"] = dict(self.rejected)
+        return entry
+
+
+def write_stats(outdir: Path, tables: Dict[str, Tuple[Path, int, TableStats]], fmt: str) -> Path:
+    """Skriv saft_stats.json for tables (navn -> (sti, rader, statistikk fra radskriveren))."""
+    doc = {
+        "stats_version": STATS_VERSION,
+        "format": fmt,
+        "tables": {name: stats.entry(path, rows) for name, (path, rows, stats) in tables.items()},
+    }
+    target = Path(outdir) / STATS_FILE
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(json.dumps(doc, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, target)
+    return target
+
+
+def load_stats(outdir: Path) -> Optional[Dict[str, Any]]:
+    """saft_stats.json i outdir, eller None hvis den mangler eller er ugyldig."""
+    try:
+        doc = json.loads((Path(outdir) / STATS_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(doc, dict) or doc.get("stats_version") != STATS_VERSION:
+        return None
+    return doc
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Felles, typet transaksjonslager for rapportene fra en SAF-T-mappe.
+
+make_subledger, make_general_ledger, make_trial_balance, _complete_accounts_file
+(run_saft_pro_gui) og generate_saldolist (ar_ap_saldolist) leste tidligere
+transactions.csv hver for seg med dtype=str og normaliserte kontoene på nytt.
+load_transactions(sti) gjør dette én gang:
+
+- AccountID normalisert (uten ledende nuller og ".0"), vektorisert
+- TransactionDate/PostingDate som datetime64 og Date = PostingDate ?? TransactionDate
+- Debit, Credit og TaxAmount som float (tomme = 0) og Amount = Debit - Credit
+- øvrige kolonner som tekst, akkurat som med dtype=str
+- order_account_date / order_date: stabile sorteringsrekkefølger (radposisjoner)
+- account_missing: rå AccountID tom eller parserens plassholder "UNDEFINED"
+  (normaliseringen gjør tom til "0", som ikke kan skilles fra konto "0000")
+
+Resultatet holdes i minnet for prosessen og lagres som Arrow IPC-fil
+(.saft_store/transactions.arrow ved siden av CSV-en). Filen minnekartlegges ved
+innlesing og konverteres kolonnevis uten å slå sammen blokker: tallkolonner uten
+tomme verdier deles med kartet, og tekst blir Arrow-baserte strenger med pandas
+sin standard strengtype i pandas 3 (eldre pandas lager Python-objekter, dvs. en
+full kopi av tekstkolonnene). Datoer med NaT kopieres. Lageret gjelder så lenge CSV-filens størrelse og mtime er uendret; ellers bygges
+det på nytt. Uten pyarrow brukes bare minnecachen.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# valgfri avhengighet for lagring på disk
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    _HAS_PYARROW = True
+except ImportError:  # pragma: no cover - avhenger av miljøet
+    pa = None  # type: ignore
+    pa_ipc = None  # type: ignore
+    _HAS_PYARROW = False
+
+STORE_DIR = ".saft_store"
+STORE_VERSION = 2
+AMOUNT_COLUMNS = ("Debit", "Credit", "TaxAmount")
+DATE_COLUMNS = ("TransactionDate", "PostingDate")
+_ORD_ACC_DATE = "__order_account_date"
+_ORD_DATE = "__order_date"
+_ACC_MISSING = "__account_missing"
+UNDEFINED_ACCOUNT = "UNDEFINED"   # saft_parser_pro sin plassholder for linjer uten konto
+
+_MEMO: Dict[Path, Tuple[Tuple[int, int], "TxStore"]] = {}
+
+
+def norm_acc_series(s: pd.Series) -> pd.Series:
+    """Vektorisert _norm_acc: trim, fjern ".0" på slutten og ledende nuller (tom -> "0")."""
+    s = s.astype(str).str.strip()
+    s = s.where(~s.str.endswith(".0"), s.str[:-2])
+    s = s.str.lstrip("0")
+    return s.mask(s == "", "0")
+
+
+@dataclass
+class TxStore:
+    """Typede transaksjoner for én transactions.csv, med ferdige sorteringsrekkefølger."""
+    source: Path
+    frame: pd.DataFrame
+    order_account_date: np.ndarray   # radposisjoner sortert på (AccountID, Date), stabilt
+    order_date: np.ndarray           # radposisjoner sortert på Date (NaT sist), stabilt
+    account_missing: np.ndarray      # bool pr rad: rå AccountID tom eller UNDEFINED
+
+    def transactions(self) -> pd.DataFrame:
+        """Kopi av transaksjonene som rapportene kan endre fritt (copy-on-write)."""
+        return self.frame.copy(deep=False)
+
+
+def _build(csv_path: Path) -> Optional[TxStore]:
+    try:
+        tx = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
+    except Exception:
+        return None
+    for c in DATE_COLUMNS:
+        if c in tx.columns:
+            tx[c] = pd.to_datetime(tx[c], errors="coerce")
+    if {"PostingDate", "TransactionDate"}.issubset(tx.columns):
+        tx["Date"] = tx["PostingDate"].fillna(tx["TransactionDate"])
+    if "AccountID" in tx.columns:
+        raw = tx["AccountID"].str.strip()
+        missing = ((raw == "") | (raw == UNDEFINED_ACCOUNT)).to_numpy(dtype=bool)
+        tx["AccountID"] = norm_acc_series(tx["AccountID"])
+    else:
+        missing = np.ones(len(tx), dtype=bool)
+    for c in AMOUNT_COLUMNS:
+        if c in tx.columns:
+            tx[c] = pd.to_numeric(tx[c], errors="coerce").fillna(0.0)
+    if {"Debit", "Credit"}.issubset(tx.columns):
+        tx["Amount"] = tx["Debit"] - tx["Credit"]
+
+    n = len(tx)
+    keys = [c for c in ("AccountID", "Date") if c in tx.columns]
+    pos = pd.RangeIndex(n)
+    order_acc = (tx[keys].set_axis(pos).sort_values(keys, kind="stable").index.to_numpy()
+                 if keys else np.arange(n))
+    order_date = (tx["Date"].set_axis(pos).sort_values(kind="stable").index.to_numpy()
+                  if "Date" in tx.columns else np.arange(n))
+    return TxStore(csv_path, tx, order_acc.astype(np.int64), order_date.astype(np.int64), missing)
+
+
+def _store_path(csv_path: Path) -> Path:
+    return csv_path.parent / STORE_DIR / f"{csv_path.stem}.arrow"
+
+
+def _stamp_meta(stamp: Tuple[int, int]) -> Dict[bytes, bytes]:
+    return {b"saft_store": f"{STORE_VERSION}:{stamp[0]}:{stamp[1]}".encode()}
+
+
+def _read_ipc(path: Path, stamp: Tuple[int, int], csv_path: Path) -> Optional[TxStore]:
+    try:
+        with pa.memory_map(str(path), "r") as src:
+            table = pa_ipc.open_file(src).read_all()
+    except Exception:
+        return None
+    if (table.schema.metadata or {}).get(b"saft_store") != _stamp_meta(stamp)[b"saft_store"]:
+        return None
+    order_acc = table.column(_ORD_ACC_DATE).to_numpy()
+    order_date = table.column(_ORD_DATE).to_numpy()
+    missing = table.column(_ACC_MISSING).to_numpy()
+    # split_blocks: én blokk pr kolonne, så kolonner fra kartet ikke kopieres sammen
+    frame = table.drop_columns([_ORD_ACC_DATE, _ORD_DATE, _ACC_MISSING]).to_pandas(split_blocks=True)
+    return TxStore(csv_path, frame, order_acc, order_date, missing)
+
+
+def _write_ipc(store: TxStore, path: Path, stamp: Tuple[int, int]) -> None:
+    table = pa.Table.from_pandas(store.frame, preserve_index=False)
+    table = table.append_column(_ORD_ACC_DATE, pa.array(store.order_account_date, pa.int64()))
+    table = table.append_column(_ORD_DATE, pa.array(store.order_date, pa.int64()))
+    table = table.append_column(_ACC_MISSING, pa.array(store.account_missing, pa.bool_()))
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **_stamp_meta(stamp)})
+    path.parent.mkdir(exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with pa.OSFile(str(tmp), "wb") as sink, pa_ipc.new_file(sink, table.schema) as w:
+        w.write_table(table)
+    tmp.replace(path)
+
+
+def load_transactions(csv_path: Path) -> Optional[TxStore]:
+    """Typet lager for csv_path (fra minnet, Arrow-filen eller bygget fra CSV).
+
+    Returnerer None hvis CSV-en ikke finnes eller ikke kan leses.
+    """
+    csv_path = Path(csv_path).resolve()
+    try:
+        st = csv_path.stat()
+    except OSError:
+        return None
+    stamp = (st.st_size, st.st_mtime_ns)
+    hit = _MEMO.get(csv_path)
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+
+    store = None
+    ipc = _store_path(csv_path)
+    if _HAS_PYARROW and ipc.exists():
+        store = _read_ipc(ipc, stamp, csv_path)
+    if store is None:
+        store = _build(csv_path)
+        if store is None:
+            return None
+        if _HAS_PYARROW:
+            try:
+                _write_ipc(store, ipc, stamp)
+            except Exception:
+                pass  # skrivebeskyttet mappe o.l.: minnecachen holder
+    _MEMO[csv_path] = (stamp, store)
+    return store
+
+
+def clear_cache() -> None:
+    """Tøm minnecachen (Arrow-filene på disk beholdes)."""
+    _MEMO.clear()
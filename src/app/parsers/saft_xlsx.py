@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Strømmende Excel-skriving for store SAF-T-rapporter (general_ledger.xlsx o.l.).
+
+pandas.to_excel bygger hele arket i minnet før det skrives; for hovedbøker med
+millioner av linjer krever det flere GB og feiler over Excels radgrense.
+XlsxStream skriver med xlsxwriter i constant_memory-modus:
+
+- rader skrives bit for bit (CHUNK_ROWS om gangen), og hver rad flushes til
+  disk før neste, så minnebruken er konstant uansett antall linjer
+- når et ark når EXCEL_MAX_ROWS fortsetter det i "<navn>_2", "<navn>_3", ...
+  (overskriftsraden gjentas)
+- kolonneformat settes én gang pr kolonne: datoer (datetime64) som
+  yyyy-mm-dd, desimaltall som #,##0.00; cellene selv får ikke eget format
+- order: valgfri rekkefølge (radposisjoner), så en sortert visning kan
+  skrives uten å lage en sortert kopi av hele tabellen
+
+Bruk:
+    with XlsxStream(outdir / "general_ledger.xlsx") as xs:
+        xs.write_frame(tx, "GeneralLedger", order=store.order_account_date)
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+EXCEL_MAX_ROWS = 1_048_576
+CHUNK_ROWS = 50_000
+SHEET_NAME_MAX = 31
+DATE_FORMAT = "yyyy-mm-dd"
+NUMBER_FORMAT = "#,##0.00"
+_EXCEL_EPOCH = np.datetime64("1899-12-30", "ns")
+_DAY_NS = 86_400_000_000_000
+
+
+def _sheet_name(base: str, part: int) -> str:
+    if part == 1:
+        return base[:SHEET_NAME_MAX]
+    suffix = f"_{part}"
+    return base[:SHEET_NAME_MAX - len(suffix)] + suffix
+
+
+def _excel_dates(s: pd.Series) -> np.ndarray:
+    """datetime64 -> Excel-serienummer (float, NaN for NaT), vektorisert."""
+    vals = s.to_numpy(dtype="datetime64[ns]")
+    out = (vals - _EXCEL_EPOCH).astype("int64") / _DAY_NS
+    out[np.isnat(vals)] = np.nan
+    return out
+
+
+def _cell_values(s: pd.Series) -> List[Any]:
+    """Kolonne som Python-verdier for xlsxwriter (manglende verdi -> None = tom celle)."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        vals = _excel_dates(s)
+    else:
+        vals = s.to_numpy()
+    if vals.dtype.kind == "f":
+        obj = vals.astype(object)
+        obj[np.isnan(vals)] = None
+        return obj.tolist()
+    if vals.dtype.kind in "iub":
+        return vals.tolist()
+    obj = vals.astype(object)
+    obj[pd.isna(obj)] = None
+    return obj.tolist()
+
+
+class XlsxStream:
+    """Én .xlsx-fil skrevet ark for ark med konstant minnebruk."""
+
+    def __init__(self, path: Path, max_rows: int = EXCEL_MAX_ROWS, chunk_rows: int = CHUNK_ROWS) -> None:
+        import xlsxwriter   # lastes først ved skriving, som med pandas' engine="xlsxwriter"
+
+        if max_rows < 2:
+            raise ValueError("max_rows må gi plass til overskrift og minst én rad")
+        self.path = Path(path)
+        self.max_rows = max_rows
+        self.chunk_rows = max(1, chunk_rows)
+        self._wb = xlsxwriter.Workbook(str(self.path), {
+            "constant_memory": True,
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+            "strings_to_numbers": False,
+        })
+        self._header = self._wb.add_format({"bold": True, "border": 1})
+        self._date = self._wb.add_format({"num_format": DATE_FORMAT})
+        self._number = self._wb.add_format({"num_format": NUMBER_FORMAT})
+
+    def _column_formats(self, df: pd.DataFrame) -> List[Any]:
+        fmts = []
+        for c in df.columns:
+            s = df[c]
+            if pd.api.types.is_datetime64_any_dtype(s):
+                fmts.append(self._date)
+            elif pd.api.types.is_float_dtype(s):
+                fmts.append(self._number)
+            else:
+                fmts.append(None)
+        return fmts
+
+    def _new_sheet(self, name: str, columns: Sequence[str], fmts: List[Any]):
+        ws = self._wb.add_worksheet(name)
+        for i, fmt in enumerate(fmts):
+            if fmt is not None:
+                ws.set_column(i, i, None, fmt)
+        ws.write_row(0, 0, [str(c) for c in columns], self._header)
+        return ws
+
+    def write_frame(self, df: pd.DataFrame, sheet_name: str, order: Optional[np.ndarray] = None) -> List[str]:
+        """Skriv df (i rekkefølgen order, om gitt) til ett eller flere ark.
+
+        Returnerer navnene på arkene som ble laget; et tomt datasett gir ett ark
+        med bare overskriften.
+        """
+        columns = list(df.columns)
+        fmts = self._column_formats(df)
+        positions = np.arange(len(df)) if order is None else np.asarray(order)
+        per_sheet = self.max_rows - 1
+        part = 1
+        ws = self._new_sheet(_sheet_name(sheet_name, part), columns, fmts)
+        names = [ws.get_name()]
+        row = 1
+        for start in range(0, len(positions), self.chunk_rows):
+            chunk = df.take(positions[start:start + self.chunk_rows])
+            cols = [_cell_values(chunk.iloc[:, j]) for j in range(len(columns))]
+            for values in zip(*cols):
+                if row > per_sheet:
+                    part += 1
+                    ws = self._new_sheet(_sheet_name(sheet_name, part), columns, fmts)
+                    names.append(ws.get_name())
+                    row = 1
+                ws.write_row(row, 0, values)
+                row += 1
+        return names
+
+    def close(self) -> None:
+        self._wb.close()
+
+    def __enter__(self) -> "XlsxStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -1,11 +1,17 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-import os, sys, json, re, hashlib, datetime as dt
+import os, sys, json, re, base64, hashlib, functools, operator, datetime as dt
 from pathlib import Path
-from typing import Tuple, Dict, Any, Optional
+from typing import Tuple, Dict, Any, Optional, Iterable, Sequence, List
 
 import pandas as pd
 
+try:
+    import pyarrow  # noqa: F401
+    _HAS_PYARROW = True
+except Exception:
+    _HAS_PYARROW = False
+
 # Stioppsett: støtt både "app.services.*" og "services.*"
 SRC = Path(__file__).resolve().parents[2]
 if str(SRC) not in sys.path:
@@ -15,21 +21,23 @@ def _imports():
     try:
         from app.services.clients import load_meta
         from app.services.versioning import resolve_active_raw_file
-        from app.services.io import read_raw
-        from app.services.mapping import ensure_mapping_interactive, standardize_with_mapping
+        from app.services.io import read_head, read_raw_hashed
+        from app.services.mapping import (ensure_mapping_interactive, standardize_with_mapping,
+                                          _bnr_key_series, _STR_DTYPE)
         from app.services.regnskapslinjer import try_map_saldobalanse_to_regnskapslinjer
     except Exception:
         from services.clients import load_meta                          # type: ignore
         from services.versioning import resolve_active_raw_file          # type: ignore
-        from services.io import read_raw                                 # type: ignore
-        from services.mapping import ensure_mapping_interactive, standardize_with_mapping  # type: ignore
+        from services.io import read_head, read_raw_hashed              # type: ignore
+        from services.mapping import (ensure_mapping_interactive, standardize_with_mapping,  # type: ignore
+                                      _bnr_key_series, _STR_DTYPE)
         from services.regnskapslinjer import try_map_saldobalanse_to_regnskapslinjer      # type: ignore
-    return (load_meta, resolve_active_raw_file, read_raw,
-            ensure_mapping_interactive, standardize_with_mapping,
+    return (load_meta, resolve_active_raw_file, read_head, read_raw_hashed,
+            ensure_mapping_interactive, standardize_with_mapping, _bnr_key_series, _STR_DTYPE,
             try_map_saldobalanse_to_regnskapslinjer)
 
-(load_meta, resolve_active_raw_file, read_raw,
- ensure_mapping_interactive, standardize_with_mapping,
+(load_meta, resolve_active_raw_file, read_head, read_raw_hashed,
+ ensure_mapping_interactive, standardize_with_mapping, _bnr_key_series, _STR_DTYPE,
  try_map_saldobalanse_to_regnskapslinjer) = _imports()
 
 # ------------------------- hjelpere -------------------------
@@ -49,10 +57,6 @@ def _find_col_priority(df: pd.DataFrame, key: str) -> Optional[str]:
                 return c
     return None
 
-def _bnr_key(x) -> Optional[str]:
-    if x is None: return None
-    return re.sub(r"[^0-9a-z]+", "", str(x).lower()) or None
-
 def _konto_key_series(s: pd.Series) -> pd.Series:
     if pd.api.types.is_numeric_dtype(s):
         return pd.to_numeric(s, errors="coerce").round(0).astype("Int64").astype(str)
@@ -89,20 +93,20 @@ def _choose_konto_kontonavn(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
+_SUMMARY_RE = r"(?i)(?:totalt\s*bel|^sum(?: |$))"
+
 def _remove_summary_rows(df: pd.DataFrame) -> pd.DataFrame:
     """Fjern rader som ser ut som summer/«Totalt beløp»."""
     txt_cols = [c for c in ("konto","kontonavn","tekst") if c in df.columns]
     if not txt_cols: return df
-    patt = re.compile(r"(totalt\s*bel|^sum( |$))", re.IGNORECASE)
-    mask = pd.Series(True, index=df.index)
+    bad = pd.Series(False, index=df.index)
     for c in txt_cols:
-        s = df[c].astype(str)
-        bad = s.str.contains(patt, na=False, regex=True)
-        if "konto" in df.columns:
-            kontostr = df["konto"].astype(str)
-            bad = bad & ~kontostr.str.fullmatch(r"\d+", na=False)
-        mask &= ~bad
-    return df[mask].reset_index(drop=True)
+        bad |= df[c].astype(_STR_DTYPE).str.contains(_SUMMARY_RE, na=False, regex=True).to_numpy(bool)
+    if not bad.any():
+        return df
+    if "konto" in df.columns:
+        bad &= ~df["konto"].astype(_STR_DTYPE).str.fullmatch(r"\d+", na=False).to_numpy(bool)
+    return df[~bad].reset_index(drop=True)
 
 def _sha256_file(p: Path, block: int = 1 << 20) -> str:
     h = hashlib.sha256()
@@ -113,6 +117,29 @@ def _sha256_file(p: Path, block: int = 1 << 20) -> str:
             h.update(b)
     return h.hexdigest()
 
+# Fingeravtrykk av råfilen: stat-feltene er gratis (ingen lesing), prøve-hashen
+# leser bare hode og hale. Full SHA-256 trengs kun når disse ikke avgjør saken.
+FINGERPRINT_SAMPLE_BYTES = 64 * 1024
+_STAT_KEYS = ("size", "mtime_ns", "inode")
+
+def _stat_fingerprint(p: Path) -> Dict[str, Any]:
+    st = p.stat()
+    return {"size": int(st.st_size), "mtime_ns": int(st.st_mtime_ns), "inode": int(st.st_ino)}
+
+def _sample_sha256(p: Path, sample_bytes: int = FINGERPRINT_SAMPLE_BYTES) -> str:
+    """SHA-256 av de første og siste sample_bytes (hele filen hvis den er mindre)."""
+    h = hashlib.sha256()
+    with p.open("rb") as f:
+        h.update(f.read(sample_bytes))
+        size = f.seek(0, os.SEEK_END)
+        if size > sample_bytes:
+            f.seek(max(sample_bytes, size - sample_bytes))
+            h.update(f.read(sample_bytes))
+    return h.hexdigest()
+
+def _same_stat(a: Optional[Dict[str, Any]], b: Dict[str, Any]) -> bool:
+    return bool(a) and all(a.get(k) == b[k] for k in _STAT_KEYS)
+
 def _sha256_json(o: Any) -> str:
     s = json.dumps(o, sort_keys=True, default=str, ensure_ascii=False).encode("utf-8")
     return hashlib.sha256(s).hexdigest()
@@ -122,23 +149,216 @@ def _dataset_paths(version_dir: Path, source: str) -> Tuple[Path, Path]:
     processed.mkdir(parents=True, exist_ok=True)
     return processed / f"{source}.parquet", processed / f"{source}.manifest.json"
 
+# Radgrupper på ~64k linjer: hovedboken er datosortert, så min/max-statistikken
+# for dato pr radgruppe lar lesere hoppe over alt utenfor en periode.
+ROW_GROUP_ROWS = 65_536
+
 def _write_dataset(df: pd.DataFrame, out: Path) -> Tuple[Path, str]:
     """Forsøk Parquet, fallback til pickle hvis pyarrow mangler."""
     try:
-        df.to_parquet(out, index=False)
+        df.to_parquet(out, index=False, row_group_size=ROW_GROUP_ROWS)
         return out, "parquet"
     except Exception:
         out_pkl = out.with_suffix(".pkl")
         df.to_pickle(out_pkl)
         return out_pkl, "pickle"
 
+# Hovedbok skrives partisjonert: én Parquet-fil pr måned i <kilde>/ (f.eks.
+# processed/hovedbok/2025-01.parquet). Manifestet holder radantall og
+# innholdshash pr periode, så en ny måned bare skriver sin egen fil.
+MANIFEST_VERSION = 2
+PERIOD_FORMAT = "%Y-%m"
+NO_PERIOD = "ukjent"          # rader uten gyldig dato
+
+def _period_keys(dato: pd.Series) -> pd.Series:
+    return pd.to_datetime(dato, errors="coerce").dt.strftime(PERIOD_FORMAT).fillna(NO_PERIOD)
+
+def _period_key(x: Any) -> str:
+    """'2025-01', dato eller Timestamp -> 'YYYY-MM'."""
+    return pd.Period(x, freq="M").strftime(PERIOD_FORMAT)
+
+def _frame_sha256(df: pd.DataFrame, schema: Any = None) -> str:
+    h = hashlib.sha256(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode("utf-8"))
+    if schema is not None:
+        h.update(schema.serialize().to_pybytes())
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _dataset_schema(df: pd.DataFrame):
+    """Ett Arrow-skjema for hele datasettet. Pr periode ville en måned uten f.eks.
+    bilagsnr gitt kolonnetypen null og gjort periodefilene uforenlige."""
+    import pyarrow as pa
+    return pa.Schema.from_pandas(df, preserve_index=False)
+
+def _schema_to_json(schema) -> str:
+    return base64.b64encode(schema.serialize().to_pybytes()).decode("ascii")
+
+def _schema_from_json(s: str):
+    import pyarrow as pa
+    return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(s)))
+
+def _write_partitioned(df: pd.DataFrame, out_dir: Path,
+                       previous: Optional[Dict[str, Dict[str, Any]]] = None,
+                       schema: Any = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Skriv df som én fil pr periode i out_dir og returner {periode: {file, rows, sha256}}.
+    Alle filer skrives med samme skjema (default: utledet fra hele df).
+    Perioder med samme innholdshash som i previous skrives ikke på nytt;
+    perioder som ikke lenger finnes slettes.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as papq
+
+    previous = previous or {}
+    schema = schema if schema is not None else _dataset_schema(df)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    periods = _period_keys(df["dato"])
+    parts: Dict[str, Dict[str, Any]] = {}
+    for period, idx in sorted(periods.groupby(periods).indices.items()):
+        part = df.take(idx).reset_index(drop=True)
+        sha = _frame_sha256(part, schema)
+        target = out_dir / f"{period}.parquet"
+        prev = previous.get(period) or {}
+        if prev.get("sha256") != sha or not target.exists():
+            tmp = out_dir / f".{period}.parquet.tmp"   # punktum-prefiks: ignoreres av Parquet-lesere
+            table = pa.Table.from_pandas(part, schema=schema, preserve_index=False)
+            papq.write_table(table, tmp, row_group_size=ROW_GROUP_ROWS)
+            os.replace(tmp, target)
+        parts[period] = {"file": target.name, "rows": int(len(part)), "sha256": sha}
+    for stale in out_dir.glob("*.parquet"):
+        if stale.stem not in parts:
+            stale.unlink()
+    return parts
+
+def _partition_schema(d: Path):
+    """Datasettskjemaet fra manifestet ved siden av mappen (None hvis det mangler)."""
+    mani = d.with_suffix(".manifest.json")
+    try:
+        s = json.loads(mani.read_text(encoding="utf-8")).get("arrow_schema")
+        return _schema_from_json(s) if s else None
+    except Exception:
+        return None
+
+def _partition_files(d: Path, periods: Optional[Iterable[Any]], date_bounds) -> List[Path]:
+    """Periodefilene som kan inneholde rader for periods/datoperioden."""
+    files = sorted(d.glob("*.parquet"))
+    wanted = {_period_key(x) for x in periods} if periods is not None else None
+    lo, hi = date_bounds
+    out = []
+    for f in files:
+        if wanted is not None and f.stem not in wanted:
+            continue
+        if lo is not None or hi is not None:
+            if f.stem == NO_PERIOD:
+                continue
+            start = pd.Period(f.stem, freq="M").start_time
+            if (hi is not None and start >= hi) or (lo is not None and start + pd.offsets.MonthBegin(1) <= lo):
+                continue
+        out.append(f)
+    return out
+
 def _read_dataset(p: Path) -> pd.DataFrame:
+    if p.is_dir():
+        schema = _partition_schema(p)
+        return pd.read_parquet(p, schema=schema) if schema is not None else pd.read_parquet(p)
     if p.suffix == ".parquet":
         return pd.read_parquet(p)
     if p.suffix == ".pkl":
         return pd.read_pickle(p)
     raise ValueError(f"Ukjent datasettformat: {p}")
 
+def _account_ranges(accounts: Iterable[Any]) -> List[Tuple[int, int]]:
+    """Konti som enkeltverdier eller (fra, til)-par -> liste av inklusive heltallsintervaller."""
+    out: List[Tuple[int, int]] = []
+    for a in accounts:
+        lo, hi = a if isinstance(a, (tuple, list)) else (a, a)
+        lo_d, hi_d = re.sub(r"\D", "", str(lo)), re.sub(r"\D", "", str(hi))
+        if not lo_d or not hi_d:
+            raise ValueError(f"Ugyldig konto/kontointervall: {a!r}")
+        out.append((int(lo_d), int(hi_d)))
+    return out
+
+def _date_bounds(date_from: Any, date_to: Any) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+    """[fra, til+1 dag) – til-datoen er inklusiv for hele dagen."""
+    lo = pd.Timestamp(date_from).normalize() if date_from is not None else None
+    hi = pd.Timestamp(date_to).normalize() + pd.Timedelta(days=1) if date_to is not None else None
+    return lo, hi
+
+def _periods_as_bounds(periods: Iterable[Any], date_bounds):
+    """Omsluttende datoperiode for periods (første til siste måned)."""
+    ps = sorted(pd.Period(x, freq="M") for x in periods)
+    if not ps:
+        return date_bounds
+    lo, hi = ps[0].start_time, ps[-1].end_time.normalize() + pd.Timedelta(days=1)
+    if date_bounds[0] is not None: lo = max(lo, date_bounds[0])
+    if date_bounds[1] is not None: hi = min(hi, date_bounds[1])
+    return lo, hi
+
+def _filter_frame(df: pd.DataFrame, date_bounds, ranges, keys) -> pd.DataFrame:
+    """Samme filtre som load_canonical_dataset, i pandas (pickle eller ikke-pushbare kolonner)."""
+    mask = pd.Series(True, index=df.index)
+    lo, hi = date_bounds
+    if (lo is not None or hi is not None) and "dato" in df.columns:
+        d = pd.to_datetime(df["dato"], errors="coerce")
+        if lo is not None: mask &= d >= lo
+        if hi is not None: mask &= d < hi
+    if ranges is not None and "konto" in df.columns:
+        k = pd.to_numeric(_konto_key_series(df["konto"]), errors="coerce")
+        hit = pd.Series(False, index=df.index)
+        for a, b in ranges:
+            hit |= k.between(a, b)
+        mask &= hit
+    if keys is not None:
+        if "__bnr_key__" in df.columns:
+            mask &= df["__bnr_key__"].isin(keys)
+        elif "bilagsnr" in df.columns:
+            mask &= _bnr_key_series(df["bilagsnr"]).isin(keys)
+    return df[mask].reset_index(drop=True)
+
+def _query_parquet(files: Sequence[Path], columns, date_bounds, ranges, keys, schema: Any = None) -> pd.DataFrame:
+    """Les bare valgte kolonner; dato/konto/bilag skyves ned til radgrupper og Arrow-skann."""
+    import pyarrow as pa
+    import pyarrow.dataset as pads
+
+    dset = pads.dataset([str(f) for f in files], format="parquet", schema=schema)
+    schema = dset.schema
+    exprs: list = []
+    pushed = set()
+    lo, hi = date_bounds
+    if (lo is not None or hi is not None) and "dato" in schema.names \
+            and pa.types.is_timestamp(schema.field("dato").type):
+        f = pads.field("dato")
+        if lo is not None: exprs.append(f >= pa.scalar(lo.to_pydatetime()))
+        if hi is not None: exprs.append(f < pa.scalar(hi.to_pydatetime()))
+        pushed.add("dato")
+    if ranges is not None and "konto" in schema.names and pa.types.is_integer(schema.field("konto").type):
+        f = pads.field("konto")
+        exprs.append(functools.reduce(operator.or_, [(f >= a) & (f <= b) for a, b in ranges]))
+        pushed.add("konto")
+    if keys is not None and "__bnr_key__" in schema.names:
+        exprs.append(pads.field("__bnr_key__").isin(list(keys)))
+        pushed.add("bilag")
+    expr = functools.reduce(operator.and_, exprs) if exprs else None
+
+    rest = {"dato": lo is not None or hi is not None, "konto": ranges is not None,
+            "bilag": keys is not None}
+    rest = {k for k, v in rest.items() if v and k not in pushed}
+    need = {"dato": ["dato"], "konto": ["konto"], "bilag": ["__bnr_key__", "bilagsnr"]}
+    read_cols = None
+    if columns is not None:
+        read_cols = [c for c in columns if c in schema.names]
+        for k in rest:
+            read_cols += [c for c in need[k] if c in schema.names and c not in read_cols]
+    df = dset.to_table(columns=read_cols, filter=expr).to_pandas()
+    if rest:
+        df = _filter_frame(df,
+                           date_bounds if "dato" in rest else (None, None),
+                           ranges if "konto" in rest else None,
+                           keys if "bilag" in rest else None)
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
 def _canonicalize(df: pd.DataFrame, source: str) -> pd.DataFrame:
     df = _choose_konto_kontonavn(df)
 
@@ -150,10 +370,11 @@ def _canonicalize(df: pd.DataFrame, source: str) -> pd.DataFrame:
         first = [c for c in ["konto","kontonavn","inngående balanse","endring","utgående balanse"] if c in df.columns]
         df = df[first + [c for c in df.columns if c not in first]]
     else:  # hovedbok
-        if "bilagsnr" in df.columns:
-            df["__bnr_key__"] = df["bilagsnr"].map(_bnr_key)
-        if "dato" in df.columns:
-            try: df = df.sort_values("dato").reset_index(drop=True)
+        if "bilagsnr" in df.columns and "__bnr_key__" not in df.columns:
+            df["__bnr_key__"] = _bnr_key_series(df["bilagsnr"])
+        # Allerede datosortert kilde (vanlig for hovedbokseksport): hopp over sorteringen
+        if "dato" in df.columns and not df["dato"].is_monotonic_increasing:
+            try: df = df.sort_values("dato", kind="stable").reset_index(drop=True)
             except Exception: pass
 
     return df
@@ -165,45 +386,98 @@ def ensure_parquet_fresh(parent,
                          client: str,
                          year: int,
                          source: str,  # "hovedbok" | "saldobalanse"
-                         vtype: str    # "ao" | "interim" | "versjon"
+                         vtype: str,   # "ao" | "interim" | "versjon"
+                         verify: bool = False
                          ) -> Tuple[Path, Dict[str, Any]]:
     """
     Returnerer (dataset_path, manifest). Regenererer datasett når råfil eller mapping er endret.
+
+    Ferskhet sjekkes trinnvis mot manifestets raw_fingerprint:
+      1) størrelse, mtime_ns og inode uendret -> ferskt uten å lese råfilen
+         (mapping-preview bygges fra manifestets raw_columns)
+      2) ellers hashes hode/hale; avviker størrelse eller prøve er filen endret
+      3) ellers avgjør full SHA-256; er innholdet likt oppdateres fingeravtrykket
+    verify=True hopper over trinn 1 og krever full hash.
     """
     meta = load_meta(root_dir, client)
     raw_path = resolve_active_raw_file(root_dir, client, year, source, vtype, meta)
     if not raw_path:
         raise FileNotFoundError(f"Ingen aktiv versjon for {source}/{vtype} {year}.")
 
-    version_dir = Path(raw_path).parents[1]  # …/vYYYY…/
+    raw_path = Path(raw_path)
+    version_dir = raw_path.parents[1]  # …/vYYYY…/
     dataset_path, manifest_path = _dataset_paths(version_dir, source)
 
-    raw_sha = _sha256_file(Path(raw_path))
-
-    # Hent mapping (viser dialog første gang) – bruk preview for mapping
-    df_prev, _ = read_raw(Path(raw_path))
-    mapping = ensure_mapping_interactive(parent, root_dir, client, year, source, df_prev.head(1000))
+    old: Optional[Dict[str, Any]] = None
+    if manifest_path.exists():
+        try:
+            old = json.loads(manifest_path.read_text(encoding="utf-8"))
+        except Exception:
+            old = None
+    fp = _stat_fingerprint(raw_path)
+    old_fp = (old or {}).get("raw_fingerprint") or {}
+    stat_same = not verify and _same_stat(old_fp, fp) and bool((old or {}).get("raw_columns"))
+
+    # Hent mapping (viser dialog første gang). Mappingen avhenger bare av
+    # kolonnenavnene, så en uendret fil trenger ingen preview fra disk.
+    if stat_same:
+        df_prev = pd.DataFrame(columns=old["raw_columns"])
+    else:
+        df_prev, _ = read_head(raw_path, 1000)
+    mapping = ensure_mapping_interactive(parent, root_dir, client, year, source, df_prev)
     mapping_sha = _sha256_json(mapping)
 
     # Hvis manifest finnes og matcher, bruk det
-    if manifest_path.exists():
+    if old is not None:
         try:
-            old = json.loads(manifest_path.read_text(encoding="utf-8"))
-            if old.get("raw_sha256") == raw_sha and old.get("mapping_sha256") == mapping_sha:
-                data_path = Path(old.get("dataset_path", str(dataset_path)))
-                if data_path.exists():
+            data_path = Path(old.get("dataset_path", str(dataset_path)))
+            if (old.get("schema_version") == MANIFEST_VERSION
+                    and old.get("mapping_sha256") == mapping_sha and data_path.exists()):
+                if stat_same:
                     return data_path, old
+                if fp["size"] == old_fp.get("size", fp["size"]):
+                    fp["sample_sha256"] = _sample_sha256(raw_path)
+                    if (old_fp.get("sample_sha256") in (None, fp["sample_sha256"])
+                            and old.get("raw_sha256") == _sha256_file(raw_path)):
+                        old["raw_fingerprint"] = fp
+                        old["raw_columns"] = [str(c) for c in df_prev.columns]
+                        manifest_path.write_text(json.dumps(old, ensure_ascii=False, indent=2), encoding="utf-8")
+                        return data_path, old
         except Exception:
             pass  # fall through
 
-    # Regenerer datasett
-    df_raw, _ = read_raw(Path(raw_path))
+    # Regenerer datasett – råfilen hashes mens den leses (ett gjennomløp).
+    # Fingeravtrykket tas før lesing, så en fil som endres underveis sjekkes på nytt.
+    fp = _stat_fingerprint(raw_path)
+    fp["sample_sha256"] = _sample_sha256(raw_path)
+    df_raw, _, raw_sha = read_raw_hashed(raw_path)
+    raw_columns = [str(c) for c in df_raw.columns]
     df_std = standardize_with_mapping(df_raw, mapping=mapping,
                                       parse_dates=True,
                                       numeric_fields=("beløp","mvabeløp","inngående balanse","utgående balanse"))
     df_std = _canonicalize(_remove_summary_rows(df_std), source)
 
-    out_path, fmt = _write_dataset(df_std, dataset_path)
+    partitions: Optional[Dict[str, Dict[str, Any]]] = None
+    if source == "hovedbok" and "dato" in df_std.columns and _HAS_PYARROW:
+        out_path, fmt = dataset_path.with_suffix(""), "parquet-partitioned"
+        prev_parts = None
+        if old and old.get("format") == fmt and old.get("dataset_path") == str(out_path):
+            prev_parts = old.get("partitions")
+        arrow_schema = _dataset_schema(df_std)
+        partitions = _write_partitioned(df_std, out_path, prev_parts, arrow_schema)
+    else:
+        out_path, fmt = _write_dataset(df_std, dataset_path)
+    # forrige layout (én fil / pickle / mappe) ryddes bort når den er erstattet
+    prev = Path(old["dataset_path"]) if old and old.get("dataset_path") else None
+    if prev is not None and prev != out_path and prev.parent == dataset_path.parent:
+        try:
+            if prev.is_dir():
+                for f in prev.glob("*.parquet"): f.unlink()
+                prev.rmdir()
+            elif prev.exists():
+                prev.unlink()
+        except OSError:
+            pass
 
     # ---------------- REGNSKAPSLINJER (kun for saldobalanse) ----------------
     regn_meta: Dict[str, Any] = {}
@@ -237,13 +511,15 @@ def ensure_parquet_fresh(parent,
             pass
 
     mani = {
-        "schema_version": 1,
+        "schema_version": MANIFEST_VERSION,
         "dataset": source,
         "created_at": dt.datetime.now().isoformat(timespec="seconds"),
         "dataset_path": str(out_path),
         "format": fmt,
         "raw_file": str(raw_path),
         "raw_sha256": raw_sha,
+        "raw_fingerprint": fp,
+        "raw_columns": raw_columns,
         "mapping_sha256": mapping_sha,
         "row_count": nrows,
         "col_count": ncols,
@@ -253,14 +529,74 @@ def ensure_parquet_fresh(parent,
         "columns": list(df_std.columns),
         "dtypes": {c: str(df_std[c].dtype) for c in df_std.columns},
     }
+    if partitions is not None:
+        mani["partition_by"] = f"dato ({PERIOD_FORMAT})"
+        mani["partitions"] = partitions
+        mani["arrow_schema"] = _schema_to_json(arrow_schema)
     if regn_meta:
         mani["regnskapslinjer"] = regn_meta
 
     manifest_path.write_text(json.dumps(mani, ensure_ascii=False, indent=2), encoding="utf-8")
     return out_path, mani
 
-def load_canonical_dataset(dataset_path: Path) -> pd.DataFrame:
-    return _read_dataset(Path(dataset_path))
+def load_canonical_dataset(dataset_path: Path,
+                           columns: Optional[Sequence[str]] = None,
+                           date_from: Any = None,
+                           date_to: Any = None,
+                           accounts: Optional[Iterable[Any]] = None,
+                           vouchers: Optional[Iterable[Any]] = None,
+                           periods: Optional[Iterable[Any]] = None) -> pd.DataFrame:
+    """
+    Last kanonisk datasett (fil eller partisjonert mappe), eventuelt bare et utsnitt.
+
+    columns:   kolonner som skal returneres (ukjente ignoreres); None = alle
+    date_from/date_to: inklusiv datoperiode på 'dato'
+    accounts:  kontonumre og/eller (fra, til)-intervaller, f.eks. [1920, (3000, 3999)]
+    vouchers:  bilagsnumre; sammenlignes som __bnr_key__ (små bokstaver, bare [0-9a-z])
+    periods:   måneder ('2025-01', dato eller Timestamp); i en partisjonert mappe
+               leses bare disse periodefilene
+
+    Partisjonerte datasett leser bare periodefilene som overlapper
+    periods/datoperioden. For Parquet skyves filtrene ned: radgrupper utenfor datoperioden hoppes over
+    via min/max-statistikk, og konto/bilag filtreres i Arrow-skannet før noe
+    konverteres til pandas. Pickle-datasett filtreres etter lesing.
+    """
+    p = Path(dataset_path)
+    ranges = _account_ranges(accounts) if accounts is not None else None
+    keys = None
+    if vouchers is not None:
+        keys = [k for k in _bnr_key_series(pd.Series(list(vouchers), dtype=object)) if k is not None]
+    bounds = _date_bounds(date_from, date_to)
+    cols = list(columns) if columns is not None else None
+    if p.is_dir():
+        schema = _partition_schema(p)
+        files = _partition_files(p, periods, bounds)
+        if not files:
+            everything = sorted(p.glob("*.parquet"))
+            if schema is None and not everything:
+                return pd.DataFrame(columns=cols)
+            if schema is None:
+                import pyarrow.parquet as papq
+                schema = papq.read_schema(everything[0])
+            df = schema.empty_table().to_pandas()
+            return df[[c for c in cols if c in df.columns]] if cols is not None else df
+        return _query_parquet(files, cols, bounds, ranges, keys, schema)
+    wanted = None
+    read_cols = cols
+    if periods is not None:   # eldre, upartisjonert fil: periodene som datofilter
+        wanted = {_period_key(x) for x in periods}
+        bounds = _periods_as_bounds(wanted, bounds)
+        if cols is not None and "dato" not in cols:
+            read_cols = cols + ["dato"]
+    if p.suffix == ".parquet":
+        df = _query_parquet([p], read_cols, bounds, ranges, keys)
+    else:
+        df = _filter_frame(_read_dataset(p), bounds, ranges, keys)
+    if wanted is not None and "dato" in df.columns:
+        df = df[_period_keys(df["dato"]).isin(wanted)].reset_index(drop=True)
+    if cols is not None:
+        df = df[[c for c in cols if c in df.columns]]
+    return df
 
 
 # Valgfri CLI for backfill
@@ -272,7 +608,8 @@ if __name__ == "__main__":
     p.add_argument("--year", type=int, required=True)
     p.add_argument("--source", choices=["hovedbok","saldobalanse"], required=True)
     p.add_argument("--type", dest="vtype", choices=["ao","interim","versjon"], required=True)
+    p.add_argument("--verify", action="store_true", help="full SHA-256 av råfilen selv om fingeravtrykket er uendret")
     a = p.parse_args()
     root = get_clients_root()
-    ds_path, mani = ensure_parquet_fresh(None, root, a.client, a.year, a.source, a.vtype)
+    ds_path, mani = ensure_parquet_fresh(None, root, a.client, a.year, a.source, a.vtype, verify=a.verify)
     print("OK", ds_path, "rows:", mani.get("row_count"))
@@ -1,11 +1,11 @@
 # src/app/services/io.py
 # -----------------------------------------------------------------------------
 # Robust fil-IO for CSV/XLSX:
-#  - Sniffer encoding og delimiter
+#  - Sniffer encoding og delimiter (bare starten/slutten av filen, cachet)
 #  - Leser store CSV-er forutsigbart
 #  - Normaliserer beløp (tusen-/desimalskilletegn)
 #  - Forsøker å parse dato-kolonner
-#  - Standardiserer kolonnetitler via mapping/synonymer
+#  - Standardiserer kolonnetitler via mapping/synonymer (også chunket til Parquet)
 #  - Preview/paginering og eksport til Excel
 #  - (Valgfritt) Parquet-cache med pyarrow
 # -----------------------------------------------------------------------------
@@ -16,6 +16,9 @@ from pathlib import Path
 from typing import Any, Iterable, Mapping, Optional
 
 import csv
+import hashlib
+import io as _stdio
+import os
 import re
 
 import chardet
@@ -48,14 +51,25 @@ class ReadInfo:
     rows: Optional[int]
     cols: Optional[int]
     source_type: str      # "csv" | "xlsx" | "parquet" | "unknown"
+    decimal: str = "."
+    thousands: Optional[str] = None
+    engine: Optional[str] = None   # pandas-motoren som leste CSV-en
 
 
 __all__ = [
     "ReadInfo",
     "sniff_csv",
+    "clear_sniff_cache",
+    "csv_engines",
     "read_csv_robust",
     "read_raw",
+    "read_head",
+    "read_raw_hashed",
     "standardize",
+    "StandardizePlan",
+    "infer_standardize_plan",
+    "apply_standardize_plan",
+    "standardize_chunked",
     "detect_schema",
     "preview",
     "save_excel",
@@ -66,54 +80,200 @@ __all__ = [
 
 # ---------------------------- CSV-sniff & lesing ------------------------------
 
-def sniff_csv(path: Path, sample_bytes: int = 200_000) -> tuple[str, Optional[str]]:
-    """
-    Sniff encoding og delimiter for CSV.
-    Returnerer (encoding, sep). 'sep' kan være None (la pandas sniffe).
-    """
-    raw = path.read_bytes()
-    head = raw[:sample_bytes]
-    enc = "utf-8"
+# Sniff-resultater pr filidentitet (sti, størrelse, mtime) – gjentatte
+# read_raw-kall på samme fil (mapping-dialog, preview, import) sniffer ikke på nytt.
+_SNIFF_CACHE: dict[tuple, tuple[str, Optional[str]]] = {}
+_SNIFF_CACHE_MAX = 256
+TAIL_SAMPLE_BYTES = 64_000   # halen read_csv_robust tar med i encoding-gjettingen
+
+
+def _file_identity(path: Path) -> Optional[tuple]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (str(path.resolve()), st.st_size, st.st_mtime_ns)
+
+
+def _read_sample(path: Path, sample_bytes: int, tail_bytes: int) -> tuple[bytes, bytes]:
+    """Les starten av filen (og evt. slutten), aldri hele filen."""
+    with path.open("rb") as fh:
+        head = fh.read(sample_bytes)
+        tail = b""
+        if tail_bytes > 0 and len(head) == sample_bytes:
+            size = fh.seek(0, 2)
+            start = max(sample_bytes, size - tail_bytes)
+            if start < size:
+                fh.seek(start)
+                tail = fh.read(size - start)
+                nl = tail.find(b"\n")
+                tail = tail[nl + 1:] if nl >= 0 else b""   # dropp påbegynt linje
+    return head, tail
+
+
+def _is_utf8(sample: bytes) -> bool:
+    """Gyldig UTF-8 uten NUL-bytes (utelukker UTF-16); kan slutte midt i et tegn."""
+    if b"\x00" in sample:
+        return False
+    try:
+        sample.decode("utf-8")
+    except UnicodeDecodeError as exc:
+        return exc.start >= len(sample) - 3 and exc.reason == "unexpected end of data"
+    return True
+
+
+def _detect_encoding(head: bytes, tail: bytes = b"") -> str:
+    # Rask vei for BOM og ren UTF-8; ellers chardet på prøven
+    if head.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    if _is_utf8(head) and _is_utf8(tail):
+        return "utf-8"
     try:
-        enc = chardet.detect(head).get("encoding") or "utf-8"
+        return chardet.detect(head + tail).get("encoding") or "utf-8"
     except Exception:
-        pass
+        return "utf-8"
+
+
+_COMMA_DECIMAL_RE = re.compile(r"^-?\d{1,3}(?:[ \xa0.]?\d{3})*,\d+$")
+_DOT_DECIMAL_RE = re.compile(r"^-?\d+\.\d+$")
+_DOT_AMOUNT_RE = re.compile(r"^-?\d{1,3}(?:,?\d{3})*\.\d{1,2}$")
+_SPACE_THOUSANDS_RE = re.compile(r"^-?\d{1,3}(?:([ \xa0])\d{3})+(?:,\d+)?$")
+_NUMBER_SNIFF_LINES = 500
+
+
+def _sniff_numbers(text: str, sep: Optional[str]) -> tuple[str, Optional[str]]:
+    """
+    Gjett desimal- og tusenskilletegn fra prøveteksten: (decimal, thousands).
+    Desimalkomma bare når sep ikke er komma; tusenskille bare mellomrom/NBSP
+    ('.' ville gjort datoer som 31.01.2025 om til tall).
+    """
+    if not sep or sep == ",":
+        return ".", None
+    comma = dot = 0
+    thousands: Optional[str] = None
+    for line in text.splitlines()[1:_NUMBER_SNIFF_LINES]:
+        for field in line.split(sep):
+            field = field.strip().strip('"')
+            if _COMMA_DECIMAL_RE.match(field):
+                comma += 1
+            elif _DOT_DECIMAL_RE.match(field):
+                dot += 1
+            m = _SPACE_THOUSANDS_RE.match(field)
+            if m and thousands is None:
+                thousands = m.group(1)
+    return ("," if comma > dot else "."), thousands
+
+
+def _sniff(path: Path, sample_bytes: int, tail_bytes: int) -> tuple[str, Optional[str], str, Optional[str]]:
+    """(encoding, sep, decimal, thousands), cachet pr filidentitet."""
+    ident = _file_identity(path)
+    key = (ident, sample_bytes, tail_bytes) if ident is not None else None
+    if key is not None and key in _SNIFF_CACHE:
+        return _SNIFF_CACHE[key]
+
+    head, tail = _read_sample(path, sample_bytes, tail_bytes)
+    enc = _detect_encoding(head, tail)
 
     # csv.Sniffer kan feile – fang og la sep bli None
+    text = ""
     try:
         text = head.decode(enc, errors="replace")
+        if len(head) == sample_bytes and "\n" in text:
+            text = text[:text.rindex("\n")]          # ikke snif på en avkuttet linje
         dialect = csv.Sniffer().sniff(text, delimiters=";,|\t,")
         sep = dialect.delimiter
     except Exception:
         sep = None
+    if sep is None and text and not any(d in text.split("\n", 1)[0] for d in ";,|\t"):
+        sep = ","   # én kolonne: ingen skilletegn i overskriften
+    decimal, thousands = _sniff_numbers(text, sep)
+
+    result = (enc, sep, decimal, thousands)
+    if key is not None:
+        if len(_SNIFF_CACHE) >= _SNIFF_CACHE_MAX:
+            _SNIFF_CACHE.clear()
+        _SNIFF_CACHE[key] = result
+    return result
+
+
+def sniff_csv(path: Path, sample_bytes: int = 200_000, tail_bytes: int = 0) -> tuple[str, Optional[str]]:
+    """
+    Sniff encoding og delimiter for CSV.
+    Returnerer (encoding, sep). 'sep' kan være None (la pandas sniffe).
 
+    Leser bare de første sample_bytes (og de siste tail_bytes, som tas med i
+    encoding-gjettingen – nyttig når æøå først dukker opp langt ned i filen).
+    Resultatet caches pr (sti, størrelse, mtime).
+    """
+    enc, sep, _, _ = _sniff(path, sample_bytes, tail_bytes)
     return enc, sep
 
 
+def clear_sniff_cache() -> None:
+    """Tøm sniff-cachen (f.eks. i tester)."""
+    _SNIFF_CACHE.clear()
+
+
+def csv_engines(sep: Optional[str], thousands: Optional[str] = None) -> list[str]:
+    """
+    Motorene read_csv_robust prøver, raskest først:
+      - "pyarrow" (flertrådet) når pyarrow finnes og dialekten ikke trenger thousands
+      - "c" for alle enkelttegn-separatorer
+      - "python" til slutt, og alene når sep er ukjent (None) eller flere tegn
+    """
+    if not sep or len(sep) != 1:
+        return ["python"]
+    engines = ["pyarrow"] if _HAS_PYARROW and thousands is None else []
+    return engines + ["c", "python"]
+
+
+def _read_with_engine(
+    path: Path | Any,
+    engine: str,
+    enc: str,
+    sep: Optional[str],
+    decimal: str,
+    thousands: Optional[str],
+    dtype: Optional[Mapping[str, Any]],
+    low_memory: bool,
+) -> pd.DataFrame:
+    kwargs: dict[str, Any] = {"encoding": enc, "sep": sep, "engine": engine, "dtype": dtype, "decimal": decimal}
+    if thousands is not None:
+        kwargs["thousands"] = thousands
+    if engine == "c":
+        kwargs["low_memory"] = low_memory   # python/pyarrow støtter ikke low_memory
+    return pd.read_csv(path, **kwargs)
+
+
 def read_csv_robust(
     path: Path,
     dtype: Optional[Mapping[str, Any]] = None,
-    low_memory: bool = False,  # bevart parameter for bakoverkompatibilitet (IGNORERES med python-engine)
+    low_memory: bool = False,  # brukes bare av C-motoren
 ) -> tuple[pd.DataFrame, ReadInfo]:
     """
     Les CSV robust:
-      - Sniffer encoding/delimiter
-      - Faller tilbake til latin-1 ved uventede feil
-
-    NB: Vi bruker pandas' python-engine når sep=None eller ukjente separators.
-        Python-engine støtter **ikke** low_memory. Derfor sender vi ikke dette flagget.
+      - Sniffer encoding/delimiter og desimal-/tusenskilletegn (sendes eksplisitt)
+      - Velger raskeste motor som takler dialekten (se csv_engines); feiler
+        en motor (f.eks. pyarrow på ujevne rader), prøves neste
+      - Faller tilbake til latin-1 med python-motoren ved uventede feil
     """
-    enc, sep = sniff_csv(path)
-    try:
-        # Viktig: IKKE send low_memory til python-engine
-        df = pd.read_csv(path, encoding=enc, sep=sep, engine="python", dtype=dtype)
-    except Exception:
+    enc, sep, decimal, thousands = _sniff(path, 200_000, TAIL_SAMPLE_BYTES)
+    df = None
+    engine = "python"
+    for engine in csv_engines(sep, thousands):
+        try:
+            df = _read_with_engine(path, engine, enc, sep, decimal, thousands, dtype, low_memory)
+            break
+        except Exception:
+            continue
+    if df is None:
         # fallback: prøv latin-1 uten sep (la pandas sniffe)
         df = pd.read_csv(path, encoding="latin-1", engine="python", dtype=dtype)
-        enc, sep = "latin-1", None
+        enc, sep, decimal, thousands, engine = "latin-1", None, ".", None, "python"
 
     info = ReadInfo(path=path, encoding=enc, sep=sep,
-                    rows=len(df), cols=len(df.columns), source_type="csv")
+                    rows=len(df), cols=len(df.columns), source_type="csv",
+                    decimal=decimal, thousands=thousands, engine=engine)
     return df, info
 
 
@@ -144,6 +304,101 @@ def read_raw(path: Path) -> tuple[pd.DataFrame, ReadInfo]:
     raise ValueError(f"Ukjent/ikke støttet filtype: {path.suffix}")
 
 
+HEAD_ROWS = 1000
+_HASH_BLOCK = 1 << 20
+
+
+def read_head(path: Path, nrows: int = HEAD_ROWS) -> tuple[pd.DataFrame, ReadInfo]:
+    """
+    Les bare de første nrows radene (til mapping-dialog/preview), med samme
+    sniffing som read_raw. ReadInfo.rows er antall leste rader, ikke filens.
+    """
+    suf = path.suffix.lower()
+    if suf == ".csv":
+        enc, sep, decimal, thousands = _sniff(path, 200_000, TAIL_SAMPLE_BYTES)
+        for engine in [e for e in csv_engines(sep, thousands) if e != "pyarrow"]:   # pyarrow: ingen nrows
+            try:
+                df = pd.read_csv(path, encoding=enc, sep=sep, engine=engine, decimal=decimal,
+                                 nrows=nrows, **({"thousands": thousands} if thousands else {}))
+                break
+            except Exception:
+                continue
+        else:
+            df = pd.read_csv(path, encoding="latin-1", engine="python", nrows=nrows)
+            enc, sep, decimal, thousands, engine = "latin-1", None, ".", None, "python"
+        return df, ReadInfo(path=path, encoding=enc, sep=sep, rows=len(df), cols=len(df.columns),
+                            source_type="csv", decimal=decimal, thousands=thousands, engine=engine)
+
+    if suf in (".xlsx", ".xls"):
+        if not _HAS_OPENPYXL:
+            raise RuntimeError("openpyxl mangler – installer 'openpyxl' for å lese Excel-filer.")
+        df = pd.read_excel(path, engine="openpyxl", nrows=nrows)
+        return df, ReadInfo(path=path, encoding="binary", sep=None,
+                            rows=len(df), cols=len(df.columns), source_type="xlsx")
+
+    if suf == ".parquet":
+        if not _HAS_PYARROW:
+            raise RuntimeError("pyarrow mangler – installer 'pyarrow' for å lese Parquet.")
+        pf = pq.ParquetFile(path)
+        batch = next(pf.iter_batches(batch_size=nrows), None)
+        df = batch.to_pandas() if batch is not None else pf.schema_arrow.empty_table().to_pandas()
+        return df, ReadInfo(path=path, encoding="binary", sep=None,
+                            rows=len(df), cols=len(df.columns), source_type="parquet")
+
+    raise ValueError(f"Ukjent/ikke støttet filtype: {path.suffix}")
+
+
+class _HashingReader(_stdio.RawIOBase):
+    """Binær leser som oppdaterer en hash med alt som leses (sekvensielt)."""
+
+    def __init__(self, fh, h) -> None:
+        self._fh = fh
+        self._h = h
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._fh.readinto(b)
+        if n:
+            self._h.update(memoryview(b)[:n])
+        return n
+
+
+def _sha256_path(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as fh:
+        for block in iter(lambda: fh.read(_HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_raw_hashed(path: Path) -> tuple[pd.DataFrame, ReadInfo, str]:
+    """
+    Som read_raw, men returnerer også SHA-256 av filen.
+
+    CSV hashes mens pandas leser (ett gjennomløp av filen); må en annen motor
+    prøves, eller er filen Excel/Parquet, hashes filen for seg.
+    """
+    if path.suffix.lower() == ".csv":
+        enc, sep, decimal, thousands = _sniff(path, 200_000, TAIL_SAMPLE_BYTES)
+        engine = csv_engines(sep, thousands)[0]
+        h = hashlib.sha256()
+        try:
+            with path.open("rb", buffering=0) as raw:
+                stream = _stdio.BufferedReader(_HashingReader(raw, h), _HASH_BLOCK)
+                df = _read_with_engine(stream, engine, enc, sep, decimal, thousands, None, False)
+                for _ in iter(lambda: stream.read(_HASH_BLOCK), b""):
+                    pass   # resten av filen (pandas kan stoppe før EOF)
+            info = ReadInfo(path=path, encoding=enc, sep=sep, rows=len(df), cols=len(df.columns),
+                            source_type="csv", decimal=decimal, thousands=thousands, engine=engine)
+            return df, info, h.hexdigest()
+        except Exception:
+            pass   # f.eks. pyarrow på ujevne rader: les på vanlig måte under
+    df, info = read_raw(path)
+    return df, info, _sha256_path(path)
+
+
 # --------------------------- Normalisering helpers ----------------------------
 
 _NON_BREAKING_SPACE = "\u00A0"
@@ -172,18 +427,6 @@ def _normalize_numeric_series(s: pd.Series) -> pd.Series:
 _DATE_RE = re.compile(r"\b(dato|date|trans|bilagsdato|post_date)\b", re.IGNORECASE)
 
 
-def _maybe_parse_dates(df: pd.DataFrame, candidate_cols: Iterable[str]) -> None:
-    """
-    Prøv å parse dato-kolonner in-place (tåler tom/feil verdier).
-    """
-    for c in candidate_cols:
-        if c in df.columns:
-            try:
-                df[c] = pd.to_datetime(df[c], errors="coerce", utc=False, dayfirst=True)
-            except Exception:
-                pass
-
-
 # ------------------------------ Standardisering -------------------------------
 
 _DEFAULT_SYNONYMS: dict[str, tuple[str, ...]] = {
@@ -204,28 +447,21 @@ def _normalize_colname(s: str) -> str:
     )
 
 
-def standardize(
-    df: pd.DataFrame,
-    mapping: Optional[Mapping[str, str]] = None,
-    synonyms: Optional[Mapping[str, Iterable[str]]] = None,
-    parse_dates: bool = True,
-    numeric_fields: Iterable[str] = ("beløp",),
-) -> tuple[pd.DataFrame, dict[str, str]]:
-    """
-    Standardiser kolonner til kanoniske navn vha. mapping/synonymer.
-    Returnerer (df_kopi, mapping_brukt).
-
-    mapping: f.eks. {"beløp": "Belop", "konto": "Konto", ...}
-    synonyms: f.eks. {"beløp": ("beløp","belop","amount",...)}
-    """
+def _resolve_mapping(
+    columns: Iterable[str],
+    mapping: Optional[Mapping[str, str]],
+    synonyms: Optional[Mapping[str, Iterable[str]]],
+) -> dict[str, str]:
+    """Kanonisk navn -> originalkolonne, fra eksplisitt mapping og synonymer."""
+    columns = list(columns)
     syn = {k: tuple(v) for k, v in (synonyms or _DEFAULT_SYNONYMS).items()}
     used_map: dict[str, str] = {}
-    col_lut = {c: _normalize_colname(c) for c in df.columns}
+    col_lut = {c: _normalize_colname(c) for c in columns}
 
     # 1) Eksplisitt mapping har førsteprioritet
     if mapping:
         for std, col in mapping.items():
-            if col in df.columns:
+            if col in col_lut:
                 used_map[std] = col
 
     # 2) Fyll inn via synonymer
@@ -239,27 +475,177 @@ def standardize(
                     break
             if std in used_map:
                 break
+    return used_map
 
-    # 3) Bygg rename-kart og lag kopi
-    rename_map = {}
-    for std, col in used_map.items():
-        if col in df.columns and col != std:
-            rename_map[col] = std
 
-    out = df.copy()
-    if rename_map:
-        out = out.rename(columns=rename_map)
+_DATE_FORMATS = ("%d.%m.%Y", "%Y-%m-%d", "%d/%m/%Y", "%d.%m.%y", "%Y%m%d", "%d-%m-%Y",
+                 "%Y-%m-%d %H:%M:%S", "%d.%m.%Y %H:%M:%S")
+
+
+def _infer_date_format(s: pd.Series) -> Optional[str]:
+    """Formatet i _DATE_FORMATS som tolker flest ikke-tomme verdier i prøven (None hvis ingen)."""
+    vals = s.dropna().astype(str).str.strip()
+    vals = vals[vals != ""]
+    best, best_hits = None, 0
+    for fmt in _DATE_FORMATS:
+        hits = int(pd.to_datetime(vals, format=fmt, errors="coerce").notna().sum())
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+        if hits == len(vals):
+            break
+    return best
+
+
+def _infer_decimal(s: pd.Series) -> str:
+    """',' eller '.' som desimaltegn ut fra prøveverdiene (tall-kolonner gir '.')."""
+    if pd.api.types.is_numeric_dtype(s):
+        return "."
+    vals = s.dropna().astype(str).str.strip().str.strip('"')
+    comma = int(vals.str.match(_COMMA_DECIMAL_RE).sum())
+    dot = int(vals.str.match(_DOT_AMOUNT_RE).sum())   # "1.234" alene er tusenskille
+    return "." if dot > comma else ","
+
+
+def _to_number(s: pd.Series, decimal: str) -> pd.Series:
+    if decimal == "," or pd.api.types.is_numeric_dtype(s):
+        return _normalize_numeric_series(s)
+    out = (
+        s.astype(str)
+         .str.replace(_NON_BREAKING_SPACE, "", regex=False)
+         .str.replace(" ", "", regex=False)
+         .str.replace(",", "", regex=False)      # tusenskille
+    )
+    return pd.to_numeric(out, errors="coerce")
+
+
+def _parse_date_column(s: pd.Series, fmt: Optional[str]) -> pd.Series:
+    """Parse med kjent format (raskt); resten med de andre kjente formatene, så dayfirst."""
+    if pd.api.types.is_datetime64_any_dtype(s):
+        return s
+    if fmt is None:
+        return pd.to_datetime(s, errors="coerce", utc=False, dayfirst=True)
+    out = pd.to_datetime(s, format=fmt, errors="coerce")
+    for other in _DATE_FORMATS:
+        miss = out.isna() & s.notna()
+        if not miss.any():
+            return out
+        out[miss] = pd.to_datetime(s[miss], format=other, errors="coerce")
+    miss = out.isna() & s.notna()
+    if miss.any():
+        out[miss] = s[miss].map(lambda v: pd.to_datetime(v, errors="coerce", dayfirst=True))
+    return out
+
+
+@dataclass
+class StandardizePlan:
+    """Kolonnemapping og dato-/tallformater utledet én gang, brukt på hver chunk."""
+    mapping: dict[str, str]                   # kanonisk navn -> originalkolonne
+    rename: dict[str, str]                    # originalkolonne -> kanonisk navn
+    date_formats: dict[str, Optional[str]]    # (kanonisk) datokolonne -> format (None = dayfirst)
+    decimals: dict[str, str]                  # tallfelt -> desimaltegn
 
-    # 4) Dato og beløp-normalisering
-    if parse_dates:
-        date_candidates = [c for c in out.columns if c == "dato" or _DATE_RE.search(c)]
-        _maybe_parse_dates(out, date_candidates)
 
-    for fld in numeric_fields:
+def infer_standardize_plan(
+    sample: pd.DataFrame,
+    mapping: Optional[Mapping[str, str]] = None,
+    synonyms: Optional[Mapping[str, Iterable[str]]] = None,
+    parse_dates: bool = True,
+    numeric_fields: Iterable[str] = ("beløp",),
+) -> StandardizePlan:
+    """Utled mapping og formater fra en prøve (f.eks. de første radene av filen)."""
+    used_map = _resolve_mapping(sample.columns, mapping, synonyms)
+    rename = {col: std for std, col in used_map.items() if col in sample.columns and col != std}
+    renamed = sample.rename(columns=rename) if rename else sample
+    date_formats: dict[str, Optional[str]] = {}
+    if parse_dates:
+        for c in renamed.columns:
+            if c == "dato" or _DATE_RE.search(c):
+                date_formats[c] = _infer_date_format(renamed[c])
+    decimals = {f: _infer_decimal(renamed[f]) for f in numeric_fields if f in renamed.columns}
+    return StandardizePlan(dict(used_map), rename, date_formats, decimals)
+
+
+def apply_standardize_plan(df: pd.DataFrame, plan: StandardizePlan) -> pd.DataFrame:
+    """Gi df kanoniske navn og normaliserte dato-/tallkolonner etter planen (ny DataFrame)."""
+    out = df.rename(columns=plan.rename) if plan.rename else df.copy()
+    for c, fmt in plan.date_formats.items():
+        if c in out.columns:
+            try:
+                out[c] = _parse_date_column(out[c], fmt)
+            except Exception:
+                pass
+    for fld, decimal in plan.decimals.items():
         if fld in out.columns:
-            out[fld] = _normalize_numeric_series(out[fld])
+            out[fld] = _to_number(out[fld], decimal)
+    return out
 
-    return out, {k: v for k, v in used_map.items()}
+
+def standardize(
+    df: pd.DataFrame,
+    mapping: Optional[Mapping[str, str]] = None,
+    synonyms: Optional[Mapping[str, Iterable[str]]] = None,
+    parse_dates: bool = True,
+    numeric_fields: Iterable[str] = ("beløp",),
+) -> tuple[pd.DataFrame, dict[str, str]]:
+    """
+    Standardiser kolonner til kanoniske navn vha. mapping/synonymer.
+    Returnerer (df_kopi, mapping_brukt).
+
+    mapping: f.eks. {"beløp": "Belop", "konto": "Konto", ...}
+    synonyms: f.eks. {"beløp": ("beløp","belop","amount",...)}
+
+    For filer større enn minnet: se standardize_chunked.
+    """
+    plan = infer_standardize_plan(df, mapping, synonyms, parse_dates, numeric_fields)
+    return apply_standardize_plan(df, plan), dict(plan.mapping)
+
+
+CHUNK_ROWS = 250_000
+SAMPLE_ROWS = 10_000
+
+
+def _csv_chunks(path: Path, chunk_rows: int) -> tuple[Iterable[pd.DataFrame], str, Optional[str]]:
+    """CSV som tekst-chunks (stabile kolonnetyper på tvers av chunks)."""
+    enc, sep, _, _ = _sniff(path, 200_000, TAIL_SAMPLE_BYTES)
+    engine = "c" if "c" in csv_engines(sep) else "python"   # pyarrow kan ikke chunke
+    reader = pd.read_csv(path, encoding=enc, sep=sep, engine=engine, dtype=str, chunksize=chunk_rows)
+    return reader, enc, sep
+
+
+def standardize_chunked(
+    src: Path,
+    dst: Path,
+    mapping: Optional[Mapping[str, str]] = None,
+    synonyms: Optional[Mapping[str, Iterable[str]]] = None,
+    parse_dates: bool = True,
+    numeric_fields: Iterable[str] = ("beløp",),
+    chunk_rows: int = CHUNK_ROWS,
+    sample_rows: int = SAMPLE_ROWS,
+) -> tuple[Path, dict[str, str]]:
+    """
+    Standardiser en CSV i faste batcher og skriv resultatet fortløpende til
+    Parquet (dst), med begrenset minnebruk uansett filstørrelse.
+
+    Mapping og dato-/tallformater utledes én gang fra de første sample_rows
+    radene og brukes på hver chunk. Kolonner som ikke er dato eller tallfelt
+    beholdes som tekst, slik at skjemaet er likt i alle chunks.
+    Returnerer (parquet-sti, mapping_brukt).
+    """
+    if src.suffix.lower() != ".csv":
+        raise ValueError("standardize_chunked forventer en .csv-kildefil")
+    numeric_fields = tuple(numeric_fields)
+    sample_reader, _, _ = _csv_chunks(src, sample_rows)
+    with sample_reader:
+        sample = next(iter(sample_reader), None)
+    if sample is None:
+        raise ValueError(f"Fant ingen kolonner i {src}")
+    plan = infer_standardize_plan(sample, mapping, synonyms, parse_dates, numeric_fields)
+
+    reader, _, _ = _csv_chunks(src, chunk_rows)
+    with reader:
+        path = to_parquet((apply_standardize_plan(chunk, plan) for chunk in reader), dst,
+                          empty=apply_standardize_plan(sample.iloc[:0], plan))
+    return path, dict(plan.mapping)
 
 
 # --------------------------- Schema & utility-funksjoner -----------------------
@@ -307,9 +693,18 @@ def save_excel(df: pd.DataFrame, path: Path, sheet_name: str = "Uttrekk") -> Pat
 
 # ------------------------------- Parquet-cache --------------------------------
 
-def to_parquet(df: pd.DataFrame, dst: Path) -> Path:
+def to_parquet(
+    df: pd.DataFrame | Iterable[pd.DataFrame],
+    dst: Path,
+    empty: Optional[pd.DataFrame] = None,
+) -> Path:
     """
     Skriv DataFrame til Parquet (uten index). Returnerer lagret sti.
+
+    df kan også være en iterator av DataFrames med samme kolonner: de skrives
+    da fortløpende som egne row groups (skjema fra første chunk), så hele
+    datasettet aldri ligger i minnet. empty brukes som skjema hvis iteratoren
+    er tom.
     """
     if not _HAS_PYARROW:
         raise RuntimeError("pyarrow mangler – installer 'pyarrow' for Parquet.")
@@ -317,8 +712,39 @@ def to_parquet(df: pd.DataFrame, dst: Path) -> Path:
     from pyarrow import parquet as _pq
 
     dst = dst.with_suffix(".parquet")
-    table = Table.from_pandas(df, preserve_index=False)
-    _pq.write_table(table, dst)
+    if isinstance(df, pd.DataFrame):
+        table = Table.from_pandas(df, preserve_index=False)
+        _pq.write_table(table, dst)
+        return dst
+
+    # Skriv til midlertidig navn og flytt på plass først når alle chunks er skrevet,
+    # slik at en feil midt i strømmen ikke etterlater en avkortet (men lesbar) fil.
+    tmp = dst.with_name(f".{dst.name}.tmp")
+    writer = None
+    try:
+        for chunk in df:
+            if writer is None:
+                table = Table.from_pandas(chunk, preserve_index=False)
+                writer = _pq.ParquetWriter(tmp, table.schema)
+            else:
+                table = Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+        if writer is None:
+            if empty is None:
+                raise ValueError("to_parquet: ingen chunks å skrive")
+            _pq.write_table(Table.from_pandas(empty, preserve_index=False), tmp)
+        else:
+            writer.close()
+            writer = None
+        os.replace(tmp, dst)
+    except BaseException:
+        if writer is not None:
+            try:
+                writer.close()
+            except Exception:
+                pass
+        tmp.unlink(missing_ok=True)
+        raise
     return dst
 
 
@@ -326,14 +752,22 @@ def convert_csv_to_parquet(
     src_csv: Path,
     dst_dir: Path,
     mapping: Mapping[str, str] | None = None,
+    chunked: bool = False,
 ) -> Path:
     """
     Les CSV (robust) → standardiser (hvis mapping gitt) → lagre Parquet i dst_dir.
     Returnerer stien til Parquet-filen.
+
+    chunked=True standardiserer i batcher med begrenset minne (standardize_chunked).
     """
     if src_csv.suffix.lower() != ".csv":
         raise ValueError("convert_csv_to_parquet forventer en .csv-kildefil")
 
+    if chunked:
+        dst_dir.mkdir(parents=True, exist_ok=True)
+        path, _ = standardize_chunked(src_csv, dst_dir / src_csv.stem, mapping=mapping)
+        return path
+
     df, _ = read_csv_robust(src_csv)
     if mapping:
         df, _ = standardize(df, mapping=mapping)
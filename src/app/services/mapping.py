@@ -1,13 +1,19 @@
 # src/app/services/mapping.py
 from __future__ import annotations
 from pathlib import Path
-from typing import Mapping, Iterable, Optional, Dict, Any
+from typing import Mapping, Iterable, Optional, Dict
 import json
 import re
 import tkinter as tk
 from tkinter import ttk, messagebox
 import pandas as pd
 
+try:
+    import pyarrow  # noqa: F401
+    _STR_DTYPE = "string[pyarrow]"   # Arrow-kjerner (RE2) for str.* i stedet for Python-løkker
+except Exception:
+    _STR_DTYPE = "string"
+
 # sti-hjelper
 try:
     from app.services.clients import mapping_file
@@ -36,7 +42,7 @@ SYNONYMS: Dict[str, Iterable[str]] = {
 }
 
 NBSP = "\u00A0"
-_BNR_RE = re.compile(r"[^0-9a-z]+", re.IGNORECASE)
+_BNR_RE = re.compile(r"[^0-9a-z]+")
 
 def _norm(s: str) -> str:
     return (
@@ -47,10 +53,13 @@ def _norm(s: str) -> str:
         .replace(".", " ")
     )
 
-def _bnr_key(x: Any) -> str | None:
-    if x is None or (isinstance(x, float) and pd.isna(x)): return None
-    s = str(x).strip().lower()
-    return _BNR_RE.sub("", s) or None
+def _bnr_key_series(s: pd.Series) -> pd.Series:
+    """Bilagsnøkkel for hele kolonnen: små bokstaver, bare [0-9a-z]; tom/manglende -> None.
+
+    Felles for mapping og ingest (pushdown-filteret på bilag bruker samme nøkkel).
+    """
+    t = s.astype(_STR_DTYPE).str.lower().str.replace(_BNR_RE.pattern, "", regex=True)
+    return t.where(t.str.len() > 0).astype(object).where(lambda x: x.notna(), None)
 
 def _autoguess(df_cols: Iterable[str], source: str) -> Dict[str, str]:
     cols = list(df_cols)
@@ -217,7 +226,7 @@ def standardize_with_mapping(
 
     # HB: lag __bnr_key__ for raskt søk/drilldown
     if "bilagsnr" in df.columns:
-        df["__bnr_key__"] = df["bilagsnr"].map(_bnr_key)
+        df["__bnr_key__"] = _bnr_key_series(df["bilagsnr"])
 
     # SB: beregn endring hvis mulig
     if source == "saldobalanse":
@@ -0,0 +1,260 @@
+"""
+Tester for services.ingest – ensure_parquet_fresh med ett lesegjennomløp.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.app.services import ingest
+from src.app.services import io as sio
+
+HB_CSV = (
+    "Konto;Kontonavn;Bilagsnr;Dato;Beløp;Tekst\n"
+    "1920;Bank;1;02.01.2025;1 000,00;Innbetaling\n"
+    "3000;Salg;1;02.01.2025;-1 000,00;Salg\n"
+    "1920;Bank;2;01.01.2025;50,50;Renter\n"
+)
+
+
+@pytest.fixture()
+def raw_file(tmp_path: Path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    sio.clear_sniff_cache()
+    raw = tmp_path / "klient" / "v1" / "raw" / "hovedbok.csv"
+    raw.parent.mkdir(parents=True)
+    raw.write_text(HB_CSV, encoding="utf-8")
+    monkeypatch.setattr(ingest, "load_meta", lambda root, client: {})
+    monkeypatch.setattr(ingest, "resolve_active_raw_file", lambda *a: raw)
+    previews: list = []
+    monkeypatch.setattr(ingest, "ensure_mapping_interactive",
+                        lambda parent, root, client, year, source, df: previews.append(len(df)) or
+                        {"konto": "Konto", "kontonavn": "Kontonavn", "bilagsnr": "Bilagsnr",
+                         "dato": "Dato", "beløp": "Beløp", "tekst": "Tekst"})
+    return raw, previews
+
+
+def test_fresh_ingest_reads_once_and_reuses_manifest(raw_file, tmp_path: Path, monkeypatch) -> None:
+    raw, previews = raw_file
+    hashes: list = []
+    real_hash = ingest._sha256_file
+    monkeypatch.setattr(ingest, "_sha256_file", lambda p: hashes.append(p) or real_hash(p))
+    monkeypatch.setattr(sio, "read_raw", lambda p: pytest.fail("leste hele filen på nytt"))
+
+    path, mani = ingest.ensure_parquet_fresh(None, tmp_path, "klient", 2025, "hovedbok", "ao")
+    assert hashes == []                                  # hashet under lesingen
+    assert mani["raw_sha256"] == hashlib.sha256(raw.read_bytes()).hexdigest()
+    df = pd.read_parquet(path)
+    assert df["beløp"].tolist() == [50.5, 1000.0, -1000.0]          # sortert på dato
+    assert mani["first_date"] == "2025-01-01" and mani["row_count"] == 3
+
+    # uendret fil: manifestet gjenbrukes uten å lese råfilen i det hele tatt
+    monkeypatch.setattr(ingest, "read_raw_hashed", lambda p: pytest.fail("konverterte på nytt"))
+    monkeypatch.setattr(ingest, "read_head", lambda *a: pytest.fail("leste preview fra råfilen"))
+    monkeypatch.setattr(ingest, "_sample_sha256", lambda *a: pytest.fail("leste prøve fra råfilen"))
+    path2, mani2 = ingest.ensure_parquet_fresh(None, tmp_path, "klient", 2025, "hovedbok", "ao")
+    assert (path2, mani2["created_at"]) == (path, mani["created_at"])
+    assert hashes == []
+    assert previews == [3, 0]
+
+
+def test_freshness_tiers(raw_file, tmp_path: Path, monkeypatch) -> None:
+    raw, _ = raw_file
+    hashes: list = []
+    real_hash = ingest._sha256_file
+    monkeypatch.setattr(ingest, "_sha256_file", lambda p: hashes.append(p) or real_hash(p))
+    fresh = lambda **kw: ingest.ensure_parquet_fresh(None, tmp_path, "klient", 2025, "hovedbok", "ao", **kw)
+    _, mani = fresh()
+
+    # berørt fil (ny mtime, samme innhold): én full hash, fingeravtrykket oppdateres
+    st = raw.stat()
+    os.utime(raw, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000))
+    _, mani2 = fresh()
+    assert len(hashes) == 1 and mani2["created_at"] == mani["created_at"]
+    assert mani2["raw_fingerprint"]["mtime_ns"] == raw.stat().st_mtime_ns
+    fresh()
+    assert len(hashes) == 1
+
+    # verify=True krever full hash selv om stat er uendret
+    fresh(verify=True)
+    assert len(hashes) == 2
+
+    # samme størrelse, nytt innhold: prøve-hashen avslører endringen uten full hash
+    raw.write_text(HB_CSV.replace("50,50", "60,60"), encoding="utf-8")
+    _, mani3 = fresh()
+    assert len(hashes) == 2
+    assert mani3["raw_sha256"] == hashlib.sha256(raw.read_bytes()).hexdigest()
+    assert 60.6 in pd.read_parquet(mani3["dataset_path"])["beløp"].tolist()
+
+
+def test_read_head_is_bounded(tmp_path: Path) -> None:
+    p = tmp_path / "stor.csv"
+    p.write_text("a;b\n" + "1;2\n" * 5000, encoding="utf-8")
+    df, info = sio.read_head(p, 10)
+    assert len(df) == 10 and info.rows == 10 and info.sep == ";"
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# _canonicalize / _remove_summary_rows – vektoriserte strengkjerner
+# ────────────────────────────────────────────────────────────────────────────
+def test_bnr_key_and_summary_rows_vectorized() -> None:
+    df = pd.DataFrame({
+        "konto": ["1920", "Sum", "3000", None, "1500"],
+        "kontonavn": ["Bank", "x", "Totalt beløp", "Sum konto", "Summer"],
+        "bilagsnr": ["A-12/ b", None, "", "7", 1.0],
+        "dato": pd.to_datetime(["2025-01-02", "2025-01-01", "2025-01-01", "2025-01-03", "2025-01-01"]),
+    })
+    out = ingest._remove_summary_rows(df)
+    assert out["konto"].tolist() == ["1920", "3000", "1500"]   # «Totalt beløp» på talkonto beholdes
+
+    canon = ingest._canonicalize(out, "hovedbok")
+    assert canon["konto"].tolist() == ["3000", "1500", "1920"]  # stabil datosortering
+    assert canon["__bnr_key__"].tolist() == [None, "10", "a12b"]
+
+    from src.app.services import mapping
+    # én definisjon, i mapping (som setter __bnr_key__ ved hver innlesing)
+    assert ingest._bnr_key_series.__code__.co_filename == mapping._bnr_key_series.__code__.co_filename
+    std = mapping.standardize_with_mapping(out, {"konto": "konto", "bilagsnr": "bilagsnr", "dato": "dato"})
+    assert std["__bnr_key__"].tolist() == ["a12b", None, "10"]
+
+
+def test_canonicalize_skips_sort_for_date_ordered_input(monkeypatch) -> None:
+    df = pd.DataFrame({"dato": pd.date_range("2025-01-01", periods=5), "bilagsnr": list("abcde")})
+    monkeypatch.setattr(pd.DataFrame, "sort_values", lambda *a, **k: pytest.fail("sorterte sortert input"))
+    out = ingest._canonicalize(df, "hovedbok")
+    assert out["__bnr_key__"].tolist() == list("abcde")
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# load_canonical_dataset – kolonne- og predikat-pushdown
+# ────────────────────────────────────────────────────────────────────────────
+def _canon_hb(n: int = 1_000) -> pd.DataFrame:
+    return pd.DataFrame({
+        "konto": pd.array([[1920, 3000, 3010, 6300][i % 4] for i in range(n)], dtype="Int64"),
+        "kontonavn": ["Bank", "Salg", "Salg 2", "Leie"] * (n // 4),
+        "dato": pd.date_range("2025-01-01", periods=n, freq="8h"),
+        "bilagsnr": [f"B-{i // 2}" for i in range(n)],
+        "beløp": [float(i) for i in range(n)],
+        "__bnr_key__": [f"b{i // 2}" for i in range(n)],
+    })
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "pickle"])
+def test_load_canonical_dataset_filters(tmp_path: Path, monkeypatch, fmt: str) -> None:
+    pytest.importorskip("pyarrow")
+    df = _canon_hb()
+    monkeypatch.setattr(ingest, "ROW_GROUP_ROWS", 100)
+    if fmt == "pickle":
+        monkeypatch.setattr(pd.DataFrame, "to_parquet", lambda *a, **k: (_ for _ in ()).throw(ImportError()))
+    path, got_fmt = ingest._write_dataset(df, tmp_path / "hovedbok.parquet")
+    assert got_fmt == fmt
+
+    out = ingest.load_canonical_dataset(path, columns=["konto", "beløp"], date_from="2025-02-01",
+                                        date_to="2025-02-03", accounts=[1920, ("3000", "3005")])
+    d = df["dato"]
+    want = df[(d >= "2025-02-01") & (d < "2025-02-04") & df["konto"].isin([1920, 3000])]
+    assert list(out.columns) == ["konto", "beløp"]
+    assert out["beløp"].tolist() == want["beløp"].tolist() and len(out) == 5
+
+    out = ingest.load_canonical_dataset(path, columns=["bilagsnr"], vouchers=["B-7", "b 12", "finnes ikke"])
+    assert out["bilagsnr"].tolist() == ["B-7", "B-7", "B-12", "B-12"]
+    assert len(ingest.load_canonical_dataset(path)) == len(df)
+
+
+def test_canonical_parquet_row_groups_prune_by_date(tmp_path: Path, monkeypatch) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    import pyarrow.dataset as pads
+    monkeypatch.setattr(ingest, "ROW_GROUP_ROWS", 100)
+    path, _ = ingest._write_dataset(_canon_hb(), tmp_path / "hovedbok.parquet")
+    meta = pq.ParquetFile(path).metadata
+    assert meta.num_row_groups == 10
+    dato = meta.schema.to_arrow_schema().get_field_index("dato")
+    stats = [meta.row_group(i).column(dato).statistics for i in range(meta.num_row_groups)]
+    assert all(s.has_min_max for s in stats) and all(a.max < b.min for a, b in zip(stats, stats[1:]))
+
+    frag = next(pads.dataset(str(path)).get_fragments())
+    expr = pads.field("dato") >= pd.Timestamp("2025-11-01").to_pydatetime()
+    assert len(frag.split_by_row_group(expr)) == 1
+
+
+def test_load_canonical_dataset_text_accounts(tmp_path: Path) -> None:
+    pytest.importorskip("pyarrow")
+    df = _canon_hb(8).assign(konto=lambda d: d["konto"].astype(str) + " ")
+    df.to_parquet(tmp_path / "hb.parquet", index=False)
+    out = ingest.load_canonical_dataset(tmp_path / "hb.parquet", columns=["beløp"], accounts=[(3000, 3999)])
+    assert out["beløp"].tolist() == [1.0, 2.0, 5.0, 6.0]
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Partisjonert hovedbok (én fil pr måned)
+# ────────────────────────────────────────────────────────────────────────────
+def test_new_month_writes_only_its_partition(raw_file, tmp_path: Path, monkeypatch) -> None:
+    raw, _ = raw_file
+    fresh = lambda: ingest.ensure_parquet_fresh(None, tmp_path, "klient", 2025, "hovedbok", "ao")
+    path, mani = fresh()
+    assert path.is_dir() and mani["format"] == "parquet-partitioned"
+    assert {k: v["rows"] for k, v in mani["partitions"].items()} == {"2025-01": 3}
+
+    import pyarrow.parquet as papq
+    writes: list = []
+    real = papq.write_table
+    monkeypatch.setattr(papq, "write_table", lambda t, p, **kw: writes.append(Path(p)) or real(t, p, **kw))
+    with open(raw, "a", encoding="utf-8") as fh:
+        fh.write("1920;Bank;3;03.02.2025;200,00;Februar\n6300;Leie;4;;-5,00;Uten dato\n")
+    path2, mani2 = fresh()
+    assert path2 == path and [w.name for w in writes] == [".2025-02.parquet.tmp", ".ukjent.parquet.tmp"]
+    assert mani2["partitions"]["2025-01"] == mani["partitions"]["2025-01"]
+    assert sorted(p.name for p in path.iterdir()) == ["2025-01.parquet", "2025-02.parquet", "ukjent.parquet"]
+
+    feb = ingest.load_canonical_dataset(path, columns=["tekst", "beløp"], periods=["2025-02"])
+    assert feb.to_dict("records") == [{"tekst": "Februar", "beløp": 200.0}]
+    jan = ingest.load_canonical_dataset(path, columns=["beløp"], date_from="2025-01-01", date_to="2025-01-31")
+    assert jan["beløp"].tolist() == [50.5, 1000.0, -1000.0]
+    assert len(ingest.load_canonical_dataset(path)) == 5
+    assert ingest.load_canonical_dataset(path, columns=["beløp"], periods=["2024-12"]).empty
+
+    # perioden forsvinner fra råfilen -> filen slettes
+    raw.write_text(HB_CSV, encoding="utf-8")
+    _, mani3 = fresh()
+    assert list(mani3["partitions"]) == ["2025-01"] and sorted(p.name for p in path.iterdir()) == ["2025-01.parquet"]
+
+
+def test_v1_manifest_is_rebuilt_partitioned(raw_file, tmp_path: Path) -> None:
+    raw, _ = raw_file
+    fresh = lambda: ingest.ensure_parquet_fresh(None, tmp_path, "klient", 2025, "hovedbok", "ao")
+    path, mani = fresh()
+    processed = path.parent
+    mono = processed / "hovedbok.parquet"
+    pd.read_parquet(path).to_parquet(mono, index=False)
+    mani.update(schema_version=1, format="parquet", dataset_path=str(mono))
+    mani.pop("partitions")
+    (processed / "hovedbok.manifest.json").write_text(json.dumps(mani), encoding="utf-8")
+
+    # eldre enkeltfil: periods fungerer som datofilter
+    assert ingest.load_canonical_dataset(mono, columns=["beløp"], periods=["2025-01"])["beløp"].tolist() == [50.5, 1000.0, -1000.0]
+
+    path2, mani2 = fresh()
+    assert path2 == path and mani2["schema_version"] == ingest.MANIFEST_VERSION and not mono.exists()
+
+
+def test_partitions_share_one_schema(raw_file, tmp_path: Path) -> None:
+    raw, _ = raw_file
+    with open(raw, "a", encoding="utf-8") as fh:   # februar: ingen bilagsnr eller tekst
+        fh.write("1920;Bank;;03.02.2025;200,00;\n6300;Leie;;04.02.2025;-5,00;\n")
+    path, mani = ingest.ensure_parquet_fresh(None, tmp_path, "klient", 2025, "hovedbok", "ao")
+    import pyarrow.parquet as papq
+    schemas = {f.name: papq.read_schema(f).remove_metadata() for f in path.glob("*.parquet")}
+    assert len(set(map(str, schemas.values()))) == 1
+    assert str(schemas["2025-02.parquet"].field("__bnr_key__").type) == "string"
+    assert "arrow_schema" in mani
+
+    df = ingest.load_canonical_dataset(path)
+    assert len(df) == 5 and df["__bnr_key__"].isna().sum() == 2
+    assert len(ingest._read_dataset(path)) == 5
+    feb = ingest.load_canonical_dataset(path, columns=["tekst", "__bnr_key__"], periods=["2025-02"])
+    assert feb.isna().all().all() and len(feb) == 2
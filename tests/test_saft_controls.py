@@ -0,0 +1,110 @@
+"""
+Tester for saft_controls_and_exports – aldersfordeling (aging) for flere skjæringsdatoer.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+PARSERS_DIR = Path(__file__).resolve().parents[1] / "src" / "app" / "parsers"
+if str(PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(PARSERS_DIR))
+
+import saft_controls_and_exports as sce  # noqa: E402
+
+
+def _tx() -> pd.DataFrame:
+    return pd.DataFrame({
+        "CustomerID": ["C1", "C1", "C2", "C2", "C1"],
+        "Name": ["Kunde 1", "Kunde 1", "", "", "Kunde 1"],
+        "TransactionDate": pd.to_datetime(["2024-12-01", "2024-10-15", "2024-12-31", "2025-01-20", None]),
+        "PostingDate": pd.to_datetime([None, "2024-10-02", None, None, None]),
+        "Debit": [100.0, 40.0, 70.0, 0.0, 999.0],
+        "Credit": [0.0, 0.0, 0.0, 20.0, 0.0],
+    })
+
+
+def test_aging_cube_buckets_each_asof() -> None:
+    cube = sce.aging_cube(_tx(), "CustomerID", ["2024-12-31", "2025-01-31"], "Name")
+    assert list(cube.columns) == ["AsOf", "CustomerID", "Name", *sce.AGING_BUCKETS, "Total"]
+    cube = cube.set_index([cube["AsOf"].dt.strftime("%Y-%m-%d"), "CustomerID"])
+    assert len(cube) == 4
+    buckets = lambda key: cube.loc[key, sce.AGING_BUCKETS].tolist()   # noqa: E731
+
+    assert buckets(("2024-12-31", "C1")) == [100.0, 0.0, 40.0, 0.0]    # 30 og 90 dager gamle
+    assert buckets(("2025-01-31", "C1")) == [0.0, 0.0, 100.0, 40.0]    # 61 og 121 dager
+    assert cube.loc[("2025-01-31", "C2"), "Total"] == 50.0
+    assert cube.loc[("2024-12-31", "C2"), "Name"] == ""
+
+    single = sce.age_buckets(_tx(), "CustomerID", pd.Timestamp("2024-12-31"), "Name")
+    pd.testing.assert_frame_equal(single, cube.loc["2024-12-31"].drop(columns="AsOf").reset_index())
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# Kontrollmotoren (saft_checks)
+# ────────────────────────────────────────────────────────────────────────────
+import saft_checks  # noqa: E402
+import saft_store  # noqa: E402
+
+TX_CSV = """RecordID,VoucherID,JournalID,AccountID,CustomerID,SupplierID,TransactionDate,PostingDate,Debit,Credit
+1,V1,J1,1510,C1,,2024-01-10,,100.00,
+2,V1,J1,3000,,,2024-01-10,,,100.00
+3,V2,J2,2410,,S9,2024-02-01,,,80.00
+4,V2,J2,6300,,,2024-02-01,,70.00,
+5,V3,J2,,,,2024-02-02,,5.00,5.00
+"""
+
+
+def _client(tmp_path: Path, name: str) -> Path:
+    d = tmp_path / name
+    d.mkdir()
+    (d / "transactions.csv").write_text(TX_CSV, encoding="utf-8")
+    (d / "accounts.csv").write_text(
+        "AccountID,AccountDescription,ClosingDebit,ClosingCredit\n"
+        "01510,Kunder,100,\n3000,Salg,,100\n2410,Lev,,80\n6300,Kontor,80,\n", encoding="utf-8")
+    (d / "vouchers.csv").write_text("VoucherID\nV1\nV2\nV3\n", encoding="utf-8")
+    (d / "customers.csv").write_text("CustomerID,Name\nC1,Kunde\n", encoding="utf-8")
+    (d / "suppliers.csv").write_text("SupplierID,Name\nS1,Lev\n", encoding="utf-8")
+    (d / "gl_totals.csv").write_text("JournalID,TotalDebit,TotalCredit\nJ1,100,100\n", encoding="utf-8")
+    return d
+
+
+def test_controls_report_status_delta_and_keys(tmp_path: Path) -> None:
+    saft_store.clear_cache()
+    res = saft_checks.run_controls(saft_checks.load_control_data(_client(tmp_path, "a")))
+    assert res["control_id"].tolist() == list(saft_checks.CONTROLS)
+    assert list(res.columns) == saft_checks.RESULT_COLUMNS
+    r = res.set_index("control_id")
+
+    assert r.loc["global_balance", ["status", "delta"]].tolist() == ["AVVIK", -10.0]
+    assert r.loc["voucher_balance", ["status", "delta", "offending_keys"]].tolist() == ["AVVIK", 10.0, "V2"]
+    assert r.loc["journal_totals", ["status", "offending_keys"]].tolist() == ["AVVIK", "J2"]
+    assert r.loc["tb_vs_closing", ["status", "n_offending", "offending_keys"]].tolist() == ["AVVIK", 1, "6300"]
+    assert r.loc["missing_account", ["status", "offending_keys"]].tolist() == ["AVVIK", "5"]
+    assert r.loc["orphan_customer", "status"] == "OK"
+    assert r.loc["orphan_supplier", ["status", "offending_keys"]].tolist() == ["AVVIK", "S9"]
+    assert r.loc["analysis_orphans", "status"] == "SKIPPET"
+    assert (res["seconds"] >= 0).all()
+
+
+def test_run_batch_stacks_clients(tmp_path: Path) -> None:
+    saft_store.clear_cache()
+    dirs = [_client(tmp_path, "a"), _client(tmp_path, "b"), tmp_path / "tom"]
+    res = saft_checks.run_batch(dirs, ["line_count", "voucher_balance"])
+    assert res.groupby("client", sort=False)["control_id"].apply(list).tolist() == [
+        ["line_count", "voucher_balance"], ["line_count", "voucher_balance"], ["load"]]
+    assert res.loc[res["control_id"] == "line_count", "result"].tolist() == [5, 5]
+
+
+def test_missing_account_uses_raw_account_id(tmp_path: Path) -> None:
+    d = tmp_path / "c"
+    d.mkdir()
+    (d / "transactions.csv").write_text(
+        "RecordID,VoucherID,AccountID,Debit,Credit\n"
+        "1,V1,0000,10,\n2,V1,0,,10\n3,V2,,5,\n4,V2,UNDEFINED,,5\n", encoding="utf-8")
+    for _ in range(2):   # bygget fra CSV, deretter fra Arrow-filen
+        saft_store.clear_cache()
+        res = saft_checks.run_controls(saft_checks.load_control_data(d), ["missing_account"])
+        assert res[["status", "offending_keys"]].values.tolist() == [["AVVIK", "3|4"]]
@@ -0,0 +1,155 @@
+"""
+Tester for saft_engine – felles, cachet SAF-T-parsing bak konsumentene.
+"""
+from __future__ import annotations
+
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+PARSERS_DIR = Path(__file__).resolve().parents[1] / "src" / "app" / "parsers"
+if str(PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(PARSERS_DIR))
+
+pytest.importorskip("pyarrow")
+import saft_engine  # noqa: E402
+import saft_parser_pro as spp  # noqa: E402
+
+# Tripletex: flate transaksjoner (kontering direkte på <Transaction>), JournalID på <Journal>
+SAFT_TRIPLETEX_FLAT = """<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="urn:StandardAuditFile-Tax" version="1.3">
+  <Header>
+    <AuditFileVersion>1.3</AuditFileVersion><SoftwareCompanyName>Tripletex</SoftwareCompanyName>
+    <Company><CompanyName>Flat AS</CompanyName>
+      <BankAccount><BankAccountNumber>12345678903</BankAccountNumber><CurrencyCode>NOK</CurrencyCode></BankAccount>
+    </Company>
+  </Header>
+  <MasterFiles>
+    <GeneralLedgerAccounts>
+      <Account><AccountID>3000</AccountID><AccountDescription>Salg</AccountDescription><VatCode>3</VatCode></Account>
+    </GeneralLedgerAccounts>
+  </MasterFiles>
+  <GeneralLedgerEntries>
+    <Journal><JournalID>J7</JournalID><Description>Salg</Description><VoucherDate>2024-03-05</VoucherDate>
+      <Transaction><VoucherNo>1</VoucherNo><TransactionDate>2024-03-05</TransactionDate>
+        <AccountID>1500</AccountID><DebitAmount>1250.00</DebitAmount><DocumentNo>F1</DocumentNo></Transaction>
+      <Transaction><VoucherNo>1</VoucherNo><TransactionDate>2024-03-05</TransactionDate>
+        <AccountID>3000</AccountID><CreditAmount>1000.00</CreditAmount>
+        <TaxInformation><TaxType>MVA</TaxType><VATCode>3</VATCode><TaxBase>1000.00</TaxBase>
+          <TaxAmount>250.00</TaxAmount></TaxInformation></Transaction>
+      <Transaction><VoucherNo>1</VoucherNo><TransactionDate>2024-03-05</TransactionDate>
+        <AccountID>2700</AccountID><CreditAmount>250.00</CreditAmount></Transaction>
+    </Journal>
+  </GeneralLedgerEntries>
+</AuditFile>
+"""
+
+
+@pytest.fixture()
+def cache(tmp_path: Path) -> Path:
+    return tmp_path / "cache"
+
+
+def test_second_load_hits_cache(tmp_path: Path, cache: Path, monkeypatch) -> None:
+    src = tmp_path / "a.xml"
+    src.write_text(SAFT_TRIPLETEX_FLAT, encoding="utf-8")
+    first = saft_engine.load_saft(src, cache_dir=cache)
+
+    calls: list = []
+    monkeypatch.setattr(spp, "parse_saft", lambda *a, **k: calls.append(a))
+    copy = tmp_path / "kopi.xml"                     # samme innhold, annet navn
+    copy.write_bytes(src.read_bytes())
+    again = saft_engine.load_saft(copy, cache_dir=cache)
+    upload = saft_engine.load_saft(io.BytesIO(src.read_bytes()), cache_dir=cache)
+
+    assert calls == []
+    assert again.folder == first.folder == upload.folder
+    assert sorted(p.name for p in cache.iterdir()) == [first.folder.name, saft_engine.INDEX_FILE]
+
+
+def test_known_path_skips_full_hash(tmp_path: Path, cache: Path, monkeypatch) -> None:
+    src = tmp_path / "a.xml"
+    src.write_text(SAFT_TRIPLETEX_FLAT, encoding="utf-8")
+    first = saft_engine.load_saft(src, cache_dir=cache)
+
+    real_hash = saft_engine._hash_file
+    monkeypatch.setattr(saft_engine, "_hash_file", lambda p: pytest.fail("hashet hele filen"))
+    assert saft_engine.load_saft(src, cache_dir=cache).folder == first.folder
+
+    # endret fil (samme størrelse): fingeravtrykket bommer og filen hashes på nytt
+    monkeypatch.setattr(saft_engine, "_hash_file", real_hash)
+    src.write_text(SAFT_TRIPLETEX_FLAT.replace("Flat AS", "Flot AS"), encoding="utf-8")
+    changed = saft_engine.load_saft(src, cache_dir=cache)
+    assert changed.folder != first.folder
+    assert changed.header.loc[0, "CompanyName"] == "Flot AS"
+
+
+def test_flat_tripletex_lines_and_vat(tmp_path: Path, cache: Path) -> None:
+    src = tmp_path / "flat.xml"
+    src.write_text(SAFT_TRIPLETEX_FLAT, encoding="utf-8")
+    res = saft_engine.load_saft(src, cache_dir=cache)
+
+    lines = res.lines
+    assert lines["AccountID"].tolist() == ["1500", "3000", "2700"]
+    assert lines["JournalID"].tolist() == ["J7"] * 3
+    assert lines["Debit"].tolist() == [1250.0, 0.0, 0.0]
+    assert lines.loc[0, "DocumentNumber"] == "F1"
+    assert str(lines["Debit"].dtype) == "float64" and str(lines["TransactionDate"].dtype) == "datetime64[ns]"
+    lines["Ekstra"] = 1                                   # grunn kopi: cachen er urørt
+    assert "Ekstra" not in res.lines.columns
+
+    vat = res.vat_lines
+    assert vat[["TaxCode", "TaxBase", "TaxAmount"]].values.tolist() == [["3", 1000.0, 250.0]]
+    assert str(vat.loc[0, "Date"].date()) == "2024-03-05"
+
+    assert res.journals["JournalID"].tolist() == ["J7"]
+    assert res.accounts.loc[0, "TaxCode"] == "3"
+    assert res.bank_accounts.loc[0, "BankAccountNumber"] == "12345678903"
+    assert res.header.loc[0, "SoftwareCompanyName"] == "Tripletex"
+
+
+def test_debit_credit_indicator_lines(tmp_path: Path, cache: Path) -> None:
+    xml = SAFT_TRIPLETEX_FLAT.replace(
+        "<DebitAmount>1250.00</DebitAmount>",
+        "<Amount>1250.00</Amount><DebitCreditIndicator>D</DebitCreditIndicator>").replace(
+        "<CreditAmount>250.00</CreditAmount>",
+        "<Amount>250.00</Amount><DebitCreditIndicator>C</DebitCreditIndicator>")
+    src = tmp_path / "dc.xml"
+    src.write_text(xml, encoding="utf-8")
+    lines = saft_engine.load_saft(src, cache_dir=cache).lines
+    assert lines["Debit"].tolist() == [1250.0, 0.0, 0.0]
+    assert lines["Credit"].tolist() == [0.0, 1000.0, 250.0]
+
+
+def test_report_gui_parses_through_cache(tmp_path: Path, cache: Path, monkeypatch) -> None:
+    pytest.importorskip("xlsxwriter")
+    import run_saft_pro_gui
+
+    monkeypatch.setenv(saft_engine.CACHE_ENV, str(cache))
+    src = tmp_path / "flat.xml"
+    src.write_text(SAFT_TRIPLETEX_FLAT, encoding="utf-8")
+    spp.parse_saft(src, tmp_path / "direkte")                 # grunnlinjen: CSV rett fra parseren
+
+    def same_as_direct(csv_dir: Path) -> None:
+        names = sorted(p.name for p in (tmp_path / "direkte").glob("*.csv"))
+        assert "raw_elements.csv" in names
+        assert sorted(p.name for p in csv_dir.glob("*.csv")) == names
+        for name in names:
+            assert (csv_dir / name).read_bytes() == (tmp_path / "direkte" / name).read_bytes(), name
+
+    saft_engine.load_saft(src, csv_dir=tmp_path / "bom", raw_mode="full")     # ett gjennomløp
+    same_as_direct(tmp_path / "bom")
+    assert (tmp_path / "bom" / "saft_manifest.json").exists()
+    assert not list(cache.glob("*/raw_elements.parquet"))        # cachen har ingen rådump
+    saft_engine.load_saft(src, csv_dir=tmp_path / "treff", raw_mode="full")
+    same_as_direct(tmp_path / "treff")
+
+    run_saft_pro_gui._run_full_process(src, tmp_path / "ut")
+    assert (tmp_path / "ut" / "excel" / "general_ledger.xlsx").exists()
+    assert (tmp_path / "ut" / "csv" / "raw_elements.csv").exists()
+
+    # mva-dashbordet etterpå: ren cache-oppslag
+    monkeypatch.setattr(spp, "parse_saft", lambda *a, **k: pytest.fail("parset på nytt"))
+    assert saft_engine.load_saft(src).vat_lines["TaxCode"].tolist() == ["3"]
@@ -0,0 +1,209 @@
+"""
+Paritet og ytelse for de kompilerte uttrekksplanene i saft_parser_pro.
+
+Planene skal gi nøyaktig de samme verdiene som referansefunksjonene
+_first/_amount_of for SAF-T 1.10, 1.30 og Tripletex-varianten.
+"""
+from __future__ import annotations
+
+import csv
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+from lxml import etree
+
+PARSERS_DIR = Path(__file__).resolve().parents[1] / "src" / "app" / "parsers"
+if str(PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(PARSERS_DIR))
+
+import saft_parser_pro as spp  # noqa: E402
+
+# Tidsmålinger er avhengige av maskinen – kjøres bare med AO7_BENCHMARK=1
+benchmark = pytest.mark.skipif(not os.environ.get("AO7_BENCHMARK"),
+                               reason="mikrobenchmark (sett AO7_BENCHMARK=1)")
+
+# 1.10: eldre taggnavn, beløp som direkte tekst
+SAFT_110 = """<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="urn:StandardAuditFile-Taxation-Financial:NO">
+  <Header>
+    <AuditFileVersion>1.10</AuditFileVersion><FileCreationDate>2019-02-01</FileCreationDate>
+    <Company><CompanyName>Gamle AS</CompanyName><CompanyID>888888888</CompanyID></Company>
+    <DefaultCurrencyCode>NOK</DefaultCurrencyCode>
+    <SelectionCriteria><SelectionStart>2018-01-01</SelectionStart><SelectionEnd>2018-12-31</SelectionEnd></SelectionCriteria>
+  </Header>
+  <MasterFiles>
+    <GeneralLedgerAccounts>
+      <Account><AccountID>1920</AccountID><AccountDescription>Bank</AccountDescription>
+        <GroupingCategoryCode>19</GroupingCategoryCode><OpeningDebitBalance>10.00</OpeningDebitBalance></Account>
+    </GeneralLedgerAccounts>
+    <Suppliers>
+      <Supplier><SupplierID>S1</SupplierID><SupplierName>Lev AS</SupplierName>
+        <Address><City>Oslo</City><PostalCode>0150</PostalCode></Address></Supplier>
+    </Suppliers>
+    <TaxTable><TaxTableEntry><TaxType>MVA</TaxType><Description>Inngående</Description>
+      <TaxCodeDetails><TaxCode>1</TaxCode><StandardCode>1</StandardCode><TaxPercentage>25</TaxPercentage></TaxCodeDetails>
+    </TaxTableEntry></TaxTable>
+  </MasterFiles>
+  <GeneralLedgerEntries>
+    <Journal><JournalID>GL</JournalID>
+      <Transaction>
+        <TransactionNo>17</TransactionNo><EntryDate>2018-03-01</EntryDate><Period>3</Period><Year>2018</Year>
+        <Line><LineID>1</LineID><AccountID>1920</AccountID><Narrative>Betaling</Narrative>
+          <CreditAmount>80.00</CreditAmount></Line>
+        <Line><LineID>2</LineID><SupplierID>S1</SupplierID><AccountID></AccountID><AccountID>2400</AccountID>
+          <DebitAmount>80.00</DebitAmount><PostingDate>2018-03-02</PostingDate></Line>
+      </Transaction>
+    </Journal>
+  </GeneralLedgerEntries>
+</AuditFile>
+"""
+
+# 1.30: nestede <Amount>, mva-splitt og kildedokumenter
+SAFT_130 = """<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="urn:StandardAuditFile-Taxation-Financial:NO">
+  <Header>
+    <AuditFileVersion>1.30</AuditFileVersion><AuditFileDateCreated>2025-02-01</AuditFileDateCreated>
+    <Company><CompanyName>ACME AS</CompanyName><CompanyID>999999999</CompanyID></Company>
+    <DefaultCurrencyCode>NOK</DefaultCurrencyCode>
+    <SelectionCriteria><SelectionStartDate>2025-01-01</SelectionStartDate><SelectionEndDate>2025-12-31</SelectionEndDate></SelectionCriteria>
+  </Header>
+  <MasterFiles>
+    <Customers>
+      <Customer><CustomerID>C1</CustomerID><Name>Kunde AS</Name><VATNumber>NO1MVA</VATNumber>
+        <BalanceAccountStructure><AccountID>1500</AccountID>
+          <OpeningDebitBalance>0.00</OpeningDebitBalance><ClosingDebitBalance>125.00</ClosingDebitBalance>
+        </BalanceAccountStructure>
+      </Customer>
+    </Customers>
+  </MasterFiles>
+  <GeneralLedgerEntries>
+    <Journal><JournalID>S</JournalID>
+      <Transaction>
+        <TransactionID>T1</TransactionID><Period>1</Period><PeriodYear>2025</PeriodYear>
+        <TransactionDate>2025-01-10</TransactionDate><SourceID>U1</SourceID><VoucherType>Salg</VoucherType>
+        <Line><RecordID>1</RecordID><CustomerID>C1</CustomerID>
+          <DebitAmount><Amount>125.00</Amount><CurrencyCode>EUR</CurrencyCode><CurrencyAmount>11</CurrencyAmount></DebitAmount></Line>
+        <Line><RecordID>2</RecordID><AccountID>3000</AccountID><Description>Salg</Description>
+          <CreditAmount><Amount>100.00</Amount></CreditAmount>
+          <TaxInformation><TaxType>MVA</TaxType><TaxCode>3</TaxCode><TaxPercentage>25</TaxPercentage>
+            <TaxAmount><Amount>25.00</Amount></TaxAmount></TaxInformation>
+          <Analysis><AnalysisType>A</AnalysisType><AnalysisID>P1</AnalysisID>
+            <AnalysisAmount><Amount>100.00</Amount></AnalysisAmount></Analysis></Line>
+      </Transaction>
+    </Journal>
+  </GeneralLedgerEntries>
+  <SourceDocuments>
+    <SalesInvoices><Invoice><InvoiceNo>1001</InvoiceNo><CustomerID>C1</CustomerID>
+      <InvoiceDate>2025-01-10</InvoiceDate><DueDate>2025-01-24</DueDate>
+      <DocumentTotals><NetTotal>100.00</NetTotal><GrossTotal>125.00</GrossTotal></DocumentTotals>
+    </Invoice></SalesInvoices>
+  </SourceDocuments>
+</AuditFile>
+"""
+
+# Tripletex: eget namespace, beløp som attributt og valutafelter
+SAFT_TRIPLETEX = """<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="urn:StandardAuditFile-Tax">
+  <Header>
+    <AuditFileVersion>1.0</AuditFileVersion><FileCreationDateTime>2024-05-01T10:00:00</FileCreationDateTime>
+    <Company><CompanyName>Tripletex Demo AS</CompanyName></Company>
+    <SelectionCriteria><SelectionStartDate>2024-01-01</SelectionStartDate><SelectionEndDate>2024-04-30</SelectionEndDate></SelectionCriteria>
+  </Header>
+  <MasterFiles>
+    <GeneralLedgerAccounts>
+      <Account><AccountID>2400</AccountID><AccountDescription>Leverandørgjeld</AccountDescription>
+        <ClosingCreditBalance Amount="1 250.00"/></Account>
+    </GeneralLedgerAccounts>
+  </MasterFiles>
+  <GeneralLedgerEntries>
+    <Journal><JournalID>1</JournalID>
+      <Transaction>
+        <TransactionID>55</TransactionID><TransactionDate>2024-02-01</TransactionDate>
+        <Description>Innkjøp</Description><CurrencyCode>EUR</CurrencyCode>
+        <Line><RecordID>1</RecordID><AccountID>6300</AccountID><DebitAmount Amount="1000.00"/>
+          <ForeignAmount>90</ForeignAmount><ExchangeRate>11.1</ExchangeRate>
+          <DebitTaxAmount><Amount>250.00</Amount></DebitTaxAmount></Line>
+        <Line><RecordID>2</RecordID><AccountID>2400</AccountID><CreditAmount>1 250,00</CreditAmount></Line>
+      </Transaction>
+    </Journal>
+  </GeneralLedgerEntries>
+</AuditFile>
+"""
+
+VARIANTS = {"1.10": SAFT_110, "1.30": SAFT_130, "tripletex": SAFT_TRIPLETEX}
+
+# plan -> elementtagger planen brukes på i parseren
+PLAN_ELEMENTS = {
+    "header": ("Header",),
+    "account": ("Account",),
+    "tax": ("TaxTableEntry",),
+    "customer": ("Customer",),
+    "supplier": ("Supplier",),
+    "balance": ("BalanceAccountStructure",),
+    "voucher": ("Transaction",),
+    "line": ("Line",),
+    "line_ref": ("Line",),
+    "analysis": ("Analysis",),
+    "invoice": ("Invoice",),
+}
+
+
+def _reference(el, name: str, ns: str) -> dict:
+    fields, amounts = spp._PLAN_SPECS[name]
+    out = {key: spp._first(el, cands, ns) for key, cands in fields.items()}
+    out.update({a: spp._amount_of(el, a, ns) for a in amounts})
+    return out
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 1  Paritet mot _first/_amount_of
+# ────────────────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("variant", sorted(VARIANTS))
+def test_plans_match_reference(variant: str) -> None:
+    root = etree.fromstring(VARIANTS[variant].encode("utf-8"))
+    ns = etree.QName(root).namespace or ""
+    plans = spp._plans_for(ns)
+    checked = 0
+    for name, tags in PLAN_ELEMENTS.items():
+        for tag in tags:
+            for el in root.iter(spp._q(ns, tag)):
+                assert plans[name].extract(el) == _reference(el, name, ns), (variant, name)
+                checked += 1
+    assert checked >= 6
+
+
+def test_tripletex_namespace_is_parsed(tmp_path: Path) -> None:
+    src = tmp_path / "tripletex.xml"
+    src.write_text(SAFT_TRIPLETEX, encoding="utf-8")
+    spp.parse_saft(src, tmp_path / "out", raw_mode="off")
+    with (tmp_path / "out" / "transactions.csv").open(encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [r["AccountID"] for r in rows] == ["6300", "2400"]
+    assert rows[0]["Debit"] == "1000.00" and rows[0]["VoucherID"] == "55"
+    assert rows[0]["TransactionDate"] == "2024-02-01" and rows[0]["CurrencyCode"] == "EUR"
+    assert rows[0]["DebitTaxAmount"] == "250.00"
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 2  Mikrobenchmark – linjer pr sekund (opt-in)
+# ────────────────────────────────────────────────────────────────────────────
+@benchmark
+def test_plan_is_faster_than_first() -> None:
+    root = etree.fromstring(SAFT_130.encode("utf-8"))
+    ns = etree.QName(root).namespace
+    lines = list(root.iter(spp._q(ns, "Line"))) * 2000
+    plan = spp._plans_for(ns)["line"]
+
+    def rate(fn) -> float:
+        t0 = time.perf_counter()
+        for ln in lines:
+            fn(ln)
+        return len(lines) / (time.perf_counter() - t0)
+
+    ref_rate = rate(lambda ln: _reference(ln, "line", ns))
+    plan_rate = rate(plan.extract)
+    print(f"\n_first: {ref_rate:,.0f} linjer/s – plan: {plan_rate:,.0f} linjer/s")
+    assert plan_rate > ref_rate
@@ -0,0 +1,71 @@
+"""
+Tester for saft_openitems – avstemming av fakturaer mot betalinger (åpne poster).
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+PARSERS_DIR = Path(__file__).resolve().parents[1] / "src" / "app" / "parsers"
+if str(PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(PARSERS_DIR))
+
+import saft_openitems as oi  # noqa: E402
+import saft_controls_and_exports as sce  # noqa: E402
+
+
+def _lines() -> pd.DataFrame:
+    rows = [
+        # C1: F1 betalt via referanse, F2 delbetalt via referanse
+        ("C1", "F1", "2024-01-10", 100.0, 0.0),
+        ("C1", "F1", "2024-02-01", 0.0, 100.0),
+        ("C1", "F2", "2024-02-10", 200.0, 0.0),
+        ("C1", "F2", "2024-03-01", 0.0, 50.0),
+        # C2: F3 betalt uten referanse (beløp); B9 fordeles FIFO på F4 og F5
+        ("C2", "F3", "2024-01-05", 300.0, 0.0),
+        ("C2", "", "2024-01-20", 0.0, 300.0),
+        ("C2", "F4", "2024-02-05", 80.0, 0.0),
+        ("C2", "F5", "2024-02-06", 70.0, 0.0),
+        ("C2", "B9", "2024-03-01", 0.0, 100.0),
+        ("", "X", "2024-03-01", 5.0, 0.0),           # uten part: ikke med
+    ]
+    df = pd.DataFrame(rows, columns=["CustomerID", "DocumentNumber", "TransactionDate", "Debit", "Credit"])
+    df["CustomerName"] = df["CustomerID"].map({"C1": "Kunde 1"}).fillna("")
+    return df
+
+
+def test_matching_steps_and_balances() -> None:
+    inv = pd.DataFrame({"InvoiceNo": ["F2", "F5"], "DueDate": ["2024-03-10", "2024-03-06"]})
+    res = oi.match_open_items(_lines(), "AR", invoices=inv)
+    items = res.items.set_index("Ref")
+
+    assert items.loc["F1", ["Open", "MatchedBy"]].tolist() == [0.0, "ref"]
+    assert items.loc["F2", ["Original", "Open", "MatchedBy"]].tolist() == [200.0, 150.0, "ref"]
+    assert items.loc["F3", ["Open", "MatchedBy"]].tolist() == [0.0, "amount"]
+    assert items.loc["F4", "Open"] == 0.0 and items.loc["F5", "Open"] == 50.0
+    assert items.loc["F5", "DueDate"] == pd.Timestamp("2024-03-06")
+    assert items.loc["F2", "CustomerName"] == "Kunde 1"
+    # summen av åpne poster er partens saldo, og hver linje peker på sin post
+    assert res.items.groupby("CustomerID")["Open"].sum().to_dict() == {"C1": 150.0, "C2": 50.0}
+    assert len(res.line_item) == 9 and (res.line_item >= 0).all()
+
+    ap = _lines().rename(columns={"CustomerID": "SupplierID", "CustomerName": "SupplierName",
+                                  "Debit": "Credit", "Credit": "Debit"})
+    ap_open = oi.open_items(ap, "AP")
+    assert ap_open.groupby("SupplierID")["Open"].sum().to_dict() == {"C1": -150.0, "C2": -50.0}
+
+
+def test_open_items_asof_and_aging() -> None:
+    early = oi.open_items(_lines(), "AR", asof="2024-02-15")
+    assert early.set_index("Ref")["Open"].to_dict() == {"F2": 200.0, "F4": 80.0, "F5": 70.0}
+
+    cube = sce.aging_cube(early, "CustomerID", ["2024-03-31"], "CustomerName",
+                          date_col="Date", amount_col="Open").set_index("CustomerID")
+    assert cube.loc["C1", sce.AGING_BUCKETS].tolist() == [0.0, 200.0, 0.0, 0.0]
+    assert cube.loc["C2", "Total"] == 150.0
+
+    with pytest.raises(ValueError):
+        oi.open_items(_lines(), "GL")
@@ -0,0 +1,437 @@
+"""
+Tester for utdata-modusene i saft_parser_pro (CSV/Parquet m.m.).
+
+Parser-modulene under src/app/parsers importerer hverandre som toppnivåmoduler,
+så mappen legges på sys.path her.
+"""
+from __future__ import annotations
+
+import csv
+import gzip
+import json
+import os
+import zipfile
+import sys
+from decimal import Decimal
+from pathlib import Path
+
+import pytest
+
+PARSERS_DIR = Path(__file__).resolve().parents[1] / "src" / "app" / "parsers"
+if str(PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(PARSERS_DIR))
+
+import saft_parser_pro as spp  # noqa: E402
+
+SAFT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<AuditFile xmlns="urn:StandardAuditFile-Taxation-Financial:NO">
+  <Header>
+    <AuditFileVersion>1.30</AuditFileVersion>
+    <AuditFileDateCreated>2025-02-01</AuditFileDateCreated>
+    <Company><CompanyName>ACME AS</CompanyName><CompanyID>999999999</CompanyID></Company>
+    <DefaultCurrencyCode>NOK</DefaultCurrencyCode>
+    <SelectionCriteria>
+      <SelectionStartDate>2025-01-01</SelectionStartDate>
+      <SelectionEndDate>2025-12-31</SelectionEndDate>
+    </SelectionCriteria>
+  </Header>
+  <MasterFiles>
+    <GeneralLedgerAccounts>
+      <Account>
+        <AccountID>1500</AccountID><AccountDescription>Kundefordringer</AccountDescription>
+        <AccountType>GL</AccountType>
+        <OpeningDebitBalance>0.00</OpeningDebitBalance><ClosingDebitBalance>125.00</ClosingDebitBalance>
+      </Account>
+      <Account>
+        <AccountID>3000</AccountID><AccountDescription>Salg</AccountDescription>
+        <AccountType>GL</AccountType>
+        <OpeningCreditBalance>0.00</OpeningCreditBalance><ClosingCreditBalance>100.00</ClosingCreditBalance>
+      </Account>
+    </GeneralLedgerAccounts>
+    <Customers>
+      <Customer>
+        <CustomerID>C1</CustomerID><Name>Kunde AS</Name>
+        <BalanceAccountStructure><AccountID>1500</AccountID></BalanceAccountStructure>
+      </Customer>
+    </Customers>
+    <TaxTable>
+      <TaxTableEntry><TaxType>MVA</TaxType><Description>Merverdiavgift</Description>
+        <TaxCodeDetails><TaxCode>3</TaxCode><TaxPercentage>25.00</TaxPercentage></TaxCodeDetails>
+      </TaxTableEntry>
+    </TaxTable>
+  </MasterFiles>
+  <GeneralLedgerEntries>
+    <Journal>
+      <JournalID>GL</JournalID><Description>Hovedbok</Description>
+      <Transaction>
+        <TransactionID>T1</TransactionID><Period>1</Period><PeriodYear>2025</PeriodYear>
+        <TransactionDate>2025-01-10</TransactionDate>
+        <Line>
+          <RecordID>1</RecordID><CustomerID>C1</CustomerID>
+          <DebitAmount><Amount>125.00</Amount></DebitAmount>
+        </Line>
+        <Line>
+          <RecordID>2</RecordID><AccountID>3000</AccountID>
+          <CreditAmount><Amount>100.00</Amount></CreditAmount>
+          <TaxInformation><TaxType>MVA</TaxType><TaxCode>3</TaxCode><TaxPercentage>25</TaxPercentage>
+            <TaxAmount><Amount>25.00</Amount></TaxAmount></TaxInformation>
+          <Analysis><AnalysisType>A</AnalysisType><AnalysisID>P1</AnalysisID>
+            <AnalysisAmount><Amount>100.00</Amount></AnalysisAmount></Analysis>
+        </Line>
+      </Transaction>
+    </Journal>
+  </GeneralLedgerEntries>
+</AuditFile>
+"""
+
+
+@pytest.fixture()
+def saft_file(tmp_path: Path) -> Path:
+    p = tmp_path / "saft.xml"
+    p.write_text(SAFT_XML, encoding="utf-8")
+    return p
+
+
+def _read_csv(p: Path) -> list[dict]:
+    with p.open(encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 1  Parquet-modus – typede kolonner og skjemaversjon
+# ────────────────────────────────────────────────────────────────────────────
+def test_parquet_output_is_typed(saft_file: Path, tmp_path: Path) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    out = tmp_path / "pq"
+    spp.parse_saft(saft_file, out, fmt="parquet", row_group_size=1)
+
+    tx = pq.read_table(out / "transactions.parquet")
+    assert tx.num_rows == 2
+    assert pq.ParquetFile(out / "transactions.parquet").num_row_groups == 2
+    assert str(tx.schema.field("Debit").type).startswith("decimal128")
+    assert str(tx.schema.field("TransactionDate").type) == "date32[day]"
+
+    rows = tx.to_pylist()
+    assert rows[0]["Debit"] == Decimal("125.00")
+    assert rows[0]["AccountID"] == "1500"  # kontrollkonto via BalanceAccountStructure
+    assert rows[1]["TaxAmount"] == Decimal("25.00")
+
+    schema = json.loads((out / spp.SCHEMA_FILE).read_text(encoding="utf-8"))
+    assert schema["schema_version"] == spp.PARQUET_SCHEMA_VERSION
+    assert schema["tables"]["transactions"]["Debit"] == "amount"
+
+
+def test_parquet_reports_rejected_values(tmp_path: Path, caplog) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    import saft_stats
+
+    src = tmp_path / "feil.xml"
+    src.write_text(SAFT_XML.replace("<TaxPercentage>25.00</TaxPercentage>",
+                                    "<TaxPercentage>25,00</TaxPercentage>"), encoding="utf-8")
+    with caplog.at_level("WARNING", logger="saft"):
+        spp.parse_saft(src, tmp_path / "pq", fmt="parquet", raw_mode="off")
+    assert pq.read_table(tmp_path / "pq" / "tax_table.parquet").column("TaxPercentage").to_pylist() == [None]
+    stats = saft_stats.load_stats(tmp_path / "pq")["tables"]
+    assert stats["tax_table"]["rejected"] == {"TaxPercentage": 1}
+    assert "rejected" not in stats["transactions"]
+    assert any("TaxPercentage" in r.getMessage() and "25,00" in r.getMessage() for r in caplog.records)
+
+
+def test_csv_and_parquet_have_same_rows(saft_file: Path, tmp_path: Path) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    spp.parse_saft(saft_file, tmp_path / "csv")
+    spp.parse_saft(saft_file, tmp_path / "pq", fmt="parquet")
+
+    for name in ("transactions", "accounts", "customers", "tax_table", "analysis_lines"):
+        csv_rows = _read_csv(tmp_path / "csv" / f"{name}.csv")
+        pq_rows = pq.read_table(tmp_path / "pq" / f"{name}.parquet").to_pylist()
+        assert len(csv_rows) == len(pq_rows), name
+        assert list(csv_rows[0].keys()) == list(pq_rows[0].keys()), name
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 2  Rådump – off / sampled / full
+# ────────────────────────────────────────────────────────────────────────────
+def test_raw_mode_off_writes_no_dump(saft_file: Path, tmp_path: Path) -> None:
+    out = tmp_path / "out"
+    spp.parse_saft(saft_file, out)                      # full: lager raw_elements.csv
+    assert (out / "raw_elements.csv").exists()
+    spp.parse_saft(saft_file, out, raw_mode="off")      # gammel dump skal fjernes
+    assert not (out / "raw_elements.csv").exists()
+    assert not (out / "raw_path_stats.csv").exists()
+    assert len(_read_csv(out / "transactions.csv")) == 2
+
+
+def test_raw_mode_sampled_keeps_totals(saft_file: Path, tmp_path: Path) -> None:
+    out = tmp_path / "out"
+    spp.parse_saft(saft_file, out, raw_mode="sampled", raw_sample=1)
+
+    stats = {r["XPath"]: r for r in _read_csv(out / "raw_path_stats.csv")}
+    rec = stats["/AuditFile/GeneralLedgerEntries/Journal/Transaction/Line/RecordID"]
+    assert (rec["Count"], rec["TextCount"], rec["Sampled"]) == ("2", "2", "1")
+
+    raw = _read_csv(out / "raw_elements.csv")
+    assert len(raw) == len(stats)                        # én eksempelrad pr sti
+    assert raw[0]["XPath"] == "/AuditFile/Header/AuditFileVersion"
+
+
+def test_sampled_parse_writes_unknown_reports(saft_file: Path, tmp_path: Path) -> None:
+    import postprocess_unknown_nodes as pun
+
+    out = tmp_path / "out"
+    spp.parse_saft(saft_file, out, raw_mode="sampled", raw_sample=1)
+    summary = {r["UnknownRoot"]: r["Count"] for r in _read_csv(out / "unknown_summary.csv")}
+    assert summary["/AuditFile/MasterFiles/Customers"] == "1"
+    assert not any("Journal" in r["XPath"] for r in _read_csv(out / "unknown_nodes.csv"))
+
+    # samme resultat som etterbehandlingen fra filene på disk
+    parsed = {n: (out / n).read_bytes() for n in ("unknown_nodes.csv", "unknown_summary.csv")}
+    pun.write_unknown_reports(out)
+    assert parsed == {n: (out / n).read_bytes() for n in parsed}
+    assert pun.is_known("/n:AuditFile/n:MasterFiles[1]/n:Customers/n:Customer[3]/n:Name")
+    assert pun.root_group("/AuditFile/MasterFiles/Foo[2]/Bar") == "/AuditFile/MasterFiles/Foo"
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 3  Parallell parsing – samme rader og rekkefølge som sekvensielt
+# ────────────────────────────────────────────────────────────────────────────
+def _multi_journal_xml(n_journals: int = 3, n_tx: int = 25) -> str:
+    journals = []
+    for j in range(n_journals):
+        txs = []
+        for t in range(n_tx):
+            amt = f"{(j + 1) * 100 + t}.50"
+            txs.append(
+                f"<Transaction><TransactionID>{j}-{t}</TransactionID><Period>{t % 12 + 1}</Period>"
+                f"<TransactionDate>2025-01-{t % 28 + 1:02d}</TransactionDate>"
+                f"<Line><RecordID>1</RecordID><CustomerID>C1</CustomerID>"
+                f"<DebitAmount><Amount>{amt}</Amount></DebitAmount></Line>"
+                f"<Line><RecordID>2</RecordID><AccountID>3000</AccountID>"
+                f"<CreditAmount><Amount>{amt}</Amount></CreditAmount>"
+                f"<Analysis><AnalysisType>A</AnalysisType><AnalysisID>P{t}</AnalysisID></Analysis></Line>"
+                f"</Transaction>\n"
+            )
+        journals.append(f"<Journal><JournalID>J{j}</JournalID><Description>Journal {j}</Description>\n"
+                        + "".join(txs) + "</Journal>\n")
+    head, _ = SAFT_XML.split("<GeneralLedgerEntries>")
+    return head + "<GeneralLedgerEntries>\n" + "".join(journals) + "</GeneralLedgerEntries>\n</AuditFile>\n"
+
+
+@pytest.mark.parametrize("raw_mode", ["off", "sampled"])
+def test_parallel_matches_sequential(tmp_path: Path, monkeypatch, raw_mode: str) -> None:
+    src = tmp_path / "multi.xml"
+    src.write_text(_multi_journal_xml(), encoding="utf-8")
+    monkeypatch.setattr(spp, "_CHUNK_MIN", 512)   # mange små biter
+
+    spp.parse_saft(src, tmp_path / "seq", raw_mode=raw_mode)
+    spp.parse_saft(src, tmp_path / "par", raw_mode=raw_mode, workers=2)
+
+    seq = sorted(p.name for p in (tmp_path / "seq").iterdir())
+    assert seq == sorted(p.name for p in (tmp_path / "par").iterdir())
+    for name in seq:
+        assert (tmp_path / "par" / name).read_bytes() == (tmp_path / "seq" / name).read_bytes(), name
+    assert len(_read_csv(tmp_path / "par" / "vouchers.csv")) == 75
+
+
+def test_parallel_rejects_full_raw_dump(saft_file: Path, tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        spp.parse_saft(saft_file, tmp_path / "out", raw_mode="full", workers=2)
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 4  Komprimert input – strømmet, med framdrift i komprimerte bytes
+# ────────────────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("kind", ["zip", "gz"])
+def test_compressed_input_matches_xml(saft_file: Path, tmp_path: Path, kind: str) -> None:
+    packed = tmp_path / f"saft.{kind}"
+    if kind == "zip":
+        with zipfile.ZipFile(packed, "w", zipfile.ZIP_DEFLATED) as z:
+            z.write(saft_file, "export.xml")
+    else:
+        packed.write_bytes(gzip.compress(saft_file.read_bytes()))
+
+    calls: list = []
+    spp.parse_saft(saft_file, tmp_path / "xml", raw_mode="off")
+    spp.parse_saft(packed, tmp_path / kind, raw_mode="off", progress=lambda done, total: calls.append((done, total)))
+
+    for p in (tmp_path / "xml").iterdir():
+        if p.name == spp.MANIFEST_FILE:          # inputnavn/-størrelse er forskjellig
+            def arts(q):
+                return json.loads(q.read_text(encoding="utf-8"))["artifacts"]
+            assert arts(tmp_path / kind / p.name) == arts(p)
+            continue
+        assert (tmp_path / kind / p.name).read_bytes() == p.read_bytes(), p.name
+    size = packed.stat().st_size
+    assert calls[-1] == (size, size)
+    assert [d for d, _ in calls] == sorted(d for d, _ in calls)
+
+
+def test_gzip_input_is_streamed(tmp_path: Path) -> None:
+    # ukomprimerbart fyll gjør at komprimert størrelse ~ ukomprimert
+    filler = os.urandom(4 << 20).hex()
+    packed = tmp_path / "big.xml.gz"
+    packed.write_bytes(gzip.compress(SAFT_XML.replace("<Header>", f"<!-- {filler} --><Header>").encode("utf-8")))
+
+    src = spp._maybe_open_zip(packed)
+    try:
+        assert src.read(1 << 16).startswith(b"<?xml")
+        assert src._raw.consumed < (1 << 20) < packed.stat().st_size   # bare starten er lest fra disk
+    finally:
+        src.close()
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 5  Sjekkpunkter – avbrutt parsing fortsetter der den slapp
+# ────────────────────────────────────────────────────────────────────────────
+@pytest.mark.parametrize("kind", ["xml", "gz"])
+def test_checkpoint_resume_matches_clean_run(tmp_path: Path, monkeypatch, kind: str) -> None:
+    data = _multi_journal_xml().encode("utf-8")
+    src = tmp_path / f"multi.{kind}"
+    src.write_bytes(gzip.compress(data) if kind == "gz" else data)
+    spp.parse_saft(src, tmp_path / "clean", raw_mode="sampled")
+
+    out = tmp_path / "out"
+    real_line_row, calls = spp._line_row, []
+
+    def crash(*args):
+        calls.append(1)
+        if len(calls) == 61:                      # midt i journal 2, midt i et bilag
+            raise KeyboardInterrupt
+        return real_line_row(*args)
+
+    monkeypatch.setattr(spp, "_line_row", crash)
+    with pytest.raises(KeyboardInterrupt):
+        spp.parse_saft(src, out, raw_mode="sampled", checkpoint_secs=1e-9)
+    state = json.loads((out / spp.CHECKPOINT_FILE).read_text(encoding="utf-8"))
+    assert state["tx_done"] == 30
+
+    monkeypatch.setattr(spp, "_line_row", real_line_row)
+    spp.parse_saft(src, out, raw_mode="sampled", checkpoint_secs=1e-9)
+    assert not (out / spp.CHECKPOINT_FILE).exists()
+    assert sorted(p.name for p in out.iterdir()) == sorted(p.name for p in (tmp_path / "clean").iterdir())
+    for p in (tmp_path / "clean").iterdir():
+        assert (out / p.name).read_bytes() == p.read_bytes(), p.name
+
+
+def test_checkpoint_fingerprint_and_prefix_fallback(tmp_path: Path, monkeypatch) -> None:
+    src = tmp_path / "multi.xml"
+    src.write_text(_multi_journal_xml(), encoding="utf-8")
+    monkeypatch.setattr(spp, "_FINGERPRINT_SAMPLE", 256)       # hode/hale dekker ikke hele filen
+    spp.parse_saft(src, tmp_path / "clean", raw_mode="off")
+    out = tmp_path / "out"
+    real_line_row, real_hash_prefix = spp._line_row, spp._hash_prefix
+
+    def interrupted_run() -> dict:
+        calls: list = []
+
+        def crash(*args):
+            calls.append(1)
+            if len(calls) == 61:
+                raise KeyboardInterrupt
+            return real_line_row(*args)
+
+        # ingen full hash av inputfilen før parsingen
+        monkeypatch.setattr(spp, "_hash_prefix", lambda *a: pytest.fail("hashet inputfilen"))
+        monkeypatch.setattr(spp, "_line_row", crash)
+        with pytest.raises(KeyboardInterrupt):
+            spp.parse_saft(src, out, raw_mode="off", checkpoint_secs=1e-9)
+        monkeypatch.setattr(spp, "_line_row", real_line_row)
+        monkeypatch.setattr(spp, "_hash_prefix", real_hash_prefix)
+        return json.loads((out / spp.CHECKPOINT_FILE).read_text(encoding="utf-8"))
+
+    state = interrupted_run()
+    assert set(state["input"]) == {"size", "mtime_ns", "sample_sha256"}
+    assert 0 < state["input_prefix"][0] <= src.stat().st_size
+
+    # bare mtime endret: starten som allerede er lest hashes, og parsingen fortsetter
+    st = src.stat()
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    resumed: list = []
+    real_resume = spp.resume_pieces
+    monkeypatch.setattr(spp, "resume_pieces", lambda *a: resumed.append(1) or real_resume(*a))
+    spp.parse_saft(src, out, raw_mode="off", checkpoint_secs=1e-9)
+    assert resumed == [1]
+    for name in ("transactions.csv", "vouchers.csv"):
+        assert (out / name).read_bytes() == (tmp_path / "clean" / name).read_bytes(), name
+
+    # endret innhold midt i filen (samme størrelse, hode og hale): starter på nytt
+    interrupted_run()
+    data = bytearray(src.read_bytes())
+    i = data.index(b"<Description>Journal 0</Description>")
+    data[i + 13:i + 20] = b"JOURNAL"
+    src.write_bytes(bytes(data))
+    resumed.clear()
+    spp.parse_saft(src, out, raw_mode="off", checkpoint_secs=1e-9)
+    assert resumed == []
+
+
+def test_checkpoint_for_other_file_is_ignored(saft_file: Path, tmp_path: Path) -> None:
+    out = tmp_path / "out"
+    out.mkdir()
+    (out / spp.CHECKPOINT_FILE).write_text(json.dumps({"version": spp.CHECKPOINT_VERSION, "input": "x"}))
+    spp.parse_saft(saft_file, out, raw_mode="off", checkpoint_secs=60)
+    assert len(_read_csv(out / "transactions.csv")) == 2
+    assert not (out / spp.CHECKPOINT_FILE).exists()
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 6  Manifest – radantall/størrelse pr fil, og oppslag uten rekursivt søk
+# ────────────────────────────────────────────────────────────────────────────
+def test_manifest_lists_artifacts_and_resolves_them(saft_file: Path, tmp_path: Path, monkeypatch) -> None:
+    import saft_manifest
+
+    out = tmp_path / "klient" / "csv"
+    spp.parse_saft(saft_file, out, raw_mode="off")
+    doc = json.loads((out / spp.MANIFEST_FILE).read_text(encoding="utf-8"))
+    tx = doc["artifacts"]["transactions"]
+    assert tx["file"] == "transactions.csv" and tx["rows"] == 2
+    assert tx["bytes"] == (out / "transactions.csv").stat().st_size and "sha256" not in tx
+    assert "raw_elements" not in doc["artifacts"]
+
+    saft_manifest.clear_cache()
+    monkeypatch.setattr(saft_manifest, "_bounded_search", lambda *a: pytest.fail("søkte i mappetreet"))
+    assert saft_manifest.find_artifact(tmp_path / "klient", "transactions.csv") == out / "transactions.csv"
+    assert saft_manifest.find_artifact(out, "vouchers.csv") == out / "vouchers.csv"
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# 7  Statistikk – oversikten fra saft_stats.json uten å lese tabellene
+# ────────────────────────────────────────────────────────────────────────────
+def test_stats_sidecar_drives_overview(saft_file: Path, tmp_path: Path, monkeypatch) -> None:
+    pytest.importorskip("pyarrow")
+    import saft_dataset_overview as sdo
+    import saft_stats
+
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    # statistikken føres av radskriverne – tabellene leses ikke etter parsingen
+    monkeypatch.setattr(pd, "read_csv", lambda *a, **k: pytest.fail("leste CSV"))
+    monkeypatch.setattr(pq, "read_table", lambda *a, **k: pytest.fail("leste Parquet"))
+    spp.parse_saft(saft_file, tmp_path / "csv", raw_mode="off")
+    spp.parse_saft(saft_file, tmp_path / "pq", fmt="parquet", raw_mode="off")
+    monkeypatch.undo()
+    csv_tables = saft_stats.load_stats(tmp_path / "csv")["tables"]
+    pq_tables = saft_stats.load_stats(tmp_path / "pq")["tables"]
+
+    tx = csv_tables["transactions"]
+    assert (tx["rows"], tx["dates"]["TransactionDate"]) == (2, ["2025-01-10", "2025-01-10"])
+    assert (tx["totals"]["Debit"], tx["totals"]["TaxAmount"]) == (125.0, 25.0)
+    assert tx["distinct"] == {"VoucherID": 1, "JournalID": 1, "AccountID": 2, "CustomerID": 1,
+                              "SupplierID": 0, "TaxCode": 1}
+    for name, entry in csv_tables.items():
+        assert {k: v for k, v in entry.items() if k not in ("file", "bytes")} == \
+               {k: v for k, v in pq_tables[name].items() if k not in ("file", "bytes")}, name
+
+    monkeypatch.setattr(sdo, "count_rows", lambda p: pytest.fail(f"leste {p.name}"))
+    rows = {r[0]: r for r in sdo.overview(tmp_path / "csv")}
+    assert rows["transactions.csv"][1:4] == (2, "RecordID, VoucherID, VoucherNo, JournalID, TransactionDate, "
+                                                "PostingDate, SystemID, BatchID",
+                                             "TransactionDate 2025-01-10..2025-01-10")
+    assert {r[0]: r[1] for r in sdo.overview(tmp_path / "pq")}["transactions.parquet"] == 2
+
+    # endret fil: statistikken gjelder ikke lenger, radene telles på nytt
+    monkeypatch.undo()
+    with open(tmp_path / "csv" / "vouchers.csv", "a", encoding="utf-8") as fh:
+        fh.write("X,,,,,,,\n")
+    assert {r[0]: r[1] for r in sdo.overview(tmp_path / "csv")}["vouchers.csv"] == 2
@@ -0,0 +1,119 @@
+"""
+Tester for saft_store (felles typet transaksjonslager) og rapportenes IB/PR/UB-periodisering.
+"""
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+PARSERS_DIR = Path(__file__).resolve().parents[1] / "src" / "app" / "parsers"
+if str(PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(PARSERS_DIR))
+
+import saft_store  # noqa: E402
+import run_saft_pro_gui as gui  # noqa: E402
+import ar_ap_saldolist  # noqa: E402
+
+TX_CSV = """VoucherID,TransactionDate,PostingDate,AccountID,CustomerID,SupplierID,Debit,Credit,TaxAmount,IsGL
+1,2023-12-20,,01510,C1,,100.00,,,true
+1,2023-12-20,,3000,,,,100.00,,true
+2,2024-02-01,2024-02-03,1510.0,C2,,250.00,,,true
+2,2024-02-01,2024-02-03,3000,,,,200.00,,true
+2,2024-02-01,2024-02-03,2700,,,,50.00,50.00,true
+3,2024-03-01,,2410,,S1,,80.00,,true
+3,2024-03-01,,6300,,,80.00,,,true
+4,2024-04-01,,1510,,,10.00,,,false
+"""
+
+
+@pytest.fixture()
+def outdir(tmp_path: Path) -> Path:
+    saft_store.clear_cache()
+    (tmp_path / "transactions.csv").write_text(TX_CSV, encoding="utf-8")
+    (tmp_path / "header.csv").write_text(
+        "SelectionStart,SelectionEnd\n2024-01-01,2024-12-31\n", encoding="utf-8")
+    return tmp_path
+
+
+def test_norm_acc_series_matches_norm_acc() -> None:
+    s = pd.Series(["0012", "12.0", " 007 ", "", "0", "0.0", "1.05", "nan", "A1"])
+    assert saft_store.norm_acc_series(s).tolist() == [gui._norm_acc(x) for x in s]
+
+
+def test_reports_share_one_load(outdir: Path, monkeypatch) -> None:
+    pytest.importorskip("pyarrow")
+    builds: list = []
+    real_build = saft_store._build
+    monkeypatch.setattr(saft_store, "_build", lambda p: builds.append(p) or real_build(p))
+
+    ar_ap_saldolist.generate_saldolist(outdir)
+    gui.make_general_ledger(outdir)
+    gui.make_trial_balance(outdir)
+    assert len(builds) == 1
+
+    ar = pd.read_excel(outdir / "ar_subledger.xlsx", sheet_name="AR_Balances")
+    assert ar.set_index("CustomerID")["UB_Amount"].to_dict() == {"C1": 100.0, "C2": 250.0}
+    gl = pd.read_excel(outdir / "general_ledger.xlsx", sheet_name="GeneralLedger", dtype={"AccountID": str})
+    assert gl["AccountID"].tolist() == ["1510", "1510", "2410", "2700", "3000", "3000", "6300"]
+
+    # Ny prosess: Arrow-filen gjenbrukes; endret CSV bygger lageret på nytt
+    saft_store.clear_cache()
+    store = saft_store.load_transactions(outdir / "transactions.csv")
+    assert len(builds) == 1
+    assert store.frame["Date"].iloc[0] == pd.Timestamp("2023-12-20")
+    assert store.frame["Amount"].tolist()[:2] == [100.0, -100.0]
+
+    with open(outdir / "transactions.csv", "a", encoding="utf-8") as fh:
+        fh.write("5,2024-05-01,,1510,C1,,5.00,,,true\n")
+    st = (outdir / "transactions.csv").stat()
+    os.utime(outdir / "transactions.csv", ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert len(saft_store.load_transactions(outdir / "transactions.csv").frame) == 9
+    assert len(builds) == 2
+
+
+def test_period_balances_match_per_window_groupby(outdir: Path) -> None:
+    tx = gui._load_tx(outdir)
+    windows = gui._month_windows(pd.Timestamp("2023-12-01"), pd.Timestamp("2024-03-31"))
+    assert [w[0].strftime("%Y-%m") for w in windows] == ["2023-12", "2024-01", "2024-02", "2024-03"]
+    windows.append((pd.Timestamp("2024-05-01"), pd.Timestamp("2024-02-01")))   # dfrom > dto
+
+    for (dfrom, dto), got in zip(windows, gui._period_balances(tx, "AccountID", windows)):
+        def net(df: pd.DataFrame) -> pd.Series:
+            g = df.groupby("AccountID")[["Debit", "Credit"]].sum()
+            return g["Debit"] - g["Credit"]
+        want = pd.concat({
+            "UB": net(tx[tx["Date"] <= dto]),
+            "IB": net(tx[tx["Date"] < dfrom]),
+            "PR": net(tx[(tx["Date"] >= dfrom) & (tx["Date"] <= dto)]),
+        }, axis=1).fillna(0.0).sort_index()
+        pd.testing.assert_frame_equal(got.set_index("AccountID"), want, check_exact=False)
+
+    monthly = pd.read_excel(gui.make_monthly_subledger(outdir, "AR", "2024-01-01", "2024-03-31"))
+    c2 = monthly[monthly["CustomerID"] == "C2"].set_index("Period")
+    assert c2["PR_Amount"].to_dict() == {"2024-02": 250.0, "2024-03": 0.0}
+    assert c2.loc["2024-03", ["IB_Amount", "UB_Amount"]].tolist() == [250.0, 250.0]
+
+
+def test_saldolist_batch_in_memory(outdir: Path, monkeypatch) -> None:
+    monkeypatch.setattr(pd, "read_excel", lambda *a, **k: pytest.fail("saldolisten skal ikke lese Excel"))
+    paths = ar_ap_saldolist.generate_saldolists([outdir], ["2024-01-31", "2024-12-31"])
+    assert [p.name for p in paths] == ["ar_ap_saldolist_2024-01-31.xlsx", "ar_ap_saldolist_2024-12-31.xlsx"]
+    assert not (outdir / "ar_subledger.xlsx").exists()
+    monkeypatch.undo()
+
+    def open_by_party(path: Path) -> dict:
+        items = pd.read_excel(path, sheet_name="Customers_OpenItems", dtype={"CustomerID": str})
+        return items.groupby("CustomerID")["Open"].sum().to_dict()
+    assert open_by_party(paths[0]) == {"C1": 100.0}
+    assert open_by_party(paths[1]) == {"C1": 100.0, "C2": 250.0}
+    csv = pd.read_csv(outdir / "ar_ap_saldolist_2024-12-31.csv")
+    assert csv["Type"].tolist() == ["AR", "AR", "AP"]
+
+    ar_ap_saldolist.generate_saldolists([outdir], ["2024-01-31", "2024-12-31"], subledgers=True)
+    assert (outdir / "ar_subledger_2024-01-31.xlsx").exists()
+    assert (outdir / "ap_subledger_2024-12-31.xlsx").exists()
+    assert not (outdir / "ar_subledger.xlsx").exists()
@@ -0,0 +1,60 @@
+"""
+Tester for saft_xlsx – strømmende Excel-skriving med arkdeling ved radgrensen.
+"""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+PARSERS_DIR = Path(__file__).resolve().parents[1] / "src" / "app" / "parsers"
+if str(PARSERS_DIR) not in sys.path:
+    sys.path.insert(0, str(PARSERS_DIR))
+
+import saft_xlsx  # noqa: E402
+
+pytest.importorskip("xlsxwriter")
+pytest.importorskip("openpyxl")
+
+
+def _frame() -> pd.DataFrame:
+    return pd.DataFrame({
+        "AccountID": ["3000", "1510", "2410", "1510", "=SUM(A1)"],
+        "Date": pd.to_datetime(["2024-01-05", "2024-02-01", None, "2024-01-31", "2024-03-01"]),
+        "Debit": [10.5, np.nan, 0.0, 7.25, 1.0],
+        "Lines": [1, 2, 3, 4, 5],
+    })
+
+
+def test_sheets_split_at_row_limit_in_given_order(tmp_path: Path) -> None:
+    df = _frame()
+    order = np.array([1, 3, 2, 0, 4])
+    path = tmp_path / "gl.xlsx"
+    with saft_xlsx.XlsxStream(path, max_rows=3, chunk_rows=2) as xs:
+        names = xs.write_frame(df, "GeneralLedger", order=order)
+        assert xs.write_frame(df.iloc[:0], "Empty") == ["Empty"]
+    assert names == ["GeneralLedger", "GeneralLedger_2", "GeneralLedger_3"]
+
+    sheets = pd.read_excel(path, sheet_name=None, dtype={"AccountID": str})
+    assert list(sheets) == [*names, "Empty"]
+    assert list(sheets["Empty"].columns) == list(df.columns)
+    back = pd.concat([sheets[n] for n in names], ignore_index=True)
+    want = df.take(order).reset_index(drop=True)
+    pd.testing.assert_frame_equal(back, want, check_dtype=False)
+
+
+def test_column_formats_set_once(tmp_path: Path) -> None:
+    from openpyxl import load_workbook
+
+    path = tmp_path / "tb.xlsx"
+    with saft_xlsx.XlsxStream(path) as xs:
+        xs.write_frame(_frame(), "A" * 40)
+    ws = load_workbook(path)["A" * 31]
+    assert ws["B2"].number_format == saft_xlsx.DATE_FORMAT
+    assert ws["C2"].number_format == saft_xlsx.NUMBER_FORMAT
+    assert ws["D2"].number_format == "General"
+    assert ws["C3"].value is None and ws["B4"].value is None
+    assert ws["A6"].value == "=SUM(A1)" and ws["A6"].data_type == "s"
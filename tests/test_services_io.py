@@ -0,0 +1,180 @@
+"""
+Tester for services.io – sniffing og robust CSV-lesing.
+"""
+from __future__ import annotations
+
+import os
+import time
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from src.app.services import io as sio
+
+
+@pytest.fixture(autouse=True)
+def _fresh_cache():
+    sio.clear_sniff_cache()
+    yield
+    sio.clear_sniff_cache()
+
+
+def test_sniff_reads_bounded_prefix_and_caches(tmp_path: Path, monkeypatch) -> None:
+    p = tmp_path / "hb.csv"
+    p.write_text("konto;beløp;dato\n" + "1920;1 234,56;01.01.2025\n" * 20_000, encoding="utf-8")
+    monkeypatch.setattr(Path, "read_bytes", lambda self: pytest.fail("leste hele filen"))
+    reads: list = []
+    real = sio._read_sample
+    monkeypatch.setattr(sio, "_read_sample", lambda *a: reads.append(a) or real(*a))
+
+    assert sio.sniff_csv(p, sample_bytes=4096) == ("utf-8", ";")
+    assert sio.sniff_csv(p, sample_bytes=4096) == ("utf-8", ";")
+    assert len(reads) == 1
+
+    # endret fil (ny mtime/størrelse) sniffes på nytt
+    p.write_text("konto,beløp\n1920,10\n", encoding="utf-8")
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert sio.sniff_csv(p, sample_bytes=4096) == ("utf-8", ",")
+    assert len(reads) == 2
+
+
+def test_sniff_tail_sample_sees_late_non_utf8(tmp_path: Path) -> None:
+    p = tmp_path / "latin.csv"
+    p.write_bytes(("konto;tekst\n" + "1920;bank\n" * 5_000 + "3000;salg æøå\n").encode("cp1252"))
+    assert sio.sniff_csv(p, sample_bytes=1024)[0] == "utf-8"
+    enc, sep = sio.sniff_csv(p, sample_bytes=1024, tail_bytes=256)
+    assert sep == ";" and enc.lower() != "utf-8"
+
+
+def test_sniff_utf16_and_bom(tmp_path: Path) -> None:
+    p = tmp_path / "u16.csv"
+    p.write_bytes("konto|beløp\n1|2\n".encode("utf-16"))
+    enc, sep = sio.sniff_csv(p)
+    assert enc.lower().startswith("utf-16") and sep == "|"
+    p.write_bytes("konto;beløp\n1;2\n".encode("utf-8-sig"))
+    assert sio.sniff_csv(p) == ("utf-8-sig", ";")
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# read_csv_robust – motorvalg og mikrobenchmark
+# ────────────────────────────────────────────────────────────────────────────
+def _ledger(path: Path, n: int, thousands: str = "") -> Path:
+    rows = ["Konto;Kontonavn;Bilagsnr;Dato;Beløp;Tekst"]
+    for i in range(n):
+        amt = f"{(i * 37) % 9000 + 1000:,}".replace(",", thousands) + f",{i % 100:02d}"
+        rows.append(f"{1900 + i % 50};Bank {i % 7};{i // 3};{1 + i % 28:02d}.01.2025;"
+                    f"{'-' if i % 2 else ''}{amt};Innbetaling æøå {i}")
+    path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("thousands, first", [("", "pyarrow"), (" ", "c")])
+def test_read_csv_robust_picks_fast_engine(tmp_path: Path, thousands: str, first: str) -> None:
+    if first == "pyarrow":
+        pytest.importorskip("pyarrow")
+    p = _ledger(tmp_path / "hb.csv", 200, thousands)
+    df, info = sio.read_csv_robust(p)
+    assert (info.sep, info.decimal, info.thousands, info.engine) == (";", ",", thousands or None, first)
+    assert df["Beløp"].dtype == float and df["Beløp"].iloc[1] == -1037.01
+    assert df["Dato"].iloc[0] == "01.01.2025" and df["Tekst"].iloc[0] == "Innbetaling æøå 0"
+
+
+def test_read_csv_robust_engine_fallbacks(tmp_path: Path) -> None:
+    p = tmp_path / "en.csv"
+    p.write_text("konto\n1920\n3000\n", encoding="utf-8")
+    df, info = sio.read_csv_robust(p)
+    assert info.sep == "," and df["konto"].tolist() == [1920, 3000]
+
+    assert sio.csv_engines(None) == sio.csv_engines("::") == ["python"]
+    p = tmp_path / "ujevn.csv"   # ekstra felt: pyarrow og C feiler, python-motoren leser
+    p.write_text("a;b\n1;2\n3;4;5\n", encoding="utf-8")
+    df, info = sio.read_csv_robust(p)
+    assert info.engine == "python" and len(df) == 2
+
+
+def _engine_inputs(tmp_path: Path) -> list:
+    p = _ledger(tmp_path / "hb.csv", 60_000, " ")
+    enc, sep, decimal, thousands = sio._sniff(p, 200_000, sio.TAIL_SAMPLE_BYTES)
+    p2 = _ledger(tmp_path / "hb2.csv", 60_000)
+    enc2, sep2, decimal2, _ = sio._sniff(p2, 200_000, sio.TAIL_SAMPLE_BYTES)
+    runs = [(engine, p, enc, sep, decimal, thousands) for engine in ("python", "c")]
+    runs += [(f"{engine} (uten tusenskille)", p2, enc2, sep2, decimal2, None)
+             for engine in ("python", "c", *(["pyarrow"] if sio._HAS_PYARROW else []))]
+    return runs
+
+
+def test_engines_read_identical_frames(tmp_path: Path) -> None:
+    frames = {k: sio._read_with_engine(path, k.split()[0], *args, None, False)
+              for k, path, *args in _engine_inputs(tmp_path)}
+    pd.testing.assert_frame_equal(frames["c"], frames["python"])
+    base = frames["python (uten tusenskille)"]
+    for k, df in frames.items():
+        if "uten" in k:
+            pd.testing.assert_frame_equal(df, base, check_dtype=False)
+
+
+@pytest.mark.skipif(not os.environ.get("AO7_BENCHMARK"), reason="benchmark (sett AO7_BENCHMARK=1)")
+def test_engine_benchmark(tmp_path: Path) -> None:
+    results = {}
+    for k, path, *args in _engine_inputs(tmp_path):
+        t0 = time.perf_counter()
+        sio._read_with_engine(path, k.split()[0], *args, None, False)
+        results[k] = time.perf_counter() - t0
+    print("\n" + "\n".join(f"{k:>28}: {t:.3f}s" for k, t in results.items()))
+    assert results["c"] < results["python"]
+
+
+# ────────────────────────────────────────────────────────────────────────────
+# standardize / standardize_chunked
+# ────────────────────────────────────────────────────────────────────────────
+def test_standardize_chunked_matches_in_memory(tmp_path: Path) -> None:
+    pytest.importorskip("pyarrow")
+    p = _ledger(tmp_path / "hb.csv", 1_000, " ")
+    with open(p, "a", encoding="utf-8") as fh:
+        fh.write("1920;Bank;999;2025-02-01;12,00;ISO-dato etter prøven\n")
+    mapping = {"konto": "Konto", "beløp": "Beløp", "dato": "Dato", "bilagsnr": "Bilagsnr"}
+
+    out, used = sio.standardize_chunked(p, tmp_path / "std", mapping=mapping, chunk_rows=128, sample_rows=100)
+    assert out.suffix == ".parquet" and used == {**mapping, "kontonavn": "Kontonavn"}
+    import pyarrow.parquet as pq
+    assert pq.ParquetFile(out).metadata.num_row_groups == 8
+
+    got = pd.read_parquet(out)
+    want, _ = sio.standardize(pd.read_csv(p, sep=";", dtype=str), mapping=mapping)
+    pd.testing.assert_frame_equal(got, want, check_dtype=False)
+    assert got["beløp"].iloc[1] == -1037.01
+    assert got["dato"].iloc[-1] == pd.Timestamp("2025-02-01")
+    assert got["dato"].iloc[0] == pd.Timestamp("2025-01-01")
+
+
+def test_standardize_plan_infers_formats() -> None:
+    sample = pd.DataFrame({"Amount": ["1.234,56", "12,00"], "Dato": ["31.12.2024", "01.01.2025"],
+                           "Sum": ["1,234.50", "7.25"]})
+    plan = sio.infer_standardize_plan(sample, numeric_fields=("beløp", "Sum"))
+    assert plan.rename == {"Amount": "beløp", "Dato": "dato"}
+    assert plan.date_formats == {"dato": "%d.%m.%Y"}
+    assert plan.decimals == {"beløp": ",", "Sum": "."}
+    out = sio.apply_standardize_plan(sample, plan)
+    assert out["beløp"].tolist() == [1234.56, 12.0] and out["Sum"].tolist() == [1234.5, 7.25]
+
+
+def test_to_parquet_chunk_failure_leaves_no_file(tmp_path: Path) -> None:
+    pytest.importorskip("pyarrow")
+    dst = tmp_path / "hb.parquet"
+
+    def chunks():
+        yield pd.DataFrame({"konto": ["1920"], "beløp": [1.0]})
+        raise UnicodeDecodeError("utf-8", b"\xff", 0, 1, "ugyldig byte")
+
+    with pytest.raises(UnicodeDecodeError):
+        sio.to_parquet(chunks(), dst)
+    assert list(tmp_path.iterdir()) == []
+
+    # eksisterende fil beholdes når en ny skriving feiler
+    sio.to_parquet(iter([pd.DataFrame({"konto": ["3000"], "beløp": [2.0]})]), dst)
+    with pytest.raises(UnicodeDecodeError):
+        sio.to_parquet(chunks(), dst)
+    assert pd.read_parquet(dst)["konto"].tolist() == ["3000"]
+    assert [p.name for p in tmp_path.iterdir()] == ["hb.parquet"]